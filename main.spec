@@ -7,6 +7,14 @@ a = Analysis(
     datas=[('src/client/agents', 'agents'), ('src/client/components', 'components'), ('src/client/helpers', 'helpers')],  # Include the agents directory as 'agents' in the bundle
     hiddenimports=[
     'agents.transaction',
+    'agents.registry',
+    'agents.batch',
+    'agents.raw',
+    'agents.fleet',
+    'agents.synthetic',
+    'agents.timers',
+    'agents.inform',
+    'agents.usm',
     'components.target',
     'components.varbinds',
     'components.notification',
@@ -0,0 +1,90 @@
+"""
+Records reaching the trap store during a notification storm, with and
+without the storm aggregator, and the receive rate of SNMPManager in both.
+
+A few devices each repeat a notification about a few transactions, in
+between notifications about distinct transactions. The receive rate is the
+time spent in the receive callback; the total rate also waits for the store
+to commit.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands python -m benchmarks.bench_aggregate
+"""
+import argparse
+import random
+import tempfile
+import time
+from agents.raw import RawTrapTemplate
+from commands.trap.aggregate import TrapAggregator
+from commands.trap.manager import SNMPManager
+from commands.trap.store import TrapStore
+
+
+NOTIFICATION_OID = '1.3.6.1.4.1.12345.1.1.1.1.2'
+VARBIND_OIDS = [f'1.3.6.1.4.1.12345.1.1.1.1.{index}'
+                for index in range(1, 10)]
+VALUES = ['sale', 'settled', '125.40', 'VISA', 'MID00042',
+          '2024-01-02T00:00:00', '2024-01-01T00:00:00',
+          '2024-01-01T01:00:00', '2024-01-01T01:10:00']
+MID_OID = VARBIND_OIDS[4]
+
+
+def storm(count: int, devices: int, storm_share: float):
+    rng = random.Random(1)
+    template = RawTrapTemplate(NOTIFICATION_OID, VARBIND_OIDS)
+    datagrams = []
+    for index in range(count):
+        values = list(VALUES)
+        if rng.random() < storm_share:
+            device = rng.randrange(devices)
+            values[4] = f'MID{device:05d}{rng.randrange(3)}'
+        else:
+            device = devices + index
+            values[4] = f'MID{index:08d}'
+        datagrams.append(((f'10.{device >> 16 & 255}.{device >> 8 & 255}.'
+                           f'{device & 255}', 5000),
+                          template.encode(index, index, values)))
+    return datagrams
+
+
+def run(datagrams, aggregate):
+    with tempfile.TemporaryDirectory() as directory:
+        store = TrapStore(directory, maxsize=len(datagrams))
+        manager = SNMPManager('127.0.0.1', None, 0, verbose=False,
+                              store=store, aggregate=aggregate)
+        callback = manager._callback
+        dispatcher = manager.transportDispatcher
+        start = time.perf_counter()
+        for address, data in datagrams:
+            callback(dispatcher, None, address, data)
+        received = time.perf_counter() - start
+        manager.stop()
+        total = time.perf_counter() - start
+        rows = store.query()
+    return (len(datagrams) / received, len(datagrams) / total, len(rows),
+            sum(row.count for row in rows))
+
+
+def main(count: int, devices: int, storm_share: float):
+    datagrams = storm(count, devices, storm_share)
+    print(f"{count} traps, {storm_share:.0%} from {devices} flapping devices")
+    print(f"{'aggregation':<22}{'receive/s':>11}{'stored/s':>10}"
+          f"{'rows':>9}{'count':>9}")
+    for label, aggregate in (
+            ('none', None),
+            ('host, trap OID', lambda: TrapAggregator(1.0)),
+            ('host, trap OID, MID',
+             lambda: TrapAggregator(1.0, key_OIDs=[MID_OID]))):
+        receive_rate, total_rate, rows, total = run(
+            datagrams, aggregate and aggregate())
+        print(f"{label:<22}{receive_rate:>11.0f}{total_rate:>10.0f}"
+              f"{rows:>9}{total:>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=100000)
+    parser.add_argument('-d', '--devices', type=int, default=20)
+    parser.add_argument('-s', '--storm-share', type=float, default=0.99)
+    args = parser.parse_args()
+    main(args.count, args.devices, args.storm_share)
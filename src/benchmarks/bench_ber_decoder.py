@@ -0,0 +1,71 @@
+"""
+Decoding speed of the native BER decoder against pyasn1, for settlement
+traps, alone and through SNMPManager's receive callback.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands \\
+        python -m benchmarks.bench_ber_decoder
+"""
+import argparse
+import time
+from agents.raw import RawTrapTemplate
+from commands.trap.ber import decode_notification
+from commands.trap.lazy import decode_message
+from commands.trap.manager import SNMPManager
+
+
+NOTIFICATION_OID = '1.3.6.1.4.1.12345.1.1.1.1.2'
+VARBIND_OIDS = [f'1.3.6.1.4.1.12345.1.1.1.1.{index}'
+                for index in range(1, 10)]
+VALUES = ['sale', 'settled', '125.40', 'VISA', 'MID00042',
+          '2024-01-02T00:00:00', '2024-01-01T00:00:00',
+          '2024-01-01T01:00:00', '2024-01-01T01:10:00']
+
+
+def pyasn1(data):
+    pMod, message = decode_message(data)
+    return [(oid.prettyPrint(), val.prettyPrint())
+            for oid, val in pMod.apiPDU.get_varbinds(
+                pMod.apiMessage.get_pdu(message))]
+
+
+def native(data):
+    return decode_notification(data).varbinds
+
+
+def rate(function, datagrams):
+    start = time.perf_counter()
+    for data in datagrams:
+        function(data)
+    return len(datagrams) / (time.perf_counter() - start)
+
+
+def main(count: int):
+    template = RawTrapTemplate(NOTIFICATION_OID, VARBIND_OIDS)
+    datagrams = [template.encode(index, index, VALUES)
+                 for index in range(count)]
+    assert native(datagrams[0]) == pyasn1(datagrams[0])
+
+    managers = {}
+    for name, use_native in (('pyasn1', False), ('native', True)):
+        manager = SNMPManager('127.0.0.1', None, 0, verbose=False,
+                              native=use_native)
+        managers[name] = lambda data, manager=manager: manager._callback(
+            manager.transportDispatcher, None, ('127.0.0.1', 0), data)
+
+    print(f"{len(VARBIND_OIDS) + 2} var-binds, {count} traps")
+    print(f"{'':<18}{'pyasn1 msg/s':>14}{'native msg/s':>14}{'speedup':>10}")
+    for label, slow, fast in (
+            ('decode', pyasn1, native),
+            ('manager callback', managers['pyasn1'], managers['native'])):
+        slow_rate = rate(slow, datagrams)
+        fast_rate = rate(fast, datagrams)
+        print(f"{label:<18}{slow_rate:>14.0f}{fast_rate:>14.0f}"
+              f"{fast_rate / slow_rate:>9.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=2000)
+    args = parser.parse_args()
+    main(args.count)
@@ -0,0 +1,100 @@
+"""
+Cost of correlating settlement notifications into transaction lifecycles:
+rate of opening and completing transactions, memory per open transaction,
+and time to expire them all.
+
+Notifications are built as ReceivedTraps, so decoding is not measured.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands python -m benchmarks.bench_correlate
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from agents.raw import SNMP_TRAP_OID
+from agents.transaction import SETTLEMENT_FIELDS
+from commands.trap.correlate import TransactionCorrelator
+from commands.trap.manager import ReceivedTrap
+
+
+FIELD_OIDS = {field: f'1.3.6.1.4.1.12345.1.1.1.1.{index}'
+              for index, (field, _) in enumerate(SETTLEMENT_FIELDS, 1)}
+STAGES = {'open_datetime': '2024-01-01T00:00:00',
+          'close_datetime': '2024-01-01T01:00:00',
+          'submission_datetime': '2024-01-01T01:10:00',
+          'deposit_datetime': '2024-01-02T01:10:00'}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def settlement(index: int, stages):
+    fields = {'type': 'sale', 'status': 'settled', 'amount': '125.40',
+              'entity': 'VISA', 'mid': f'MID{index:010d}'}
+    varbinds = [('1.3.6.1.2.1.1.3.0', '0'),
+                (SNMP_TRAP_OID, FIELD_OIDS['status'])]
+    for field, _ in SETTLEMENT_FIELDS:
+        value = STAGES.get(field, '') if field in stages else \
+            fields.get(field, '')
+        varbinds.append((FIELD_OIDS[field], value))
+    return ReceivedTrap(0.0, None, ('10.0.0.1', 162), 1, 'trap', varbinds)
+
+
+def timed(function, count: int):
+    start = time.perf_counter()
+    function()
+    return count / (time.perf_counter() - start)
+
+
+def main(count: int):
+    clock = Clock()
+    tracemalloc.start()
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    correlator = TransactionCorrelator(ttl=3600.0, capacity=count,
+                                       field_OIDs=FIELD_OIDS, clock=clock)
+    opened = ('open_datetime',)
+    closed = ('close_datetime', 'submission_datetime', 'deposit_datetime')
+    add = correlator.add
+
+    def open_all():
+        for index in range(count):
+            add(settlement(index, opened))
+
+    def complete_half():
+        for index in range(0, count, 2):
+            add(settlement(index, closed))
+
+    # tracemalloc slows allocation down, the rate is measured again below
+    open_all()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"{count} open transactions: {used / count:.0f} bytes each, "
+          f"{used / (1 << 20):.1f} MiB")
+
+    correlator = TransactionCorrelator(ttl=3600.0, capacity=count,
+                                       field_OIDs=FIELD_OIDS, clock=clock)
+    add = correlator.add
+    print(f"{'operation':<28}{'per second':>12}")
+    print(f"{'open':<28}{timed(open_all, count):>12.0f}")
+    print(f"{'complete':<28}{timed(complete_half, count // 2):>12.0f}")
+    remaining = len(correlator)
+    rate = timed(lambda: correlator.expire(now=3700.0), remaining)
+    print(f"{'expire':<28}{rate:>12.0f}")
+    stats = correlator.stats()
+    print(f"completed {stats['completed']}, expired {stats['expired']}, "
+          f"incomplete {stats['incomplete']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=1000000)
+    args = parser.parse_args()
+    main(args.count)
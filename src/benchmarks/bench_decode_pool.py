@@ -0,0 +1,78 @@
+"""
+Receive-path cost and losses of SNMPManager decoding in the socket callback
+against queueing datagrams for a DecodePool, during a burst of traps.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands \\
+        python -m benchmarks.bench_decode_pool
+"""
+import argparse
+import time
+from agents.raw import RawTrapTemplate
+from commands.trap.ingest import DecodePool
+from commands.trap.manager import SNMPManager
+from commands.trap.recent import RecentTraps
+
+
+NOTIFICATION_OID = '1.3.6.1.4.1.12345.1.1.1.1.2'
+VARBIND_OIDS = [f'1.3.6.1.4.1.12345.1.1.1.1.{index}'
+                for index in range(1, 10)]
+VALUES = ['sale', 'settled', '125.40', 'VISA', 'MID00042',
+          '2024-01-02T00:00:00', '2024-01-01T00:00:00',
+          '2024-01-01T01:00:00', '2024-01-01T01:10:00']
+
+
+def burst(datagrams, decode=None):
+    manager = SNMPManager('127.0.0.1', None, 0, verbose=False,
+                          recent=RecentTraps(
+                              len(datagrams), max_bytes=len(datagrams) << 9),
+                          decode=decode)
+    callback = manager._callback
+    dispatcher = manager.transportDispatcher
+    address = ('10.0.0.1', 5000)
+    start = time.perf_counter()
+    for data in datagrams:
+        callback(dispatcher, None, address, data)
+    received = time.perf_counter() - start
+    if decode is not None:
+        decode.flush()
+    total = time.perf_counter() - start
+    manager.stop()
+    return manager, len(datagrams) / received, len(datagrams) / total
+
+
+def main(count: int, workers: int, queue: int):
+    template = RawTrapTemplate(NOTIFICATION_OID, VARBIND_OIDS)
+    datagrams = [template.encode(index, index, VALUES)
+                 for index in range(count)]
+    print(f"{count} traps, {len(VARBIND_OIDS) + 2} var-binds, decode queue "
+          f"{queue}")
+    print(f"{'decoding':<30}{'receive/s':>11}{'handled/s':>11}"
+          f"{'kept':>8}{'dropped':>9}{'max depth':>11}{'wait p99 ms':>13}")
+    cases = [('in the callback', None)]
+    for mode in ('thread', 'process'):
+        for policy in ('block', 'drop_newest'):
+            cases.append((f'{mode} x{workers}, {policy}',
+                          lambda mode=mode, policy=policy: DecodePool(
+                              workers, mode, maxsize=queue, policy=policy)))
+    for label, pool in cases:
+        decode = pool() if pool is not None else None
+        manager, receive_rate, total_rate = burst(datagrams, decode)
+        kept = len(manager.recent)
+        if decode is None:
+            print(f"{label:<30}{receive_rate:>11.0f}{total_rate:>11.0f}"
+                  f"{kept:>8}")
+            continue
+        stats = decode.stats()
+        print(f"{label:<30}{receive_rate:>11.0f}{total_rate:>11.0f}"
+              f"{kept:>8}{decode.dropped:>9}{stats['max_depth']:>11}"
+              f"{stats['wait']['p99'] * 1000:>13.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=50000)
+    parser.add_argument('-w', '--workers', type=int, default=2)
+    parser.add_argument('-q', '--queue', type=int, default=10000)
+    args = parser.parse_args()
+    main(args.count, args.workers, args.queue)
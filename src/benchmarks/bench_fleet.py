@@ -0,0 +1,49 @@
+"""
+Memory per virtual device and send-round throughput of a Fleet.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands python -m benchmarks.bench_fleet
+"""
+import argparse
+import asyncio
+import tracemalloc
+from agents.fleet import Fleet
+from agents.registry import close_snmp_engines
+
+
+NOTIFICATION_OID = '1.3.6.1.4.1.12345.1.1.1.1.2'
+DEVICE_OID = '1.3.6.1.4.1.12345.1.1.1.1.4'
+MID_OID = '1.3.6.1.4.1.12345.1.1.1.1.5'
+
+
+async def main(devices: int, host: str, port: str):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    fleet = Fleet(NOTIFICATION_OID, DEVICE_OID, MID_OID,
+                  varbinds={'1.3.6.1.4.1.12345.1.1.1.1.1': 'settlement'},
+                  ipv4_host=host, port=port, send_mode='raw')
+    fleet.populate(devices)
+    traced = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    print(f"devices:              {len(fleet)}")
+    print(f"record buffers:       {fleet.bytes_per_device():.1f} B/device")
+    print(f"traced allocations:   {traced / len(fleet):.1f} B/device")
+
+    for send_mode in ('raw', 'hlapi'):
+        fleet.agent.send_mode = send_mode
+        result = await fleet.send_round(concurrency=64)
+        print(f"{send_mode + ' round:':<22}{result.rate:.0f} traps/s "
+              f"({result.sent} sent, {result.failed} failed)")
+
+    fleet.close()
+    close_snmp_engines()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--devices', type=int, default=50000)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', default='2162')
+    args = parser.parse_args()
+    asyncio.run(main(args.devices, args.host, args.port))
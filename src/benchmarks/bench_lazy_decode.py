@@ -0,0 +1,83 @@
+"""
+Messages per second of full versus lazy (header-first) trap decoding, at
+different filter hit ratios.
+
+Full decoding decodes every message with pyasn1 and pretty-prints its
+var-binds before the filter looks at the snmpTrapOID, as SNMPManager does
+without lazy mode. Lazy decoding reads the header first and decodes the
+var-binds of accepted traps only.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands \\
+        python -m benchmarks.bench_lazy_decode
+"""
+import argparse
+import random
+import time
+from agents.raw import RawTrapTemplate
+from commands.trap.lazy import decode_header, decode_message
+
+
+ACCEPTED_OID = '1.3.6.1.4.1.12345.1.1.1.1.1'
+REJECTED_OID = '1.3.6.1.4.1.12345.1.1.1.1.2'
+VARBIND_OIDS = [f'1.3.6.1.4.1.12345.1.1.1.1.{index}'
+                for index in range(3, 10)]
+
+
+def build(count: int, hit_ratio: float, seed: int = 1):
+    rng = random.Random(seed)
+    templates = [RawTrapTemplate(OID, VARBIND_OIDS)
+                 for OID in (ACCEPTED_OID, REJECTED_OID)]
+    values = ['sale', 'settled', '125.40', 'VISA', 'MID00042',
+              '2024-01-01T00:00:00', '2024-01-01T01:00:00']
+    return [templates[rng.random() >= hit_ratio].encode(index, index, values)
+            for index in range(count)]
+
+
+def full(datagrams):
+    accepted = 0
+    for data in datagrams:
+        pMod, message = decode_message(data)
+        varbinds = [(oid.prettyPrint(), val.prettyPrint())
+                    for oid, val in pMod.apiPDU.get_varbinds(
+                        pMod.apiMessage.get_pdu(message))]
+        if varbinds[1][1] == ACCEPTED_OID:
+            accepted += 1
+    return accepted
+
+
+def lazy(datagrams):
+    accepted = 0
+    for data in datagrams:
+        header = decode_header(data)
+        if header.trap_OID == ACCEPTED_OID:
+            header.varbinds
+            accepted += 1
+    return accepted
+
+
+def rate(function, datagrams):
+    start = time.perf_counter()
+    function(datagrams)
+    return len(datagrams) / (time.perf_counter() - start)
+
+
+def main(count: int, ratios):
+    print(f"{'hit ratio':>10}{'full msg/s':>14}{'lazy msg/s':>14}"
+          f"{'speedup':>10}")
+    for ratio in ratios:
+        datagrams = build(count, ratio)
+        assert full(datagrams) == lazy(datagrams)
+        full_rate = rate(full, datagrams)
+        lazy_rate = rate(lazy, datagrams)
+        print(f"{ratio:>10.2f}{full_rate:>14.0f}{lazy_rate:>14.0f}"
+              f"{lazy_rate / full_rate:>9.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=2000)
+    parser.add_argument('--ratios', default='0,0.01,0.1,0.5,1',
+                        help='comma-separated filter hit ratios')
+    args = parser.parse_args()
+    main(args.count, [float(ratio) for ratio in args.ratios.split(',')])
@@ -0,0 +1,73 @@
+"""
+Receive latency of SNMPManager, from the raw send of a trap to its arrival
+on the manager's `traps()` iterator, plus the CPU time the manager uses
+while idle.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands \\
+        python -m benchmarks.bench_manager_latency
+"""
+import argparse
+import asyncio
+import time
+from agents.generic import SNMPAgent
+from commands.trap.histogram import LatencyHistogram
+from commands.trap.manager import SNMPManager
+
+
+NOTIFICATION_OID = '1.3.6.1.4.1.12345.1.1.1.1.2'
+SEQUENCE_OID = '1.3.6.1.4.1.12345.1.1.1.1.3'
+
+
+async def main(count: int, rate: float, port: int, idle: float):
+    manager = SNMPManager('127.0.0.1', None, port, verbose=False)
+    manager_task = asyncio.create_task(manager.run_async())
+    await manager.ready.wait()
+
+    cpu = time.process_time()
+    await asyncio.sleep(idle)
+    idle_cpu = time.process_time() - cpu
+
+    agent = SNMPAgent('127.0.0.1', port, NOTIFICATION_OID,
+                      {SEQUENCE_OID: ''}, send_mode='raw')
+    sender = await agent.get_raw_sender()
+    histogram = LatencyHistogram()
+    sent = [0.0] * count
+
+    async def receive():
+        async for trap in manager.traps():
+            histogram.record(time.perf_counter() -
+                             sent[int(trap.varbinds[-1][1])])
+            if histogram.count == count:
+                return
+
+    receiver = asyncio.create_task(receive())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    for index in range(count):
+        delay = start + index / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        sent[index] = time.perf_counter()
+        sender.send([str(index)])
+    await asyncio.wait_for(receiver, 60)
+
+    agent.close()
+    manager.stop()
+    await manager_task
+
+    print(f"traps:               {count} at {rate:.0f}/s")
+    for label, seconds in histogram.summary().items():
+        print(f"{label + ':':<21}{seconds * 1e3:8.3f} ms")
+    print(f"idle CPU:            {idle_cpu / idle * 100:8.2f} % "
+          f"over {idle:.0f} s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=250.0)
+    parser.add_argument('--port', type=int, default=2162)
+    parser.add_argument('--idle', type=float, default=2.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.count, args.rate, args.port, args.idle))
@@ -0,0 +1,92 @@
+"""
+Cost of recording metrics: per-call cost of the histogram and counter
+updates, the receive rate of SNMPManager with and without its stage
+latencies, and the time to render a scrape.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands python -m benchmarks.bench_metrics
+"""
+import argparse
+import random
+import time
+from agents.raw import RawTrapTemplate
+from commands.trap.histogram import LatencyHistogram
+from commands.trap.manager import SNMPManager
+from commands.trap.metrics import MetricsRegistry, manager_metrics
+from commands.trap.recent import RecentTraps
+
+
+NOTIFICATION_OID = '1.3.6.1.4.1.12345.1.1.1.1.2'
+VARBIND_OIDS = [f'1.3.6.1.4.1.12345.1.1.1.1.{index}'
+                for index in range(1, 10)]
+VALUES = ['sale', 'settled', '125.40', 'VISA', 'MID00042',
+          '2024-01-02T00:00:00', '2024-01-01T00:00:00',
+          '2024-01-01T01:00:00', '2024-01-01T01:10:00']
+
+
+class Counter:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+
+def per_call(function, values):
+    start = time.perf_counter()
+    for value in values:
+        function(value)
+    return (time.perf_counter() - start) / len(values) * 1e9
+
+
+def receive_rate(datagrams, latency: bool):
+    manager = SNMPManager('127.0.0.1', None, 0, verbose=False,
+                          recent=RecentTraps(1000), latency=latency)
+    callback = manager._callback
+    dispatcher = manager.transportDispatcher
+    address = ('10.0.0.1', 5000)
+    start = time.perf_counter()
+    for data in datagrams:
+        callback(dispatcher, None, address, data)
+    rate = len(datagrams) / (time.perf_counter() - start)
+    manager.stop()
+    return manager, rate
+
+
+def main(count: int):
+    rng = random.Random(1)
+    seconds = [rng.expovariate(1 / 0.002) for _ in range(count)]
+    nanos = [int(value * 1e9) for value in seconds]
+    counter = Counter()
+
+    def increment(_):
+        counter.value += 1
+
+    print(f"{'recording':<28}{'ns/call':>10}")
+    for label, function, values in (
+            ('counter increment', increment, seconds),
+            ('LatencyHistogram.record', LatencyHistogram().record, seconds),
+            ('LatencyHistogram.record_ns', LatencyHistogram().record_ns,
+             nanos)):
+        print(f"{label:<28}{per_call(function, values):>10.0f}")
+
+    template = RawTrapTemplate(NOTIFICATION_OID, VARBIND_OIDS)
+    datagrams = [template.encode(index, index, VALUES)
+                 for index in range(count)]
+    print(f"\n{'manager receive':<28}{'msg/s':>10}")
+    for label, latency in (('counters only', False),
+                           ('with stage latencies', True)):
+        manager, rate = receive_rate(datagrams, latency)
+        print(f"{label:<28}{rate:>10.0f}")
+
+    registry = MetricsRegistry([manager_metrics(manager)])
+    start = time.perf_counter()
+    text = registry.render()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"\nscrape: {elapsed:.2f} ms, {len(text)} bytes")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=100000)
+    args = parser.parse_args()
+    main(args.count)
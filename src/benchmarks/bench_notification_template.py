@@ -0,0 +1,92 @@
+"""
+Per-trap CPU cost of `SNMPNotification.create()` versus a precompiled
+`NotificationTemplate`, for building the varbinds alone and for build + send.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands \\
+        python -m benchmarks.bench_notification_template
+"""
+import argparse
+import asyncio
+import time
+from pysnmp.hlapi.asyncio import SnmpEngine, CommunityData, ContextData, \
+    UdpTransportTarget, send_notification
+from pysnmp.hlapi.varbinds import MibViewControllerManager
+from agents.generic import SNMPNotification, NotificationTemplate
+from components.varbinds import Varbind
+
+
+NOTIFICATION_OID = '1.3.6.1.4.1.12345.1.1.1.1.2'
+SETTLEMENT_OIDS = ['1.3.6.1.4.1.12345.1.1.1.1.%d' % i for i in range(1, 10)]
+
+
+def timed(count, fn):
+    start = time.process_time()
+    for i in range(count):
+        fn(i)
+    return (time.process_time() - start) / count
+
+
+async def timed_async(count, fn):
+    start = time.process_time()
+    for i in range(count):
+        await fn(i)
+    return (time.process_time() - start) / count
+
+
+def report(name, before, after):
+    print(f"{name:<14} create(): {before * 1e6:9.1f} us   "
+          f"template: {after * 1e6:9.1f} us   "
+          f"speedup: {before / after:6.2f}x")
+
+
+async def main(count: int):
+    engine = SnmpEngine()
+    community = CommunityData('public', mpModel=1)
+    context = ContextData()
+    target = await UdpTransportTarget.create(('127.0.0.1', 2162))
+    mib_view = MibViewControllerManager.get_mib_view_controller(engine.cache)
+    template = NotificationTemplate(NOTIFICATION_OID, SETTLEMENT_OIDS)
+
+    def values(i):
+        return ['%s-%d' % (OID[-1], i) for OID in SETTLEMENT_OIDS]
+
+    def build_create(i):
+        varbinds = [Varbind(OID, value)
+                    for OID, value in zip(SETTLEMENT_OIDS, values(i))]
+        # Resolution normally happens inside send_notification
+        SNMPNotification(NOTIFICATION_OID, varbinds).create() \
+            .resolve_with_mib(mib_view, ignoreErrors=False)
+
+    def build_template(i):
+        template.create(values(i), engine)
+
+    async def send_create(i):
+        varbinds = [Varbind(OID, value)
+                    for OID, value in zip(SETTLEMENT_OIDS, values(i))]
+        notification = SNMPNotification(NOTIFICATION_OID, varbinds).create()
+        await send_notification(engine, community, target, context, 'trap',
+                                notification)
+
+    async def send_template(i):
+        await send_notification(engine, community, target, context, 'trap',
+                                *template.create(values(i), engine))
+
+    # Warm up MIB loading, LCD configuration and the template
+    build_create(0)
+    build_template(0)
+    await send_create(0)
+    await send_template(0)
+
+    print(f"iterations: {count}, CPU time per trap")
+    report('build', timed(count, build_create), timed(count, build_template))
+    report('build + send', await timed_async(count, send_create),
+           await timed_async(count, send_template))
+    engine.close_dispatcher()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.count))
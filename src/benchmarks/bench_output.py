@@ -0,0 +1,88 @@
+"""
+Receive throughput of SNMPManager printing every var-bind synchronously,
+as it used to, against queuing notifications to a BufferedOutput.
+
+Output goes to a line-buffered stream, as stdout is on a terminal, so every
+print() is a write system call. The receive rate is the time spent in the
+receive callback; the total rate also waits for the output to be written.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands python -m benchmarks.bench_output
+"""
+import argparse
+import os
+import time
+from agents.raw import RawTrapTemplate
+from commands.trap.manager import SNMPManager
+from commands.trap.sinks import BufferedOutput, StreamSink
+
+
+NOTIFICATION_OID = '1.3.6.1.4.1.12345.1.1.1.1.2'
+VARBIND_OIDS = [f'1.3.6.1.4.1.12345.1.1.1.1.{index}'
+                for index in range(1, 10)]
+VALUES = ['sale', 'settled', '125.40', 'VISA', 'MID00042',
+          '2024-01-02T00:00:00', '2024-01-01T00:00:00',
+          '2024-01-01T01:00:00', '2024-01-01T01:10:00']
+
+
+class PrintOutput:
+    """
+    Prints each notification line by line on the receive path, like the
+    manager's print() calls did.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    def put(self, trap):
+        print("Notification message from {}:{}: ".format(
+            trap.domain, trap.address), file=self.stream)
+        print("Var-binds:", file=self.stream)
+        for oid, val in trap.varbinds:
+            print(f"{oid} = {val}", file=self.stream)
+
+    def flush(self, timeout=None):
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+
+
+def run(datagrams, output):
+    manager = SNMPManager('127.0.0.1', None, 0, verbose=False, output=output)
+    callback = manager._callback
+    dispatcher = manager.transportDispatcher
+    address = ('127.0.0.1', 5000)
+    start = time.perf_counter()
+    for data in datagrams:
+        callback(dispatcher, None, address, data)
+    received = time.perf_counter() - start
+    output.flush()
+    total = time.perf_counter() - start
+    manager.stop()
+    return len(datagrams) / received, len(datagrams) / total
+
+
+def main(count: int, format: str):
+    template = RawTrapTemplate(NOTIFICATION_OID, VARBIND_OIDS)
+    datagrams = [template.encode(index, index, VALUES)
+                 for index in range(count)]
+    with open(os.devnull, 'w', buffering=1) as stream:
+        outputs = (
+            ('print()', PrintOutput(stream)),
+            (f'buffered {format}',
+             BufferedOutput(StreamSink(stream), format, maxsize=count)),
+        )
+        print(f"{len(VARBIND_OIDS) + 2} var-binds, {count} traps")
+        print(f"{'output':<18}{'receive msg/s':>15}{'total msg/s':>14}")
+        for label, output in outputs:
+            receive_rate, total_rate = run(datagrams, output)
+            print(f"{label:<18}{receive_rate:>15.0f}{total_rate:>14.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=20000)
+    parser.add_argument('--format', choices=('text', 'ndjson'),
+                        default='text')
+    args = parser.parse_args()
+    main(args.count, args.format)
@@ -0,0 +1,94 @@
+"""
+Loopback receive throughput of SNMPManager worker processes sharing one
+port with SO_REUSEPORT, for increasing worker counts.
+
+Sender processes flood the port with pre-encoded traps from many source
+ports, more than the workers can decode, and the benchmark counts the
+notifications the workers decode per second. Senders and workers share the
+machine's cores, so compare runs with the same number of senders.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands \\
+        python -m benchmarks.bench_receiver_workers --workers 1,2,4
+"""
+import argparse
+import multiprocessing
+import socket
+import time
+from agents.raw import RawTrapTemplate
+from commands.trap.workers import ReceiverSupervisor
+
+
+NOTIFICATION_OID = '1.3.6.1.4.1.12345.1.1.1.1.2'
+AMOUNT_OID = '1.3.6.1.4.1.12345.1.1.1.1.3'
+
+
+def flood(port: int, duration: float, sources: int):
+    template = RawTrapTemplate(NOTIFICATION_OID, [AMOUNT_OID])
+    datagrams = [template.encode(index, 0, [f'{index}.00'])
+                 for index in range(1024)]
+    sockets = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+               for _ in range(sources)]
+    target = ('127.0.0.1', port)
+    end = time.monotonic() + duration
+    index = 0
+    while time.monotonic() < end:
+        for sock in sockets:
+            try:
+                sock.sendto(datagrams[index & 1023], target)
+            except OSError:
+                pass
+            index += 1
+
+
+def measure(workers: int, senders: int, port: int, warmup: float,
+            duration: float):
+    supervisor = ReceiverSupervisor(workers, '127.0.0.1', None, port,
+                                    report_interval=0.2)
+    supervisor.start()
+    try:
+        while supervisor.ready < workers:
+            supervisor.poll()
+        context = multiprocessing.get_context()
+        processes = [context.Process(target=flood,
+                                     args=(port, warmup + duration, 16),
+                                     daemon=True)
+                     for _ in range(senders)]
+        for process in processes:
+            process.start()
+
+        supervisor.poll(warmup)
+        first = supervisor.totals()["notifications"]
+        start = time.monotonic()
+        supervisor.poll(duration)
+        decoded = supervisor.totals()["notifications"] - first
+        elapsed = time.monotonic() - start
+        for process in processes:
+            process.join()
+    finally:
+        supervisor.stop()
+    return decoded / elapsed
+
+
+def main(worker_counts, senders: int, port: int, warmup: float,
+         duration: float):
+    print(f"cores: {multiprocessing.cpu_count()}, senders: {senders}")
+    print(f"{'workers':>8}{'traps/s':>12}{'scaling':>10}")
+    baseline = None
+    for workers in worker_counts:
+        rate = measure(workers, senders, port, warmup, duration)
+        baseline = baseline or rate
+        print(f"{workers:>8}{rate:>12.0f}{rate / baseline:>9.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', default='1,2,4',
+                        help='comma-separated worker counts (default 1,2,4)')
+    parser.add_argument('--senders', type=int, default=2)
+    parser.add_argument('--port', type=int, default=2162)
+    parser.add_argument('--warmup', type=float, default=1.0)
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+    main([int(workers) for workers in args.workers.split(',')],
+         args.senders, args.port, args.warmup, args.duration)
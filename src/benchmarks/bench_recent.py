@@ -0,0 +1,118 @@
+"""
+Memory use and speed of the RecentTraps ring buffer against keeping the
+last notifications as decoded objects.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands python -m benchmarks.bench_recent
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from collections import deque
+from agents.raw import RawTrapTemplate
+from commands.trap.lazy import decode_message, decode_trap
+from commands.trap.manager import LazyReceivedTrap
+from commands.trap.recent import RecentTraps
+
+
+NOTIFICATION_OID = '1.3.6.1.4.1.12345.1.1.1.1.2'
+VARBIND_OIDS = [f'1.3.6.1.4.1.12345.1.1.1.1.{index}'
+                for index in range(1, 10)]
+HOSTS = 50
+
+
+def datagrams(count: int):
+    template = RawTrapTemplate(NOTIFICATION_OID, VARBIND_OIDS)
+    for index in range(count):
+        yield index, template.encode(
+            index, index, ['sale', 'settled', f'{index / 100:.2f}', 'VISA',
+                           f'MID{index % 1000:05d}', '2024-01-02T00:00:00',
+                           '2024-01-01T00:00:00', '2024-01-01T01:00:00',
+                           f'2024-01-01T01:{index % 60:02d}:00'])
+
+
+def received(index: int, data: bytes):
+    return LazyReceivedTrap(time.time(), None,
+                            (f'10.0.0.{index % HOSTS}', 5000),
+                            decode_trap(data))
+
+
+def measure(keep, count: int):
+    # Bytes still allocated after keeping the last notifications of a
+    # stream of `count`
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    buffer = keep()
+    for index, data in datagrams(count):
+        buffer.append(index, data)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return buffer, used
+
+
+class Objects:
+    def __init__(self, capacity):
+        self.traps = deque(maxlen=capacity)
+
+    def append(self, index, data):
+        trap = received(index, data)
+        trap.varbinds
+        self.traps.append(trap)
+
+
+class Pyasn1:
+    def __init__(self, capacity):
+        self.messages = deque(maxlen=capacity)
+
+    def append(self, index, data):
+        self.messages.append(decode_message(data))
+
+
+class Ring:
+    def __init__(self, capacity):
+        self.recent = RecentTraps(capacity, max_bytes=capacity * 512)
+
+    def append(self, index, data):
+        self.recent.add(received(index, data))
+
+
+def main(capacity: int, count: int):
+    print(f"last {capacity} of {count} traps, "
+          f"{len(VARBIND_OIDS) + 2} var-binds each")
+    print(f"{'kept as':<24}{'MiB':>8}{'bytes/trap':>12}")
+    for label, keep in (('pyasn1 messages', Pyasn1),
+                        ('decoded ReceivedTrap', Objects),
+                        ('RecentTraps records', Ring)):
+        buffer, used = measure(lambda: keep(capacity), count)
+        print(f"{label:<24}{used / (1 << 20):>8.1f}"
+              f"{used / capacity:>12.0f}")
+
+    recent = buffer.recent
+    traps = [received(index, data) for index, data in datagrams(count)]
+    start = time.perf_counter()
+    for trap in traps:
+        recent.add(trap)
+    rate = len(traps) / (time.perf_counter() - start)
+    print(f"\nadd: {rate:.0f} traps/s")
+    for label, query in (
+            ('one host', lambda: recent.query(host='10.0.0.7')),
+            ('trap OID, newest 20',
+             lambda: recent.query(trap_OID='1.3.6.1.4.1.12345', limit=20)),
+            ('var-bind OID, one host',
+             lambda: recent.query(varbind_OID=VARBIND_OIDS[4],
+                                  host='10.0.0.7'))):
+        start = time.perf_counter()
+        rows = len(query())
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"query {label:<24}{elapsed:>7.1f} ms{rows:>7} rows")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-c', '--capacity', type=int, default=5000)
+    parser.add_argument('-n', '--count', type=int, default=10000)
+    args = parser.parse_args()
+    main(args.capacity, args.count)
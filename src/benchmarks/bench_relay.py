@@ -0,0 +1,115 @@
+"""
+Relay rate of SNMPManager forwarding datagrams unchanged to several
+collectors, against decoding and re-encoding every trap for each hop.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands python -m benchmarks.bench_relay
+"""
+import argparse
+import socket
+import threading
+import time
+from agents.raw import RawTrapTemplate
+from commands.trap.lazy import decode_trap
+from commands.trap.manager import SNMPManager
+from commands.trap.relay import RelayDestination
+
+
+NOTIFICATION_OID = '1.3.6.1.4.1.12345.1.1.1.1.2'
+VARBIND_OIDS = [f'1.3.6.1.4.1.12345.1.1.1.1.{index}'
+                for index in range(1, 10)]
+VALUES = ['sale', 'settled', '125.40', 'VISA', 'MID00042',
+          '2024-01-02T00:00:00', '2024-01-01T00:00:00',
+          '2024-01-01T01:00:00', '2024-01-01T01:10:00']
+
+
+class Collector:
+    # A bound socket counting what it receives on a thread
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 << 20)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.5)
+        self.port = self.sock.getsockname()[1]
+        self.received = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sock.recv(65535)
+            except socket.timeout:
+                return
+            except OSError:
+                return
+            self.received += 1
+
+    def close(self):
+        self._thread.join()
+        self.sock.close()
+
+
+def relay(datagrams, collectors, sample: float):
+    manager = SNMPManager('127.0.0.1', None, 0, verbose=False, relay=[
+        RelayDestination('127.0.0.1', collector.port, sample=sample,
+                         maxsize=len(datagrams))
+        for collector in collectors])
+    callback = manager._callback
+    dispatcher = manager.transportDispatcher
+    address = ('10.0.0.1', 5000)
+    start = time.perf_counter()
+    for data in datagrams:
+        callback(dispatcher, None, address, data)
+    received = time.perf_counter() - start
+    manager.relay.flush()
+    total = time.perf_counter() - start
+    manager.stop()
+    return len(datagrams) / received, len(datagrams) / total
+
+
+def reencode(datagrams, collectors):
+    # What a manager plus an agent per hop does: decode, then encode again
+    template = RawTrapTemplate(NOTIFICATION_OID, VARBIND_OIDS)
+    sockets = []
+    for collector in collectors:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.connect(('127.0.0.1', collector.port))
+        sockets.append(sock)
+    start = time.perf_counter()
+    for index, data in enumerate(datagrams):
+        values = [value for _, value in decode_trap(data).varbinds[2:]]
+        for sock in sockets:
+            sock.send(template.encode(index, index, values))
+    rate = len(datagrams) / (time.perf_counter() - start)
+    for sock in sockets:
+        sock.close()
+    return rate, rate
+
+
+def main(count: int, destinations: int):
+    template = RawTrapTemplate(NOTIFICATION_OID, VARBIND_OIDS)
+    datagrams = [template.encode(index, index, VALUES)
+                 for index in range(count)]
+    print(f"{count} traps to {destinations} collectors")
+    print(f"{'forwarding':<26}{'receive/s':>11}{'sent/s':>10}"
+          f"{'delivered':>11}")
+    for label, run in (
+            ('decode and re-encode', lambda c: reencode(datagrams, c)),
+            ('relay bytes', lambda c: relay(datagrams, c, 1.0)),
+            ('relay bytes, 10% sample', lambda c: relay(datagrams, c, 0.1))):
+        collectors = [Collector() for _ in range(destinations)]
+        receive_rate, total_rate = run(collectors)
+        for collector in collectors:
+            collector.close()
+        delivered = sum(collector.received for collector in collectors)
+        print(f"{label:<26}{receive_rate:>11.0f}{total_rate:>10.0f}"
+              f"{delivered:>11}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=50000)
+    parser.add_argument('-d', '--destinations', type=int, default=3)
+    args = parser.parse_args()
+    main(args.count, args.destinations)
@@ -0,0 +1,87 @@
+"""
+Route lookup speed of the OID-prefix trie against a linear scan of the
+rules, for growing numbers of rules on settlement and device MIB subtrees.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands python -m benchmarks.bench_routing
+"""
+import argparse
+import random
+import time
+from commands.trap.manager import ReceivedTrap
+from commands.trap.routing import TrapRouter
+
+
+SNMP_TRAP_OID = '1.3.6.1.6.3.1.1.4.1.0'
+
+
+def make_rules(count: int, rng: random.Random):
+    # Prefixes of one to three arcs under 200 enterprises
+    rules = set()
+    while len(rules) < count:
+        arcs = [1, 3, 6, 1, 4, 1, rng.randrange(1000, 1200)]
+        arcs.extend(rng.randrange(1, 20) for _ in range(rng.randrange(1, 4)))
+        rules.add('.'.join(map(str, arcs)))
+    return sorted(rules)
+
+
+def make_OIDs(count: int, rng: random.Random):
+    return ['.'.join(map(str, [1, 3, 6, 1, 4, 1, rng.randrange(1000, 1400)] +
+                     [rng.randrange(1, 20) for _ in range(5)]))
+            for _ in range(count)]
+
+
+def linear_match(rules, oid):
+    return [rule for rule in rules
+            if oid == rule or oid.startswith(rule + '.')]
+
+
+def rate(function, OIDs):
+    start = time.perf_counter()
+    for oid in OIDs:
+        function(oid)
+    return len(OIDs) / (time.perf_counter() - start)
+
+
+def main(lookups: int, sizes):
+    rng = random.Random(1)
+    OIDs = make_OIDs(lookups, rng)
+    print(f"{lookups} lookups of 12-arc OIDs")
+    print(f"{'rules':>7}{'linear lookup/s':>17}{'trie lookup/s':>15}"
+          f"{'speedup':>10}{'dispatch msg/s':>16}")
+    for size in sizes:
+        rules = make_rules(size, rng)
+        router = TrapRouter()
+        for rule in rules:
+            router.add(rule, lambda trap: None)
+        trie = router._tries['trap_OID']
+
+        sample = OIDs[:200]
+        assert all(sorted(linear_match(rules, oid)) ==
+                   sorted('.'.join(map(str, route.prefix))
+                          for route in trie.match(oid))
+                   for oid in sample)
+        # The linear scan gets a smaller sample at large rule counts
+        linear = rate(lambda oid: linear_match(rules, oid),
+                      OIDs[:max(100, lookups * 100 // size)])
+        indexed = rate(trie.match, OIDs)
+
+        traps = [ReceivedTrap(0.0, None, ('10.0.0.1', 162), 1, 'trap',
+                              [('1.3.6.1.2.1.1.3.0', '0'),
+                               (SNMP_TRAP_OID, oid)])
+                 for oid in OIDs]
+        start = time.perf_counter()
+        for trap in traps:
+            router.dispatch(trap)
+        dispatch = len(traps) / (time.perf_counter() - start)
+        print(f"{size:>7}{linear:>17.0f}{indexed:>15.0f}"
+              f"{indexed / linear:>9.0f}x{dispatch:>16.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--lookups', type=int, default=100000)
+    parser.add_argument('--rules', type=int, nargs='+',
+                        default=[100, 1000, 10000])
+    args = parser.parse_args()
+    main(args.lookups, args.rules)
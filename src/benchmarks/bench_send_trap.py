@@ -0,0 +1,92 @@
+"""
+Per-trap send latency with a fresh engine and transport target per send
+(the old `SNMPAgent` behaviour) versus the shared engine registry and cached
+transport target, and versus the raw BER send mode.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands python -m benchmarks.bench_send_trap
+"""
+import argparse
+import asyncio
+import os
+import time
+from pysnmp.hlapi.asyncio import SnmpEngine, UdpTransportTarget, \
+    send_notification
+from agents.generic import SNMPAgent, SNMPNotification
+from agents.registry import close_snmp_engines
+from components.varbinds import Varbind
+
+
+def settlement_varbinds():
+    return [
+        Varbind('1.3.6.1.4.1.12345.1.1.1.1.%d' % i, 'value-%d' % i)
+        for i in range(1, 10)
+    ]
+
+
+async def send_uncached(agent: SNMPAgent, count: int):
+    """
+    Sends `count` traps, building a new engine and target for each one.
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        engine = SnmpEngine()
+        target = await UdpTransportTarget.create((agent.target['ip'],
+                                                  agent.target['port']))
+        notification = SNMPNotification(agent.notification_OID,
+                                        agent.varbinds).create()
+        await send_notification(engine, agent.community, target,
+                                agent.context, 'trap', notification)
+        engine.close_dispatcher()
+    return (time.perf_counter() - start) / count
+
+
+async def send_cached(agent: SNMPAgent, count: int):
+    """
+    Sends `count` traps through the shared engine and cached target.
+    """
+    # Warm the registry and cache so only steady-state sends are timed
+    await agent.send_trap()
+    start = time.perf_counter()
+    for _ in range(count):
+        await agent.send_trap()
+    return (time.perf_counter() - start) / count
+
+
+async def send_raw(agent: SNMPAgent, count: int):
+    """
+    Sends `count` traps through the agent's raw BER sender.
+    """
+    agent.send_mode = 'raw'
+    await agent.send_trap()
+    start = time.perf_counter()
+    for _ in range(count):
+        await agent.send_trap()
+    elapsed = (time.perf_counter() - start) / count
+    agent.close()
+    agent.send_mode = 'hlapi'
+    return elapsed
+
+
+async def main(count: int):
+    agent = SNMPAgent(ipv4_host=os.getenv('IPv4_HOST_IP', '127.0.0.1'),
+                      port=os.getenv('PORT', '2162'),
+                      notification_OID='1.3.6.1.4.1.12345.1.1.1.1.2',
+                      varbinds=settlement_varbinds())
+    before = await send_uncached(agent, count)
+    after = await send_cached(agent, count)
+    raw = await send_raw(agent, count)
+    close_snmp_engines()
+
+    print(f"traps per run:          {count}")
+    print(f"fresh engine + target:  {before * 1e6:9.1f} us/trap")
+    print(f"shared engine + cache:  {after * 1e6:9.1f} us/trap")
+    print(f"speedup:                {before / after:9.2f}x")
+    print(f"raw BER send mode:      {raw * 1e6:9.1f} us/trap")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.count))
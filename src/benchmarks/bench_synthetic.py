@@ -0,0 +1,73 @@
+"""
+Synthetic settlement generation with NumPy columns versus the per-field
+setters of TransactionSNMPAgent, and streaming of the batch into traps.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands python -m benchmarks.bench_synthetic
+"""
+import argparse
+import asyncio
+import random
+import time
+from agents.registry import close_snmp_engines
+from agents.synthetic import TransactionGenerator
+from agents.transaction import TransactionSNMPAgent, settlement_OIDs
+
+
+def generate_setters(agent: TransactionSNMPAgent, count: int):
+    """
+    Fills the agent's varbinds one settlement at a time, the way callers did
+    before the generator existed.
+    """
+    OIDs = settlement_OIDs()
+    start = time.perf_counter()
+    for _ in range(count):
+        agent.set_type(OIDs['type'], random.choice(('sale', 'refund')))
+        agent.set_status(OIDs['status'], random.choice(('settled', 'failed')))
+        agent.set_amount(OIDs['amount'],
+                         '%.2f' % random.lognormvariate(3.5, 1))
+        agent.set_entity(OIDs['entity'], random.choice(('VISA', 'AMEX')))
+        agent.set_mid(OIDs['mid'], agent.generate_random_mid())
+        for field in ('deposit', 'open', 'close', 'submission'):
+            agent.edit_varbind(OIDs[f'{field}_datetime'],
+                               '2024-01-01T00:00:00')
+    return time.perf_counter() - start
+
+
+async def main(count: int, sends: int, host: str, port: str):
+    generator = TransactionGenerator(seed=0)
+    start = time.perf_counter()
+    batch = generator.generate(count)
+    generated = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in batch.rows():
+        pass
+    converted = time.perf_counter() - start
+
+    OIDs = settlement_OIDs()
+    agent = TransactionSNMPAgent(host, port, OIDs['status'],
+                                 {OID: '' for OID in OIDs.values()},
+                                 send_mode='raw')
+    setters = generate_setters(agent, sends) / sends
+
+    small = TransactionGenerator(seed=0).generate(sends)
+    result = await agent.send_transactions(small)
+    close_snmp_engines()
+
+    print(f"settlements:            {count}")
+    print(f"NumPy generation:       {generated:9.3f} s "
+          f"({generated / count * 1e9:.0f} ns/settlement)")
+    print(f"row conversion:         {converted:9.3f} s")
+    print(f"per-field setters:      {setters * 1e9:9.0f} ns/settlement")
+    print(f"raw stream of {sends}:    {result.rate:9.0f} traps/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=1_000_000)
+    parser.add_argument('-s', '--sends', type=int, default=20000)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', default='2162')
+    args = parser.parse_args()
+    asyncio.run(main(args.count, args.sends, args.host, args.port))
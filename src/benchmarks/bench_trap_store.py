@@ -0,0 +1,80 @@
+"""
+Ingest rate of the trap store behind SNMPManager's receive callback, and
+query times by time range, source and OID on the stored notifications.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands \\
+        python -m benchmarks.bench_trap_store
+"""
+import argparse
+import tempfile
+import time
+from agents.raw import RawTrapTemplate
+from commands.trap.manager import SNMPManager
+from commands.trap.store import TrapStore
+
+
+NOTIFICATION_OID = '1.3.6.1.4.1.12345.1.1.1.1.2'
+VARBIND_OIDS = [f'1.3.6.1.4.1.12345.1.1.1.1.{index}'
+                for index in range(1, 10)]
+VALUES = ['sale', 'settled', '125.40', 'VISA', 'MID00042',
+          '2024-01-02T00:00:00', '2024-01-01T00:00:00',
+          '2024-01-01T01:00:00', '2024-01-01T01:10:00']
+HOSTS = 50
+
+
+def ingest(directory, datagrams):
+    store = TrapStore(directory)
+    manager = SNMPManager('127.0.0.1', None, 0, verbose=False, store=store)
+    callback = manager._callback
+    dispatcher = manager.transportDispatcher
+    start = time.perf_counter()
+    for index, data in enumerate(datagrams):
+        callback(dispatcher, None, (f'10.0.0.{index % HOSTS}', 5000), data)
+    received = time.perf_counter() - start
+    last = time.time()
+    store.flush()
+    total = time.perf_counter() - start
+    manager.stop()
+    return store, last, len(datagrams) / received, len(datagrams) / total
+
+
+def timed(function, repeat: int = 5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat * 1000, len(result)
+
+
+def main(count: int):
+    template = RawTrapTemplate(NOTIFICATION_OID, VARBIND_OIDS)
+    datagrams = [template.encode(index, index, VALUES)
+                 for index in range(count)]
+    print(f"{len(VARBIND_OIDS) + 2} var-binds, {count} traps from {HOSTS} "
+          f"hosts")
+    with tempfile.TemporaryDirectory() as directory:
+        store, last, receive_rate, total_rate = ingest(directory, datagrams)
+        print(f"receive {receive_rate:.0f} msg/s, stored {total_rate:.0f} "
+              f"msg/s")
+
+        print(f"\n{'query':<28}{'ms':>8}{'rows':>8}")
+        for label, query in (
+                ('last second', lambda: store.query(start=last - 1)),
+                ('one host', lambda: store.query(host='10.0.0.7')),
+                ('one host, last second',
+                 lambda: store.query(host='10.0.0.7', start=last - 1)),
+                ('trap OID subtree, limit 100',
+                 lambda: store.query(trap_OID='1.3.6.1.4.1.12345',
+                                     limit=100)),
+                ('var-bind OID, one host',
+                 lambda: store.query(varbind_OID=VARBIND_OIDS[4],
+                                     host='10.0.0.7'))):
+            elapsed, rows = timed(query)
+            print(f"{label:<28}{elapsed:>8.1f}{rows:>8}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=100000)
+    args = parser.parse_args()
+    main(args.count)
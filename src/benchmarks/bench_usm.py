@@ -0,0 +1,102 @@
+"""
+SNMPv2c versus SNMPv3 authPriv trap send rates, first-trap latency of a
+new SNMPv3 engine with and without cached localized keys, and the cost of
+localizing a user's keys.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client:src/commands python -m benchmarks.bench_usm
+"""
+import argparse
+import asyncio
+import time
+from agents.generic import SNMPAgent
+from agents.registry import close_snmp_engines
+from agents.usm import USMUser, localized_keys
+
+
+NOTIFICATION_OID = '1.3.6.1.4.1.12345.1.1.1.1.2'
+VARBINDS = {'1.3.6.1.4.1.12345.1.1.1.1.%d' % i: 'value-%d' % i
+            for i in range(1, 10)}
+ENGINE_ID = '8000000001020304'
+
+
+def build_agent(host: str, port: str, usm: bool, engine_name: str):
+    user = USMUser('benchuser', 'authpass123', 'privpass123',
+                   auth_protocol='SHA256', priv_protocol='AES')
+    return SNMPAgent(host, port, NOTIFICATION_OID, VARBINDS,
+                     engine_name=engine_name,
+                     usm_user=user if usm else None,
+                     engine_id=ENGINE_ID if usm else None)
+
+
+async def rate(host: str, port: str, count: int, usm: bool):
+    """
+    Returns steady-state traps per second over `count` sends.
+    """
+    agent = build_agent(host, port, usm, 'bench')
+    await agent.send_trap()     # warm the shared engine, keys and target
+    start = time.perf_counter()
+    for _ in range(count):
+        await agent.send_trap()
+    elapsed = time.perf_counter() - start
+    close_snmp_engines()
+    return count / elapsed
+
+
+async def first_trap(host: str, port: str, count: int, clear_keys: bool):
+    """
+    Returns the mean latency of the first SNMPv3 trap of a new engine.
+    """
+    elapsed = 0.0
+    for index in range(count):
+        if clear_keys:
+            localized_keys.clear()
+        agent = build_agent(host, port, True, f'first-{index}')
+        start = time.perf_counter()
+        await agent.send_trap()
+        elapsed += time.perf_counter() - start
+    close_snmp_engines()
+    return elapsed / count
+
+
+def localization(count: int):
+    """
+    Returns the mean (uncached, cached) cost of looking up a user's keys.
+    """
+    user = USMUser('benchuser', 'authpass123', 'privpass123',
+                   auth_protocol='SHA256', priv_protocol='AES',
+                   engine_id=ENGINE_ID)
+    start = time.perf_counter()
+    for _ in range(count):
+        localized_keys.clear()
+        user.localized_keys()
+    uncached = (time.perf_counter() - start) / count
+    start = time.perf_counter()
+    for _ in range(count):
+        user.localized_keys()
+    return uncached, (time.perf_counter() - start) / count
+
+
+async def main(count: int, host: str, port: str):
+    v2c = await rate(host, port, count, False)
+    warm = await rate(host, port, count, True)
+    cold = await first_trap(host, port, 10, True)
+    cached = await first_trap(host, port, 10, False)
+    uncached_keys, cached_keys = localization(20)
+
+    print(f"v2c:                          {v2c:9.0f} traps/s")
+    print(f"v3 authPriv, warm:            {warm:9.0f} traps/s "
+          f"({warm / v2c:.0%} of v2c)")
+    print(f"v3 first trap, cold keys:     {cold * 1e3:9.1f} ms")
+    print(f"v3 first trap, cached keys:   {cached * 1e3:9.1f} ms")
+    print(f"key localization:             {uncached_keys * 1e3:9.2f} ms")
+    print(f"cached key lookup:            {cached_keys * 1e6:9.2f} us")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=1000)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', default='2162')
+    args = parser.parse_args()
+    asyncio.run(main(args.count, args.host, args.port))
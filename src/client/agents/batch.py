@@ -0,0 +1,255 @@
+import asyncio
+import time
+
+
+class TrapOutcome:
+    """
+    Result of sending a single trap from a batch.
+
+    Attributes:
+        index (int): Position of the notification in the submitted stream.
+        error (str): Error indication or exception text, None on success.
+        latency (float): Seconds spent in the send call.
+    """
+    __slots__ = ('index', 'error', 'latency')
+
+    def __init__(self, index: int, error, latency: float):
+        self.index = index
+        self.error = error
+        self.latency = latency
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return (f"TrapOutcome(index={self.index}, error={self.error!r}, "
+                f"latency={self.latency:.6f})")
+
+
+class BatchResult:
+    """
+    Aggregate timing and per-trap outcomes of a batch send.
+
+    Attributes:
+        outcomes (list(TrapOutcome)): Per-trap outcomes in completion order.
+            Left empty when the sender was given an `on_result` callback, so
+            unbounded streams do not accumulate results.
+        sent (int): Number of traps sent successfully.
+        failed (int): Number of traps that raised or reported an error.
+        elapsed (float): Wall-clock seconds from the first submission to the
+            last completion.
+        latency_total (float): Sum of per-trap send latencies in seconds.
+        latency_max (float): Slowest single send in seconds.
+    """
+    def __init__(self):
+        self.outcomes = []
+        self.sent = 0
+        self.failed = 0
+        self.elapsed = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def total(self):
+        return self.sent + self.failed
+
+    @property
+    def rate(self):
+        """
+        Returns the achieved send rate in traps per second.
+        """
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def latency_mean(self):
+        return self.latency_total / self.total if self.total else 0.0
+
+    def record(self, outcome: TrapOutcome, keep: bool = True):
+        """
+        Adds a single outcome to the aggregate counters.
+
+        Args:
+            outcome (TrapOutcome): Outcome to add.
+            keep (bool): Whether to keep the outcome in `outcomes`.
+        """
+        if outcome.error is None:
+            self.sent += 1
+        else:
+            self.failed += 1
+        self.latency_total += outcome.latency
+        if outcome.latency > self.latency_max:
+            self.latency_max = outcome.latency
+        if keep:
+            self.outcomes.append(outcome)
+
+
+class TrapBatchSender:
+    """
+    Bounded-queue producer interface that keeps up to `concurrency` trap sends
+    in flight through one SNMP engine and one transport target.
+
+    Producers `await put()` notifications; `put()` blocks while the queue is
+    full, so memory stays flat however long the producer runs.
+
+    Example:
+        async with agent.trap_sender(concurrency=32) as sender:
+            for notification in notifications:
+                await sender.put(notification)
+        print(sender.result.rate)
+
+    Attributes:
+        agent (SNMPAgent): Agent whose engine, credentials and target are
+            used for every send.
+        concurrency (int): Maximum number of sends in flight.
+        on_result (function): Optional callback invoked with each
+            TrapOutcome. When set, outcomes are not kept in `result`.
+        result (BatchResult): Aggregate outcome of the batch.
+    """
+    def __init__(self, agent, concurrency: int = 10, maxsize: int = None,
+                 on_result=None):
+        """
+        Args:
+            agent (SNMPAgent): Agent to send through.
+            concurrency (int): Maximum number of sends in flight.
+            maxsize (int, optional): Queue capacity. Defaults to twice the
+                concurrency.
+            on_result (function, optional): Callback invoked with each
+                TrapOutcome as it completes. If it raises, sending goes on
+                and `close()` raises its first exception.
+
+        Raises:
+            ValueError: If `concurrency` is smaller than 1.
+        """
+        if concurrency < 1:
+            raise ValueError('Argument "concurrency" must be at least 1')
+
+        self.agent = agent
+        self.concurrency = concurrency
+        self.on_result = on_result
+        self.result = BatchResult()
+        self._queue = asyncio.Queue(maxsize or concurrency * 2)
+        self._workers = []
+        self._submitted = 0
+        self._started = None
+        self._callback_error = None
+
+    async def start(self):
+        """
+        Resolves the engine and target once and starts the send workers.
+        """
+        engine = self.agent.snmp_engine
+        target = await self.agent.get_target()
+        self._started = time.perf_counter()
+        self._workers = [
+            asyncio.create_task(self._worker(engine, target))
+            for _ in range(self.concurrency)
+        ]
+
+    async def put(self, notification):
+        """
+        Queues a notification for sending, waiting while the queue is full.
+
+        Args:
+            notification (SNMPNotification | NotificationType | tuple): The
+                notification to send.
+        """
+        if not self._workers:
+            raise RuntimeError('TrapBatchSender has not been started')
+        await self._queue.put((self._submitted, notification))
+        self._submitted += 1
+
+    async def close(self):
+        """
+        Waits for every queued notification to be sent and stops the
+        workers.
+
+        Returns:
+            BatchResult: Aggregate outcome of the batch.
+
+        Raises:
+            Exception: The first exception `on_result` raised, once every
+                notification is sent.
+        """
+        for _ in self._workers:
+            await self._queue.put(None)
+        await asyncio.gather(*self._workers)
+        self._workers = []
+        if self._started is not None:
+            self.result.elapsed = time.perf_counter() - self._started
+        error, self._callback_error = self._callback_error, None
+        if error is not None:
+            raise error
+        return self.result
+
+    async def _worker(self, engine, target):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            index, notification = item
+            start = time.perf_counter()
+            try:
+                error = await self.agent.send_prepared(notification,
+                                                       engine, target)
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+            outcome = TrapOutcome(index, error,
+                                  time.perf_counter() - start)
+            self.result.record(outcome, keep=self.on_result is None)
+            if self.on_result is not None:
+                try:
+                    self.on_result(outcome)
+                except Exception as e:
+                    # A dead worker would leave close() waiting on a full
+                    # queue: keep sending, and raise from close()
+                    if self._callback_error is None:
+                        self._callback_error = e
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.close()
+        else:
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            self._workers = []
+
+
+async def send_raw_stream(sender, rows, on_result=None,
+                          yield_every: int = 256):
+    """
+    Writes one raw datagram per row through a RawTrapSender, yielding to the
+    event loop every `yield_every` datagrams.
+
+    Args:
+        sender (RawTrapSender): An opened raw sender.
+        rows (iterable(tuple)): Varbind values of each trap.
+        on_result (function, optional): Callback invoked with each
+            TrapOutcome. When set, outcomes are not kept in the result.
+        yield_every (int): Datagrams written between yields.
+
+    Returns:
+        BatchResult: Aggregate outcome of the stream.
+    """
+    result = BatchResult()
+    started = time.perf_counter()
+    for index, values in enumerate(rows):
+        send_start = time.perf_counter()
+        try:
+            sender.send(values)
+            error = None
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        outcome = TrapOutcome(index, error, time.perf_counter() - send_start)
+        result.record(outcome, keep=on_result is None)
+        if on_result is not None:
+            on_result(outcome)
+        if index % yield_every == yield_every - 1:
+            await asyncio.sleep(0)
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,278 @@
+import os
+import sys
+import time
+from array import array
+from agents.generic import SNMPAgent
+from agents.batch import TrapOutcome, send_raw_stream
+from agents.transaction import TransactionSNMPAgent
+
+
+class VirtualDevice:
+    """
+    Lightweight view of one device of a Fleet. Views are created on demand
+    and hold no device state themselves.
+
+    Attributes:
+        fleet (Fleet): The fleet holding the device record.
+        index (int): Position of the device record in the fleet.
+    """
+    __slots__ = ('fleet', 'index')
+
+    def __init__(self, fleet, index: int):
+        self.fleet = fleet
+        self.index = index
+
+    @property
+    def device_id(self):
+        return self.fleet.device_ids[self.index]
+
+    @property
+    def mid(self):
+        return self.fleet.get_mid(self.index)
+
+    @property
+    def sent(self):
+        return self.fleet.sent[self.index]
+
+    @property
+    def errors(self):
+        return self.fleet.errors[self.index]
+
+    async def send(self, values=None):
+        """
+        Sends one trap identifying this device.
+        """
+        return await self.fleet.send(self.index, values)
+
+    def __repr__(self):
+        return (f"VirtualDevice(device_id={self.device_id}, mid={self.mid!r}, "
+                f"sent={self.sent}, errors={self.errors})")
+
+
+class Fleet:
+    """
+    Simulates a fleet of terminals as compact, array-backed device records
+    that all send through one SNMPAgent, and so through one shared SNMP
+    engine and one socket.
+
+    Every device record is a device ID, a fixed-width MID and per-device
+    sent/error counters, stored column-wise in `array` buffers (about 20
+    bytes per device). A device's identity travels in its traps as the
+    `device_OID` and `mid_OID` varbinds, followed by the fleet's static
+    varbinds.
+
+    Attributes:
+        agent (SNMPAgent): Agent used for every send.
+        device_OID (str): Varbind OID carrying the device ID.
+        mid_OID (str): Varbind OID carrying the device's MID.
+        static_varbinds (dict): OID -> value varbinds sent by every device.
+        mid_length (int): Width of the stored MIDs.
+        device_ids (array): Device ID per record.
+        sent (array): Traps sent per record.
+        errors (array): Failed sends per record.
+    """
+    def __init__(self,
+                 notification_OID: str,
+                 device_OID: str,
+                 mid_OID: str = os.getenv('OID_SETTLEMENT_MID'),
+                 varbinds: dict = None,
+                 ipv4_host: str = os.getenv('IPv4_HOST_IP'),
+                 port: str = os.getenv('PORT'),
+                 send_mode: str = 'hlapi',
+                 mid_length: int = 8):
+        """
+        Initializes an empty fleet.
+
+        Args:
+            notification_OID (str): OID for the type of SNMP notification.
+            device_OID (str): Varbind OID carrying the device ID.
+            mid_OID (str): Varbind OID carrying the device's MID.
+            varbinds (dict, optional): OID -> value varbinds sent by every
+                device after the identity varbinds.
+            ipv4_host (str): IP address of the SNMP target.
+            port (str): Port number of the SNMP target.
+            send_mode (str): 'hlapi' or 'raw', see SNMPAgent.
+            mid_length (int): Width of the stored MIDs.
+        """
+        if (device_OID is None or device_OID == ''):
+            raise ValueError('Argument "device_OID" cannot be empty')
+
+        if (mid_OID is None or mid_OID == ''):
+            raise ValueError('Argument "mid_OID" cannot be empty')
+
+        self.device_OID = device_OID
+        self.mid_OID = mid_OID
+        self.static_varbinds = dict(varbinds or {})
+        self.mid_length = mid_length
+        self.agent = SNMPAgent(ipv4_host, port, notification_OID,
+                               self._varbind_layout(('', '')),
+                               send_mode=send_mode)
+
+        self.device_ids = array('Q')
+        self.sent = array('I')
+        self.errors = array('I')
+        self._mids = bytearray()
+        self._static_values = tuple(self.static_varbinds.values())
+
+    def _varbind_layout(self, identity):
+        varbinds = {self.device_OID: identity[0], self.mid_OID: identity[1]}
+        varbinds.update(self.static_varbinds)
+        return varbinds
+
+    def __len__(self):
+        return len(self.device_ids)
+
+    def __getitem__(self, index: int):
+        if not -len(self) <= index < len(self):
+            raise IndexError('Fleet index out of range')
+        return VirtualDevice(self, index % len(self))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield VirtualDevice(self, index)
+
+    def add(self, device_id: int = None, mid: str = None):
+        """
+        Adds a device record.
+
+        Args:
+            device_id (int, optional): Device ID. Defaults to the next index.
+            mid (str, optional): MID of the device. Defaults to a random MID.
+
+        Returns:
+            int: Index of the new record.
+
+        Raises:
+            ValueError: If the MID is longer than `mid_length` or not ASCII.
+        """
+        if mid is None:
+            mid = TransactionSNMPAgent.generate_random_mid(self.mid_length)
+        encoded = mid.encode('ascii')
+        if len(encoded) > self.mid_length:
+            raise ValueError(f'MID "{mid}" is longer than {self.mid_length}')
+
+        index = len(self.device_ids)
+        self.device_ids.append(index if device_id is None else device_id)
+        self.sent.append(0)
+        self.errors.append(0)
+        self._mids += encoded.ljust(self.mid_length, b'\0')
+        return index
+
+    def populate(self, count: int, first_device_id: int = None):
+        """
+        Adds `count` devices with consecutive IDs and random MIDs.
+
+        Args:
+            count (int): Number of devices to add.
+            first_device_id (int, optional): ID of the first new device.
+                Defaults to the current fleet size.
+        """
+        start = len(self) if first_device_id is None else first_device_id
+        for offset in range(count):
+            self.add(start + offset)
+
+    def get_mid(self, index: int):
+        """
+        Returns the MID of the device at `index`.
+        """
+        offset = index * self.mid_length
+        return self._mids[offset:offset + self.mid_length] \
+            .rstrip(b'\0').decode('ascii')
+
+    def values(self, index: int, values=None):
+        """
+        Returns the varbind values of one trap from the device at `index`.
+
+        Args:
+            index (int): Device record index.
+            values (iterable(str), optional): Values replacing the fleet's
+                static varbind values for this trap.
+
+        Returns:
+            tuple(str): Device ID, MID, then the static or given values.
+        """
+        return (str(self.device_ids[index]), self.get_mid(index)) + \
+            (tuple(values) if values is not None else self._static_values)
+
+    async def send(self, index: int, values=None):
+        """
+        Sends one trap from the device at `index`.
+
+        Args:
+            index (int): Device record index.
+            values (iterable(str), optional): Values replacing the static
+                varbind values for this trap.
+
+        Returns:
+            str: Error indication, None on success.
+        """
+        agent = self.agent
+        start = time.perf_counter()
+        try:
+            if agent.send_mode == 'raw':
+                sender = await agent.get_raw_sender()
+                sender.send(self.values(index, values))
+                error = None
+            else:
+                error = await agent.send_prepared(
+                    agent.get_template().create(self.values(index, values)))
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        self._count(TrapOutcome(index, error, time.perf_counter() - start))
+        return error
+
+    async def send_round(self, concurrency: int = 50, yield_every: int = 256):
+        """
+        Sends one trap from every device.
+
+        Args:
+            concurrency (int): Maximum number of hlapi sends in flight.
+            yield_every (int): In raw mode, number of datagrams written
+                between yields to the event loop.
+
+        Returns:
+            BatchResult: Aggregate counters and timing of the round.
+                Per-device outcomes go to the fleet counters instead of the
+                result.
+        """
+        agent = self.agent
+        if agent.send_mode != 'raw':
+            engine = agent.snmp_engine
+            template = agent.get_template()
+            return await agent.send_traps(
+                (template.create(self.values(index), engine)
+                 for index in range(len(self))),
+                concurrency=concurrency,
+                on_result=self._count)
+
+        sender = await agent.get_raw_sender()
+        return await send_raw_stream(
+            sender,
+            (self.values(index) for index in range(len(self))),
+            on_result=self._count,
+            yield_every=yield_every)
+
+    def _count(self, outcome: TrapOutcome):
+        if outcome.error is None:
+            self.sent[outcome.index] += 1
+        else:
+            self.errors[outcome.index] += 1
+
+    def memory_usage(self):
+        """
+        Returns the bytes held by the device record buffers.
+        """
+        return (sys.getsizeof(self.device_ids) + sys.getsizeof(self.sent) +
+                sys.getsizeof(self.errors) + sys.getsizeof(self._mids))
+
+    def bytes_per_device(self):
+        """
+        Returns the record memory divided by the number of devices.
+        """
+        return self.memory_usage() / len(self) if len(self) else 0.0
+
+    def close(self):
+        """
+        Closes the fleet agent's raw socket, if one was opened.
+        """
+        self.agent.close()
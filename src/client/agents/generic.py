@@ -1,8 +1,16 @@
 import os
-from pysnmp.hlapi.asyncio import SnmpEngine, CommunityData, \
-    UdpTransportTarget, ContextData, NotificationType, send_notification, \
-    ObjectType, ObjectIdentity
+import time
+import weakref
+from pysnmp.hlapi.asyncio import CommunityData, ContextData, \
+    NotificationType, send_notification, ObjectType, ObjectIdentity
+from pysnmp.hlapi.varbinds import MibViewControllerManager
 from pysnmp.proto import rfc1902 as univ
+from agents.registry import get_snmp_engine, transport_targets
+from agents.batch import TrapBatchSender
+from agents.raw import RawTrapTemplate, RawTrapSender, TAG_INFORM_PDU, \
+    encode_octets
+from agents.inform import InformSender
+from agents.usm import engine_id_bytes
 import asyncio
 
 
@@ -91,26 +99,183 @@ class SNMPNotification:
         return self.varbinds
 
 
+# SNMPv2-MIB::snmpTrapOID.0, first varbind of every SNMPv2c notification
+SNMP_TRAP_OID = '1.3.6.1.6.3.1.1.4.1.0'
+
+
+class NotificationTemplate:
+    """
+    A precompiled SNMP notification with a fixed notification type OID and a
+    fixed, ordered set of varbind OIDs, where only the values change between
+    sends.
+
+    `SNMPNotification.create()` builds and MIB-resolves a new ObjectIdentity
+    for every varbind on every call. A template resolves the snmpTrapOID
+    varbind and every varbind OID once per SNMP engine, so creating a
+    notification only wraps the new values.
+
+    Attributes:
+        notification_type_OID (str): The OID for the notification type.
+        varbind_OIDs (tuple(str)): Ordered OIDs of the varbinds.
+    """
+    def __init__(self, notification_type_OID: str, varbind_OIDs):
+        """
+        Initializes a NotificationTemplate and validates its OIDs.
+
+        Args:
+            notification_type_OID (str): The object identifier for the type of
+                notification.
+            varbind_OIDs (iterable(str)): Ordered OIDs of the varbinds whose
+                values are supplied to `create()`.
+
+        Example:
+            template = NotificationTemplate('1.3.6.1.4.1.9.9.599.1.1',
+                                            ['1.3.6.1.4.1.9.9.599.1.3.1'])
+            notification = template.create(('success',))
+        """
+        if (notification_type_OID is None or notification_type_OID == ''):
+            raise AttributeError('notification_type_OID is not specficied')
+
+        if (not isinstance(notification_type_OID, str)):
+            raise AttributeError('notification_type_OID is not type str')
+
+        self.notification_type_OID = notification_type_OID
+        self.varbind_OIDs = tuple(varbind_OIDs)
+
+        for OID in self.varbind_OIDs:
+            if (not isinstance(OID, str) or OID == ''):
+                raise AttributeError(f'varbind OID {OID!r} is not a '
+                                     'non-empty str')
+
+        # SnmpEngine -> (resolved snmpTrapOID varbind, resolved identities)
+        self._resolved = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_notification(cls, notification: SNMPNotification):
+        """
+        Builds a template from the OIDs of an SNMPNotification.
+
+        Args:
+            notification (SNMPNotification): Notification to take the
+                notification type OID and varbind OIDs from.
+
+        Returns:
+            NotificationTemplate: The template.
+        """
+        if (not isinstance(notification.varbinds, list)):
+            raise AttributeError(f'varbinds is {type(notification.varbinds)} '
+                                 'type, must be list of Varbinds')
+
+        return cls(notification.notification_type_OID,
+                   [varbind.OID for varbind in notification.varbinds])
+
+    @property
+    def key(self):
+        """
+        Returns the (notification type OID, varbind OIDs) pair identifying the
+        template.
+        """
+        return self.notification_type_OID, self.varbind_OIDs
+
+    def resolve(self, snmp_engine):
+        """
+        Resolves the template OIDs against the MIB view of `snmp_engine`,
+        once per engine.
+
+        Args:
+            snmp_engine (SnmpEngine): The engine the notification will be
+                sent with.
+
+        Returns:
+            tuple: The resolved snmpTrapOID ObjectType and the tuple of
+                resolved varbind ObjectIdentity objects.
+        """
+        resolved = self._resolved.get(snmp_engine)
+        if resolved is None:
+            mib_view = MibViewControllerManager.get_mib_view_controller(
+                snmp_engine.cache)
+            trap_OID = ObjectType(
+                ObjectIdentity(SNMP_TRAP_OID),
+                univ.ObjectIdentifier(self.notification_type_OID)
+            ).resolve_with_mib(mib_view, ignoreErrors=False)
+            identities = tuple(
+                ObjectIdentity(OID).resolve_with_mib(mib_view)
+                for OID in self.varbind_OIDs
+            )
+            resolved = self._resolved[snmp_engine] = (trap_OID, identities)
+        return resolved
+
+    def create(self, values, snmp_engine=None):
+        """
+        Creates a ready-to-send notification from the varbind values.
+
+        Args:
+            values (tuple(str)): One value per varbind OID, in order.
+            snmp_engine (SnmpEngine, optional): The engine the notification
+                will be sent with. Defaults to the shared engine of the
+                running event loop.
+
+        Returns:
+            tuple(ObjectType): Resolved varbinds, snmpTrapOID first, to pass
+                to `send_notification` or `SNMPAgent.send_prepared`.
+
+        Raises:
+            ValueError: If the number of values does not match the number of
+                varbind OIDs.
+        """
+        if len(values) != len(self.varbind_OIDs):
+            raise ValueError(f'Expected {len(self.varbind_OIDs)} values, '
+                             f'got {len(values)}')
+
+        if snmp_engine is None:
+            snmp_engine = get_snmp_engine()
+        trap_OID, identities = self.resolve(snmp_engine)
+
+        return (trap_OID,) + tuple(
+            ObjectType(identity, univ.OctetString(value))
+            for identity, value in zip(identities, values)
+        )
+
+
 class SNMPAgent:
     """
     A class to represent an SNMP agent that constructs and sends SNMP traps
     (notifications) with customizable varbinds and notification types.
 
     Attributes:
-        snmp_engine (SnmpEngine): The SNMP engine for sending traps.
+        snmp_engine (SnmpEngine): The shared SNMP engine for sending traps,
+            looked up in the process-wide registry for the running event loop.
+        engine_name (str): Registry key of the shared SNMP engine.
+        transport_targets (TransportTargetCache): Cache of resolved transport
+            targets, shared by all agents by default.
+        send_mode (str): 'hlapi' to send through the pysnmp engine, or 'raw'
+            to send pre-encoded SNMPv2c datagrams straight to a UDP socket.
         community (CommunityData): SNMP community data using SNMPv2c.
+        usm_user (USMUser): SNMPv3 credentials used instead of the community
+            when set.
+        engine_id (bytes): Fixed SNMP engine ID of the agent's engine, None
+            for a generated one.
         context (ContextData): SNMP context data.
         target (dict): Target IP and port for the SNMP trap.
         notification_OID (str): The Object Identifier (OID) for the
         notification type.
         varbinds (list(Varbind)): Dictionary of OIDs and their associated
             varbinds.
+        send_latency (LatencyHistogram): Records how long every
+            `send_trap()` and `send_prepared()` call took, None when not
+            measured. Anything with a `record_ns(nanos)` method will do.
     """
     def __init__(self,
                  ipv4_host=os.getenv('IPv4_HOST_IP'),
                  port=os.getenv('PORT'),
                  notification_OID=None,
-                 varbinds: dict = {}):
+                 varbinds: dict = {},
+                 engine_name: str = 'default',
+                 target_cache=transport_targets,
+                 send_mode: str = 'hlapi',
+                 usm_user=None,
+                 engine_id=None,
+                 send_latency=None):
         """
         Initializes the SNMPAgent with host details, notification OID, and
         varbinds.
@@ -123,10 +288,35 @@ class SNMPAgent:
             varbinds (list(Varbind), optional): Dictionary of varbinds where
                 each key is an OID (str) and value is the data associated with
                 it.
+            engine_name (str, optional): Registry key of the shared SNMP
+                engine to send with.
+            target_cache (TransportTargetCache, optional): Cache of resolved
+                transport targets to send through.
+            send_mode (str, optional): 'hlapi' (default) or 'raw'. The raw
+                mode bypasses the pysnmp engine for high-rate load tests.
+            usm_user (USMUser, optional): Send SNMPv3 traps with these
+                credentials instead of SNMPv2c.
+            engine_id (str | bytes, optional): SNMP engine ID of the agent's
+                engine, which SNMPv3 receivers need to know the agent's
+                localized keys. Agents with different engine IDs must use
+                different `engine_name`s.
+            send_latency (LatencyHistogram, optional): Records the duration
+                of every send.
         """
+        if send_mode not in ('hlapi', 'raw'):
+            raise ValueError('Argument "send_mode" must be "hlapi" or "raw"')
 
-        self.snmp_engine = SnmpEngine()
+        if usm_user is not None and send_mode == 'raw':
+            raise ValueError('SNMPv3 is not supported by the "raw" send mode')
+
+        self.send_mode = send_mode
+
+        self.engine_name = engine_name
+        self.transport_targets = target_cache
         self.community = CommunityData('public', mpModel=1)  # SNMPv2c
+        self.usm_user = usm_user
+        self.engine_id = (engine_id_bytes(engine_id)
+                          if engine_id is not None else None)
         self.context = ContextData()
         # TRAP details
         self.target = {
@@ -136,10 +326,48 @@ class SNMPAgent:
         }
         self.notification_OID = notification_OID
         self.varbinds = varbinds
+        self.send_latency = send_latency
+        self._template = None
+        self._raw_sender = None
 
         if ipv4_host is None:
             raise ValueError('Argument "ipv4_host" cannot be empty')
 
+    @property
+    def snmp_engine(self):
+        """
+        Returns the shared SNMP engine for the running event loop.
+        """
+        return get_snmp_engine(self.engine_name, self.engine_id)
+
+    def get_auth_data(self, snmp_engine=None):
+        """
+        Returns the hlapi authentication data to send with: the SNMPv2c
+        community, or the USM user with keys localized to the engine's ID.
+
+        Args:
+            snmp_engine (SnmpEngine, optional): The sending engine. Defaults
+                to the shared engine.
+
+        Returns:
+            CommunityData | UsmUserData: The authentication data.
+        """
+        if self.usm_user is None:
+            return self.community
+        if snmp_engine is None:
+            snmp_engine = self.snmp_engine
+        return self.usm_user.user_data(bytes(snmp_engine.snmpEngineID))
+
+    async def get_target(self):
+        """
+        Returns the cached transport target for the agent's IP and port.
+
+        Returns:
+            UdpTransportTarget: The resolved transport target.
+        """
+        return await self.transport_targets.get(self.target['ip'],
+                                                self.target['port'])
+
     # Varbinds
     def set_notifcation_type(self, OID: str):
         """
@@ -249,6 +477,46 @@ class SNMPAgent:
         """
         return self.notification_OID
 
+    def _varbind_items(self):
+        """
+        Returns the agent's varbinds as (OID, value) pairs, whether they are
+        held as a list of Varbinds or as an OID -> value dictionary.
+        """
+        if isinstance(self.varbinds, dict):
+            return list(self.varbinds.items())
+        return [(varbind.OID, varbind.message) for varbind in self.varbinds]
+
+    def get_template(self):
+        """
+        Returns the NotificationTemplate for the agent's notification OID and
+        varbind OIDs. The template is cached and only rebuilt when the OIDs
+        change, so repeated sends only re-wrap the varbind values.
+
+        Returns:
+            NotificationTemplate: The cached template.
+        """
+        OIDs = tuple(OID for OID, _ in self._varbind_items())
+        if (self._template is None or
+                self._template.key != (self.notification_OID, OIDs)):
+            self._template = NotificationTemplate(self.notification_OID, OIDs)
+        return self._template
+
+    def create_notification(self, snmp_engine=None):
+        """
+        Creates a ready-to-send notification from the agent's current varbind
+        values.
+
+        Args:
+            snmp_engine (SnmpEngine, optional): The engine the notification
+                will be sent with. Defaults to the shared engine of the
+                running event loop.
+
+        Returns:
+            tuple(ObjectType): Resolved varbinds, snmpTrapOID first.
+        """
+        values = [value for _, value in self._varbind_items()]
+        return self.get_template().create(values, snmp_engine)
+
     async def send_trap(self):
         """
         Constructs and sends an SNMP trap (notification) using the specified
@@ -270,22 +538,28 @@ class SNMPAgent:
         if (self.varbinds is None):
             raise ValueError('Attribute "varbinds" cannot be empty')
 
-        target = await UdpTransportTarget.create((self.target['ip'],
-                                                  int(self.target['port'])))
+        start = time.perf_counter_ns()
+        if self.send_mode == 'raw':
+            await self._send_trap_raw()
+            self._record_send(start)
+            return
 
-        # Construct the notification
-        notification = SNMPNotification(self.notification_OID, self.varbinds)
-        notification = notification.create()
+        target = await self.get_target()
+
+        # Construct the notification from the precompiled template
+        engine = self.snmp_engine
+        notification = self.create_notification(engine)
 
         # Send the trap
         await send_notification(
-            self.snmp_engine,
-            self.community,
+            engine,
+            self.get_auth_data(engine),
             target,
             self.context,
             'trap',
-            notification
+            *notification
         )
+        self._record_send(start)
         if os.getenv('PYTEST_CURRENT_TEST'):
             print("Settlement trap sent successfully.")
 
@@ -306,24 +580,235 @@ class SNMPAgent:
         # if not self.varbinds:
         #     raise ValueError('Attribute "varbinds" cannot be empty')
 
+        start = time.perf_counter_ns()
+        if self.send_mode == 'raw':
+            await self._send_trap_raw()
+            self._record_send(start)
+            return
+
         # Set up SNMP target
-        target = await UdpTransportTarget.create(
-            (self.target['ip'], int(self.target['port']))
-        )
+        target = await self.get_target()
 
-        # Construct the notification
-        notification = SNMPNotification(self.notification_OID, self.varbinds)
-        notification = notification.create()
+        # Construct the notification from the precompiled template
+        engine = self.snmp_engine
+        notification = self.create_notification(engine)
 
         # Send the trap
         await send_notification(
-            self.snmp_engine,
-            self.community,
+            engine,
+            self.get_auth_data(engine),
+            target,
+            self.context,
+            'trap',
+            *notification
+        )
+        self._record_send(start)
+
+    def _record_send(self, start: int):
+        if self.send_latency is not None:
+            self.send_latency.record_ns(time.perf_counter_ns() - start)
+
+    async def get_raw_sender(self):
+        """
+        Returns the agent's raw-mode sender, opening its socket on first use
+        and rebuilding it when the notification or varbind OIDs, the target
+        or the community change.
+
+        Returns:
+            RawTrapSender: The opened raw sender.
+
+        Raises:
+            ValueError: If the agent sends SNMPv3.
+        """
+        if self.usm_user is not None:
+            raise ValueError('SNMPv3 is not supported by the "raw" send mode')
+
+        template = self.get_template()
+        community = str(self.community.communityName)
+        target = (self.target['ip'], self.target['port'])
+        sender = self._raw_sender
+        if (sender is None or sender.protocol is None or
+                sender.target != target or
+                sender.template.community != encode_octets(community) or
+                sender.template.notification_type_OID !=
+                template.notification_type_OID or
+                sender.template.varbind_OIDs != template.varbind_OIDs):
+            if sender is not None:
+                sender.close()
+            sender = RawTrapSender(
+                RawTrapTemplate(template.notification_type_OID,
+                                template.varbind_OIDs, community=community),
+                *target)
+            await sender.open()
+            self._raw_sender = sender
+        return sender
+
+    async def _send_trap_raw(self):
+        """
+        Sends the agent's current varbinds through the raw sender.
+        """
+        sender = await self.get_raw_sender()
+        sender.send([value for _, value in self._varbind_items()])
+
+    def close(self):
+        """
+        Closes the agent's raw-mode socket, if one was opened. The shared
+        engine and transport target cache are left to their owners.
+        """
+        if self._raw_sender is not None:
+            self._raw_sender.close()
+            self._raw_sender = None
+
+    async def inform_sender(self, window: int = 1000, timeout: float = 1.0,
+                            retries: int = 3, backoff: float = 2.0,
+                            on_result=None):
+        """
+        Returns an opened InformSender for the agent's notification OID,
+        varbind OIDs and target. The caller closes it.
+
+        Args:
+            window (int): Maximum outstanding informs.
+            timeout (float): Seconds before the first retransmit.
+            retries (int): Retransmits before an inform is counted as lost.
+            backoff (float): Timeout multiplier per retransmit.
+            on_result (function, optional): Callback invoked with a
+                TrapOutcome per acked or lost inform.
+
+        Returns:
+            InformSender: The opened sender.
+
+        Raises:
+            ValueError: If the agent sends SNMPv3.
+        """
+        if self.usm_user is not None:
+            raise ValueError('Informs are only sent with SNMPv2c')
+
+        template = self.get_template()
+        sender = InformSender(
+            RawTrapTemplate(template.notification_type_OID,
+                            template.varbind_OIDs,
+                            community=str(self.community.communityName),
+                            pdu_tag=TAG_INFORM_PDU),
+            self.target['ip'], self.target['port'], window=window,
+            timeout=timeout, retries=retries, backoff=backoff,
+            on_result=on_result)
+        await sender.open()
+        return sender
+
+    async def send_informs(self, rows=None, count: int = 1, **options):
+        """
+        Sends informs and waits until each one is acked or lost.
+
+        Args:
+            rows (iterable(iterable(str)), optional): Varbind values of each
+                inform. Defaults to `count` informs with the agent's current
+                varbind values.
+            count (int): Number of informs when `rows` is not given.
+            **options: Window, timeout, retry, backoff and on_result options
+                of `inform_sender()`.
+
+        Returns:
+            InformReport: Delivery counters and ack latency.
+        """
+        if rows is None:
+            values = [value for _, value in self._varbind_items()]
+            rows = (values for _ in range(count))
+
+        sender = await self.inform_sender(**options)
+        try:
+            for values in rows:
+                await sender.send(values)
+            return await sender.drain()
+        finally:
+            sender.close()
+
+    async def send_prepared(self, notification, engine=None, target=None):
+        """
+        Sends an already constructed notification through the agent's
+        credentials and context.
+
+        Args:
+            notification (SNMPNotification | NotificationType | tuple): The
+                notification to send. SNMPNotification instances are created
+                before sending; tuples are varbinds returned by
+                `NotificationTemplate.create()`.
+            engine (SnmpEngine, optional): Engine to send with. Defaults to
+                the shared engine.
+            target (UdpTransportTarget, optional): Target to send to.
+                Defaults to the cached target for the agent's IP and port.
+
+        Returns:
+            str: The error indication reported by the engine, None on
+                success.
+        """
+        start = time.perf_counter_ns()
+        if isinstance(notification, SNMPNotification):
+            notification = notification.create()
+        if engine is None:
+            engine = self.snmp_engine
+        if target is None:
+            target = await self.get_target()
+        if not isinstance(notification, tuple):
+            notification = (notification,)
+
+        errorIndication, _, _, _ = await send_notification(
+            engine,
+            self.get_auth_data(engine),
             target,
             self.context,
             'trap',
-            notification
+            *notification
         )
+        self._record_send(start)
+        return str(errorIndication) if errorIndication else None
+
+    def trap_sender(self, concurrency: int = 10, maxsize: int = None,
+                    on_result=None):
+        """
+        Returns a bounded-queue sender that keeps up to `concurrency` traps
+        in flight through this agent. Use it as an async context manager.
+
+        Args:
+            concurrency (int): Maximum number of sends in flight.
+            maxsize (int, optional): Queue capacity. Defaults to twice the
+                concurrency.
+            on_result (function, optional): Callback invoked with each
+                TrapOutcome. When set, outcomes are not accumulated.
+
+        Returns:
+            TrapBatchSender: The batch sender.
+        """
+        return TrapBatchSender(self, concurrency, maxsize, on_result)
+
+    async def send_traps(self, notifications, concurrency: int = 10,
+                         on_result=None):
+        """
+        Sends every notification from a (possibly unbounded, possibly async)
+        iterable, keeping up to `concurrency` sends in flight.
+
+        Args:
+            notifications (iterable | async iterable): SNMPNotification or
+                NotificationType objects to send.
+            concurrency (int): Maximum number of sends in flight.
+            on_result (function, optional): Callback invoked with each
+                TrapOutcome. When set, outcomes are not accumulated, which
+                keeps memory flat for unbounded generators.
+
+        Returns:
+            BatchResult: Per-trap outcomes and aggregate timing.
+        """
+        if (self.target['ip'] is None or self.target['port'] is None):
+            raise ValueError('Attributes in "target" cannot be empty')
+
+        async with self.trap_sender(concurrency,
+                                    on_result=on_result) as sender:
+            if hasattr(notifications, '__aiter__'):
+                async for notification in notifications:
+                    await sender.put(notification)
+            else:
+                for notification in notifications:
+                    await sender.put(notification)
+        return sender.result
 
 
 # Example usage
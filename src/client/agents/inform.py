@@ -0,0 +1,233 @@
+import asyncio
+import time
+from agents.batch import TrapOutcome
+from agents.raw import RawTrapProtocol, TAG_RESPONSE_PDU, REQUEST_ID_MAX, \
+    decode_request_id
+from agents.timers import TimerWheel
+
+
+class InformReport:
+    """
+    Delivery counters of an InformSender.
+
+    Attributes:
+        sent (int): Informs sent, not counting retransmits.
+        acked (int): Informs acknowledged by a response.
+        lost (int): Informs given up on after the last retransmit.
+        retransmits (int): Retransmitted datagrams.
+        duplicates (int): Responses for informs no longer outstanding,
+            e.g. the ack of a retransmitted inform arriving twice.
+        latency_total (float): Sum of ack latencies in seconds, measured
+            from the first transmission.
+        latency_max (float): Largest ack latency in seconds.
+    """
+    def __init__(self):
+        self.sent = 0
+        self.acked = 0
+        self.lost = 0
+        self.retransmits = 0
+        self.duplicates = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def latency_mean(self):
+        return self.latency_total / self.acked if self.acked else 0.0
+
+    @property
+    def loss_rate(self):
+        done = self.acked + self.lost
+        return self.lost / done if done else 0.0
+
+    def __repr__(self):
+        return (f"InformReport(sent={self.sent}, acked={self.acked}, "
+                f"lost={self.lost}, retransmits={self.retransmits}, "
+                f"latency_mean={self.latency_mean * 1e3:.2f}ms)")
+
+
+class _Pending:
+    __slots__ = ('index', 'datagram', 'first_sent', 'attempts', 'timeout',
+                 'deadline')
+
+    def __init__(self, index, datagram, first_sent, timeout, deadline):
+        self.index = index
+        self.datagram = datagram
+        self.first_sent = first_sent
+        self.attempts = 0
+        self.timeout = timeout
+        self.deadline = deadline
+
+
+class InformSender:
+    """
+    Sends SNMPv2c INFORM requests encoded by a RawTrapTemplate and tracks
+    their acknowledgements.
+
+    At most `window` informs are outstanding at once; `send()` waits for a
+    slot when the window is full. Outstanding request IDs are kept in a dict
+    and their timeouts on a single TimerWheel driven by one background task,
+    so thousands of informs can be in flight without a task or timer handle
+    per request. An inform that times out is retransmitted unchanged, with
+    the timeout multiplied by `backoff`, up to `retries` times before it is
+    counted as lost.
+
+    Attributes:
+        template (RawTrapTemplate): Template built with TAG_INFORM_PDU.
+        target (tuple): (ip, port) of the SNMP manager.
+        window (int): Maximum outstanding informs.
+        timeout (float): Seconds before the first retransmit.
+        retries (int): Retransmits before an inform is lost.
+        backoff (float): Timeout multiplier per retransmit.
+        report (InformReport): Delivery counters.
+        on_result (function): Called with a TrapOutcome per acked or lost
+            inform; `index` is the send order and `error` is 'timeout' for a
+            lost inform.
+    """
+    def __init__(self, template, ip: str, port: int, window: int = 1000,
+                 timeout: float = 1.0, retries: int = 3, backoff: float = 2.0,
+                 tick: float = 0.01, on_result=None):
+        if window <= 0:
+            raise ValueError('Argument "window" must be positive')
+
+        if retries < 0:
+            raise ValueError('Argument "retries" cannot be negative')
+
+        self.template = template
+        self.target = (str(ip), int(port))
+        self.window = window
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.report = InformReport()
+        self.on_result = on_result
+        self.protocol = None
+        self._wheel = TimerWheel(tick)
+        self._pending = {}
+        self._request_id = 0
+        self._started = time.monotonic()
+        self._timer_task = None
+        self._space = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    async def open(self):
+        """
+        Opens the UDP socket and starts the timer task.
+        """
+        loop = asyncio.get_running_loop()
+        _, self.protocol = await loop.create_datagram_endpoint(
+            lambda: RawTrapProtocol(self._on_datagram),
+            remote_addr=self.target
+        )
+        self._timer_task = asyncio.create_task(self._run_timers())
+
+    def _next_request_id(self):
+        request_id = self._request_id % REQUEST_ID_MAX + 1
+        while request_id in self._pending:
+            request_id = request_id % REQUEST_ID_MAX + 1
+        self._request_id = request_id
+        return request_id
+
+    async def send(self, values):
+        """
+        Sends one inform, first waiting for a free slot in the window.
+
+        Args:
+            values (iterable(str | bytes)): One value per varbind OID.
+
+        Returns:
+            int: The request ID of the inform.
+        """
+        if self.protocol is None:
+            raise RuntimeError('InformSender has not been opened')
+        while len(self._pending) >= self.window:
+            self._space.clear()
+            await self._space.wait()
+
+        request_id = self._next_request_id()
+        uptime = int((time.monotonic() - self._started) * 100)
+        datagram = self.template.encode(request_id, uptime, values)
+        deadline = self._wheel.schedule(request_id, self.timeout)
+        self._pending[request_id] = _Pending(
+            self.report.sent, datagram, time.perf_counter(), self.timeout,
+            deadline)
+        self._idle.clear()
+        self.protocol.transport.sendto(datagram)
+        self.report.sent += 1
+        return request_id
+
+    def _on_datagram(self, data, addr):
+        try:
+            pdu_tag, request_id = decode_request_id(data)
+        except ValueError:
+            return
+        if pdu_tag != TAG_RESPONSE_PDU:
+            return
+        pending = self._pending.pop(request_id, None)
+        if pending is None:
+            self.report.duplicates += 1
+            return
+
+        latency = time.perf_counter() - pending.first_sent
+        report = self.report
+        report.acked += 1
+        report.latency_total += latency
+        if latency > report.latency_max:
+            report.latency_max = latency
+        self._release(TrapOutcome(pending.index, None, latency))
+
+    def _release(self, outcome: TrapOutcome):
+        if self.on_result is not None:
+            self.on_result(outcome)
+        self._space.set()
+        if not self._pending:
+            self._idle.set()
+
+    async def _run_timers(self):
+        wheel = self._wheel
+        while True:
+            await asyncio.sleep(wheel.tick)
+            for request_id in wheel.advance():
+                pending = self._pending.get(request_id)
+                # Acked, or rescheduled after an earlier retransmit
+                if pending is None or pending.deadline > wheel.current:
+                    continue
+                if pending.attempts < self.retries:
+                    pending.attempts += 1
+                    pending.timeout *= self.backoff
+                    pending.deadline = wheel.schedule(request_id,
+                                                      pending.timeout)
+                    self.protocol.transport.sendto(pending.datagram)
+                    self.report.retransmits += 1
+                else:
+                    del self._pending[request_id]
+                    self.report.lost += 1
+                    self._release(TrapOutcome(
+                        pending.index, 'timeout',
+                        time.perf_counter() - pending.first_sent))
+
+    async def drain(self):
+        """
+        Waits until every outstanding inform is acked or lost.
+
+        Returns:
+            InformReport: The sender's counters.
+        """
+        await self._idle.wait()
+        return self.report
+
+    def close(self):
+        """
+        Stops the timer task and closes the UDP socket. Outstanding informs
+        are abandoned without being counted as lost.
+        """
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+            self._timer_task = None
+        if self.protocol is not None and self.protocol.transport:
+            self.protocol.transport.close()
+        self.protocol = None
@@ -0,0 +1,363 @@
+import asyncio
+import itertools
+import time
+
+
+# BER tags used by SNMPv2c notifications
+TAG_INTEGER = 0x02
+TAG_OCTET_STRING = 0x04
+TAG_OBJECT_IDENTIFIER = 0x06
+TAG_SEQUENCE = 0x30
+TAG_TIMETICKS = 0x43
+TAG_TRAP_PDU = 0xA7
+TAG_INFORM_PDU = 0xA6
+TAG_RESPONSE_PDU = 0xA2
+
+# SNMPv2-MIB::sysUpTime.0 and SNMPv2-MIB::snmpTrapOID.0
+SYS_UPTIME_OID = '1.3.6.1.2.1.1.3.0'
+SNMP_TRAP_OID = '1.3.6.1.6.3.1.1.4.1.0'
+
+# Request IDs are positive 32-bit signed integers
+REQUEST_ID_MAX = 0x7FFFFFFF
+
+
+def encode_length(length: int):
+    """
+    Returns the BER definite-form encoding of a length.
+
+    Args:
+        length (int): Length of the contents in bytes.
+
+    Returns:
+        bytes: The encoded length octets.
+    """
+    if length < 0x80:
+        return bytes((length,))
+    octets = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes((0x80 | len(octets),)) + octets
+
+
+def encode_tlv(tag: int, contents: bytes):
+    """
+    Returns a BER tag-length-value triplet.
+
+    Args:
+        tag (int): The identifier octet.
+        contents (bytes): The contents octets.
+
+    Returns:
+        bytes: The encoded TLV.
+    """
+    return bytes((tag,)) + encode_length(len(contents)) + contents
+
+
+def encode_unsigned(tag: int, value: int):
+    """
+    Returns the minimal BER encoding of a non-negative integer.
+
+    Args:
+        tag (int): The identifier octet (INTEGER, TimeTicks, ...).
+        value (int): The value to encode.
+
+    Returns:
+        bytes: The encoded TLV.
+    """
+    contents = value.to_bytes(value.bit_length() // 8 + 1, 'big')
+    return encode_tlv(tag, contents)
+
+
+def encode_oid(OID: str):
+    """
+    Returns the BER encoding of a dotted OBJECT IDENTIFIER.
+
+    Args:
+        OID (str): The dotted OID, e.g. '1.3.6.1.2.1.1.3.0'.
+
+    Returns:
+        bytes: The encoded TLV.
+
+    Raises:
+        ValueError: If the OID has fewer than two arcs or invalid first arcs.
+    """
+    arcs = [int(arc) for arc in OID.strip('.').split('.')]
+    if len(arcs) < 2 or arcs[0] > 2 or (arcs[0] < 2 and arcs[1] > 39):
+        raise ValueError(f'Invalid OID "{OID}"')
+
+    contents = bytearray()
+    for arc in [arcs[0] * 40 + arcs[1]] + arcs[2:]:
+        chunk = [arc & 0x7F]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7F))
+            arc >>= 7
+        contents.extend(reversed(chunk))
+    return encode_tlv(TAG_OBJECT_IDENTIFIER, bytes(contents))
+
+
+def encode_octets(value):
+    """
+    Returns the bytes of an OctetString value. Strings are encoded the way
+    pysnmp's OctetString encodes them (ISO-8859-1).
+    """
+    if isinstance(value, str):
+        return value.encode('iso-8859-1')
+    return bytes(value)
+
+
+def decode_tlv(data: bytes, offset: int = 0):
+    """
+    Reads the header of one BER TLV.
+
+    Args:
+        data (bytes): The encoded data.
+        offset (int): Position of the tag byte.
+
+    Returns:
+        tuple(int, int, int): The tag and the start and end offsets of the
+            contents.
+
+    Raises:
+        ValueError: If the TLV is truncated or uses an indefinite length.
+    """
+    if offset + 2 > len(data):
+        raise ValueError('Truncated BER header')
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7F
+        if size == 0 or offset + size > len(data):
+            raise ValueError('Unsupported or truncated BER length')
+        length = int.from_bytes(data[offset:offset + size], 'big')
+        offset += size
+    if offset + length > len(data):
+        raise ValueError('Truncated BER contents')
+    return tag, offset, offset + length
+
+
+def decode_request_id(datagram: bytes):
+    """
+    Reads the PDU type and request-id of an SNMPv1/v2c message without
+    decoding the rest of it.
+
+    Args:
+        datagram (bytes): The encoded message.
+
+    Returns:
+        tuple(int, int): The PDU tag and the request ID.
+
+    Raises:
+        ValueError: If the datagram is not an SNMP message.
+    """
+    tag, offset, _ = decode_tlv(datagram)
+    if tag != TAG_SEQUENCE:
+        raise ValueError('SNMP message is not a SEQUENCE')
+    _, _, offset = decode_tlv(datagram, offset)     # version
+    _, _, offset = decode_tlv(datagram, offset)     # community
+    pdu_tag, offset, _ = decode_tlv(datagram, offset)
+    tag, start, end = decode_tlv(datagram, offset)
+    if tag != TAG_INTEGER:
+        raise ValueError('Request ID is not an INTEGER')
+    return pdu_tag, int.from_bytes(datagram[start:end], 'big', signed=True)
+
+
+class RawTrapTemplate:
+    """
+    A pre-encoded SNMPv2c notification PDU for a fixed community,
+    notification type OID and ordered varbind OIDs.
+
+    Everything except the request-id, sysUpTime and the OctetString values is
+    encoded once, so encoding a notification only encodes those fields and
+    the enclosing lengths around the pre-encoded segments. Lengths use the
+    minimal definite form, which makes the output identical to pysnmp's
+    encoding of the same message.
+
+    Attributes:
+        community (bytes): SNMPv2c community string.
+        notification_type_OID (str): The OID for the notification type.
+        varbind_OIDs (tuple(str)): Ordered OIDs of the varbinds.
+        pdu_tag (int): TAG_TRAP_PDU or TAG_INFORM_PDU.
+    """
+    def __init__(self, notification_type_OID: str, varbind_OIDs,
+                 community: str = 'public', pdu_tag: int = TAG_TRAP_PDU):
+        """
+        Args:
+            notification_type_OID (str): The object identifier for the type of
+                notification.
+            varbind_OIDs (iterable(str)): Ordered OIDs of the varbinds whose
+                values are supplied to `encode()`.
+            community (str): SNMPv2c community string.
+            pdu_tag (int): PDU type, TAG_TRAP_PDU or TAG_INFORM_PDU.
+        """
+        if (notification_type_OID is None or notification_type_OID == ''):
+            raise AttributeError('notification_type_OID is not specficied')
+
+        self.community = encode_octets(community)
+        self.notification_type_OID = notification_type_OID
+        self.varbind_OIDs = tuple(varbind_OIDs)
+        self.pdu_tag = pdu_tag
+
+        # version (1 = SNMPv2c) and community
+        self._message_head = (encode_unsigned(TAG_INTEGER, 1) +
+                              encode_tlv(TAG_OCTET_STRING, self.community))
+        # error-status and error-index are always 0
+        self._errors = (encode_unsigned(TAG_INTEGER, 0) +
+                        encode_unsigned(TAG_INTEGER, 0))
+        self._uptime_OID = encode_oid(SYS_UPTIME_OID)
+        self._trap_OID_varbind = encode_tlv(
+            TAG_SEQUENCE,
+            encode_oid(SNMP_TRAP_OID) + encode_oid(notification_type_OID)
+        )
+        self._varbind_OIDs = tuple(encode_oid(OID)
+                                   for OID in self.varbind_OIDs)
+
+    def encode(self, request_id: int, uptime: int, values):
+        """
+        Encodes a complete SNMPv2c message.
+
+        Args:
+            request_id (int): Request ID in [0, REQUEST_ID_MAX].
+            uptime (int): sysUpTime.0 in hundredths of a second.
+            values (iterable(str | bytes)): One value per varbind OID.
+
+        Returns:
+            bytes: The encoded datagram.
+
+        Raises:
+            ValueError: If the number of values does not match the number of
+                varbind OIDs, or the request ID is out of range.
+        """
+        if not 0 <= request_id <= REQUEST_ID_MAX:
+            raise ValueError(f'request_id {request_id} out of range')
+
+        varbinds = [
+            self._varbind(self._uptime_OID,
+                          encode_unsigned(TAG_TIMETICKS, uptime & 0xFFFFFFFF)),
+            self._trap_OID_varbind
+        ]
+        count = 0
+        for OID, value in zip(self._varbind_OIDs, values):
+            varbinds.append(self._varbind(
+                OID, encode_tlv(TAG_OCTET_STRING, encode_octets(value))))
+            count += 1
+        if count != len(self._varbind_OIDs):
+            raise ValueError(f'Expected {len(self._varbind_OIDs)} values')
+
+        varbind_list = b''.join(varbinds)
+        pdu = b''.join((
+            encode_unsigned(TAG_INTEGER, request_id),
+            self._errors,
+            bytes((TAG_SEQUENCE,)), encode_length(len(varbind_list)),
+            varbind_list
+        ))
+        message = b''.join((
+            self._message_head,
+            bytes((self.pdu_tag,)), encode_length(len(pdu)), pdu
+        ))
+        return bytes((TAG_SEQUENCE,)) + encode_length(len(message)) + message
+
+    @staticmethod
+    def _varbind(OID: bytes, value: bytes):
+        contents = OID + value
+        return bytes((TAG_SEQUENCE,)) + encode_length(len(contents)) \
+            + contents
+
+
+class RawTrapProtocol(asyncio.DatagramProtocol):
+    """
+    Minimal datagram protocol used by RawTrapSender. It counts socket errors
+    reported by the event loop and forwards received datagrams to an
+    optional callback.
+    """
+    def __init__(self, on_datagram=None):
+        self.transport = None
+        self.errors = 0
+        self.on_datagram = on_datagram
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if self.on_datagram is not None:
+            self.on_datagram(data, addr)
+
+    def error_received(self, exc):
+        self.errors += 1
+
+
+class RawTrapSender:
+    """
+    Sends notifications encoded by a RawTrapTemplate straight to a connected
+    UDP socket, bypassing the pysnmp engine.
+
+    Attributes:
+        template (RawTrapTemplate): The pre-encoded notification.
+        target (tuple): (ip, port) of the SNMP manager.
+        sent (int): Number of datagrams handed to the socket.
+    """
+    def __init__(self, template: RawTrapTemplate, ip: str, port: int):
+        self.template = template
+        self.target = (str(ip), int(port))
+        self.sent = 0
+        self.protocol = None
+        self._started = time.monotonic()
+        self._request_ids = itertools.count(1)
+
+    @property
+    def errors(self):
+        return self.protocol.errors if self.protocol else 0
+
+    def uptime(self):
+        """
+        Returns the sender's sysUpTime in hundredths of a second.
+        """
+        return int((time.monotonic() - self._started) * 100)
+
+    def next_request_id(self):
+        request_id = next(self._request_ids)
+        if request_id >= REQUEST_ID_MAX:
+            self._request_ids = itertools.count(1)
+        return request_id
+
+    async def open(self, on_datagram=None):
+        """
+        Opens the UDP socket connected to the target.
+
+        Args:
+            on_datagram (function, optional): Called with (data, addr) for
+                every datagram received on the socket.
+        """
+        loop = asyncio.get_running_loop()
+        _, self.protocol = await loop.create_datagram_endpoint(
+            lambda: RawTrapProtocol(on_datagram),
+            remote_addr=self.target
+        )
+
+    def send(self, values, request_id: int = None):
+        """
+        Encodes and sends one notification without awaiting.
+
+        Args:
+            values (iterable(str | bytes)): One value per varbind OID.
+            request_id (int, optional): Request ID to use. Defaults to the
+                next ID of the sender.
+
+        Returns:
+            int: The request ID of the sent notification.
+        """
+        if self.protocol is None:
+            raise RuntimeError('RawTrapSender has not been opened')
+        if request_id is None:
+            request_id = self.next_request_id()
+        self.protocol.transport.sendto(
+            self.template.encode(request_id, self.uptime(), values))
+        self.sent += 1
+        return request_id
+
+    def close(self):
+        """
+        Closes the UDP socket.
+        """
+        if self.protocol is not None and self.protocol.transport:
+            self.protocol.transport.close()
+        self.protocol = None
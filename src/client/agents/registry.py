@@ -0,0 +1,148 @@
+import asyncio
+import weakref
+from collections import OrderedDict
+from pysnmp.hlapi.asyncio import SnmpEngine, UdpTransportTarget
+from pysnmp.proto.rfc1902 import OctetString
+
+
+# SnmpEngine instances shared by every agent, keyed by the event loop they
+# were created on. An engine's dispatcher and sockets are bound to the loop
+# that opened them, so each loop (e.g. one `asyncio.run()` per GUI click) gets
+# its own set of engines, and they are released with the loop.
+_engines = weakref.WeakKeyDictionary()
+
+
+def get_snmp_engine(name: str = 'default', engine_id: bytes = None):
+    """
+    Returns the process-wide SnmpEngine registered under `name` for the
+    running event loop, creating it on first use. Callers outside of a
+    coroutine run one first, e.g. the GUI sends from `loop.run_until_complete`
+    on its own loop.
+
+    Args:
+        name (str): Registry key of the engine. Agents that need isolated
+            engine state (e.g. separate SNMPv3 engine IDs) can use their
+            own name.
+        engine_id (bytes, optional): SNMP engine ID of the engine. Defaults
+            to a generated ID.
+
+    Returns:
+        SnmpEngine: The shared SNMP engine.
+
+    Raises:
+        RuntimeError: If no event loop is running.
+        ValueError: If the engine registered under `name` has a different
+            engine ID.
+    """
+    loop = asyncio.get_running_loop()
+    engines = _engines.get(loop)
+    if engines is None:
+        engines = _engines[loop] = {}
+
+    engine = engines.get(name)
+    if engine is None:
+        engine = engines[name] = SnmpEngine(
+            snmpEngineID=OctetString(engine_id) if engine_id else None)
+    elif engine_id and bytes(engine.snmpEngineID) != engine_id:
+        raise ValueError(f'SNMP engine "{name}" has a different engine ID')
+    return engine
+
+
+def close_snmp_engines():
+    """
+    Closes the dispatchers of all registered engines and empties the
+    registry.
+    """
+    for engines in list(_engines.values()):
+        for engine in engines.values():
+            engine.close_dispatcher()
+        engines.clear()
+    _engines.clear()
+
+
+class TransportTargetCache:
+    """
+    LRU cache of resolved `UdpTransportTarget` objects keyed by (ip, port).
+
+    `UdpTransportTarget.create()` resolves the address through the event
+    loop's resolver on every call. Caching the resolved target means a trap to
+    a known destination only pays for encoding and `sendto`.
+
+    Attributes:
+        maxsize (int): Maximum number of targets kept before the least
+            recently used one is evicted.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that had to create a target.
+    """
+    def __init__(self, maxsize: int = 128):
+        """
+        Initializes an empty cache.
+
+        Args:
+            maxsize (int): Maximum number of cached targets.
+
+        Raises:
+            ValueError: If `maxsize` is smaller than 1.
+        """
+        if maxsize < 1:
+            raise ValueError('Argument "maxsize" must be at least 1')
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._targets = OrderedDict()
+
+    async def get(self, ip: str, port: int):
+        """
+        Returns the transport target for (ip, port), creating and caching it
+        on a miss.
+
+        Args:
+            ip (str): IP address of the SNMP target.
+            port (int): Port number of the SNMP target.
+
+        Returns:
+            UdpTransportTarget: The resolved transport target.
+        """
+        key = (str(ip), int(port))
+        target = self._targets.get(key)
+        if target is not None:
+            self.hits += 1
+            self._targets.move_to_end(key)
+            return target
+
+        self.misses += 1
+        target = await UdpTransportTarget.create(key)
+        self._targets[key] = target
+        if len(self._targets) > self.maxsize:
+            self._targets.popitem(last=False)
+        return target
+
+    def evict(self, ip: str, port: int):
+        """
+        Removes the target for (ip, port) if it is cached.
+
+        Args:
+            ip (str): IP address of the SNMP target.
+            port (int): Port number of the SNMP target.
+        """
+        self._targets.pop((str(ip), int(port)), None)
+
+    def close(self):
+        """
+        Drops every cached target and resets the hit/miss counters.
+        """
+        self._targets.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._targets)
+
+    def __contains__(self, key):
+        ip, port = key
+        return (str(ip), int(port)) in self._targets
+
+
+# Default cache shared by every SNMPAgent
+transport_targets = TransportTargetCache()
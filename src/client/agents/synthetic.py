@@ -0,0 +1,268 @@
+import numpy as np
+from agents.transaction import SETTLEMENT_FIELDS
+
+
+MID_ALPHABET = b'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+DATETIME_FIELDS = ('open_datetime', 'close_datetime', 'submission_datetime',
+                   'deposit_datetime')
+
+
+class TransactionBatch:
+    """
+    A batch of synthetic settlements stored column-wise in NumPy arrays.
+
+    Categorical fields are stored as small integer codes into their option
+    tuples, amounts as float64 rounded to cents, MIDs as fixed-width byte
+    strings and datetimes as datetime64[s]. Columns are only converted to
+    strings, a chunk at a time, when rows are read.
+
+    Attributes:
+        columns (dict): Field name -> NumPy array.
+        options (dict): Categorical field name -> tuple of option strings.
+    """
+    def __init__(self, columns: dict, options: dict):
+        self.columns = columns
+        self.options = options
+
+    def __len__(self):
+        return len(self.columns['amount'])
+
+    def column(self, field: str):
+        """
+        Returns one field of every settlement as a NumPy array of strings
+        (or floats for 'amount').
+
+        Raises:
+            KeyError: If the field is not part of the batch.
+        """
+        return self._convert(field, slice(None))
+
+    def _convert(self, field: str, rows: slice):
+        values = self.columns[field][rows]
+        if field in self.options:
+            return np.asarray(self.options[field], dtype=object)[values]
+        if field == 'mid':
+            return values.astype('U')
+        if field in DATETIME_FIELDS:
+            return np.datetime_as_string(values, unit='s')
+        return values
+
+    def rows(self, fields=None, chunk_size: int = 65536):
+        """
+        Yields every settlement as a tuple of strings, ready to be used as
+        the varbind values of a trap.
+
+        Args:
+            fields (iterable(str), optional): Fields to yield, in order.
+                Defaults to every settlement field in varbind order.
+            chunk_size (int): Number of rows converted to strings at once.
+
+        Yields:
+            tuple(str): The values of one settlement.
+        """
+        fields = tuple(fields or (field for field, _ in SETTLEMENT_FIELDS))
+        for start in range(0, len(self), chunk_size):
+            rows = slice(start, start + chunk_size)
+            chunk = []
+            for field in fields:
+                if field == 'amount':
+                    chunk.append(['%.2f' % amount for amount in
+                                  self.columns['amount'][rows].tolist()])
+                else:
+                    chunk.append(self._convert(field, rows).tolist())
+            yield from zip(*chunk)
+
+
+class TransactionGenerator:
+    """
+    Generates batches of synthetic settlements with NumPy.
+
+    Every field of a batch is drawn in one vectorized call per column from a
+    seeded `numpy.random.Generator`, so a generator built with the same seed
+    and settings produces the same batches in the same order.
+
+    Open datetimes increase monotonically with exponentially distributed
+    gaps averaging 1/`rate` seconds. Each settlement then closes, is
+    submitted and is deposited after exponentially distributed delays, so
+    open <= close <= submission <= deposit for every row.
+
+    Attributes:
+        rng (numpy.random.Generator): Source of every random draw.
+        options (dict): Categorical field name -> tuple of option strings.
+        weights (dict): Categorical field name -> normalized probabilities,
+            None for uniform.
+        amount_distribution (str): 'lognormal' or 'uniform'.
+        amount_params (tuple(float)): (mean, sigma) of the log of the amount
+            for 'lognormal', (low, high) for 'uniform'.
+        mid_length (int): Length of the generated MIDs.
+        merchants (int): Size of the MID pool, None for a new MID per row.
+        start (numpy.datetime64): Open datetime of the first settlement.
+        rate (float): Mean settlements opened per second.
+        close_delay (float): Mean seconds between open and close.
+        submission_delay (float): Mean seconds between close and submission.
+        deposit_delay (float): Mean seconds between submission and deposit.
+    """
+    def __init__(self,
+                 seed: int = None,
+                 types=('sale', 'refund', 'void'),
+                 type_weights=(0.9, 0.08, 0.02),
+                 statuses=('settled', 'pending', 'failed'),
+                 status_weights=(0.85, 0.1, 0.05),
+                 entities=('VISA', 'MASTERCARD', 'AMEX', 'DISCOVER'),
+                 entity_weights=None,
+                 amount_distribution: str = 'lognormal',
+                 amount_params=(3.5, 1.0),
+                 mid_length: int = 8,
+                 merchants: int = None,
+                 start: str = '2024-01-01T00:00:00',
+                 rate: float = 10.0,
+                 close_delay: float = 3600.0,
+                 submission_delay: float = 600.0,
+                 deposit_delay: float = 86400.0):
+        """
+        Initializes the generator.
+
+        Args:
+            seed (int, optional): Seed of the random generator. Defaults to
+                fresh OS entropy.
+            types, statuses, entities (tuple(str)): Options of each
+                categorical field.
+            type_weights, status_weights, entity_weights (tuple(float),
+                optional): Relative weight of each option. None for uniform.
+            amount_distribution (str): 'lognormal' or 'uniform'.
+            amount_params (tuple(float)): Parameters of the amount
+                distribution, see Attributes.
+            mid_length (int): Length of the generated MIDs.
+            merchants (int, optional): Draw MIDs from a fixed pool of this
+                many merchants instead of a new MID per settlement.
+            start (str): ISO datetime of the first open datetime.
+            rate (float): Mean settlements opened per second.
+            close_delay (float): Mean seconds between open and close.
+            submission_delay (float): Mean seconds between close and
+                submission.
+            deposit_delay (float): Mean seconds between submission and
+                deposit.
+
+        Raises:
+            ValueError: If a weight tuple does not match its options, the
+                amount distribution is unknown, or a length, pool size or
+                rate is not positive.
+        """
+        if amount_distribution not in ('lognormal', 'uniform'):
+            raise ValueError('Argument "amount_distribution" must be '
+                             '"lognormal" or "uniform"')
+
+        if mid_length <= 0:
+            raise ValueError('Argument "mid_length" must be positive')
+
+        if merchants is not None and merchants <= 0:
+            raise ValueError('Argument "merchants" must be positive')
+
+        if rate <= 0:
+            raise ValueError('Argument "rate" must be positive')
+
+        self.rng = np.random.default_rng(seed)
+        self.options = {'type': tuple(types), 'status': tuple(statuses),
+                        'entity': tuple(entities)}
+        self.weights = {
+            field: self._normalize(field, self.options[field], weights)
+            for field, weights in (('type', type_weights),
+                                   ('status', status_weights),
+                                   ('entity', entity_weights))
+        }
+        self.amount_distribution = amount_distribution
+        self.amount_params = tuple(amount_params)
+        self.mid_length = mid_length
+        self.merchants = merchants
+        self.start = np.datetime64(start, 's')
+        self.rate = rate
+        self.close_delay = close_delay
+        self.submission_delay = submission_delay
+        self.deposit_delay = deposit_delay
+
+        self._alphabet = np.frombuffer(MID_ALPHABET, dtype=np.uint8)
+        self._merchant_pool = (self.generate_mids(merchants)
+                               if merchants else None)
+        self._clock = 0.0
+
+    @staticmethod
+    def _normalize(field: str, options: tuple, weights):
+        if not options:
+            raise ValueError(f'Options of "{field}" cannot be empty')
+        if weights is None:
+            return None
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(weights) != len(options) or weights.sum() <= 0 or \
+                (weights < 0).any():
+            raise ValueError(f'Weights of "{field}" must be one non-negative '
+                             'value per option')
+        return weights / weights.sum()
+
+    def generate_mids(self, count: int):
+        """
+        Returns `count` random MIDs of uppercase letters and digits as a
+        fixed-width byte string array.
+        """
+        codes = self.rng.integers(0, len(self._alphabet),
+                                  size=(count, self.mid_length),
+                                  dtype=np.uint8)
+        return self._alphabet[codes].view(f'S{self.mid_length}').ravel()
+
+    def _categorical(self, field: str, count: int):
+        options = self.options[field]
+        dtype = np.uint8 if len(options) <= 256 else np.uint32
+        return self.rng.choice(len(options), size=count,
+                               p=self.weights[field]).astype(dtype)
+
+    def _amounts(self, count: int):
+        if self.amount_distribution == 'lognormal':
+            amounts = self.rng.lognormal(*self.amount_params, size=count)
+        else:
+            amounts = self.rng.uniform(*self.amount_params, size=count)
+        return np.round(amounts, 2)
+
+    def _delays(self, mean: float, count: int):
+        return self.rng.exponential(mean, size=count).astype(np.int64)
+
+    def generate(self, count: int):
+        """
+        Generates `count` settlements. Successive batches continue the
+        timeline of the previous ones.
+
+        Args:
+            count (int): Number of settlements.
+
+        Returns:
+            TransactionBatch: The settlements as columns.
+        """
+        if count < 0:
+            raise ValueError('Argument "count" cannot be negative')
+
+        gaps = self.rng.exponential(1.0 / self.rate, size=count)
+        offsets = self._clock + np.cumsum(gaps)
+        if count:
+            self._clock = float(offsets[-1])
+
+        opened = self.start + offsets.astype(np.int64).astype('m8[s]')
+        closed = opened + self._delays(self.close_delay, count)
+        submitted = closed + self._delays(self.submission_delay, count)
+        deposited = submitted + self._delays(self.deposit_delay, count)
+
+        if self._merchant_pool is not None:
+            mids = self._merchant_pool[
+                self.rng.integers(0, len(self._merchant_pool), size=count)]
+        else:
+            mids = self.generate_mids(count)
+
+        columns = {
+            'type': self._categorical('type', count),
+            'status': self._categorical('status', count),
+            'amount': self._amounts(count),
+            'entity': self._categorical('entity', count),
+            'mid': mids,
+            'deposit_datetime': deposited,
+            'open_datetime': opened,
+            'close_datetime': closed,
+            'submission_datetime': submitted,
+        }
+        return TransactionBatch(columns, self.options)
@@ -0,0 +1,96 @@
+import math
+import time
+
+
+class TimerWheel:
+    """
+    A hashed timer wheel for large numbers of short timeouts.
+
+    Scheduling and expiring a timer are O(1) list operations instead of the
+    heap operations of `loop.call_later`, and no task or handle is created
+    per timer. Timers are not cancelled: owners ignore expired keys they no
+    longer track, or whose deadline moved.
+
+    Attributes:
+        tick (float): Resolution of the wheel in seconds.
+        slots (int): Number of slots. Delays longer than `tick * slots`
+            wrap around and stay in their slot until due.
+    """
+    def __init__(self, tick: float = 0.01, slots: int = 512, clock=None):
+        """
+        Args:
+            tick (float): Resolution of the wheel in seconds.
+            slots (int): Number of slots.
+            clock (function, optional): Returns the current time in
+                seconds. Defaults to `time.monotonic`.
+
+        Raises:
+            ValueError: If `tick` or `slots` is not positive.
+        """
+        if tick <= 0 or slots <= 0:
+            raise ValueError('Arguments "tick" and "slots" must be positive')
+
+        self.tick = tick
+        self.slots = slots
+        self._clock = clock or time.monotonic
+        self._origin = self._clock()
+        self._current = 0
+        self._wheel = [[] for _ in range(slots)]
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def current(self):
+        """
+        The last tick the wheel advanced to.
+        """
+        return self._current
+
+    def schedule(self, key, delay: float):
+        """
+        Schedules `key` to expire after `delay` seconds from now, rounded up
+        to the next tick.
+
+        Returns:
+            int: The tick at which the key expires.
+        """
+        # The wheel may not have advanced for a while: count from the
+        # current time, not from the last advance()
+        now = int((self._clock() - self._origin) / self.tick)
+        deadline = max(self._current, now) + \
+            max(1, math.ceil(delay / self.tick))
+        self._wheel[deadline % self.slots].append((deadline, key))
+        self._count += 1
+        return deadline
+
+    def advance(self, now: float = None):
+        """
+        Moves the wheel up to the current time.
+
+        Args:
+            now (float, optional): Current clock time. Defaults to the
+                wheel's clock.
+
+        Returns:
+            list: The keys that expired, in deadline order.
+        """
+        if now is None:
+            now = self._clock()
+        target = int((now - self._origin) / self.tick)
+        expired = []
+        while self._current < target:
+            self._current += 1
+            bucket = self._wheel[self._current % self.slots]
+            if not bucket:
+                continue
+            keep = []
+            for deadline, key in bucket:
+                if deadline <= self._current:
+                    expired.append(key)
+                else:
+                    keep.append((deadline, key))
+            self._wheel[self._current % self.slots] = keep
+        self._count -= len(expired)
+        return expired
@@ -1,6 +1,32 @@
 import os
 import random
-from agents.generic import SNMPAgent
+from agents.batch import send_raw_stream
+from agents.generic import SNMPAgent, NotificationTemplate
+from agents.raw import RawTrapSender, RawTrapTemplate
+
+
+# Settlement fields in varbind order, with the environment variable holding
+# the OID of each one
+SETTLEMENT_FIELDS = (
+    ('type', 'OID_SETTLEMENT_TYPE'),
+    ('status', 'OID_SETTLEMENT_STATUS'),
+    ('amount', 'OID_SETTLEMENT_AMOUNT'),
+    ('entity', 'OID_SETTLEMENT_ENTITY'),
+    ('mid', 'OID_SETTLEMENT_MID'),
+    ('deposit_datetime', 'OID_SETTLEMENT_DEPOSIT_DATE'),
+    ('open_datetime', 'OID_SETTLEMENT_OPEN_DATE'),
+    ('close_datetime', 'OID_SETTLEMENT_CLOSE_DATE'),
+    ('submission_datetime', 'OID_SETTLEMENT_SUBMISSION_DATE'),
+)
+
+
+def settlement_OIDs():
+    """
+    Returns a {field: OID} dictionary of the settlement varbind OIDs set in
+    the environment, in varbind order.
+    """
+    return {field: os.getenv(variable)
+            for field, variable in SETTLEMENT_FIELDS}
 
 
 class TransactionSNMPAgent(SNMPAgent):
@@ -27,7 +53,9 @@ class TransactionSNMPAgent(SNMPAgent):
                  ipv4_host: str = os.getenv('IPv4_HOST_IP'),
                  port: str = os.getenv('PORT'),
                  notification_OID: str = None,
-                 varbinds: list = None):
+                 varbinds: list = None,
+                 send_mode: str = 'hlapi',
+                 send_latency=None):
         """
         Initializes the TransactionSNMPAgent with host details and optional
         varbinds.
@@ -41,8 +69,13 @@ class TransactionSNMPAgent(SNMPAgent):
                 SNMP notification.
             varbinds (dict, optional): Dictionary of varbinds with OID keys
                 and values.
+            send_mode (str, optional): 'hlapi' (default) or 'raw', see
+                SNMPAgent.
+            send_latency (LatencyHistogram, optional): Records the duration
+                of every send, see SNMPAgent.
         """
-        super().__init__(ipv4_host, port, notification_OID, varbinds)
+        super().__init__(ipv4_host, port, notification_OID, varbinds,
+                         send_mode=send_mode, send_latency=send_latency)
 
     @staticmethod
     def generate_random_mid(length: int = 8):
@@ -149,3 +182,48 @@ class TransactionSNMPAgent(SNMPAgent):
             value (str): The datetime value to associate with the OID.
         """
         SNMPAgent.edit_varbind(self, OID, value)
+
+    async def send_transactions(self, batch, field_OIDs: dict = None,
+                                concurrency: int = 10, on_result=None):
+        """
+        Sends one trap per settlement of a synthetic batch, using the
+        agent's notification OID, target and send mode. The agent's own
+        varbinds are left untouched.
+
+        Args:
+            batch (TransactionBatch): Settlements to send.
+            field_OIDs (dict, optional): Field name -> varbind OID, in
+                varbind order. Defaults to the settlement OIDs set in the
+                environment.
+            concurrency (int): Maximum number of hlapi sends in flight.
+            on_result (function, optional): Callback invoked with each
+                TrapOutcome. When set, outcomes are not accumulated.
+
+        Returns:
+            BatchResult: Per-trap outcomes and aggregate timing.
+
+        Raises:
+            ValueError: If a field OID is empty.
+        """
+        field_OIDs = dict(field_OIDs or settlement_OIDs())
+        if any(OID is None or OID == '' for OID in field_OIDs.values()):
+            raise ValueError('Field OIDs cannot be empty')
+
+        rows = batch.rows(field_OIDs.keys())
+        if self.send_mode != 'raw':
+            engine = self.snmp_engine
+            template = NotificationTemplate(self.notification_OID,
+                                            field_OIDs.values())
+            return await self.send_traps(
+                (template.create(values, engine) for values in rows),
+                concurrency=concurrency, on_result=on_result)
+
+        sender = RawTrapSender(
+            RawTrapTemplate(self.notification_OID, field_OIDs.values(),
+                            community=str(self.community.communityName)),
+            self.target['ip'], self.target['port'])
+        await sender.open()
+        try:
+            return await send_raw_stream(sender, rows, on_result=on_result)
+        finally:
+            sender.close()
@@ -0,0 +1,282 @@
+import hashlib
+from collections import OrderedDict
+from pysnmp.entity import config
+from pysnmp.hlapi.asyncio import UsmUserData
+from pysnmp.proto.rfc1902 import OctetString
+
+
+AUTH_PROTOCOLS = {
+    'NONE': config.USM_AUTH_NONE,
+    'MD5': config.USM_AUTH_HMAC96_MD5,
+    'SHA': config.USM_AUTH_HMAC96_SHA,
+    'SHA224': config.USM_AUTH_HMAC128_SHA224,
+    'SHA256': config.USM_AUTH_HMAC192_SHA256,
+    'SHA384': config.USM_AUTH_HMAC256_SHA384,
+    'SHA512': config.USM_AUTH_HMAC384_SHA512,
+}
+
+PRIV_PROTOCOLS = {
+    'NONE': config.USM_PRIV_NONE,
+    'DES': config.USM_PRIV_CBC56_DES,
+    '3DES': config.USM_PRIV_CBC168_3DES,
+    'AES': config.USM_PRIV_CFB128_AES,
+    'AES192': config.USM_PRIV_CFB192_AES,
+    'AES256': config.USM_PRIV_CFB256_AES,
+}
+
+
+def engine_id_bytes(engine_id):
+    """
+    Returns an SNMP engine ID as bytes.
+
+    Args:
+        engine_id (str | bytes | OctetString): Hex string (with or without
+            a '0x' prefix), raw bytes, or a pysnmp engine ID.
+
+    Returns:
+        bytes: The engine ID.
+    """
+    if isinstance(engine_id, str):
+        engine_id = engine_id[2:] if engine_id.startswith('0x') else engine_id
+        return bytes.fromhex(engine_id)
+    return bytes(engine_id)
+
+
+class LocalizedKeyCache:
+    """
+    A least-recently-used cache of USM keys localized to an engine ID.
+
+    Turning a pass phrase into a localized key hashes a megabyte of repeated
+    pass phrase (RFC 3414, A.2), which costs milliseconds per key. The keys
+    only depend on the user, engine ID, protocols and pass phrases, so they
+    are computed once per combination and reused by every engine and
+    manager that registers the same user.
+
+    Entries are keyed by (user name, engine ID, auth protocol, priv
+    protocol) plus a digest of the pass phrases, so changing a pass phrase
+    never returns a stale key.
+
+    Attributes:
+        maxsize (int): Maximum number of cached key pairs.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that localized new keys.
+    """
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._keys = OrderedDict()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get(self, user_name: str, engine_id: bytes, auth_protocol,
+            auth_key, priv_protocol, priv_key):
+        """
+        Returns the localized (auth, priv) keys of a user, localizing them on
+        a cache miss.
+
+        Args:
+            user_name (str): USM user name.
+            engine_id (bytes): Authoritative engine ID to localize to.
+            auth_protocol (tuple): pysnmp authentication protocol OID.
+            auth_key (str): Authentication pass phrase, None for noAuth.
+            priv_protocol (tuple): pysnmp privacy protocol OID.
+            priv_key (str): Privacy pass phrase, None for noPriv.
+
+        Returns:
+            tuple(bytes, bytes): The localized keys, None where no pass
+                phrase was given.
+        """
+        digest = hashlib.sha256(repr((auth_key, priv_key)).encode()).digest()
+        key = (user_name, engine_id, tuple(auth_protocol),
+               tuple(priv_protocol), digest)
+        keys = self._keys.get(key)
+        if keys is not None:
+            self._keys.move_to_end(key)
+            self.hits += 1
+            return keys
+
+        self.misses += 1
+        keys = self._keys[key] = self.localize(
+            engine_id, auth_protocol, auth_key, priv_protocol, priv_key)
+        if len(self._keys) > self.maxsize:
+            self._keys.popitem(last=False)
+        return keys
+
+    @staticmethod
+    def localize(engine_id: bytes, auth_protocol, auth_key, priv_protocol,
+                 priv_key):
+        """
+        Localizes pass phrases to an engine ID without caching.
+        """
+        auth_service = config.AUTH_SERVICES[auth_protocol]
+        engine_id = OctetString(engine_id)
+        local_auth = local_priv = None
+        if auth_key is not None:
+            local_auth = bytes(auth_service.localize_key(
+                auth_service.hash_passphrase(OctetString(auth_key)),
+                engine_id))
+        if priv_key is not None:
+            priv_service = config.PRIV_SERVICES[priv_protocol]
+            local_priv = bytes(priv_service.localize_key(
+                auth_protocol,
+                priv_service.hash_passphrase(auth_protocol,
+                                             OctetString(priv_key)),
+                engine_id))
+        return local_auth, local_priv
+
+    def clear(self):
+        self._keys.clear()
+
+
+# Process-wide cache shared by every USMUser
+localized_keys = LocalizedKeyCache()
+
+
+class USMUser:
+    """
+    SNMPv3 User-based Security Model credentials.
+
+    Attributes:
+        user_name (str): USM user name.
+        auth_key (str): Authentication pass phrase, None for noAuth.
+        priv_key (str): Privacy pass phrase, None for noPriv.
+        auth_protocol (tuple): pysnmp authentication protocol OID.
+        priv_protocol (tuple): pysnmp privacy protocol OID.
+        engine_id (bytes): Authoritative engine ID of the user. For traps
+            this is the engine ID of the sending agent, which the receiving
+            manager needs to verify them. None to use the agent engine's ID.
+        key_cache (LocalizedKeyCache): Cache of localized keys.
+    """
+    def __init__(self,
+                 user_name: str,
+                 auth_key: str = None,
+                 priv_key: str = None,
+                 auth_protocol: str = 'SHA',
+                 priv_protocol: str = 'AES',
+                 engine_id=None,
+                 key_cache: LocalizedKeyCache = localized_keys):
+        """
+        Args:
+            user_name (str): USM user name.
+            auth_key (str, optional): Authentication pass phrase, at least 8
+                characters. None for noAuthNoPriv.
+            priv_key (str, optional): Privacy pass phrase, at least 8
+                characters. None for authNoPriv.
+            auth_protocol (str): One of AUTH_PROTOCOLS.
+            priv_protocol (str): One of PRIV_PROTOCOLS.
+            engine_id (str | bytes, optional): Authoritative engine ID, as a
+                hex string or bytes.
+            key_cache (LocalizedKeyCache, optional): Cache of localized keys.
+
+        Raises:
+            ValueError: If the user name is empty, a protocol is unknown, a
+                pass phrase is too short, or privacy is set without
+                authentication.
+        """
+        if (user_name is None or user_name == ''):
+            raise ValueError('Argument "user_name" cannot be empty')
+
+        if auth_protocol.upper() not in AUTH_PROTOCOLS:
+            raise ValueError(f'Unknown auth protocol "{auth_protocol}"')
+
+        if priv_protocol.upper() not in PRIV_PROTOCOLS:
+            raise ValueError(f'Unknown priv protocol "{priv_protocol}"')
+
+        if priv_key is not None and auth_key is None:
+            raise ValueError('Privacy requires an authentication key')
+
+        for key in (auth_key, priv_key):
+            if key is not None and len(key) < 8:
+                raise ValueError('USM pass phrases need 8 characters or more')
+
+        self.user_name = user_name
+        self.auth_key = auth_key
+        self.priv_key = priv_key
+        self.auth_protocol = (AUTH_PROTOCOLS[auth_protocol.upper()]
+                              if auth_key is not None
+                              else config.USM_AUTH_NONE)
+        self.priv_protocol = (PRIV_PROTOCOLS[priv_protocol.upper()]
+                              if priv_key is not None
+                              else config.USM_PRIV_NONE)
+        self.engine_id = (engine_id_bytes(engine_id)
+                          if engine_id is not None else None)
+        self.key_cache = key_cache
+        self._user_data = {}
+
+    @property
+    def security_level(self):
+        if self.priv_key is not None:
+            return 'authPriv'
+        return 'authNoPriv' if self.auth_key is not None else 'noAuthNoPriv'
+
+    def localized_keys(self, engine_id=None):
+        """
+        Returns the (auth, priv) keys localized to an engine ID.
+
+        Args:
+            engine_id (str | bytes, optional): Engine ID. Defaults to the
+                user's engine ID.
+        """
+        engine_id = self._engine_id(engine_id)
+        return self.key_cache.get(self.user_name, engine_id,
+                                  self.auth_protocol, self.auth_key,
+                                  self.priv_protocol, self.priv_key)
+
+    def user_data(self, engine_id=None):
+        """
+        Returns pysnmp UsmUserData carrying pre-localized keys, so pysnmp
+        skips the pass phrase expansion when registering the user.
+
+        Args:
+            engine_id (str | bytes, optional): Engine ID the keys are
+                localized to. Defaults to the user's engine ID.
+
+        Returns:
+            UsmUserData: The authentication data for hlapi calls.
+        """
+        engine_id = self._engine_id(engine_id)
+        user_data = self._user_data.get(engine_id)
+        if user_data is None:
+            auth, priv = self.localized_keys(engine_id)
+            user_data = self._user_data[engine_id] = UsmUserData(
+                self.user_name,
+                authKey=auth,
+                privKey=priv,
+                authProtocol=self.auth_protocol,
+                privProtocol=self.priv_protocol,
+                securityEngineId=engine_id,
+                authKeyType=config.USM_KEY_TYPE_LOCALIZED,
+                privKeyType=config.USM_KEY_TYPE_LOCALIZED)
+        return user_data
+
+    def register(self, snmp_engine, engine_id=None):
+        """
+        Adds the user to an engine's USM table (e.g. a receiving manager's)
+        with pre-localized keys.
+
+        Args:
+            snmp_engine (SnmpEngine): The engine to register the user on.
+            engine_id (str | bytes, optional): Authoritative engine ID of the
+                user. Defaults to the user's engine ID.
+        """
+        engine_id = self._engine_id(engine_id)
+        auth, priv = self.localized_keys(engine_id)
+        config.add_v3_user(snmp_engine, self.user_name,
+                           self.auth_protocol, auth,
+                           self.priv_protocol, priv,
+                           securityEngineId=engine_id,
+                           authKeyType=config.USM_KEY_TYPE_LOCALIZED,
+                           privKeyType=config.USM_KEY_TYPE_LOCALIZED)
+
+    def _engine_id(self, engine_id):
+        if engine_id is None:
+            engine_id = self.engine_id
+        if engine_id is None:
+            raise ValueError(f'No engine ID for USM user "{self.user_name}"')
+        return engine_id_bytes(engine_id)
+
+    def __repr__(self):
+        return (f"USMUser(user_name={self.user_name!r}, "
+                f"security_level={self.security_level!r})")
@@ -1,8 +1,10 @@
 import sys
+import asyncio
 from PySide6 import QtWidgets
 from PySide6.QtGui import QFont
 from PySide6.QtCore import Qt
 from agents.transaction import TransactionSNMPAgent
+from agents.registry import close_snmp_engines
 from components.target import SNMPAgentTarget
 from components.varbinds import SNMPAgentVarbinds
 from components.notification import SNMPNotification
@@ -19,6 +21,10 @@ class SNMPAgentClient(QtWidgets.QWidget):
     def __init__(self):
         super().__init__()
 
+        # Event loop reused for every send, so the shared SNMP engine and its
+        # socket survive between clicks
+        self.loop = asyncio.new_event_loop()
+
         # Agent State
         self.valid = {
             "target_ip": False,
@@ -110,8 +116,16 @@ class SNMPAgentClient(QtWidgets.QWidget):
         """
         Send SNMP Trap message to configured SNMP Manager, async process.
         """
-        import asyncio
-        asyncio.run(self.send())
+        self.loop.run_until_complete(self.send())
+
+    def closeEvent(self, event):
+        """
+        Release the shared SNMP engines and the send event loop when the
+        window closes.
+        """
+        close_snmp_engines()
+        self.loop.close()
+        super().closeEvent(event)
 
     def update_state(self, state: str, new_state):
         """
@@ -0,0 +1,287 @@
+"""
+Storm suppression of notifications.
+
+A device that flaps sends the same notification over and over, hundreds of
+times a second. `TrapAggregator` collapses the notifications sharing a key
+(the sender's host, the snmpTrapOID and the values of chosen var-binds)
+within a sliding window:
+
+- the first notification of a key is delivered at once, as received;
+- the ones following it, each within `window` seconds of the previous one,
+  are counted instead of delivered;
+- once the key has been quiet for `window` seconds, or `max_span` seconds
+  after the first one counted, a `TrapSummary` is delivered with their
+  count, the receive times of the first and last of them, and the
+  var-binds of the last.
+
+A storm of n notifications thus reaches sinks and storage as two records,
+and summing `count` over the delivered records (1 for a plain notification)
+gives the number of notifications received.
+
+Keys are kept in an OrderedDict, least recently seen first, so keys whose
+window has closed are found at its front. Past `maxsize` keys, the least
+recently seen key is evicted and its summary delivered early, which bounds
+memory to one key and one notification per tracked key.
+
+    aggregator = TrapAggregator(window=2.0, key_OIDs=['1.3.6.1.2.1.2.2.1.1'])
+    manager = SNMPManager(aggregate=aggregator)
+"""
+import time
+from collections import OrderedDict
+
+
+class TrapSummary:
+    """
+    Notifications of one key collapsed into one record. It reads like the
+    last of them, received at `last_seen`.
+
+    Attributes:
+        trap (ReceivedTrap): The last notification collapsed.
+        count (int): Notifications collapsed.
+        first_seen (float): Receive time of the first of them, seconds since
+            the epoch.
+        last_seen (float): Receive time of the last of them.
+    """
+    __slots__ = ('trap', 'count', 'first_seen', 'last_seen')
+
+    def __init__(self, trap, count, first_seen, last_seen):
+        self.trap = trap
+        self.count = count
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+
+    @property
+    def received(self):
+        return self.last_seen
+
+    @property
+    def domain(self):
+        return self.trap.domain
+
+    @property
+    def address(self):
+        return self.trap.address
+
+    @property
+    def version(self):
+        return self.trap.version
+
+    @property
+    def pdu_type(self):
+        return self.trap.pdu_type
+
+    @property
+    def varbinds(self):
+        return self.trap.varbinds
+
+    @property
+    def trap_OID(self):
+        return self.trap.trap_OID
+
+    def __repr__(self):
+        return (f"TrapSummary(address={self.address!r}, "
+                f"trap_OID={self.trap_OID!r}, count={self.count}, "
+                f"first_seen={self.first_seen}, "
+                f"last_seen={self.last_seen})")
+
+
+class TrapAggregator:
+    """
+    A size-bounded table of notification keys and what was counted for
+    each within its window.
+
+    Attributes:
+        window (float): Seconds after a notification during which the next
+            one of the same key is counted rather than delivered.
+        key_OIDs (tuple(str)): OIDs of the var-binds whose values are part
+            of the key.
+        maxsize (int): Maximum number of keys tracked.
+        max_span (float): Longest a summary covers, so a storm that never
+            pauses is still reported.
+        seen (int): Notifications added.
+        suppressed (int): Notifications counted instead of delivered.
+        summaries (int): Summaries delivered.
+        evicted (int): Keys evicted because the table was full.
+    """
+    def __init__(self, window: float = 1.0, key_OIDs=None,
+                 maxsize: int = 10000, max_span: float = 60.0,
+                 clock=time.time):
+        """
+        Args:
+            window (float): Seconds during which a notification of the same
+                key is counted.
+            key_OIDs (list(str), optional): OIDs of the var-binds whose
+                values tell storms of the same snmpTrapOID apart, e.g. the
+                interface index of linkDown. Reading them decodes the
+                var-binds of lazily decoded notifications.
+            maxsize (int): Maximum number of keys tracked.
+            max_span (float): Seconds after which a summary is delivered
+                even if the storm goes on.
+            clock (function, optional): Returns the current time in seconds
+                since the epoch, the clock of the receive times.
+
+        Raises:
+            ValueError: If `window`, `maxsize` or `max_span` is not
+                positive.
+        """
+        if window <= 0:
+            raise ValueError('Argument "window" must be positive')
+
+        if maxsize <= 0:
+            raise ValueError('Argument "maxsize" must be positive')
+
+        if max_span <= 0:
+            raise ValueError('Argument "max_span" must be positive')
+
+        self.window = window
+        self.key_OIDs = tuple(key_OIDs or ())
+        self.maxsize = maxsize
+        self.max_span = max_span
+        self.clock = clock
+        self.seen = 0
+        self.suppressed = 0
+        self.summaries = 0
+        self.evicted = 0
+        # key -> [last seen, count, first counted, last counted trap]
+        self._keys = OrderedDict()
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def suppression_ratio(self):
+        """
+        Share of the notifications added that were not delivered
+        individually.
+        """
+        return self.suppressed / self.seen if self.seen else 0.0
+
+    def key(self, trap):
+        """
+        Returns the key of a notification.
+
+        Args:
+            trap (ReceivedTrap): The notification.
+
+        Returns:
+            tuple: The sender's host, the snmpTrapOID and the value of each
+                of `key_OIDs`, None for those the notification lacks.
+        """
+        if not self.key_OIDs:
+            return (trap.address[0], trap.trap_OID)
+        values = dict(trap.varbinds)
+        return (trap.address[0], trap.trap_OID) + tuple(
+            [values.get(oid) for oid in self.key_OIDs])
+
+    def add(self, trap):
+        """
+        Adds a received notification.
+
+        Args:
+            trap (ReceivedTrap): The notification.
+
+        Returns:
+            list(ReceivedTrap | TrapSummary): The records to deliver now:
+                the notification itself if it starts a window, and the
+                summaries of keys whose window closed or that were evicted.
+                Empty when the notification was counted.
+        """
+        now = trap.received
+        keys = self._keys
+        self.seen += 1
+        records = []
+        if keys:
+            entry = keys[next(iter(keys))]
+            if now - entry[0] >= self.window:
+                records = self._expire(now)
+
+        key = self.key(trap)
+        entry = keys.get(key)
+        if entry is not None and now - entry[0] < self.window:
+            keys.move_to_end(key)
+            if entry[1] and now - entry[2] >= self.max_span:
+                records.append(self._summary(entry))
+            entry[0] = now
+            if not entry[1]:
+                entry[2] = now
+            entry[1] += 1
+            entry[3] = trap
+            self.suppressed += 1
+            return records
+
+        if entry is not None:
+            # Received out of order after its window closed
+            del keys[key]
+            if entry[1]:
+                records.append(self._summary(entry))
+        keys[key] = [now, 0, None, None]
+        if len(keys) > self.maxsize:
+            _, evicted = keys.popitem(last=False)
+            self.evicted += 1
+            if evicted[1]:
+                records.append(self._summary(evicted))
+        records.append(trap)
+        return records
+
+    def expire(self, now: float = None):
+        """
+        Ends the windows that have closed.
+
+        Args:
+            now (float, optional): Current time, `clock()` by default.
+
+        Returns:
+            list(TrapSummary): Summaries of the keys whose window closed.
+        """
+        return self._expire(self.clock() if now is None else now)
+
+    def flush(self):
+        """
+        Ends every window, e.g. when the manager stops.
+
+        Returns:
+            list(TrapSummary): Summaries of every key with notifications
+                counted.
+        """
+        records = [self._summary(entry) for entry in self._keys.values()
+                   if entry[1]]
+        self._keys.clear()
+        return records
+
+    def stats(self):
+        """
+        Returns the counters of the aggregator.
+
+        Returns:
+            dict: The 'keys' tracked, the 'seen', 'suppressed',
+                'summaries' and 'evicted' counters and the
+                'suppression_ratio'.
+        """
+        return {
+            'keys': len(self._keys),
+            'seen': self.seen,
+            'suppressed': self.suppressed,
+            'summaries': self.summaries,
+            'evicted': self.evicted,
+            'suppression_ratio': self.suppression_ratio,
+        }
+
+    def _expire(self, now: float):
+        keys = self._keys
+        closed = now - self.window
+        records = []
+        while keys:
+            key = next(iter(keys))
+            entry = keys[key]
+            if entry[0] > closed:
+                break
+            del keys[key]
+            if entry[1]:
+                records.append(self._summary(entry))
+        return records
+
+    def _summary(self, entry):
+        summary = TrapSummary(entry[3], entry[1], entry[2], entry[0])
+        entry[1] = 0
+        self.summaries += 1
+        return summary
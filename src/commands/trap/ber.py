@@ -0,0 +1,262 @@
+"""
+Native BER decoder for the SNMP notifications the manager receives.
+
+Decodes SNMPv1 Trap-PDUs and SNMPv2c SNMPv2-Trap-PDUs and InformRequests
+straight from a `memoryview` of the datagram into Python strings, without
+building pyasn1 objects. Var-bind values are formatted exactly like
+pyasn1's `prettyPrint()`.
+
+Only definite lengths, single-octet tags and the primitive SNMP types are
+supported, and values are checked against the same constraints as pysnmp's
+ASN.1 definitions. Anything else raises ValueError, and the caller decodes
+the message with pyasn1 instead, so the decoder never accepts a message
+pyasn1 would reject or decode differently.
+"""
+from collections import namedtuple
+from agents.raw import TAG_INTEGER, TAG_OCTET_STRING, TAG_SEQUENCE, \
+    TAG_OBJECT_IDENTIFIER, TAG_TIMETICKS, TAG_TRAP_PDU, TAG_INFORM_PDU, \
+    SNMP_TRAP_OID
+
+
+# Tags the agents never encode
+TAG_NULL = 0x05
+TAG_IP_ADDRESS = 0x40
+TAG_COUNTER32 = 0x41
+TAG_GAUGE32 = 0x42
+TAG_OPAQUE = 0x44
+TAG_COUNTER64 = 0x46
+TAG_V1_TRAP_PDU = 0xA4
+
+# Prefix of the generic SNMPv1 traps
+GENERIC_TRAPS = '1.3.6.1.6.3.1.1.5'
+
+INT32_MIN = -0x80000000
+INT32_MAX = 0x7FFFFFFF
+UINT32_MAX = 0xFFFFFFFF
+UINT64_MAX = 0xFFFFFFFFFFFFFFFF
+
+# Var-bind names repeat from one notification to the next, so decoded OIDs
+# are memoized by their contents octets. The cache is emptied when full.
+OID_CACHE_SIZE = 4096
+_OIDs = {}
+
+Notification = namedtuple(
+    'Notification',
+    'version community pdu_tag request_id trap_OID varbinds')
+Notification.__doc__ = """
+A decoded notification.
+
+Attributes:
+    version (int): 0 for SNMPv1, 1 for SNMPv2c.
+    community (bytes): The community string.
+    pdu_tag (int): TAG_TRAP_PDU, TAG_INFORM_PDU or TAG_V1_TRAP_PDU.
+    request_id (int): The request-id, 0 for SNMPv1 traps.
+    trap_OID (str): The snmpTrapOID.0 value, derived as in RFC 3584 for
+        SNMPv1 traps; None when the second var-bind is not snmpTrapOID.0.
+    varbinds (list(tuple(str, str))): (OID, value) pairs as pyasn1
+        pretty-prints them.
+"""
+
+
+def _tlv(view, offset: int, end: int):
+    # Header of the TLV at `offset`, which must fit before `end`
+    if offset + 2 > end:
+        raise ValueError('Truncated BER header')
+    tag = view[offset]
+    length = view[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7F
+        if size == 0 or size > 4 or offset + size > end:
+            raise ValueError('Unsupported or truncated BER length')
+        length = int.from_bytes(view[offset:offset + size], 'big')
+        offset += size
+    if offset + length > end:
+        raise ValueError('Truncated BER contents')
+    return tag, offset, offset + length
+
+
+def _integer(view, start: int, end: int, low=None, high=None):
+    if start == end:
+        raise ValueError('Empty INTEGER')
+    value = int.from_bytes(view[start:end], 'big', signed=True)
+    if (low is not None and value < low) or \
+            (high is not None and value > high):
+        raise ValueError(f'INTEGER {value} out of range')
+    return value
+
+
+def _expect(view, offset: int, end: int, tag: int):
+    found, start, offset = _tlv(view, offset, end)
+    if found != tag:
+        raise ValueError(f'Expected tag 0x{tag:02X}, found 0x{found:02X}')
+    return start, offset
+
+
+def decode_oid(data, start: int, end: int):
+    """
+    Returns the dotted form of the contents of an OBJECT IDENTIFIER.
+
+    Args:
+        data (bytes | memoryview): The encoded data.
+        start (int): Offset of the first contents octet.
+        end (int): Offset after the last contents octet.
+
+    Returns:
+        str: The OID, e.g. '1.3.6.1.2.1.1.3.0'.
+
+    Raises:
+        ValueError: If the OID is empty, an arc starts with a 0x80 padding
+            octet or the last arc is truncated.
+    """
+    if start >= end:
+        raise ValueError('Empty OBJECT IDENTIFIER')
+    contents = bytes(data[start:end])
+    OID = _OIDs.get(contents)
+    if OID is not None:
+        return OID
+    if contents.isascii():
+        # No octet has the continuation bit, every arc is a single octet
+        arcs = list(contents)
+    else:
+        arcs = []
+        arc = 0
+        leading = True
+        for octet in contents:
+            if leading and octet == 0x80:
+                raise ValueError('Padded OBJECT IDENTIFIER arc')
+            arc = (arc << 7) | (octet & 0x7F)
+            leading = not octet & 0x80
+            if leading:
+                arcs.append(arc)
+                arc = 0
+        if not leading:
+            raise ValueError('Truncated OBJECT IDENTIFIER arc')
+    first = arcs[0]
+    if first < 80:
+        arcs[0:1] = divmod(first, 40)
+    else:
+        arcs[0:1] = (2, first - 80)
+    OID = '.'.join(map(str, arcs))
+    if len(_OIDs) >= OID_CACHE_SIZE:
+        _OIDs.clear()
+    _OIDs[contents] = OID
+    return OID
+
+
+def _octets(view, start: int, end: int):
+    # pyasn1 prints printable ASCII as text and anything else as hex
+    raw = bytes(view[start:end])
+    if raw.isascii():
+        text = raw.decode('ascii')
+        if text.isprintable():
+            return text
+    return '0x' + raw.hex()
+
+
+def _value(view, tag: int, start: int, end: int, version: int):
+    if tag == TAG_OCTET_STRING or tag == TAG_OPAQUE:
+        return _octets(view, start, end)
+    if tag == TAG_INTEGER:
+        if version:
+            return str(_integer(view, start, end, INT32_MIN, INT32_MAX))
+        return str(_integer(view, start, end))
+    if tag == TAG_OBJECT_IDENTIFIER:
+        return decode_oid(view, start, end)
+    if tag == TAG_COUNTER32 or tag == TAG_GAUGE32 or tag == TAG_TIMETICKS:
+        return str(_integer(view, start, end, 0, UINT32_MAX))
+    if tag == TAG_IP_ADDRESS:
+        if end - start != 4:
+            raise ValueError('IpAddress is not 4 octets')
+        return '.'.join(map(str, view[start:end]))
+    if tag == TAG_NULL:
+        if start != end:
+            raise ValueError('NULL with contents')
+        return ''
+    if tag == TAG_COUNTER64 and version:
+        return str(_integer(view, start, end, 0, UINT64_MAX))
+    raise ValueError(f'Unsupported var-bind value tag 0x{tag:02X}')
+
+
+def _varbinds(view, offset: int, end: int, version: int):
+    varbinds = []
+    trap_OID = None
+    while offset < end:
+        start, offset = _expect(view, offset, end, TAG_SEQUENCE)
+        name_start, name_end = _expect(view, start, offset,
+                                       TAG_OBJECT_IDENTIFIER)
+        tag, value_start, value_end = _tlv(view, name_end, offset)
+        if value_end != offset:
+            raise ValueError('Trailing data in var-bind')
+        name = decode_oid(view, name_start, name_end)
+        value = _value(view, tag, value_start, value_end, version)
+        if len(varbinds) == 1 and name == SNMP_TRAP_OID and \
+                tag == TAG_OBJECT_IDENTIFIER:
+            trap_OID = value
+        varbinds.append((name, value))
+    return varbinds, trap_OID
+
+
+def decode_notification(data):
+    """
+    Decodes one SNMPv1 Trap, SNMPv2c Trap or SNMPv2c InformRequest.
+
+    Args:
+        data (bytes | memoryview): A datagram holding one SNMP message.
+
+    Returns:
+        Notification: The decoded notification.
+
+    Raises:
+        ValueError: If the datagram is not exactly one notification within
+            the supported subset of BER and SNMP types.
+    """
+    view = memoryview(data)
+    size = len(view)
+    start, end = _expect(view, 0, size, TAG_SEQUENCE)
+    if end != size:
+        raise ValueError('Trailing data after the message')
+    version_start, offset = _expect(view, start, end, TAG_INTEGER)
+    version = _integer(view, version_start, offset)
+    community_start, offset = _expect(view, offset, end, TAG_OCTET_STRING)
+    community = bytes(view[community_start:offset])
+    pdu_tag, offset, pdu_end = _tlv(view, offset, end)
+    if pdu_end != end:
+        raise ValueError('Trailing data after the PDU')
+
+    if version == 1 and (pdu_tag == TAG_TRAP_PDU or
+                         pdu_tag == TAG_INFORM_PDU):
+        start, offset = _expect(view, offset, end, TAG_INTEGER)
+        request_id = _integer(view, start, offset, INT32_MIN, INT32_MAX)
+        start, offset = _expect(view, offset, end, TAG_INTEGER)
+        _integer(view, start, offset)               # error-status
+        start, offset = _expect(view, offset, end, TAG_INTEGER)
+        _integer(view, start, offset, 0, INT32_MAX)   # error-index
+    elif version == 0 and pdu_tag == TAG_V1_TRAP_PDU:
+        request_id = 0
+        start, offset = _expect(view, offset, end, TAG_OBJECT_IDENTIFIER)
+        enterprise = decode_oid(view, start, offset)
+        start, offset = _expect(view, offset, end, TAG_IP_ADDRESS)
+        if offset - start != 4:
+            raise ValueError('agent-addr is not 4 octets')
+        start, offset = _expect(view, offset, end, TAG_INTEGER)
+        generic = _integer(view, start, offset)
+        start, offset = _expect(view, offset, end, TAG_INTEGER)
+        specific = _integer(view, start, offset)
+        start, offset = _expect(view, offset, end, TAG_TIMETICKS)
+        _integer(view, start, offset, 0, UINT32_MAX)    # time-stamp
+    else:
+        raise ValueError(f'Unsupported PDU 0x{pdu_tag:02X} for version '
+                         f'{version}')
+
+    start, offset = _expect(view, offset, end, TAG_SEQUENCE)
+    if offset != end:
+        raise ValueError('Trailing data after the var-bind list')
+    varbinds, trap_OID = _varbinds(view, start, offset, version)
+    if pdu_tag == TAG_V1_TRAP_PDU:
+        if generic == 6:
+            trap_OID = f'{enterprise}.0.{specific}'
+        else:
+            trap_OID = f'{GENERIC_TRAPS}.{generic + 1}'
+    return Notification(version, community, pdu_tag, request_id, trap_OID,
+                        varbinds)
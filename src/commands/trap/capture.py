@@ -0,0 +1,239 @@
+"""
+Trap capture recording and timed replay.
+
+A capture is a compact, append-only log of raw SNMP datagrams. The file
+starts with the 8-byte magic `SNMPCAP1`, followed by one record per
+datagram:
+
+    timestamp   float64   receive time, seconds since the epoch
+    family      uint8     4 or 6
+    port        uint16    source port
+    length      uint32    datagram length
+    address     4 or 16 bytes, packed source address
+    datagram    `length` bytes
+
+All integers are big-endian. Records are read and written one at a time, so
+neither recording nor replaying holds more than one datagram in memory.
+
+Record with `SNMPManager(capture='traps.cap')`, then replay from the
+repository root:
+    PYTHONPATH=src:src/client python -m commands.trap.capture traps.cap \\
+        --host 127.0.0.1 --port 162 --speed 2
+"""
+import argparse
+import asyncio
+import socket
+import struct
+import time
+from collections import namedtuple
+
+
+MAGIC = b'SNMPCAP1'
+RECORD_HEADER = struct.Struct('!dBHI')
+ADDRESS_SIZES = {4: 4, 6: 16}
+FAMILIES = {4: socket.AF_INET, 6: socket.AF_INET6}
+
+CaptureRecord = namedtuple('CaptureRecord', 'timestamp address data')
+
+
+class CaptureWriter:
+    """
+    Appends received datagrams to a capture file.
+
+    Attributes:
+        path (str): Path of the capture file.
+        records (int): Number of records written by this writer.
+    """
+    def __init__(self, path: str, buffer_size: int = 1 << 16):
+        """
+        Opens the capture file for appending, writing the magic header when
+        the file is new or empty.
+
+        Args:
+            path (str): Path of the capture file.
+            buffer_size (int): Size of the write buffer in bytes.
+
+        Raises:
+            ValueError: If the file exists and is not a capture.
+        """
+        self.path = path
+        self.records = 0
+        self._file = open(path, 'a+b', buffering=buffer_size)
+        self._file.seek(0)
+        magic = self._file.read(len(MAGIC))
+        if not magic:
+            self._file.write(MAGIC)
+        elif magic != MAGIC:
+            self._file.close()
+            raise ValueError(f'"{path}" is not a trap capture file')
+
+    def write(self, data: bytes, address, timestamp: float = None):
+        """
+        Appends one datagram.
+
+        Args:
+            data (bytes): The raw datagram.
+            address (tuple): (host, port, ...) of the sender.
+            timestamp (float, optional): Receive time in seconds since the
+                epoch. Defaults to now.
+        """
+        host, port = address[0], address[1]
+        family = 6 if ':' in host else 4
+        packed = socket.inet_pton(FAMILIES[family], host)
+        self._file.write(RECORD_HEADER.pack(
+            time.time() if timestamp is None else timestamp,
+            family, port, len(data)) + packed + bytes(data))
+        self.records += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_capture(path: str):
+    """
+    Streams the records of a capture file.
+
+    Args:
+        path (str): Path of the capture file.
+
+    Yields:
+        CaptureRecord: (timestamp, (host, port), data) of each datagram, in
+            file order.
+
+    Raises:
+        ValueError: If the file is not a capture or a record is truncated.
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'"{path}" is not a trap capture file')
+        while True:
+            header = file.read(RECORD_HEADER.size)
+            if not header:
+                return
+            if len(header) < RECORD_HEADER.size:
+                raise ValueError(f'Truncated record header in "{path}"')
+            timestamp, family, port, length = RECORD_HEADER.unpack(header)
+            if family not in ADDRESS_SIZES:
+                raise ValueError(f'Unknown address family {family} in '
+                                 f'"{path}"')
+            packed = file.read(ADDRESS_SIZES[family])
+            data = file.read(length)
+            if len(packed) < ADDRESS_SIZES[family] or len(data) < length:
+                raise ValueError(f'Truncated record in "{path}"')
+            host = socket.inet_ntop(FAMILIES[family], packed)
+            yield CaptureRecord(timestamp, (host, port), data)
+
+
+class ReplayResult:
+    """
+    Outcome of a capture replay.
+
+    Attributes:
+        sent (int): Datagrams handed to the socket.
+        elapsed (float): Wall-clock seconds of the replay.
+        max_lag (float): Largest delay, in seconds, between a datagram's
+            scheduled and actual send time.
+    """
+    def __init__(self):
+        self.sent = 0
+        self.elapsed = 0.0
+        self.max_lag = 0.0
+
+    @property
+    def rate(self):
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+
+class _ReplayProtocol(asyncio.DatagramProtocol):
+    def error_received(self, exc):
+        pass
+
+
+async def replay(path: str, ip: str, port: int, speed: float = 1.0,
+                 yield_every: int = 256):
+    """
+    Resends the datagrams of a capture to one target.
+
+    With a speed factor, each datagram is sent at its original offset from
+    the first datagram divided by `speed`. The schedule is absolute, so a
+    late send does not delay the ones after it.
+
+    Args:
+        path (str): Path of the capture file.
+        ip (str): Target IP address.
+        port (int): Target port.
+        speed (float, optional): Timing scale, 2.0 replays twice as fast.
+            None or 0 sends as fast as possible.
+        yield_every (int): Datagrams sent between yields to the event loop
+            when running behind schedule or at full speed.
+
+    Returns:
+        ReplayResult: Counters of the replay.
+
+    Raises:
+        ValueError: If `speed` is negative or the capture is invalid.
+    """
+    if speed is not None and speed < 0:
+        raise ValueError('Argument "speed" cannot be negative')
+
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        _ReplayProtocol, remote_addr=(ip, int(port)))
+    result = ReplayResult()
+    started = time.monotonic()
+    first = None
+    try:
+        for record in read_capture(path):
+            if speed:
+                if first is None:
+                    first = record.timestamp
+                due = started + (record.timestamp - first) / speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    result.max_lag = max(result.max_lag, -delay)
+            transport.sendto(record.data)
+            result.sent += 1
+            if result.sent % yield_every == 0:
+                await asyncio.sleep(0)
+    finally:
+        result.elapsed = time.monotonic() - started
+        transport.close()
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay a trap capture against a collector")
+    parser.add_argument("capture", help="capture file to replay")
+    parser.add_argument("--host", default='127.0.0.1',
+                        help="target host (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=162,
+                        help="target port (default 162)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="timing scale, 0 for as fast as possible "
+                             "(default 1)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = asyncio.run(replay(args.capture, args.host, args.port,
+                                args.speed))
+    print(f"sent {result.sent} datagrams in {result.elapsed:.2f} s "
+          f"({result.rate:.0f}/s, max lag {result.max_lag * 1e3:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+"""
+Correlation of settlement notifications into transaction lifecycles.
+
+TransactionSNMPAgent sends a settlement as one notification whose var-binds
+carry its status, MID and the open, close, submission and deposit datetimes
+known so far. `TransactionCorrelator` indexes those notifications by
+transaction key, the MID by default, and joins the stages reported across
+notifications. A transaction is finished when:
+
+- every stage has a datetime ('completed');
+- its status is terminal, e.g. 'failed' ('failed');
+- no notification about it arrived for `ttl` seconds ('expired');
+- `capacity` transactions are open and a new one starts, for the least
+  recently seen of them ('evicted').
+
+Finished transactions record the time between consecutive stages, and from
+open to deposit, in LatencyHistograms; expired and evicted ones are counted
+as incomplete, by the first stage they miss.
+
+Open transactions live in slots of flat arrays, so memory is bounded by
+`capacity` transactions. Finished transactions put their slot on a free
+list for the next one; only when every slot is taken is the least recently
+seen transaction evicted, in O(1). TTLs run on a TimerWheel with at most
+one timer per slot, which a slot keeps when it is reused: a timer firing
+for a transaction seen since, or for one that took the slot over, is
+rescheduled for the rest of its TTL, and one firing for a free slot is
+dropped. Notifications never touch the wheel, and it never holds more than
+`capacity` timers.
+
+    correlator = TransactionCorrelator(ttl=2 * 86400, capacity=1000000)
+    manager = SNMPManager(correlate=correlator)
+    ...
+    correlator.stats()['incomplete']
+"""
+import math
+import time
+from array import array
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from agents.timers import TimerWheel
+from agents.transaction import settlement_OIDs
+from commands.trap.histogram import LatencyHistogram
+
+
+STAGES = ('open', 'close', 'submission', 'deposit')
+# Settlement field holding the datetime of each stage
+STAGE_FIELDS = ('open_datetime', 'close_datetime', 'submission_datetime',
+                'deposit_datetime')
+# Stage pairs whose durations are recorded
+DURATIONS = (('open', 'close'), ('close', 'submission'),
+             ('submission', 'deposit'), ('open', 'deposit'))
+# Slots of a TTL on the timer wheel; the wheel has twice as many, so no
+# timer wraps around it
+TTL_TICKS = 512
+
+_EPOCH = datetime(1970, 1, 1)
+_UNSET = (math.nan,) * len(STAGES)
+_PAIRS = tuple((STAGES.index(start), STAGES.index(end))
+               for start, end in DURATIONS)
+
+Lifecycle = namedtuple('Lifecycle',
+                       'key open close submission deposit last_seen')
+Lifecycle.__doc__ = """
+An open transaction, as returned by `TransactionCorrelator.lookup()`.
+
+Attributes:
+    key (str | tuple(str)): The transaction key.
+    open, close, submission, deposit (float): Datetime of each stage in
+        seconds since the epoch, None if not reported yet.
+    last_seen (float): Receive time of the last notification about it.
+"""
+
+
+def parse_datetime(value):
+    """
+    Parses an ISO 8601 datetime, e.g. '2024-01-01T00:00:00'.
+
+    Args:
+        value (str): The datetime, naive ones are read as UTC.
+
+    Returns:
+        float: Seconds since the epoch, None if `value` is empty or not a
+            datetime.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        return parsed.timestamp()
+    return (parsed - _EPOCH).total_seconds()
+
+
+class TransactionCorrelator:
+    """
+    A memory-bounded index of open transactions, joining the lifecycle
+    stages their notifications report.
+
+    Attributes:
+        ttl (float): Seconds without a notification after which an open
+            transaction expires.
+        capacity (int): Most open transactions tracked.
+        key_fields (tuple(str)): Settlement fields making up the transaction
+            key.
+        terminal_statuses (frozenset(str)): Statuses that finish a
+            transaction, whatever stages it misses.
+        wheel (TimerWheel): Timers of the open transactions, at most one
+            per slot.
+        transactions (int): Transactions seen.
+        completed (int): Transactions that reached every stage.
+        failed (int): Transactions finished by a terminal status.
+        expired (int): Transactions that expired incomplete.
+        evicted (int): Transactions evicted incomplete for newer ones, the
+            least recently seen first.
+        ignored (int): Notifications without the key fields.
+        incomplete (dict): First missing stage -> expired and evicted
+            transactions missing it.
+        durations (dict): (stage, stage) pair of DURATIONS -> LatencyHistogram
+            of the seconds between them.
+    """
+    def __init__(self, ttl: float = 172800.0, capacity: int = 100000,
+                 key_fields=('mid',), field_OIDs: dict = None,
+                 terminal_statuses=('failed',), clock=time.time):
+        """
+        Args:
+            ttl (float): Seconds without a notification after which an open
+                transaction expires.
+            capacity (int): Most open transactions tracked. Memory grows
+                with the transactions open at once, about 330 bytes each
+                with 13-character keys, and stops at `capacity`; past it,
+                the least recently seen transaction is evicted.
+            key_fields (tuple(str)): Settlement fields identifying a
+                transaction, e.g. ('mid', 'open_datetime') when merchants
+                have several transactions open at once.
+            field_OIDs (dict, optional): Settlement field name -> var-bind
+                OID. Defaults to the settlement OIDs set in the environment.
+            terminal_statuses (tuple(str)): Statuses that finish a
+                transaction.
+            clock (function, optional): Returns the current time in seconds
+                since the epoch, the clock of the receive times.
+
+        Raises:
+            ValueError: If `ttl` or `capacity` is not positive, a key field
+                is unknown, or a needed field OID is empty.
+        """
+        if ttl <= 0:
+            raise ValueError('Argument "ttl" must be positive')
+
+        if capacity <= 0:
+            raise ValueError('Argument "capacity" must be positive')
+
+        field_OIDs = dict(field_OIDs or settlement_OIDs())
+        key_fields = tuple(key_fields)
+        for field in key_fields:
+            if field not in field_OIDs:
+                raise ValueError(f'Unknown settlement field "{field}"')
+        fields = key_fields + STAGE_FIELDS + ('status',)
+        if any(not field_OIDs.get(field) for field in fields):
+            raise ValueError('Field OIDs cannot be empty')
+
+        self.ttl = ttl
+        self.capacity = capacity
+        self.key_fields = key_fields
+        self.terminal_statuses = frozenset(terminal_statuses)
+        self.clock = clock
+        self.wheel = TimerWheel(ttl / TTL_TICKS, 2 * TTL_TICKS, clock=clock)
+        self.transactions = 0
+        self.completed = 0
+        self.failed = 0
+        self.expired = 0
+        self.evicted = 0
+        self.ignored = 0
+        self.incomplete = dict.fromkeys(STAGES, 0)
+        self.durations = {pair: LatencyHistogram() for pair in DURATIONS}
+        self._key_OIDs = tuple(field_OIDs[field] for field in key_fields)
+        self._stage_OIDs = tuple(field_OIDs[field] for field in STAGE_FIELDS)
+        self._status_OID = field_OIDs['status']
+        # key -> slot, least recently seen first, the free slots, and per
+        # slot its key (None when free), the datetime of each stage (NaN
+        # until reported), the last receive time and whether it has a timer
+        # on the wheel
+        self._index = OrderedDict()
+        self._free = []
+        self._keys = []
+        self._times = array('d')
+        self._last_seen = array('d')
+        self._timed = bytearray()
+
+    def __len__(self):
+        return len(self._index)
+
+    def add(self, trap):
+        """
+        Adds the stages a notification reports to its transaction.
+
+        Args:
+            trap (ReceivedTrap): The notification. Its var-binds are read.
+
+        Returns:
+            str: 'completed' or 'failed' if the notification finished its
+                transaction, 'open' if the transaction is still open, None
+                if the notification has no transaction key.
+        """
+        values = dict(trap.varbinds)
+        try:
+            if len(self._key_OIDs) == 1:
+                key = values[self._key_OIDs[0]]
+            else:
+                key = tuple([values[oid] for oid in self._key_OIDs])
+        except KeyError:
+            self.ignored += 1
+            return None
+
+        reported = [parse_datetime(values.get(oid))
+                    for oid in self._stage_OIDs]
+        terminal = values.get(self._status_OID) in self.terminal_statuses
+        slot = self._index.get(key)
+        if slot is None:
+            self.transactions += 1
+            if terminal or None not in reported:
+                # Finished by its first notification, never stored
+                return self._finish(reported, terminal)
+            slot = self._allocate(key)
+        else:
+            self._index.move_to_end(key)
+
+        times = self._times
+        base = slot * len(STAGES)
+        for offset, value in enumerate(reported):
+            if value is not None:
+                times[base + offset] = value
+        self._last_seen[slot] = trap.received
+        if terminal or not any(math.isnan(times[base + offset])
+                               for offset in range(len(STAGES))):
+            return self._finish(self._release(slot), terminal)
+        return 'open'
+
+    def lookup(self, key):
+        """
+        Returns an open transaction.
+
+        Args:
+            key (str | tuple(str)): The transaction key, a tuple of the
+                values of `key_fields` when there are several.
+
+        Returns:
+            Lifecycle: The transaction, None if it is not open.
+        """
+        slot = self._index.get(key)
+        if slot is None:
+            return None
+        base = slot * len(STAGES)
+        stages = [None if math.isnan(value) else value
+                  for value in self._times[base:base + len(STAGES)]]
+        return Lifecycle(key, *stages, self._last_seen[slot])
+
+    def expire(self, now: float = None):
+        """
+        Expires the open transactions not seen for `ttl` seconds.
+
+        Args:
+            now (float, optional): Current time, `clock()` by default.
+
+        Returns:
+            int: The number of transactions expired.
+        """
+        if now is None:
+            now = self.clock()
+        keys = self._keys
+        expired = 0
+        for slot in self.wheel.advance(now):
+            if keys[slot] is None:
+                self._timed[slot] = 0
+                continue
+            remaining = self._last_seen[slot] + self.ttl - now
+            if remaining > 0:
+                self._schedule(slot, remaining)
+                continue
+            self._timed[slot] = 0
+            self.expired += 1
+            self._count_incomplete(self._release(slot))
+            expired += 1
+        return expired
+
+    def stats(self):
+        """
+        Returns the counters of the correlator.
+
+        Returns:
+            dict: The 'open' transactions and the 'capacity', the
+                'transactions', 'completed', 'failed', 'expired', 'evicted'
+                and 'ignored' counters, the 'incomplete' transactions by
+                first missing stage, and a summary in seconds of each of
+                the 'durations', e.g. 'open_close'.
+        """
+        return {
+            'open': len(self._index),
+            'capacity': self.capacity,
+            'transactions': self.transactions,
+            'completed': self.completed,
+            'failed': self.failed,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'ignored': self.ignored,
+            'incomplete': dict(self.incomplete),
+            'durations': {f'{start}_{end}': histogram.summary()
+                          for (start, end), histogram
+                          in self.durations.items()},
+        }
+
+    def _allocate(self, key):
+        # A free slot, a new one below capacity, or else the slot of the
+        # least recently seen transaction, evicting it
+        if not self._free and len(self._keys) < self.capacity:
+            slot = len(self._keys)
+            self._keys.append(key)
+            self._times.extend(_UNSET)
+            self._last_seen.append(0.0)
+            self._timed.append(0)
+        else:
+            if not self._free:
+                self.evicted += 1
+                self._count_incomplete(
+                    self._release(next(iter(self._index.values()))))
+            slot = self._free.pop()
+            self._keys[slot] = key
+            base = slot * len(STAGES)
+            self._times[base:base + len(STAGES)] = array('d', _UNSET)
+        self._index[key] = slot
+        # A timer left by the slot's last transaction fires no later than
+        # this one is due, and is rescheduled then
+        if not self._timed[slot]:
+            self._schedule(slot, self.ttl)
+        return slot
+
+    def _schedule(self, slot: int, delay: float):
+        self._timed[slot] = 1
+        self.wheel.schedule(slot, delay)
+
+    def _release(self, slot: int):
+        # Frees a slot, returning its stage datetimes
+        del self._index[self._keys[slot]]
+        self._keys[slot] = None
+        self._free.append(slot)
+        base = slot * len(STAGES)
+        return [None if math.isnan(value) else value
+                for value in self._times[base:base + len(STAGES)]]
+
+    def _finish(self, stages, terminal: bool):
+        self._record(stages)
+        if terminal:
+            self.failed += 1
+            return 'failed'
+        self.completed += 1
+        return 'completed'
+
+    def _count_incomplete(self, stages):
+        self._record(stages)
+        self.incomplete[STAGES[stages.index(None)]] += 1
+
+    def _record(self, stages):
+        for pair, (start, end) in zip(DURATIONS, _PAIRS):
+            if stages[start] is not None and stages[end] is not None:
+                self.durations[pair].record(stages[end] - stages[start])
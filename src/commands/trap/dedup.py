@@ -0,0 +1,100 @@
+"""
+Suppression of duplicate datagrams.
+
+Agents and relays retransmit traps byte for byte. `DuplicateFilter` keeps
+the digests of the datagrams seen in the last `window` seconds, per source
+host, so the manager can skip exact copies before decoding them.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+
+
+class DuplicateFilter:
+    """
+    A time- and size-bounded set of (source host, datagram digest) keys.
+
+    Keys are kept in an OrderedDict in arrival order, so lookups are O(1)
+    and expired keys are evicted from the front, each in O(1), as the
+    window moves on. When more than `maxsize` keys are within the window the
+    oldest are evicted early. A duplicate does not extend the window of the
+    first copy, so a source that keeps resending the same datagram gets one
+    copy through per window.
+
+    Attributes:
+        window (float): Seconds during which a copy counts as a duplicate.
+        maxsize (int): Maximum number of remembered datagrams.
+        hits (int): Datagrams found to be duplicates.
+        misses (int): Datagrams seen for the first time within the window.
+        evictions (int): Keys evicted because the set was full.
+    """
+    def __init__(self, window: float = 5.0, maxsize: int = 65536,
+                 clock=time.monotonic):
+        """
+        Args:
+            window (float): Seconds during which a copy counts as a
+                duplicate.
+            maxsize (int): Maximum number of remembered datagrams.
+            clock (function, optional): Returns the current time in seconds.
+
+        Raises:
+            ValueError: If `window` or `maxsize` is not positive.
+        """
+        if window <= 0:
+            raise ValueError('Argument "window" must be positive')
+
+        if maxsize <= 0:
+            raise ValueError('Argument "maxsize" must be positive')
+
+        self.window = window
+        self.maxsize = maxsize
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._seen = OrderedDict()
+
+    def __len__(self):
+        return len(self._seen)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def seen(self, data: bytes, address) -> bool:
+        """
+        Records a datagram and tells whether it is a duplicate.
+
+        Args:
+            data (bytes): The raw datagram.
+            address (tuple): (host, port, ...) of the sender. Copies from
+                other ports of the same host are duplicates too.
+
+        Returns:
+            bool: True if the same host sent the same datagram within the
+                window.
+        """
+        now = self.clock()
+        seen = self._seen
+        expired = now - self.window
+        while seen:
+            key = next(iter(seen))
+            if seen[key] > expired:
+                break
+            del seen[key]
+
+        key = (address[0], hashlib.blake2b(data, digest_size=16).digest())
+        if key in seen:
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        seen[key] = now
+        if len(seen) > self.maxsize:
+            seen.popitem(last=False)
+            self.evictions += 1
+        return False
+
+    def clear(self):
+        self._seen.clear()
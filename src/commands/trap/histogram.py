@@ -0,0 +1,151 @@
+class LatencyHistogram:
+    """
+    A log-linear latency histogram with fixed relative precision.
+
+    Values are recorded in whole microseconds. Values below 64 us get one
+    bucket each; above that, every power of two is split into 32 linear
+    sub-buckets, so any percentile is reported within ~3% of the true value
+    while memory stays a few hundred counters however many samples are
+    recorded. Histograms with the same layout can be merged, which lets
+    worker processes ship their counts to a parent.
+
+    Attributes:
+        count (int): Number of recorded values.
+        total (float): Sum of recorded values in seconds.
+        max (float): Largest recorded value in seconds.
+        counts (list(int)): Count per bucket index.
+    """
+    SUB_BITS = 6
+    LINEAR = 1 << SUB_BITS          # values below this are exact
+    HALF = 1 << (SUB_BITS - 1)      # sub-buckets per power of two
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.counts = []
+
+    @classmethod
+    def bucket_index(cls, micros: int):
+        """
+        Returns the bucket index of a value in microseconds.
+        """
+        if micros < cls.LINEAR:
+            return micros
+        shift = micros.bit_length() - cls.SUB_BITS
+        return cls.LINEAR + (shift - 1) * cls.HALF + \
+            ((micros >> shift) - cls.HALF)
+
+    @classmethod
+    def bucket_bounds(cls, index: int):
+        """
+        Returns the (lowest, highest) microsecond values of a bucket.
+        """
+        if index < cls.LINEAR:
+            return index, index
+        shift = (index - cls.LINEAR) // cls.HALF + 1
+        mantissa = (index - cls.LINEAR) % cls.HALF + cls.HALF
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        """
+        Records one latency.
+
+        Args:
+            seconds (float): The latency in seconds. Negative values are
+                recorded as 0.
+        """
+        micros = int(seconds * 1e6) if seconds > 0 else 0
+        # bucket_index() inlined for SUB_BITS = 6, this is called on
+        # receive paths
+        if micros >= 64:
+            shift = micros.bit_length() - 6
+            micros = (micros >> shift) + 32 * shift
+        try:
+            self.counts[micros] += 1
+        except IndexError:
+            self._grow(micros)
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def record_ns(self, nanos: int):
+        """
+        Records one latency given in integer nanoseconds, e.g. the
+        difference of two `time.perf_counter_ns()` readings. Cheaper than
+        `record()`, which converts a float.
+
+        Args:
+            nanos (int): The latency in nanoseconds.
+        """
+        micros = nanos // 1000 if nanos > 0 else 0
+        if micros >= 64:
+            shift = micros.bit_length() - 6
+            micros = (micros >> shift) + 32 * shift
+        try:
+            self.counts[micros] += 1
+        except IndexError:
+            self._grow(micros)
+        self.count += 1
+        seconds = nanos * 1e-9
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def _grow(self, index: int):
+        counts = self.counts
+        counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+
+    def merge(self, other: 'LatencyHistogram'):
+        """
+        Adds the counts of another histogram into this one.
+
+        Args:
+            other (LatencyHistogram): The histogram to merge.
+        """
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        if other.max > self.max:
+            self.max = other.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent: float):
+        """
+        Returns the value at the given percentile, in seconds.
+
+        Args:
+            percent (float): Percentile between 0 and 100.
+
+        Returns:
+            float: The midpoint of the bucket holding the percentile, capped
+                at the largest recorded value. 0.0 when nothing was recorded.
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                low, high = self.bucket_bounds(index)
+                return min((low + high) / 2 / 1e6, self.max)
+        return self.max
+
+    def summary(self, percents=(50, 90, 99, 99.9)):
+        """
+        Returns a {label: seconds} dictionary of common percentiles plus the
+        mean and max.
+        """
+        summary = {f'p{p:g}': self.percentile(p) for p in percents}
+        summary['mean'] = self.mean
+        summary['max'] = self.max
+        return summary
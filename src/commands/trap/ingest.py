@@ -0,0 +1,363 @@
+"""
+Decoding received datagrams off the receive path.
+
+Decoding every datagram in the socket callback ties the rate the event loop
+drains its sockets to the cost of decoding; during a notification storm
+the kernel's receive buffer fills and datagrams are lost where nothing
+counts them. `DecodePool` splits the two: the receive path only timestamps
+a datagram and appends it to a bounded queue, and a pool of decode threads
+takes it from there in micro-batches. In 'process' mode the threads hand
+their batches to a pool of processes, so decoding runs on other cores.
+
+Decoded batches are delivered back on the event loop, where the manager
+filters, publishes and acknowledges them as it does inline. Datagrams the
+native decoder does not support (SNMPv3, types it does not know) are
+delivered undecoded and take the manager's pyasn1 path there. With more
+than one decode worker, batches may be delivered out of order.
+
+When the queue is full, `submit()` follows the queue's policy (see
+`commands.trap.sinks`):
+
+    block        wait for the decoders to make room; the event loop stops
+                 reading its sockets and the kernel buffers, then drops,
+                 what arrives meanwhile
+    drop_oldest  discard the oldest queued datagram
+    drop_newest  discard the datagram being submitted
+
+Queue depth, the time datagrams wait in the queue and each way a datagram
+is lost are counted, see `DecodePool.stats()`.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from commands.trap.histogram import LatencyHistogram
+from commands.trap.lazy import decode_header, decode_trap
+from commands.trap.sinks import POLICIES
+
+
+MODES = ('thread', 'process')
+
+
+def decode_batch(datagrams, lazy: bool = False):
+    """
+    Decodes datagrams with the native decoder.
+
+    Args:
+        datagrams (list(bytes)): Datagrams, each holding one SNMP message.
+        lazy (bool): Decode only up to the snmpTrapOID, as
+            `decode_header()` does.
+
+    Returns:
+        list(TrapHeader): The header of each datagram, None for those the
+            native decoder does not support.
+    """
+    decode = decode_header if lazy else decode_trap
+    headers = []
+    for data in datagrams:
+        try:
+            headers.append(decode(data))
+        except ValueError:
+            headers.append(None)
+    return headers
+
+
+class DecodePool:
+    """
+    A bounded queue of received datagrams and the workers decoding them.
+
+    Attributes:
+        workers (int): Decode threads, and decode processes in 'process'
+            mode.
+        mode (str): 'thread' or 'process'.
+        lazy (bool): Decode headers only, see `decode_header()`.
+        maxsize (int): Datagrams the queue holds.
+        policy (str): What `submit()` does when the queue is full.
+        batch_size (int): Most datagrams a worker takes at once.
+        submitted (int): Datagrams queued.
+        decoded (int): Datagrams decoded by the pool.
+        fallbacks (int): Datagrams delivered undecoded.
+        batches (int): Micro-batches delivered.
+        max_depth (int): Longest the queue has been.
+        blocked (int): Submits that waited for room in the queue.
+        blocked_seconds (float): Time spent waiting by those submits.
+        dropped_oldest (int): Queued datagrams discarded for newer ones.
+        dropped_newest (int): Datagrams discarded on submit, because the
+            queue was full or the pool closed.
+        errors (int): Datagrams whose batch failed to decode in a worker
+            process; they are delivered undecoded.
+        wait (LatencyHistogram): Time from receipt until a worker took each
+            datagram.
+    """
+    def __init__(self, workers: int = 2, mode: str = 'thread',
+                 lazy: bool = False, maxsize: int = 10000,
+                 policy: str = 'block', batch_size: int = 64):
+        """
+        Args:
+            workers (int): Decode threads, and processes in 'process' mode.
+            mode (str): 'thread' to decode on the threads, 'process' to
+                decode on a process pool.
+            lazy (bool): Decode headers only.
+            maxsize (int): Datagrams the queue holds.
+            policy (str): One of POLICIES, applied when the queue is full.
+            batch_size (int): Most datagrams decoded in one batch.
+
+        Raises:
+            ValueError: If the mode or policy is unknown, or a size is not
+                positive.
+        """
+        if mode not in MODES:
+            raise ValueError(f'Unknown decode mode "{mode}"')
+
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown queue policy "{policy}"')
+
+        if workers <= 0:
+            raise ValueError('Argument "workers" must be positive')
+
+        if maxsize <= 0:
+            raise ValueError('Argument "maxsize" must be positive')
+
+        if batch_size <= 0:
+            raise ValueError('Argument "batch_size" must be positive')
+
+        self.workers = workers
+        self.mode = mode
+        self.lazy = lazy
+        self.maxsize = maxsize
+        self.policy = policy
+        self.batch_size = batch_size
+        self.submitted = 0
+        self.decoded = 0
+        self.fallbacks = 0
+        self.batches = 0
+        self.max_depth = 0
+        self.blocked = 0
+        self.blocked_seconds = 0.0
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+        self.errors = 0
+        self.wait = LatencyHistogram()
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._executor = None
+        self._deliver = None
+        self._loop = None
+        # Decoded batches waiting for the event loop, and the lock keeping
+        # deliveries one at a time without one
+        self._posted = deque()
+        self._deliver_lock = threading.Lock()
+        self._closed = False
+        # Sequence numbers of the last queued and the last delivered or
+        # dropped datagram, for `flush()`
+        self._queued = 0
+        self._done = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    @property
+    def started(self):
+        return bool(self._threads)
+
+    @property
+    def dropped(self):
+        return self.dropped_oldest + self.dropped_newest
+
+    def stats(self):
+        """
+        Returns the counters of the pool.
+
+        Returns:
+            dict: The queue 'depth' and 'max_depth', the 'submitted',
+                'decoded', 'fallbacks', 'batches', 'blocked',
+                'blocked_seconds', 'dropped_oldest', 'dropped_newest' and
+                'errors' counters, and a summary of the queue 'wait' in
+                seconds.
+        """
+        with self._condition:
+            wait = self.wait.summary()
+        return {
+            'depth': len(self._queue),
+            'max_depth': self.max_depth,
+            'submitted': self.submitted,
+            'decoded': self.decoded,
+            'fallbacks': self.fallbacks,
+            'batches': self.batches,
+            'blocked': self.blocked,
+            'blocked_seconds': self.blocked_seconds,
+            'dropped_oldest': self.dropped_oldest,
+            'dropped_newest': self.dropped_newest,
+            'errors': self.errors,
+            'wait': wait,
+        }
+
+    def start(self, deliver, loop=None):
+        """
+        Starts the decode workers. Does nothing if they are running.
+
+        Args:
+            deliver (function): Called with each decoded batch, a list of
+                (received, domain, address, data, header) tuples where
+                `header` is None for datagrams left undecoded.
+            loop (asyncio.AbstractEventLoop, optional): Event loop
+                `deliver` is called on. Without one, it is called from the
+                decode threads, one batch at a time.
+        """
+        if self._threads or self._closed:
+            return
+        self._deliver = deliver
+        self._loop = loop
+        if self.mode == 'process':
+            self._executor = ProcessPoolExecutor(self.workers)
+            # Start the processes now, before the decode threads exist
+            self._executor.submit(decode_batch, []).result()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run,
+                                      name=f'trap-decode-{index}',
+                                      daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def submit(self, domain, address, data: bytes) -> bool:
+        """
+        Timestamps a received datagram and queues it for decoding.
+
+        Args:
+            domain (tuple): Transport domain the datagram arrived on.
+            address (tuple): Address of the sender.
+            data (bytes): The datagram.
+
+        Returns:
+            bool: False if the datagram was discarded, because the queue is
+                full under the 'drop_newest' policy or the pool is closed.
+        """
+        received = time.time()
+        with self._condition:
+            if self._closed:
+                self.dropped_newest += 1
+                return False
+            queue = self._queue
+            if len(queue) >= self.maxsize:
+                if self.policy == 'drop_newest':
+                    self.dropped_newest += 1
+                    return False
+                if self.policy == 'drop_oldest':
+                    queue.popleft()
+                    self.dropped_oldest += 1
+                    self._done += 1
+                else:
+                    self.blocked += 1
+                    start = time.monotonic()
+                    while len(queue) >= self.maxsize and not self._closed:
+                        self._condition.wait()
+                    self.blocked_seconds += time.monotonic() - start
+                    if self._closed:
+                        self.dropped_newest += 1
+                        return False
+            queue.append((received, domain, address, data))
+            self.submitted += 1
+            self._queued += 1
+            if len(queue) > self.max_depth:
+                self.max_depth = len(queue)
+            self._condition.notify_all()
+            return True
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Waits until every datagram queued so far is decoded and delivered,
+        or handed to the event loop when the pool delivers on one.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait.
+
+        Returns:
+            bool: False if the timeout expired first.
+        """
+        with self._condition:
+            target = self._queued
+            return self._condition.wait_for(
+                lambda: self._done >= target or not self._threads, timeout)
+
+    def close(self, timeout: float = 5.0):
+        """
+        Decodes and delivers the queued datagrams and stops the workers.
+        Datagrams submitted afterwards are discarded. Call it from the
+        event loop the pool delivers on, if any: batches still waiting for
+        the loop are delivered before it returns.
+
+        Args:
+            timeout (float): Maximum seconds to wait for each worker.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._drain_posted()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+        self._threads = []
+
+    def _run(self):
+        condition = self._condition
+        queue = self._queue
+        while True:
+            with condition:
+                while not queue and not self._closed:
+                    condition.wait()
+                if not queue:
+                    return
+                batch = [queue.popleft()
+                         for _ in range(min(len(queue), self.batch_size))]
+                now = time.time()
+                for item in batch:
+                    self.wait.record(now - item[0])
+                # Make room for a receive path blocked on a full queue
+                condition.notify_all()
+
+            headers = self._decode([item[3] for item in batch])
+            decoded = [item + (header,)
+                       for item, header in zip(batch, headers)]
+            found = sum(1 for header in headers if header is not None)
+            if self._loop is None:
+                with self._deliver_lock:
+                    self._deliver(decoded)
+            else:
+                self._posted.append(decoded)
+                # Once closing, the loop is waiting in `close()`, which
+                # delivers what is left
+                if not self._closed:
+                    try:
+                        self._loop.call_soon_threadsafe(self._drain_posted)
+                    except RuntimeError:
+                        # The loop is closed
+                        pass
+
+            with condition:
+                self.decoded += found
+                self.fallbacks += len(batch) - found
+                self.batches += 1
+                self._done += len(batch)
+                condition.notify_all()
+
+    def _decode(self, datagrams):
+        if self._executor is None:
+            return decode_batch(datagrams, self.lazy)
+        try:
+            return self._executor.submit(decode_batch, datagrams,
+                                         self.lazy).result()
+        except Exception:
+            # A broken process pool; the manager decodes them instead
+            with self._condition:
+                self.errors += len(datagrams)
+            return [None] * len(datagrams)
+
+    def _drain_posted(self):
+        posted = self._posted
+        with self._deliver_lock:
+            while posted:
+                self._deliver(posted.popleft())
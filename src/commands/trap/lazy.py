@@ -0,0 +1,220 @@
+"""
+Header-only decoding of SNMPv1/v2c notifications.
+
+`decode_header()` walks the BER of a message just far enough to read the
+version, community, PDU type, request-id and snmpTrapOID, without building
+any pyasn1 objects. The var-binds are only decoded when
+`TrapHeader.varbinds` is first read, so a notification that is filtered out
+on its header never pays for a full decode. They are decoded by the native
+decoder of `commands.trap.ber` when possible, by pyasn1 otherwise.
+"""
+from pyasn1.codec.ber import decoder
+from pyasn1.error import PyAsn1Error
+from pysnmp.proto import api
+from agents.raw import TAG_INTEGER, TAG_OCTET_STRING, TAG_SEQUENCE, \
+    TAG_OBJECT_IDENTIFIER, TAG_TRAP_PDU, TAG_INFORM_PDU, SNMP_TRAP_OID, \
+    encode_oid, decode_tlv
+from commands.trap.ber import TAG_V1_TRAP_PDU, GENERIC_TRAPS, decode_oid, \
+    decode_notification
+
+
+# Contents octets of the snmpTrapOID.0 name
+_TRAP_OID_NAME = encode_oid(SNMP_TRAP_OID)[2:]
+
+
+def _integer(data, offset: int):
+    tag, start, end = decode_tlv(data, offset)
+    if tag != TAG_INTEGER or start == end:
+        raise ValueError('Expected an INTEGER')
+    return int.from_bytes(data[start:end], 'big', signed=True), end
+
+
+def decode_message(data: bytes):
+    """
+    Fully decodes an SNMPv1/v2c message with pyasn1.
+
+    Args:
+        data (bytes): The encoded message.
+
+    Returns:
+        tuple(module, Message): The pysnmp protocol module of the message
+            version and the decoded message.
+
+    Raises:
+        ValueError: If the SNMP version is not supported, or pyasn1 cannot
+            decode the message.
+    """
+    try:
+        version = int(api.decodeMessageVersion(data))
+        if version not in api.PROTOCOL_MODULES:
+            raise ValueError(f'Unsupported SNMP version {version}')
+        pMod = api.PROTOCOL_MODULES[version]
+        message, _ = decoder.decode(data, asn1Spec=pMod.Message())
+    except PyAsn1Error as error:
+        raise ValueError(f'Malformed SNMP message: {error}') from error
+    return pMod, message
+
+
+class TrapHeader:
+    """
+    The header fields of an SNMPv1/v2c notification, with its var-binds
+    decoded on first use.
+
+    Attributes:
+        data (bytes): The encoded message.
+        version (int): 0 for SNMPv1, 1 for SNMPv2c.
+        community (bytes): The community string.
+        pdu_tag (int): TAG_TRAP_PDU, TAG_INFORM_PDU or TAG_V1_TRAP_PDU.
+        request_id (int): The request-id, 0 for SNMPv1 traps.
+        trap_OID (str): The snmpTrapOID.0 value. For SNMPv1 traps it is
+            derived from the enterprise and trap numbers as in RFC 3584;
+            None when the second var-bind is not snmpTrapOID.0.
+    """
+    __slots__ = ('data', 'version', 'community', 'pdu_tag', 'request_id',
+                 'trap_OID', '_message', '_varbinds')
+
+    def __init__(self, data, version, community, pdu_tag, request_id,
+                 trap_OID, varbinds=None):
+        self.data = data
+        self.version = version
+        self.community = community
+        self.pdu_tag = pdu_tag
+        self.request_id = request_id
+        self.trap_OID = trap_OID
+        self._message = None
+        self._varbinds = varbinds
+
+    @property
+    def pdu_type(self):
+        return 'inform' if self.pdu_tag == TAG_INFORM_PDU else 'trap'
+
+    def message(self):
+        """
+        Returns the pysnmp protocol module and the pyasn1 decoding of the
+        whole message, decoding it on the first call.
+        """
+        if self._message is None:
+            self._message = decode_message(self.data)
+        return self._message
+
+    @property
+    def varbinds(self):
+        """
+        list(tuple(str, str)): The (OID, value) pairs of the notification,
+        pretty-printed the way SNMPManager prints them.
+
+        Raises:
+            ValueError: If the var-binds cannot be decoded, e.g. a datagram
+                whose header decoded but whose var-binds are malformed.
+        """
+        if self._varbinds is None:
+            try:
+                self._varbinds = decode_notification(self.data).varbinds
+                return self._varbinds
+            except ValueError:
+                pass
+            pMod, message = self.message()
+            api_pdu = pMod.apiTrapPDU if self.pdu_tag == TAG_V1_TRAP_PDU \
+                else pMod.apiPDU
+            try:
+                self._varbinds = [
+                    (oid.prettyPrint(), val.prettyPrint())
+                    for oid, val in api_pdu.get_varbinds(
+                        pMod.apiMessage.get_pdu(message))]
+            except PyAsn1Error as error:
+                raise ValueError(f'Malformed var-binds: {error}') \
+                    from error
+        return self._varbinds
+
+    def __repr__(self):
+        return (f"TrapHeader(version={self.version}, "
+                f"pdu_type={self.pdu_type!r}, "
+                f"request_id={self.request_id}, trap_OID={self.trap_OID!r})")
+
+
+def decode_header(data: bytes):
+    """
+    Reads the header of an SNMPv1 Trap, SNMPv2c Trap or InformRequest
+    without decoding its var-binds.
+
+    Args:
+        data (bytes): A datagram holding one SNMP message.
+
+    Returns:
+        TrapHeader: The header of the notification.
+
+    Raises:
+        ValueError: If the datagram is not exactly one SNMPv1/v2c
+            notification.
+    """
+    tag, offset, end = decode_tlv(data)
+    if tag != TAG_SEQUENCE or end != len(data):
+        raise ValueError('Not a single SNMP message')
+    version, offset = _integer(data, offset)
+    if version not in (0, 1):
+        raise ValueError(f'Unsupported SNMP version {version}')
+    tag, start, offset = decode_tlv(data, offset)
+    if tag != TAG_OCTET_STRING:
+        raise ValueError('Community is not an OCTET STRING')
+    community = bytes(data[start:offset])
+    pdu_tag, offset, pdu_end = decode_tlv(data, offset)
+    if pdu_end != end:
+        raise ValueError('Trailing data after the PDU')
+
+    if pdu_tag == TAG_V1_TRAP_PDU and version == 0:
+        tag, start, offset = decode_tlv(data, offset)
+        if tag != TAG_OBJECT_IDENTIFIER:
+            raise ValueError('Enterprise is not an OBJECT IDENTIFIER')
+        enterprise = decode_oid(data, start, offset)
+        _, _, offset = decode_tlv(data, offset)     # agent-addr
+        generic, offset = _integer(data, offset)
+        specific, offset = _integer(data, offset)
+        if generic == 6:
+            trap_OID = f'{enterprise}.0.{specific}'
+        else:
+            trap_OID = f'{GENERIC_TRAPS}.{generic + 1}'
+        return TrapHeader(data, version, community, pdu_tag, 0, trap_OID)
+
+    if pdu_tag not in (TAG_TRAP_PDU, TAG_INFORM_PDU) or version != 1:
+        raise ValueError(f'Not a notification PDU (tag 0x{pdu_tag:02X})')
+    request_id, offset = _integer(data, offset)
+    _, offset = _integer(data, offset)      # error-status
+    _, offset = _integer(data, offset)      # error-index
+    tag, offset, list_end = decode_tlv(data, offset)
+    if tag != TAG_SEQUENCE:
+        raise ValueError('Var-bind list is not a SEQUENCE')
+
+    # sysUpTime.0 is the first var-bind, snmpTrapOID.0 the second
+    trap_OID = None
+    if offset < list_end:
+        _, _, offset = decode_tlv(data, offset)
+    if offset < list_end:
+        tag, offset, _ = decode_tlv(data, offset)
+    if offset < list_end and tag == TAG_SEQUENCE:
+        tag, start, offset = decode_tlv(data, offset)
+        if tag == TAG_OBJECT_IDENTIFIER and \
+                data[start:offset] == _TRAP_OID_NAME:
+            tag, start, offset = decode_tlv(data, offset)
+            if tag == TAG_OBJECT_IDENTIFIER:
+                trap_OID = decode_oid(data, start, offset)
+    return TrapHeader(data, version, community, pdu_tag, request_id,
+                      trap_OID)
+
+
+def decode_trap(data: bytes):
+    """
+    Decodes a whole notification, var-binds included, with the native
+    decoder.
+
+    Args:
+        data (bytes): A datagram holding one SNMP message.
+
+    Returns:
+        TrapHeader: The notification, with its var-binds already decoded.
+
+    Raises:
+        ValueError: If the datagram is not a notification the native
+            decoder supports.
+    """
+    notification = decode_notification(data)
+    return TrapHeader(data, *notification)
@@ -0,0 +1,549 @@
+"""
+Open-loop SNMP trap load generator.
+
+Drives a TransactionSNMPAgent at a fixed offered rate for a fixed duration,
+using a trap profile in the JSON format written by the client's Save Config
+button. Sends are scheduled on a fixed timeline (open loop), so a slow send
+shows up as scheduling lag and latency instead of quietly lowering the
+offered load.
+
+With --workers N the offered rate is split across N processes, each with
+its own event loop and SNMP engine. Workers stream their counters to the
+parent, which merges the latency histograms into one report.
+
+With --metrics-port the send latency of the agents, across workers, is
+served in the Prometheus text format at /metrics while the run lasts.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client python -m commands.trap.loadgen profile.json \\
+        --rate 1000 --duration 30 --warmup 5
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+from agents.transaction import TransactionSNMPAgent
+from commands.trap.histogram import LatencyHistogram
+from commands.trap.metrics import MetricsRegistry, MetricsServer, \
+    histogram_metrics
+
+
+def load_profile(file_path: str):
+    """
+    Loads a trap profile saved by the client's SaveConfig widget.
+
+    Args:
+        file_path (str): Path of the .json configuration file.
+
+    Returns:
+        dict: Keyword arguments for TransactionSNMPAgent (ipv4_host, port,
+            notification_OID and an OID -> message varbinds dictionary).
+
+    Raises:
+        ValueError: If the profile has no notification OID.
+    """
+    with open(file_path, "r") as file:
+        state = json.load(file)
+
+    if not state.get("notification_OID"):
+        raise ValueError(f'Profile "{file_path}" has no notification_OID')
+
+    varbinds = {}
+    for varbind in state.get("varbinds", []):
+        for oid, message in varbind.items():
+            varbinds[oid] = message
+
+    return {
+        "ipv4_host": state.get("ipv4_host") or os.getenv('IPv4_HOST_IP'),
+        "port": state.get("port") or os.getenv('PORT'),
+        "notification_OID": state["notification_OID"],
+        "varbinds": varbinds
+    }
+
+
+class LoadReport:
+    """
+    Results of a load generator run, covering the measured window only
+    (after warm-up).
+
+    Attributes:
+        rate (float): Offered rate in traps per second.
+        duration (float): Length of the measured window in seconds.
+        scheduled (int): Traps scheduled in the measured window.
+        sent (int): Traps sent successfully.
+        errors (int): Traps whose send raised or reported an error.
+        skipped (int): Traps not sent because the in-flight limit was hit.
+        latency (LatencyHistogram): Send latency, start to completion.
+        lag (LatencyHistogram): Scheduling lag, scheduled time to start.
+    """
+    def __init__(self, rate: float, duration: float):
+        self.rate = rate
+        self.duration = duration
+        self.scheduled = 0
+        self.sent = 0
+        self.errors = 0
+        self.skipped = 0
+        self.latency = LatencyHistogram()
+        self.lag = LatencyHistogram()
+
+    @property
+    def achieved_rate(self):
+        return self.sent / self.duration if self.duration else 0.0
+
+    def merge(self, other: 'LoadReport'):
+        """
+        Adds the counters and histograms of another report into this one.
+        Offered rates add up; the measured window is the longest of the two.
+        """
+        self.rate += other.rate
+        self.duration = max(self.duration, other.duration)
+        self.scheduled += other.scheduled
+        self.sent += other.sent
+        self.errors += other.errors
+        self.skipped += other.skipped
+        self.latency.merge(other.latency)
+        self.lag.merge(other.lag)
+
+    def format(self):
+        """
+        Returns the report as printable text.
+        """
+        def row(name, histogram):
+            summary = histogram.summary()
+            return f"{name:<16}" + "  ".join(
+                f"{label}={value * 1e3:.3f}ms"
+                for label, value in summary.items())
+
+        return "\n".join([
+            f"offered rate:   {self.rate:.1f} traps/s",
+            f"achieved rate:  {self.achieved_rate:.1f} traps/s",
+            f"scheduled:      {self.scheduled}",
+            f"sent:           {self.sent}",
+            f"errors:         {self.errors}",
+            f"skipped:        {self.skipped} (in-flight limit)",
+            row("send latency:", self.latency),
+            row("schedule lag:", self.lag),
+        ])
+
+
+class LoadGenerator:
+    """
+    Sends traps from a TransactionSNMPAgent on an open-loop schedule.
+
+    Trap i is due at start + i / rate. Every due trap is started as soon as
+    the event loop gets to it, whether or not earlier sends have finished;
+    the gap between the due time and the actual start is recorded as
+    scheduling lag.
+
+    Attributes:
+        agent (TransactionSNMPAgent): Agent providing target, credentials and
+            varbinds.
+        rate (float): Offered rate in traps per second.
+        duration (float): Measured run time in seconds, after warm-up.
+        warmup (float): Seconds of unmeasured sending before the measured
+            window starts.
+        max_inflight (int): Maximum number of unfinished sends. Traps due
+            while the limit is reached are counted as skipped.
+        vary_mid_OID (str): Optional varbind OID set to a fresh random MID
+            for every trap.
+        on_progress (function): Optional callback invoked every
+            `progress_interval` seconds with a dictionary of the measured
+            counters so far.
+        progress_interval (float): Seconds between progress callbacks.
+    """
+    def __init__(self,
+                 agent: TransactionSNMPAgent,
+                 rate: float,
+                 duration: float,
+                 warmup: float = 0.0,
+                 max_inflight: int = 1000,
+                 vary_mid_OID: str = None,
+                 on_progress=None,
+                 progress_interval: float = 1.0):
+        if rate <= 0:
+            raise ValueError('Argument "rate" must be positive')
+        if duration <= 0:
+            raise ValueError('Argument "duration" must be positive')
+        if warmup < 0:
+            raise ValueError('Argument "warmup" cannot be negative')
+
+        self.agent = agent
+        self.rate = rate
+        self.duration = duration
+        self.warmup = warmup
+        self.max_inflight = max_inflight
+        self.vary_mid_OID = vary_mid_OID
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.report = LoadReport(rate, duration)
+        self._inflight = set()
+
+    def progress(self):
+        """
+        Returns the measured counters so far.
+        """
+        return {
+            "scheduled": self.report.scheduled,
+            "sent": self.report.sent,
+            "errors": self.report.errors,
+            "skipped": self.report.skipped
+        }
+
+    async def _report_progress(self):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            self.on_progress(self.progress())
+
+    async def run(self):
+        """
+        Runs the warm-up and measured window, then waits for in-flight sends.
+
+        Returns:
+            LoadReport: Results of the measured window.
+        """
+        loop = asyncio.get_running_loop()
+        engine = self.agent.snmp_engine
+        target = await self.agent.get_target()
+        raw_sender = None
+        if self.agent.send_mode == 'raw':
+            raw_sender = await self.agent.get_raw_sender()
+
+        progress_task = None
+        if self.on_progress is not None:
+            progress_task = asyncio.ensure_future(self._report_progress())
+
+        interval = 1.0 / self.rate
+        start = loop.time()
+        measure_from = start + self.warmup
+        end = measure_from + self.duration
+        index = 0
+
+        while True:
+            due = start + index * interval
+            if due >= end:
+                break
+            now = loop.time()
+            if due > now:
+                await asyncio.sleep(due - now)
+                continue
+
+            # Start every trap that has come due, catching up if behind
+            while due <= now and due < end:
+                self._fire(engine, target, raw_sender, now - due,
+                           due >= measure_from)
+                index += 1
+                due = start + index * interval
+            await asyncio.sleep(0)
+
+        if self._inflight:
+            await asyncio.gather(*self._inflight)
+        if progress_task is not None:
+            progress_task.cancel()
+            self.on_progress(self.progress())
+        return self.report
+
+    def _fire(self, engine, target, raw_sender, lag: float, measured: bool):
+        report = self.report
+        if measured:
+            report.scheduled += 1
+            report.lag.record(lag)
+
+        if self.vary_mid_OID:
+            self.agent.set_mid(self.vary_mid_OID,
+                               TransactionSNMPAgent.generate_random_mid())
+
+        if raw_sender is not None:
+            # Raw sends hand the datagram to the socket without awaiting
+            started = time.perf_counter_ns()
+            try:
+                raw_sender.send(list(self.agent.get_varbinds().values()))
+                error = None
+            except Exception as e:
+                error = e
+            elapsed = time.perf_counter_ns() - started
+            # Not sent through send_trap(), which records the others
+            if error is None and self.agent.send_latency is not None:
+                self.agent.send_latency.record_ns(elapsed)
+            self._record(measured, error, elapsed / 1e9)
+            return
+
+        if len(self._inflight) >= self.max_inflight:
+            if measured:
+                report.skipped += 1
+            return
+
+        notification = self.agent.create_notification(engine)
+        task = asyncio.ensure_future(
+            self._send(notification, engine, target, measured))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, notification, engine, target, measured: bool):
+        started = time.perf_counter()
+        try:
+            error = await self.agent.send_prepared(notification, engine,
+                                                   target)
+        except Exception as e:
+            error = e
+        self._record(measured, error, time.perf_counter() - started)
+
+    def _record(self, measured: bool, error, latency: float):
+        if not measured:
+            return
+        if error is None:
+            self.report.sent += 1
+            self.report.latency.record(latency)
+        else:
+            self.report.errors += 1
+
+
+def build_agent(profile: dict, ipv4_host: str = None, port: str = None,
+                send_mode: str = 'hlapi', send_latency=None):
+    """
+    Builds a TransactionSNMPAgent from a loaded profile, with optional
+    target overrides and a histogram recording the duration of its sends.
+    """
+    return TransactionSNMPAgent(
+        ipv4_host=ipv4_host or profile["ipv4_host"],
+        port=port or profile["port"],
+        notification_OID=profile["notification_OID"],
+        varbinds=dict(profile["varbinds"]),
+        send_mode=send_mode,
+        send_latency=send_latency)
+
+
+def _worker_main(worker_id: int, profile: dict, options: dict, results):
+    """
+    Entry point of a load generator worker process. Runs its own event loop
+    and engine and streams ('progress' | 'latency' | 'done' | 'error',
+    worker_id, payload) tuples to the parent through `results`.
+    """
+    async def run():
+        agent = build_agent(profile, options["host"], options["port"],
+                            options["mode"],
+                            LatencyHistogram() if options["metrics"] else None)
+
+        def report_progress(counters):
+            results.put(("progress", worker_id, counters))
+            if agent.send_latency is not None:
+                # Only the sends since the last report, for the parent to
+                # merge into its histogram
+                results.put(("latency", worker_id, agent.send_latency))
+                agent.send_latency = LatencyHistogram()
+
+        generator = LoadGenerator(
+            agent,
+            rate=options["rate"],
+            duration=options["duration"],
+            warmup=options["warmup"],
+            max_inflight=options["max_inflight"],
+            vary_mid_OID=options["vary_mid"],
+            on_progress=report_progress,
+            progress_interval=options["progress_interval"])
+        try:
+            return await generator.run()
+        finally:
+            agent.close()
+
+    try:
+        results.put(("done", worker_id, asyncio.run(run())))
+    except Exception:
+        results.put(("error", worker_id, traceback.format_exc()))
+
+
+def run_workers(profile: dict,
+                workers: int,
+                rate: float,
+                duration: float,
+                warmup: float = 0.0,
+                mode: str = 'hlapi',
+                max_inflight: int = 1000,
+                vary_mid_OID: str = None,
+                ipv4_host: str = None,
+                port: str = None,
+                on_progress=None,
+                progress_interval: float = 1.0,
+                send_latency: LatencyHistogram = None):
+    """
+    Splits the offered rate evenly across `workers` processes and merges
+    their reports.
+
+    Args:
+        profile (dict): Trap profile returned by `load_profile()`.
+        workers (int): Number of worker processes.
+        rate (float): Total offered rate in traps per second.
+        duration (float): Measured run time in seconds, after warm-up.
+        warmup (float): Unmeasured warm-up in seconds.
+        mode (str): Agent send mode, 'hlapi' or 'raw'.
+        max_inflight (int): In-flight limit per worker.
+        vary_mid_OID (str, optional): Varbind OID to randomize per trap.
+        ipv4_host (str, optional): Target host override.
+        port (str, optional): Target port override.
+        on_progress (function, optional): Called with the summed counters of
+            all workers whenever a worker reports progress.
+        progress_interval (float): Seconds between worker progress reports.
+        send_latency (LatencyHistogram, optional): Histogram the send
+            latency of every worker's agent is merged into as they report
+            progress.
+
+    Returns:
+        LoadReport: The merged report of all workers.
+
+    Raises:
+        RuntimeError: If a worker fails or exits without reporting.
+    """
+    if workers < 1:
+        raise ValueError('Argument "workers" must be at least 1')
+
+    options = {
+        "host": ipv4_host,
+        "port": port,
+        "mode": mode,
+        "rate": rate / workers,
+        "duration": duration,
+        "warmup": warmup,
+        "max_inflight": max_inflight,
+        "vary_mid": vary_mid_OID,
+        "progress_interval": progress_interval,
+        "metrics": send_latency is not None
+    }
+    context = multiprocessing.get_context()
+    results = context.Queue()
+    processes = [
+        context.Process(target=_worker_main,
+                        args=(worker_id, profile, options, results),
+                        daemon=True)
+        for worker_id in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    report = LoadReport(0.0, duration)
+    progress = {}
+    pending = set(range(workers))
+    try:
+        while pending:
+            try:
+                kind, worker_id, payload = results.get(timeout=1.0)
+            except queue.Empty:
+                dead = [worker_id for worker_id in pending
+                        if not processes[worker_id].is_alive()]
+                if dead:
+                    raise RuntimeError(f"Worker(s) {dead} exited without "
+                                       "reporting")
+                continue
+
+            if kind == "progress":
+                progress[worker_id] = payload
+                if on_progress is not None:
+                    on_progress({key: sum(counters[key]
+                                          for counters in progress.values())
+                                 for key in payload})
+            elif kind == "latency":
+                send_latency.merge(payload)
+            elif kind == "done":
+                report.merge(payload)
+                pending.discard(worker_id)
+            else:
+                raise RuntimeError(f"Worker {worker_id} failed:\n{payload}")
+    finally:
+        for process in processes:
+            if process.is_alive() and pending:
+                process.terminate()
+            process.join()
+
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Open-loop SNMP trap load generator")
+    parser.add_argument("profile",
+                        help="trap profile saved by the client (.json)")
+    parser.add_argument("--rate", type=float, required=True,
+                        help="offered rate in traps per second")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="measured run time in seconds (default 10)")
+    parser.add_argument("--warmup", type=float, default=2.0,
+                        help="unmeasured warm-up in seconds (default 2)")
+    parser.add_argument("--mode", choices=("hlapi", "raw"), default="hlapi",
+                        help="agent send mode (default hlapi)")
+    parser.add_argument("--max-inflight", type=int, default=1000,
+                        help="maximum unfinished sends (default 1000)")
+    parser.add_argument("--vary-mid", metavar="OID",
+                        help="set this varbind OID to a random MID per trap")
+    parser.add_argument("--host", help="override the profile's target host")
+    parser.add_argument("--port", help="override the profile's target port")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes sharing the rate (default 1)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics at /metrics on this "
+                             "port")
+    parser.add_argument("--metrics-host", default="127.0.0.1",
+                        help="address the metrics endpoint binds (default "
+                             "127.0.0.1)")
+    return parser.parse_args(argv)
+
+
+async def run_single(profile: dict, args, send_latency=None):
+    agent = build_agent(profile, args.host, args.port, args.mode,
+                        send_latency)
+    generator = LoadGenerator(agent,
+                              rate=args.rate,
+                              duration=args.duration,
+                              warmup=args.warmup,
+                              max_inflight=args.max_inflight,
+                              vary_mid_OID=args.vary_mid)
+    try:
+        return await generator.run()
+    finally:
+        agent.close()
+
+
+def print_progress(counters: dict):
+    print("progress: " + "  ".join(f"{key}={value}"
+                                   for key, value in counters.items()))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    profile = load_profile(args.profile)
+    send_latency = None
+    server = None
+    if args.metrics_port is not None:
+        send_latency = LatencyHistogram()
+        server = MetricsServer(
+            MetricsRegistry([histogram_metrics(
+                'snmp_agent_send_latency_seconds',
+                'Duration of trap sends by the load generator agents.',
+                send_latency)]),
+            args.metrics_host, args.metrics_port)
+        server.start()
+    try:
+        if args.workers > 1:
+            report = run_workers(profile,
+                                 workers=args.workers,
+                                 rate=args.rate,
+                                 duration=args.duration,
+                                 warmup=args.warmup,
+                                 mode=args.mode,
+                                 max_inflight=args.max_inflight,
+                                 vary_mid_OID=args.vary_mid,
+                                 ipv4_host=args.host,
+                                 port=args.port,
+                                 on_progress=print_progress,
+                                 send_latency=send_latency)
+        else:
+            report = asyncio.run(run_single(profile, args, send_latency))
+    finally:
+        if server is not None:
+            server.close()
+    print(report.format())
+
+
+if __name__ == '__main__':
+    main()
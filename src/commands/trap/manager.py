@@ -1,60 +1,348 @@
-from pysnmp.carrier.asyncio.dispatch import AsyncioDispatcher
-from pysnmp.carrier.asyncio.dgram import udp, udp6
-from pyasn1.codec.ber import decoder
+from pyasn1.codec.ber import decoder, encoder
+from pysnmp.entity.engine import SnmpEngine
+from pysnmp.entity.rfc3413 import ntfrcv
 from pysnmp.proto import api
+from commands.trap.aggregate import TrapAggregator
+from commands.trap.capture import CaptureWriter
+from commands.trap.correlate import TransactionCorrelator
+from commands.trap.dedup import DuplicateFilter
+from commands.trap.histogram import LatencyHistogram
+from commands.trap.ingest import DecodePool, MODES
+from commands.trap.metrics import MetricsRegistry, MetricsServer, \
+    manager_metrics, supervisor_metrics
+from commands.trap.lazy import decode_header, decode_trap
+from commands.trap.routing import TrapRouter
+from commands.trap.sinks import BufferedOutput, POLICIES, open_output
+from commands.trap.recent import RecentTraps
+from commands.trap.relay import TrapRelay, open_relay
+from commands.trap.store import TrapStore
+from commands.trap.transport import ManagerDispatcher, DOMAINS
+from agents.raw import TAG_INFORM_PDU, SNMP_TRAP_OID, decode_request_id
+import argparse
 import asyncio
 import os
 import signal
+import socket
+import time
+
+
+class ReceivedTrap:
+    """
+    A decoded notification, as yielded by `SNMPManager.traps()`.
+
+    Attributes:
+        received (float): Receive time, seconds since the epoch.
+        domain (tuple): Transport domain the datagram arrived on.
+        address (tuple): Address of the sender.
+        version (int): 1 for SNMPv2c, 3 for SNMPv3, 0 for SNMPv1.
+        pdu_type (str): 'trap' or 'inform'.
+        varbinds (list(tuple(str, str))): (OID, value) pairs.
+    """
+    __slots__ = ('received', 'domain', 'address', 'version', 'pdu_type',
+                 'varbinds')
+
+    def __init__(self, received, domain, address, version, pdu_type,
+                 varbinds):
+        self.received = received
+        self.domain = domain
+        self.address = address
+        self.version = version
+        self.pdu_type = pdu_type
+        self.varbinds = varbinds
+
+    @property
+    def trap_OID(self):
+        """
+        The snmpTrapOID.0 value, None when the second var-bind is not
+        snmpTrapOID.0 (e.g. SNMPv1 traps decoded by pyasn1).
+        """
+        varbinds = self.varbinds
+        if len(varbinds) > 1 and varbinds[1][0] == SNMP_TRAP_OID:
+            return varbinds[1][1]
+        return None
+
+    def __repr__(self):
+        return (f"ReceivedTrap(address={self.address!r}, "
+                f"version={self.version}, pdu_type={self.pdu_type!r}, "
+                f"varbinds={self.varbinds!r})")
+
+
+class LazyReceivedTrap(ReceivedTrap):
+    """
+    A notification received as a TrapHeader, in lazy mode or from the native
+    decoder. In lazy mode its var-binds are decoded when `varbinds` is first
+    read.
+
+    Attributes:
+        header (TrapHeader): The header decoded on receipt.
+    """
+    __slots__ = ('header',)
+
+    def __init__(self, received, domain, address, header):
+        self.received = received
+        self.domain = domain
+        self.address = address
+        self.version = header.version
+        self.pdu_type = header.pdu_type
+        self.header = header
+
+    @property
+    def varbinds(self):
+        return self.header.varbinds
+
+    @property
+    def trap_OID(self):
+        return self.header.trap_OID
 
 
 class SNMPManager:
     """
     A Simple Network Management Protocol (SNMP) manager that listens for SNMP
     notifications on both IPv4 and IPv6, and processes incoming SNMP messages
-    asynchronously using the asyncio library.
+    asynchronously using the asyncio library. SNMPv2c InformRequests are
+    acknowledged with a Response PDU.
+
+    Datagrams are read by asyncio datagram protocols and decoded as soon as
+    they arrive. Decoded notifications are queued to `output`, which writes
+    them from a background thread, and handed to every `traps()` iterator.
+
+    In lazy mode, SNMPv1/v2c notifications are first decoded only up to
+    their snmpTrapOID (see `commands.trap.lazy`). Notifications rejected by
+    `trap_filter` are counted and dropped without decoding their var-binds,
+    and the var-binds of accepted ones are decoded when first read.
+
+    Otherwise SNMPv1 and SNMPv2c notifications are decoded by the native BER
+    decoder of `commands.trap.ber`, unless `native` is False. Messages it
+    does not support, and SNMPv3 messages, are decoded by pyasn1.
+
+    With `decode`, the socket callback only queues each datagram, and a
+    pool of threads or processes decodes them in micro-batches (see
+    `commands.trap.ingest`). Decoded notifications are filtered, delivered
+    and acknowledged back on the event loop.
+
+    With `relay`, every datagram is also forwarded, undecoded, to downstream
+    collectors (see `commands.trap.relay`). When nothing else reads the
+    notifications, the manager is a pure relay: it only decodes informs, to
+    acknowledge them.
+
+    With `aggregate`, storms of the same notification are collapsed before
+    reaching any of those: the first is delivered, the following ones are
+    counted into one summary (see `commands.trap.aggregate`).
+
+    With `correlate`, every notification is first joined to the lifecycle
+    of the transaction it reports on (see `commands.trap.correlate`).
+
+    Notifications are also dispatched to the handlers of `router` whose OID
+    prefixes they match (see `commands.trap.routing`), persisted by
+    `store` (see `commands.trap.store`) and kept in memory by `recent` (see
+    `commands.trap.recent`).
 
     Attributes:
         ipv4_host (str): The IPv4 address on which the SNMP manager listens.
         ipv6_host (str): The IPv6 address on which the SNMP manager listens.
         port (int): The port on which the SNMP manager listens for
             notifications.
-        transportDispatcher (AsyncioDispatcher): Manages the transport
-            mechanism for SNMP messages.
+        transportDispatcher (ManagerDispatcher): Owns the UDP sockets and
+            sends responses.
+        capture (CaptureWriter): Records every received datagram, None when
+            not recording.
+        dedup (DuplicateFilter): Skips exact copies of recent datagrams
+            before decoding them, None to decode every copy.
+        snmp_engine (SnmpEngine): Engine authenticating and decrypting
+            SNMPv3 notifications, None when no USM users are configured.
+        verbose (bool): Print every notification.
+        output (BufferedOutput): Writes every notification, None when not
+            writing them. Prints them as text to stdout by default when
+            `verbose`.
+        router (TrapRouter): Dispatches notifications to handlers by OID
+            prefix, None when not routing.
+        store (TrapStore): Persists every notification, None when not
+            storing them.
+        recent (RecentTraps): The last notifications received, None when
+            not keeping them.
+        decode (DecodePool): Decodes datagrams off the event loop, None to
+            decode them in the socket callback.
+        relay (TrapRelay): Forwards every datagram to downstream
+            collectors, None when not relaying.
+        aggregate (TrapAggregator): Collapses storms of notifications
+            before delivering them, None to deliver every notification.
+        correlate (TransactionCorrelator): Joins settlement notifications
+            into transaction lifecycles, None when not correlating.
+        reuse_port (bool): Bind with SO_REUSEPORT so several receiver
+            processes can share the port.
+        ready (asyncio.Event): Set once the sockets are bound.
+        lazy (bool): Decode notification headers first.
+        native (bool): Decode notifications with the native BER decoder
+            when not in lazy mode.
+        trap_filter (function): Called with the TrapHeader of every
+            notification in lazy mode; notifications it returns False for
+            are dropped. None to accept every notification.
+        received (int): Datagrams received.
+        bytes (int): Bytes of those datagrams.
+        notifications (int): Notifications decoded from those datagrams.
+        filtered (int): Notifications rejected by `trap_filter`.
+        duplicates (int): Datagrams skipped as duplicates.
+        unsupported (int): Messages of an SNMP version the manager does not
+            decode.
+        dropped (int): Notifications not delivered to a `traps()` iterator
+            because its queue was full.
+        errors (int): Datagrams from `decode` that raised while handled on
+            the event loop, and storm summaries that raised while delivered.
+        decode_latency (LatencyHistogram): Time from receiving a datagram
+            until its notification is decoded and delivered, None unless
+            `latency`.
+        deliver_latency (LatencyHistogram): Time spent handing each
+            notification to `router`, `output`, `store`, `recent` and the
+            `traps()` iterators, None unless `latency`.
         _running (bool): A flag indicating whether the manager is actively
             running.
+        _stopped (asyncio.Event): Set once `stop()` has been called.
     """
 
     def __init__(self, ipv4_host=os.getenv('IPv4_HOST_IP'),
                  ipv6_host=os.getenv('IPv6_HOST_IP'),
-                 port=os.getenv('PORT')):
+                 port=os.getenv('PORT'),
+                 capture=None,
+                 usm_users=None,
+                 verbose: bool = True,
+                 reuse_port: bool = False,
+                 lazy: bool = False,
+                 trap_filter=None,
+                 native: bool = True,
+                 dedup=None,
+                 output=None,
+                 router: TrapRouter = None,
+                 store=None,
+                 recent=None,
+                 decode=None,
+                 latency: bool = False,
+                 relay=None,
+                 aggregate=None,
+                 correlate: TransactionCorrelator = None):
         """
-        Initializes the SNMPManager instance, setting up the dispatcher to
-        handle incoming SNMP messages on both IPv4 and IPv6.
+        Initializes the SNMPManager instance. The sockets are bound by
+        `start()` or `run_async()`.
 
         Args:
             ipv4_host (str): The IPv4 address to bind to.
-            ipv6_host (str): The IPv6 address to bind to.
+            ipv6_host (str): The IPv6 address to bind to. Defaults to every
+                IPv6 address when IPv6 is available.
             port (int): The port to bind to for receiving SNMP messages.
+            capture (str | CaptureWriter, optional): Capture file path or
+                writer recording every received datagram before decoding.
+            usm_users (list(USMUser), optional): SNMPv3 users accepted by the
+                manager, each with the engine ID of the agent sending as
+                that user. Their keys come from the localized key cache.
+            verbose (bool, optional): Print every notification (default).
+            reuse_port (bool, optional): Set SO_REUSEPORT on the sockets, for
+                running several managers on the same port.
+            lazy (bool, optional): Decode var-binds only when they are read.
+            trap_filter (function, optional): Predicate on the TrapHeader of
+                each notification, requires `lazy`.
+            native (bool, optional): Use the native BER decoder (default),
+                False to decode everything with pyasn1.
+            dedup (float | DuplicateFilter, optional): Duplicate window in
+                seconds, or the filter to use. Informs and SNMPv3 messages
+                are never skipped, a retransmitted inform still needs its
+                response.
+            output (BufferedOutput, optional): Where notifications are
+                written. Defaults to text on stdout when `verbose`.
+            router (TrapRouter, optional): Handlers to dispatch
+                notifications to by OID prefix.
+            store (str | TrapStore, optional): Directory of the trap store,
+                or the store, persisting every notification.
+            recent (int | RecentTraps, optional): Number of recent
+                notifications to keep in memory, or the buffer to keep them
+                in.
+            decode (int | DecodePool, optional): Number of threads decoding
+                datagrams off the event loop, or the pool decoding them.
+            latency (bool, optional): Record the decode and deliver
+                latencies of every delivered notification.
+            relay (TrapRelay | list(RelayDestination), optional): Where to
+                forward every received datagram.
+            aggregate (float | TrapAggregator, optional): Storm window in
+                seconds, or the aggregator collapsing storms.
+            correlate (TransactionCorrelator, optional): Correlator every
+                notification is added to, before storms are collapsed.
+
+        Raises:
+            ValueError: If `trap_filter` is given without `lazy`, or
+                `decode` with neither `lazy` nor `native`, or a pool whose
+                `lazy` differs from the manager's.
         """
-        self.transportDispatcher = AsyncioDispatcher()
-        self.transportDispatcher.register_recv_callback(self._callback)
+        if trap_filter is not None and not lazy:
+            raise ValueError('Argument "trap_filter" requires lazy decoding')
+
+        if isinstance(decode, int):
+            decode = DecodePool(decode, lazy=lazy)
+        if decode is not None:
+            if not (lazy or native):
+                raise ValueError(
+                    'Argument "decode" requires the native decoder')
+            if decode.lazy != lazy:
+                raise ValueError(
+                    'Argument "decode" must decode as lazily as the manager')
+
+        if isinstance(capture, str):
+            capture = CaptureWriter(capture)
+        self.capture = capture
+        if isinstance(dedup, (int, float)):
+            dedup = DuplicateFilter(dedup)
+        self.dedup = dedup
+        self.transportDispatcher = ManagerDispatcher()
         self.ipv4_host = ipv4_host
         self.ipv6_host = ipv6_host
         self.port = int(port)
+        self.verbose = verbose
+        if output is None and verbose:
+            output = BufferedOutput()
+        self.output = output
+        self.router = router
+        if isinstance(store, str):
+            store = TrapStore(store)
+        self.store = store
+        if isinstance(recent, int):
+            recent = RecentTraps(recent)
+        self.recent = recent
+        self.decode = decode
+        if isinstance(relay, list):
+            relay = TrapRelay(relay)
+        self.relay = relay
+        if isinstance(aggregate, (int, float)):
+            aggregate = TrapAggregator(aggregate)
+        self.aggregate = aggregate
+        self.correlate = correlate
+        self.reuse_port = reuse_port
+        self.lazy = lazy
+        self.trap_filter = trap_filter
+        self.native = native
+        self.ready = asyncio.Event()
+        self.received = 0
+        self.bytes = 0
+        self.notifications = 0
+        self.filtered = 0
+        self.duplicates = 0
+        self.unsupported = 0
+        self.dropped = 0
+        self.errors = 0
+        self.decode_latency = LatencyHistogram() if latency else None
+        self.deliver_latency = LatencyHistogram() if latency else None
+        # Receive time of the datagram being handled, for `decode_latency`
+        self._received_ns = 0
+        self._stopped = asyncio.Event()
+        self._subscribers = []
+
+        # SNMPv3 messages are handed to a pysnmp engine sharing the
+        # dispatcher, which runs USM and calls back `_usm_callback`
+        self.snmp_engine = None
+        if usm_users:
+            self.snmp_engine = SnmpEngine()
+            self.snmp_engine.register_transport_dispatcher(
+                self.transportDispatcher, 'usm')
+            for user in usm_users:
+                user.register(self.snmp_engine)
+            ntfrcv.NotificationReceiver(self.snmp_engine, self._usm_callback)
 
-        # Set up transport mechanisms for IPv4 and IPv6
-        self.transportDispatcher.register_transport(
-            udp.DOMAIN_NAME,
-            udp.UdpAsyncioTransport().open_server_mode((self.ipv4_host,
-                                                        self.port))
-        )
-        self.transportDispatcher.register_transport(
-            udp6.DOMAIN_NAME,
-            udp6.Udp6AsyncioTransport().open_server_mode((self.ipv6_host,
-                                                          self.port))
-        )
-
-        self.transportDispatcher.job_started(1)
         self._running = True
 
         # Register signal handlers for graceful shutdown
@@ -72,23 +360,171 @@ class SNMPManager:
         print("Signal received, shutting down...")
         self.stop()
 
+    async def start(self):
+        """
+        Binds the IPv4 and IPv6 sockets and sets `ready`. Does nothing if
+        the manager is already started.
+        """
+        if self.ready.is_set():
+            return
+        if self.decode is not None:
+            self.decode.start(self._decoded, asyncio.get_running_loop())
+        dispatcher = self.transportDispatcher
+        if self.aggregate is not None or self.correlate is not None:
+            dispatcher.register_timer_callback(self._on_timer)
+        await dispatcher.open(DOMAINS[socket.AF_INET], socket.AF_INET,
+                              (self.ipv4_host, self.port), self._callback,
+                              self.reuse_port)
+        try:
+            await dispatcher.open(DOMAINS[socket.AF_INET6], socket.AF_INET6,
+                                  (self.ipv6_host or '::', self.port),
+                                  self._callback, self.reuse_port)
+        except OSError:
+            # An explicitly requested IPv6 address must be bindable
+            if self.ipv6_host is not None:
+                raise
+        self.ready.set()
+
+    def stats(self):
+        """
+        Returns the receive counters of the manager.
+
+        Returns:
+            dict: 'received' datagrams and their 'bytes', decoded
+                'notifications', messages of an 'unsupported' version,
+                notifications 'filtered' out, 'duplicates' skipped and
+                their share of the received datagrams ('duplicate_rate'),
+                notifications 'suppressed' into storm summaries, datagrams,
+                storm summaries and timer callbacks that raised ('errors')
+                and notifications 'dropped' by full `traps()` iterators.
+                With `decode`, `relay`, `aggregate` and `correlate`, also
+                their counters under 'decode', 'relay', 'aggregate' and
+                'correlate'.
+        """
+        stats = {
+            'received': self.received,
+            'bytes': self.bytes,
+            'notifications': self.notifications,
+            'unsupported': self.unsupported,
+            'filtered': self.filtered,
+            'duplicates': self.duplicates,
+            'duplicate_rate': (self.duplicates / self.received
+                               if self.received else 0.0),
+            'suppressed': (self.aggregate.suppressed
+                           if self.aggregate is not None else 0),
+            'errors': self.transportDispatcher.errors + self.errors,
+            'dropped': self.dropped,
+        }
+        if self.decode is not None:
+            stats['decode'] = self.decode.stats()
+        if self.relay is not None:
+            stats['relay'] = self.relay.stats()
+        if self.aggregate is not None:
+            stats['aggregate'] = self.aggregate.stats()
+        if self.correlate is not None:
+            stats['correlate'] = self.correlate.stats()
+        return stats
+
     async def run_async(self):
         """
-        Asynchronously runs the SNMP manager's dispatcher in a loop, allowing
-        it to process incoming SNMP messages until stopped.
+        Starts the SNMP manager and processes incoming SNMP messages as they
+        arrive until `stop()` is called.
         """
         print("Started SNMP Manager. Press Ctrl-C to stop.")
-        while self._running:
-            self.transportDispatcher.run_dispatcher()
-            await asyncio.sleep(0.1)  # Yield control to the event loop
+        await self.start()
+        await self._stopped.wait()
+
+    async def traps(self, maxsize: int = 10000):
+        """
+        Iterates over the notifications received from now on, until the
+        manager stops.
+
+        Args:
+            maxsize (int): Notifications buffered for this iterator. Newer
+                notifications are dropped, and counted in `dropped`, while
+                the buffer is full.
+
+        Yields:
+            ReceivedTrap: Each decoded notification.
+        """
+        queue = asyncio.Queue(maxsize)
+        self._subscribers.append(queue)
+        try:
+            while self._running:
+                trap = await queue.get()
+                if trap is None:
+                    return
+                yield trap
+        finally:
+            self._subscribers.remove(queue)
+
+    def _publish(self, domain, address, version, pdu_type, varBinds,
+                 received=None):
+        if not self._consumed():
+            return
+        self._deliver(ReceivedTrap(received or time.time(), domain, address,
+                                   version, pdu_type,
+                                   [(oid.prettyPrint(), val.prettyPrint())
+                                    for oid, val in varBinds]))
+
+    def _consumed(self):
+        # Whether anything uses the decoded notifications
+        return self.output is not None or self.router is not None or \
+            self.store is not None or self.recent is not None or \
+            self.correlate is not None or bool(self._subscribers)
+
+    def _deliver(self, trap):
+        latency = self.decode_latency
+        if latency is not None:
+            start = time.time_ns()
+            latency.record_ns(start - self._received_ns)
+        if self.correlate is not None:
+            self.correlate.add(trap)
+        if self.aggregate is None:
+            self._dispatch(trap)
+        else:
+            for record in self.aggregate.add(trap):
+                self._dispatch(record)
+        if latency is not None:
+            self.deliver_latency.record_ns(time.time_ns() - start)
+
+    def _dispatch(self, trap):
+        if self.router is not None:
+            self.router.dispatch(trap)
+        if self.output is not None:
+            self.output.put(trap)
+        if self.store is not None:
+            self.store.put(trap)
+        if self.recent is not None:
+            self.recent.add(trap)
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(trap)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    def _on_timer(self, now):
+        # Deliver the summaries of storms that have ended, and expire the
+        # transactions not seen for their TTL
+        if self.aggregate is not None:
+            for record in self.aggregate.expire():
+                try:
+                    self._dispatch(record)
+                except Exception:
+                    # A summary of malformed notifications must not keep
+                    # the ones after it from being delivered
+                    self.errors += 1
+        if self.correlate is not None:
+            self.correlate.expire()
 
     def _callback(self, transportDispatcher, transportDomain, transportAddress,
                   wholeMsg):
         """
-        Callback function to process received SNMP messages.
+        Callback function to process received SNMP messages. With `decode`,
+        the message is queued for the pool instead of decoded here.
 
         Args:
-            transportDispatcher (AsyncioDispatcher): The dispatcher handling
+            transportDispatcher (ManagerDispatcher): The dispatcher handling
                 the transport.
             transportDomain (tuple): The transport domain (protocol) used
                 (e.g., UDP).
@@ -98,11 +534,99 @@ class SNMPManager:
         Returns:
             bytes: Remaining message content after processing.
         """
+        self.received += 1
+        self.bytes += len(wholeMsg)
+        if self.decode_latency is not None:
+            self._received_ns = time.time_ns()
+        if self.capture is not None:
+            self.capture.write(wholeMsg, transportAddress)
+
+        if self.dedup is not None and \
+                self.dedup.seen(wholeMsg, transportAddress) and \
+                self._suppressible(wholeMsg):
+            self.duplicates += 1
+            return
+
+        if self.relay is not None:
+            self.relay.forward(wholeMsg)
+            if not self._consumed() and self._suppressible(wholeMsg):
+                # Relaying only, and the agent expects no response
+                return
+
+        if self.decode is not None:
+            if not self.decode.started:
+                # Datagrams handed over without `start()`, e.g. replayed
+                self.decode.start(self._decoded)
+            self.decode.submit(transportDomain, transportAddress, wholeMsg)
+            return
+
+        return self._decode(transportDispatcher, transportDomain,
+                            transportAddress, wholeMsg)
+
+    def _decoded(self, batch):
+        """
+        Handles a batch decoded by `decode`.
+
+        Args:
+            batch (list(tuple)): (received, domain, address, data, header)
+                tuples, `header` None for datagrams to decode here.
+        """
+        dispatcher = self.transportDispatcher
+        timed = self.decode_latency is not None
+        for received, domain, address, data, header in batch:
+            if timed:
+                self._received_ns = int(received * 1e9)
+            try:
+                if header is None:
+                    self._decode(dispatcher, domain, address, data, received)
+                else:
+                    self._receive_header(dispatcher, domain, address, header,
+                                         received)
+            except Exception:
+                self.errors += 1
+
+    def _decode(self, transportDispatcher, transportDomain, transportAddress,
+                wholeMsg, received=None):
+        """
+        Decodes a received SNMP message and handles its notifications.
+
+        Args:
+            transportDispatcher (ManagerDispatcher): The dispatcher handling
+                the transport.
+            transportDomain (tuple): The transport domain the message
+                arrived on.
+            transportAddress (tuple): Address tuple of the sender.
+            wholeMsg (bytes): The raw message.
+            received (float, optional): Receive time, now by default.
+
+        Returns:
+            bytes: Remaining message content after processing.
+        """
+        if self.snmp_engine is not None and \
+                int(api.decodeMessageVersion(wholeMsg)) == 3:
+            self.snmp_engine.message_dispatcher.receive_message(
+                self.snmp_engine, transportDomain, transportAddress, wholeMsg)
+            return
+
+        if self.lazy or self.native:
+            try:
+                header = decode_header(wholeMsg) if self.lazy \
+                    else decode_trap(wholeMsg)
+            except ValueError:
+                # Anything the fast paths do not support takes the pyasn1
+                # decoding path below
+                header = None
+            if header is not None:
+                self._receive_header(transportDispatcher, transportDomain,
+                                     transportAddress, header, received)
+                return
+
         while wholeMsg:
             msgVer = int(api.decodeMessageVersion(wholeMsg))
             if msgVer in api.PROTOCOL_MODULES:
                 pMod = api.PROTOCOL_MODULES[msgVer]
             else:
+                self.unsupported += 1
                 print("Unsupported SNMP version %s" % msgVer)
                 return
 
@@ -110,16 +634,106 @@ class SNMPManager:
                 wholeMsg,
                 asn1Spec=pMod.Message(),
             )
-            print("Notification message from {}:{}: ".format(
-                transportDomain, transportAddress))
             reqPDU = pMod.apiMessage.get_pdu(reqMsg)
-            if reqPDU.isSameTypeWith(pMod.TrapPDU()):
+            inform = self._is_inform(pMod, reqPDU)
+            if reqPDU.isSameTypeWith(pMod.TrapPDU()) or inform:
                 varBinds = pMod.apiPDU.get_varbinds(reqPDU)
-                print("Var-binds:")
-                for oid, val in varBinds:
-                    print(f"{oid.prettyPrint()} = {val.prettyPrint()}")
+                self.notifications += 1
+                self._publish(transportDomain, transportAddress, msgVer,
+                              'inform' if inform else 'trap', varBinds,
+                              received)
+            if inform:
+                self._acknowledge(transportDispatcher, transportDomain,
+                                  transportAddress, pMod, reqMsg)
         return wholeMsg
 
+    def _receive_header(self, transportDispatcher, transportDomain,
+                        transportAddress, header, received=None):
+        """
+        Handles a notification decoded by `decode_header()` or
+        `decode_trap()`.
+
+        Args:
+            transportDispatcher (ManagerDispatcher): The dispatcher handling
+                the transport.
+            transportDomain (tuple): The transport domain the notification
+                arrived on.
+            transportAddress (tuple): Address tuple of the sender.
+            header (TrapHeader): The notification header.
+            received (float, optional): Receive time, now by default.
+        """
+        accepted = self.trap_filter is None or self.trap_filter(header)
+        if accepted:
+            self.notifications += 1
+            if self._consumed():
+                self._deliver(LazyReceivedTrap(received or time.time(),
+                                               transportDomain,
+                                               transportAddress, header))
+        else:
+            self.filtered += 1
+        # Filtered informs are still acknowledged, or the agent would keep
+        # retransmitting them
+        if header.pdu_type == 'inform':
+            pMod, reqMsg = header.message()
+            self._acknowledge(transportDispatcher, transportDomain,
+                              transportAddress, pMod, reqMsg)
+
+    def _usm_callback(self, snmpEngine, stateReference, contextEngineId,
+                      contextName, varBinds, cbCtx):
+        """
+        Callback of the SNMPv3 notification receiver, called with the
+        var-binds of every authenticated notification.
+
+        Args:
+            snmpEngine (SnmpEngine): The receiving engine.
+            stateReference (int): Reference to the message state.
+            contextEngineId (OctetString): Context engine ID of the message.
+            contextName (OctetString): Context name of the message.
+            varBinds (list): The notification var-binds.
+            cbCtx: Unused callback context.
+        """
+        transportDomain, transportAddress = \
+            snmpEngine.message_dispatcher.get_transport_info(stateReference)
+        self.notifications += 1
+        self._publish(transportDomain, transportAddress, 3, 'trap', varBinds)
+
+    @staticmethod
+    def _suppressible(wholeMsg):
+        # Only SNMPv1/v2c messages that need no response can be skipped
+        try:
+            pdu_tag, _ = decode_request_id(wholeMsg)
+        except ValueError:
+            return False
+        return pdu_tag != TAG_INFORM_PDU
+
+    @staticmethod
+    def _is_inform(pMod, reqPDU):
+        return hasattr(pMod, 'InformRequestPDU') and \
+            reqPDU.isSameTypeWith(pMod.InformRequestPDU())
+
+    def _acknowledge(self, transportDispatcher, transportDomain,
+                     transportAddress, pMod, reqMsg):
+        """
+        Sends the Response PDU acknowledging an InformRequest. The response
+        echoes the request-id and var-binds of the inform.
+
+        Args:
+            transportDispatcher (ManagerDispatcher): The dispatcher handling
+                the transport.
+            transportDomain (tuple): The transport domain the inform
+                arrived on.
+            transportAddress (tuple): Address tuple of the sender.
+            pMod (module): Protocol module of the message version.
+            reqMsg (Message): The decoded inform message.
+        """
+        rspMsg = pMod.apiMessage.get_response(reqMsg)
+        rspPDU = pMod.apiMessage.get_pdu(rspMsg)
+        pMod.apiPDU.set_varbinds(
+            rspPDU,
+            pMod.apiPDU.get_varbinds(pMod.apiMessage.get_pdu(reqMsg)))
+        transportDispatcher.send_message(encoder.encode(rspMsg),
+                                         transportDomain, transportAddress)
+
     async def run(self):
         """
         Starts the SNMP manager and runs it asynchronously until interrupted.
@@ -131,29 +745,259 @@ class SNMPManager:
         except KeyboardInterrupt:
             print("Shutting down...")
         finally:
-            self.transportDispatcher.close_dispatcher()
+            self.stop()
 
     def stop(self):
         """
-        Stops the SNMP manager, halting the dispatcher and setting `_running`
-        to False.
+        Stops the SNMP manager: closes the sockets, handles the datagrams
+        queued for decoding, writes out the queued notifications, ends the
+        `traps()` iterators and sets `_running` to False. Only the first
+        call does anything: the signal handler and `run()` both stop the
+        manager.
         """
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
         self._running = False
         self.transportDispatcher.close_dispatcher()
+        if self.capture is not None:
+            self.capture.close()
+        if self.decode is not None:
+            self.decode.close()
+        if self.aggregate is not None:
+            for record in self.aggregate.flush():
+                self._dispatch(record)
+        if self.relay is not None:
+            self.relay.close()
+        if self.output is not None:
+            self.output.close()
+        if self.store is not None:
+            self.store.close()
+        if self.recent is not None:
+            self.recent.close()
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(None)
+            except asyncio.QueueFull:
+                queue.get_nowait()
+                queue.put_nowait(None)
 
 
-async def start_manager():
+async def start_manager(metrics_address=None, **options):
     """
     Creates and starts an instance of SNMPManager asynchronously.
+
+    Args:
+        metrics_address (tuple, optional): (host, port) to serve the
+            manager's Prometheus metrics on.
+        **options: Keyword arguments for SNMPManager.
     """
-    manager = SNMPManager()
-    await manager.run()
+    manager = SNMPManager(**options)
+    server = None
+    if metrics_address is not None:
+        server = MetricsServer(MetricsRegistry([manager_metrics(manager)]),
+                               *metrics_address)
+        server.start()
+    try:
+        await manager.run()
+    finally:
+        if server is not None:
+            server.close()
 
-if __name__ == '__main__':
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Receive SNMP notifications")
+    parser.add_argument("--host", default=os.getenv('IPv4_HOST_IP'),
+                        help="IPv4 address to bind (default $IPv4_HOST_IP)")
+    parser.add_argument("--ipv6-host", default=os.getenv('IPv6_HOST_IP'),
+                        help="IPv6 address to bind (default $IPv6_HOST_IP, "
+                             "else every address)")
+    parser.add_argument("--port", type=int, default=os.getenv('PORT'),
+                        help="port to bind (default $PORT)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="receiver processes sharing the port with "
+                             "SO_REUSEPORT (default 1)")
+    parser.add_argument("--stats-interval", type=float, default=5.0,
+                        help="seconds between worker statistics lines "
+                             "(default 5)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="do not print every notification")
+    parser.add_argument("--lazy", action="store_true",
+                        help="decode var-binds only when they are used")
+    parser.add_argument("--dedup-window", type=float, default=None,
+                        help="skip copies of a datagram received from the "
+                             "same host within this many seconds")
+    parser.add_argument("--aggregate-window", type=float, default=None,
+                        help="collapse notifications of the same host, "
+                             "snmpTrapOID and key var-binds received within "
+                             "this many seconds of each other into one "
+                             "summary")
+    parser.add_argument("--aggregate-key", action="append", default=None,
+                        metavar="OID",
+                        help="var-bind whose value is part of the storm "
+                             "key; repeat for several")
+    parser.add_argument("--aggregate-keys", type=int, default=10000,
+                        help="storm keys tracked at most (default 10000)")
+    parser.add_argument("--aggregate-span", type=float, default=60.0,
+                        help="seconds after which a storm summary is "
+                             "delivered even if the storm goes on "
+                             "(default 60)")
+    parser.add_argument("--correlate", action="store_true",
+                        help="join settlement notifications into "
+                             "transaction lifecycles")
+    parser.add_argument("--correlate-key", action="append", default=None,
+                        metavar="FIELD",
+                        help="settlement field identifying a transaction "
+                             "(default mid); repeat for several")
+    parser.add_argument("--correlate-ttl", type=float, default=48.0,
+                        help="hours without a notification after which an "
+                             "open transaction expires (default 48)")
+    parser.add_argument("--correlate-capacity", type=int, default=100000,
+                        help="open transactions tracked at most "
+                             "(default 100000)")
+    parser.add_argument("--format", choices=("text", "ndjson"),
+                        default="text",
+                        help="notification output format (default text)")
+    parser.add_argument("--output", default=None, metavar="PATH",
+                        help="write notifications to this file, rotated by "
+                             "size, instead of stdout")
+    parser.add_argument("--max-bytes", type=int, default=64 << 20,
+                        help="size at which the output file is rotated "
+                             "(default 64 MiB)")
+    parser.add_argument("--backups", type=int, default=5,
+                        help="rotated output files kept (default 5)")
+    parser.add_argument("--queue-size", type=int, default=10000,
+                        help="notifications buffered for the output "
+                             "(default 10000)")
+    parser.add_argument("--queue-policy", choices=POLICIES,
+                        default="drop_oldest",
+                        help="what to do when the output buffer is full "
+                             "(default drop_oldest)")
+    parser.add_argument("--store", default=None, metavar="DIRECTORY",
+                        help="persist notifications to a trap store in "
+                             "this directory")
+    parser.add_argument("--retention", type=float, default=None,
+                        help="hours of notifications kept in the store "
+                             "(default all)")
+    parser.add_argument("--decode-workers", type=int, default=0,
+                        help="decode datagrams on this many workers instead "
+                             "of the event loop (default 0)")
+    parser.add_argument("--decode-mode", choices=MODES, default="thread",
+                        help="run the decode workers as threads or "
+                             "processes (default thread)")
+    parser.add_argument("--decode-queue", type=int, default=10000,
+                        help="datagrams queued for the decode workers "
+                             "(default 10000)")
+    parser.add_argument("--decode-policy", choices=POLICIES,
+                        default="block",
+                        help="what to do when the decode queue is full "
+                             "(default block)")
+    parser.add_argument("--decode-batch", type=int, default=64,
+                        help="most datagrams a decode worker takes at once "
+                             "(default 64)")
+    parser.add_argument("--relay", action="append", default=None,
+                        metavar="HOST[:PORT][@SAMPLE]",
+                        help="forward every datagram to this collector, "
+                             "optionally only a fraction SAMPLE of them; "
+                             "repeat for several collectors")
+    parser.add_argument("--relay-queue", type=int, default=10000,
+                        help="datagrams queued per relay destination "
+                             "(default 10000)")
+    parser.add_argument("--relay-policy", choices=POLICIES,
+                        default="drop_oldest",
+                        help="what to do when a relay destination's queue "
+                             "is full (default drop_oldest)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics at /metrics on this "
+                             "port")
+    parser.add_argument("--metrics-host", default="127.0.0.1",
+                        help="address the metrics endpoint binds (default "
+                             "127.0.0.1)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    options = {"ipv4_host": args.host, "ipv6_host": args.ipv6_host,
+               "port": args.port, "verbose": not args.quiet,
+               "lazy": args.lazy, "dedup": args.dedup_window}
+    store = None
+    if args.store is not None:
+        store = {"directory": args.store,
+                 "retention": args.retention and args.retention * 3600}
+    output = None
+    if not args.quiet:
+        output = {"format": args.format, "path": args.output,
+                  "max_bytes": args.max_bytes, "backups": args.backups,
+                  "maxsize": args.queue_size, "policy": args.queue_policy}
+    decode = None
+    if args.decode_workers > 0:
+        decode = {"workers": args.decode_workers, "mode": args.decode_mode,
+                  "lazy": args.lazy, "maxsize": args.decode_queue,
+                  "policy": args.decode_policy,
+                  "batch_size": args.decode_batch}
+    relay = None
+    if args.relay:
+        relay = {"destinations": args.relay, "maxsize": args.relay_queue,
+                 "policy": args.relay_policy}
+    aggregate = None
+    if args.aggregate_window is not None:
+        aggregate = {"window": args.aggregate_window,
+                     "key_OIDs": args.aggregate_key,
+                     "maxsize": args.aggregate_keys,
+                     "max_span": args.aggregate_span}
+    correlate = None
+    if args.correlate:
+        correlate = {"ttl": args.correlate_ttl * 3600,
+                     "capacity": args.correlate_capacity,
+                     "key_fields": args.correlate_key or ("mid",)}
+    metrics = None
+    if args.metrics_port is not None:
+        metrics = (args.metrics_host, args.metrics_port)
+    if args.workers > 1:
+        # Imported here, the workers module imports this one
+        from commands.trap.workers import ReceiverSupervisor, format_stats
+        supervisor = ReceiverSupervisor(
+            args.workers, report_interval=min(1.0, args.stats_interval),
+            output=output, store=store, decode=decode, relay=relay,
+            aggregate=aggregate, correlate=correlate, **options)
+        server = None
+        if metrics is not None:
+            server = MetricsServer(
+                MetricsRegistry([supervisor_metrics(supervisor)]), *metrics)
+            server.start()
+        try:
+            supervisor.run(stats_interval=args.stats_interval,
+                           on_stats=lambda: print(format_stats(supervisor)))
+        finally:
+            if server is not None:
+                server.close()
+        return
+
+    if output is not None:
+        options["output"] = open_output(**output)
+    if store is not None:
+        options["store"] = TrapStore(**store)
+    if decode is not None:
+        options["decode"] = DecodePool(**decode)
+    if relay is not None:
+        options["relay"] = open_relay(**relay)
+    if aggregate is not None:
+        options["aggregate"] = TrapAggregator(**aggregate)
+    if correlate is not None:
+        options["correlate"] = TransactionCorrelator(**correlate)
+    if metrics is not None:
+        options["latency"] = True
     try:
-        asyncio.run(start_manager())
+        asyncio.run(start_manager(metrics, **options))
     except RuntimeError as e:
         if "while another loop is running" in str(e):
             # Fallback if already in an environment with a running event loop
             print("An event loop is already running; switching to await.")
-            asyncio.get_event_loop().run_until_complete(start_manager())
+            asyncio.get_event_loop().run_until_complete(
+                start_manager(metrics, **options))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,445 @@
+"""
+Prometheus metrics of the trap receiver and of agents.
+
+`MetricsRegistry` renders the Prometheus text format from collectors:
+functions called on every scrape with an `Exposition` to write samples to.
+`MetricsServer` serves a registry at /metrics from a background thread, so
+a scrape never runs on the event loop.
+
+The collectors read the counters SNMPManager and the queues, stores and
+routers it feeds already keep, so counting costs the receive path no more
+than an integer increment. Latencies are LatencyHistograms, a few hundred
+nanoseconds per `record_ns()`, exported as Prometheus histograms with the
+bounds of BUCKETS.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client python -m commands.trap.manager \\
+        --metrics-port 9163
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from commands.trap.histogram import LatencyHistogram
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds of the exported histogram buckets, in seconds
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bounds of the transaction stage durations, from a minute to a week
+DURATION_BUCKETS = (60.0, 300.0, 900.0, 1800.0, 3600.0, 7200.0, 21600.0,
+                    43200.0, 86400.0, 172800.0, 604800.0)
+
+# Manager counters exported by both collectors: stats() key, metric name
+# without the prefix, help
+COUNTERS = (
+    ('received', 'datagrams_received_total', 'Datagrams received.'),
+    ('bytes', 'bytes_received_total', 'Bytes of the datagrams received.'),
+    ('notifications', 'notifications_total', 'Notifications decoded.'),
+    ('filtered', 'filtered_total',
+     'Notifications rejected by the trap filter.'),
+    ('duplicates', 'duplicates_total', 'Datagrams skipped as duplicates.'),
+    ('suppressed', 'suppressed_total',
+     'Notifications collapsed into storm summaries.'),
+    ('errors', 'decode_errors_total', 'Datagrams that raised while decoded.'),
+    ('unsupported', 'unsupported_version_total',
+     'Messages of an unsupported SNMP version.'),
+)
+
+# Relay destination counters: stats() key, metric name without the prefix,
+# help
+RELAY_COUNTERS = (
+    ('sent', 'sent_total', 'Datagrams sent to a relay destination.'),
+    ('errors', 'send_errors_total',
+     'Datagrams a relay destination socket refused.'),
+    ('sampled_out', 'sampled_out_total',
+     'Datagrams skipped by relay sampling.'),
+    ('filtered', 'filtered_total',
+     'Datagrams rejected by relay filter rules.'),
+)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    labels = dict(labels or (), **extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"'
+                          for name, value in labels.items()) + '}'
+
+
+def _samples(samples):
+    # A bare value, or (labels, value) pairs
+    if isinstance(samples, (int, float, LatencyHistogram)):
+        return [(None, samples)]
+    return samples
+
+
+def histogram_buckets(histogram: LatencyHistogram, bounds=BUCKETS):
+    """
+    Returns the cumulative counts of a histogram at each bound.
+
+    A log-linear bucket is counted under a bound when its highest value is
+    at most the bound, so each count is within the histogram's precision.
+
+    Args:
+        histogram (LatencyHistogram): The histogram.
+        bounds (tuple(float)): Increasing bounds in seconds.
+
+    Returns:
+        tuple(list(int), int): The count at each bound, and the count of
+            every recorded value.
+    """
+    counts = list(histogram.counts)
+    cumulative = []
+    seen = 0
+    index = 0
+    for bound in bounds:
+        limit = bound * 1e6
+        while index < len(counts) and \
+                LatencyHistogram.bucket_bounds(index)[1] <= limit:
+            seen += counts[index]
+            index += 1
+        cumulative.append(seen)
+    return cumulative, sum(counts)
+
+
+class Exposition:
+    """
+    Metric families in the Prometheus text format, written by collectors.
+
+    Samples are given as a value, or as (labels, value) pairs where
+    `labels` is a dict.
+    """
+    def __init__(self):
+        self.lines = []
+
+    def _family(self, name: str, kind: str, help: str):
+        self.lines.append(f'# HELP {name} {help}')
+        self.lines.append(f'# TYPE {name} {kind}')
+
+    def counter(self, name: str, help: str, samples):
+        """
+        Writes a counter family. `name` should end in '_total'.
+        """
+        self._family(name, 'counter', help)
+        for labels, value in _samples(samples):
+            self.lines.append(f'{name}{_labels(labels)} {value!r}')
+
+    def gauge(self, name: str, help: str, samples):
+        """
+        Writes a gauge family.
+        """
+        self._family(name, 'gauge', help)
+        for labels, value in _samples(samples):
+            self.lines.append(f'{name}{_labels(labels)} {value!r}')
+
+    def histogram(self, name: str, help: str, samples, bounds=BUCKETS):
+        """
+        Writes a histogram family from LatencyHistogram samples, with
+        buckets at `bounds` seconds.
+        """
+        self._family(name, 'histogram', help)
+        for labels, histogram in _samples(samples):
+            cumulative, count = histogram_buckets(histogram, bounds)
+            for bound, seen in zip(bounds, cumulative):
+                self.lines.append(
+                    f'{name}_bucket{_labels(labels, le=f"{bound:g}")} '
+                    f'{seen}')
+            self.lines.append(
+                f'{name}_bucket{_labels(labels, le="+Inf")} {count}')
+            self.lines.append(f'{name}_sum{_labels(labels)} '
+                              f'{histogram.total!r}')
+            self.lines.append(f'{name}_count{_labels(labels)} {count}')
+
+    def text(self) -> str:
+        return '\n'.join(self.lines) + '\n'
+
+
+class MetricsRegistry:
+    """
+    The collectors rendered on every scrape.
+
+    Attributes:
+        collectors (list(function)): Functions called with an Exposition.
+    """
+    def __init__(self, collectors=()):
+        self.collectors = list(collectors)
+
+    def register(self, collector):
+        """
+        Adds a collector, called with an Exposition on every scrape.
+        """
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Returns the samples of every collector in the Prometheus text
+        format.
+        """
+        exposition = Exposition()
+        for collector in self.collectors:
+            collector(exposition)
+        return exposition.text()
+
+
+def histogram_metrics(name: str, help: str, histogram: LatencyHistogram,
+                      labels: dict = None):
+    """
+    Returns a collector of one histogram, e.g. the `send_latency` of an
+    SNMPAgent.
+
+    Args:
+        name (str): Metric name, e.g. 'snmp_agent_send_latency_seconds'.
+        help (str): Metric description.
+        histogram (LatencyHistogram): The histogram.
+        labels (dict, optional): Labels of its samples.
+    """
+    def collect(exposition: Exposition):
+        exposition.histogram(name, help, [(labels, histogram)])
+    return collect
+
+
+def manager_metrics(manager, prefix: str = 'snmp_manager'):
+    """
+    Returns a collector of the counters and latencies of an SNMPManager, and
+    of its decode pool, storm aggregator, transaction correlator, output,
+    store, router, relay and recent buffer.
+
+    Args:
+        manager (SNMPManager): The manager.
+        prefix (str): Prefix of the metric names.
+    """
+    def collect(exposition: Exposition):
+        stats = manager.stats()
+        for key, name, help in COUNTERS:
+            exposition.counter(f'{prefix}_{name}', help, stats[key])
+
+        # The bounded queues between the socket and the sinks
+        store = manager.store
+        queues = [(stage, queue) for stage, queue in (
+            ('decode', manager.decode), ('output', manager.output),
+            ('store', store.output if store is not None else None))
+            if queue is not None]
+        dropped = [({'stage': 'iterator', 'policy': 'drop_newest'},
+                    manager.dropped)]
+        for stage, queue in queues:
+            dropped.append(({'stage': stage, 'policy': 'drop_oldest'},
+                            queue.dropped_oldest))
+            dropped.append(({'stage': stage, 'policy': 'drop_newest'},
+                            queue.dropped_newest))
+        exposition.counter(f'{prefix}_dropped_total',
+                           'Datagrams or notifications discarded by a full '
+                           'or closed queue.', dropped)
+        if queues:
+            exposition.counter(f'{prefix}_queue_blocked_total',
+                               'Puts that waited for room in a full queue.',
+                               [({'stage': stage}, queue.blocked)
+                                for stage, queue in queues])
+            exposition.gauge(f'{prefix}_queue_depth', 'Items queued.',
+                             [({'stage': stage}, len(queue))
+                              for stage, queue in queues])
+
+        decode = manager.decode
+        if decode is not None:
+            exposition.gauge(f'{prefix}_decode_queue_max_depth',
+                             'Longest the decode queue has been.',
+                             decode.max_depth)
+            exposition.counter(f'{prefix}_decode_fallbacks_total',
+                               'Datagrams the decode pool left to the '
+                               'event loop.', decode.fallbacks)
+            exposition.histogram(f'{prefix}_decode_queue_wait_seconds',
+                                 'Time datagrams waited in the decode '
+                                 'queue.', decode.wait)
+
+        if manager.decode_latency is not None:
+            exposition.histogram(
+                f'{prefix}_stage_latency_seconds',
+                'Receive-to-decode and decode-to-sink latency of delivered '
+                'notifications.',
+                [({'stage': 'decode'}, manager.decode_latency),
+                 ({'stage': 'deliver'}, manager.deliver_latency)])
+
+        aggregate = manager.aggregate
+        if aggregate is not None:
+            exposition.gauge(f'{prefix}_aggregate_keys',
+                             'Storm keys tracked.', len(aggregate))
+            exposition.counter(f'{prefix}_aggregate_summaries_total',
+                               'Storm summaries delivered.',
+                               aggregate.summaries)
+            exposition.counter(f'{prefix}_aggregate_evicted_total',
+                               'Storm keys evicted from the full table.',
+                               aggregate.evicted)
+            exposition.gauge(f'{prefix}_aggregate_suppression_ratio',
+                             'Share of the notifications collapsed into '
+                             'storm summaries.', aggregate.suppression_ratio)
+
+        correlate = manager.correlate
+        if correlate is not None:
+            exposition.gauge(f'{prefix}_transactions_open',
+                             'Transactions with an incomplete lifecycle '
+                             'being tracked.', len(correlate))
+            exposition.counter(
+                f'{prefix}_transactions_total',
+                'Transactions by how their lifecycle ended.',
+                [({'outcome': outcome}, getattr(correlate, outcome))
+                 for outcome in ('completed', 'failed', 'expired',
+                                 'evicted')])
+            exposition.counter(
+                f'{prefix}_transactions_incomplete_total',
+                'Expired and evicted transactions by first missing stage.',
+                [({'stage': stage}, count)
+                 for stage, count in correlate.incomplete.items()])
+            exposition.histogram(
+                f'{prefix}_transaction_stage_seconds',
+                'Time between lifecycle stages of a transaction.',
+                [({'from': start, 'to': end}, histogram)
+                 for (start, end), histogram
+                 in correlate.durations.items()],
+                bounds=DURATION_BUCKETS)
+
+        if manager.output is not None:
+            exposition.counter(f'{prefix}_output_written_total',
+                               'Notifications written to the output.',
+                               manager.output.written)
+        router = manager.router
+        if router is not None:
+            exposition.counter(f'{prefix}_routed_total',
+                               'Notifications by routing outcome.',
+                               [({'outcome': 'dispatched'}, router.dispatched),
+                                ({'outcome': 'unmatched'}, router.unmatched),
+                                ({'outcome': 'error'}, router.errors)])
+        relay = manager.relay
+        if relay is not None:
+            destinations = relay.stats()['destinations']
+            for key, name, help in RELAY_COUNTERS:
+                exposition.counter(
+                    f'{prefix}_relay_{name}', help,
+                    [({'destination': stats['destination']}, stats[key])
+                     for stats in destinations])
+            exposition.counter(
+                f'{prefix}_relay_dropped_total',
+                'Datagrams discarded by a full relay destination queue.',
+                [({'destination': stats['destination'], 'policy': policy},
+                  stats[key]) for stats in destinations
+                 for policy, key in (('drop_oldest', 'dropped_oldest'),
+                                     ('drop_newest', 'dropped_newest'))])
+            exposition.gauge(
+                f'{prefix}_relay_queue_depth',
+                'Datagrams queued for a relay destination.',
+                [({'destination': stats['destination']}, stats['queued'])
+                 for stats in destinations])
+
+        recent = manager.recent
+        if recent is not None:
+            exposition.gauge(f'{prefix}_recent_notifications',
+                             'Notifications kept in the recent buffer.',
+                             len(recent))
+            exposition.counter(f'{prefix}_recent_evicted_total',
+                               'Notifications evicted from the recent '
+                               'buffer.', recent.evicted)
+    return collect
+
+
+def supervisor_metrics(supervisor, prefix: str = 'snmp_manager'):
+    """
+    Returns a collector of the counters of a ReceiverSupervisor, summed over
+    its workers.
+
+    Args:
+        supervisor (ReceiverSupervisor): The supervisor.
+        prefix (str): Prefix of the metric names, the same as the single
+            manager's by default.
+    """
+    def collect(exposition: Exposition):
+        totals = supervisor.totals()
+        for key, name, help in COUNTERS:
+            exposition.counter(f'{prefix}_{name}', help, totals[key])
+        exposition.counter(f'{prefix}_dropped_total',
+                           'Datagrams or notifications discarded by a full '
+                           'or closed queue.',
+                           [({'stage': 'iterator', 'policy': 'drop_newest'},
+                             totals['dropped'])])
+        exposition.gauge(f'{prefix}_workers_ready',
+                         'Receiver workers bound to the port.',
+                         supervisor.ready)
+        exposition.counter(f'{prefix}_worker_restarts_total',
+                           'Receiver workers restarted.',
+                           supervisor.restarts)
+    return collect
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        try:
+            body = self.server.registry.render().encode()
+        except Exception:
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are not worth a line on stderr each
+        pass
+
+
+class MetricsServer:
+    """
+    Serves a MetricsRegistry at /metrics over HTTP, from a daemon thread.
+
+    Attributes:
+        registry (MetricsRegistry): The metrics served.
+        host (str): Address the server binds.
+        port (int): Port the server listens on, the bound one once started.
+    """
+    def __init__(self, registry: MetricsRegistry, host: str = '127.0.0.1',
+                 port: int = 9163):
+        """
+        Args:
+            registry (MetricsRegistry): The metrics to serve.
+            host (str): Address to bind, loopback by default.
+            port (int): Port to listen on, 0 for any free port.
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """
+        Binds the port and starts serving. Does nothing if already serving.
+        """
+        if self._server is not None:
+            return
+        server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        server.daemon_threads = True
+        server.registry = self.registry
+        self.port = server.server_address[1]
+        self._server = server
+        self._thread = threading.Thread(target=server.serve_forever,
+                                        name='metrics-server', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """
+        Stops serving and closes the socket.
+        """
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
@@ -0,0 +1,407 @@
+"""
+Memory-bounded buffer of the most recently received notifications.
+
+`RecentTraps` keeps the last `capacity` notifications, or fewer when they
+would not fit in `max_bytes`, as compact binary records in a byte arena
+allocated up front. The receive time, source and snmpTrapOID of each record
+are kept in fixed-size arrays beside it. OIDs and source hosts are interned
+to 32-bit ids in bounded tables, and var-bind values are kept as their
+UTF-8 bytes, so no decoded objects are kept alive and memory use does not
+grow however long the manager runs.
+
+Record layout, all integers big-endian:
+
+    version      uint8
+    pdu_type     uint8    0 'trap', 1 'inform'
+    port         uint16   source port
+    count        uint16   number of var-binds
+    host         string
+    trap_OID     string
+    count times:
+        OID      string
+        length   uint32
+        value    `length` bytes, UTF-8
+
+A string is a uint32 id into the interning table, NONE for None, or INLINE
+followed by a uint16 length and the UTF-8 bytes when the table is full.
+
+    recent = RecentTraps(capacity=10000)
+    manager = SNMPManager(recent=recent)
+    ...
+    recent.query(trap_OID='1.3.6.1.4.1.12345', limit=20)
+    async for trap in recent.follow(host='10.0.0.7'):
+        print(trap)
+"""
+import asyncio
+import struct
+from array import array
+from collections import namedtuple
+
+
+INLINE = 0xFFFFFFFF
+NONE = 0xFFFFFFFE
+PDU_TYPES = ('trap', 'inform')
+
+_HEADER = struct.Struct('!BBHH')
+_ID = struct.Struct('!I')
+_OID_LENGTH = struct.Struct('!H')
+_VALUE_LENGTH = struct.Struct('!I')
+_NONE_ID = _ID.pack(NONE)
+_INLINE_ID = _ID.pack(INLINE)
+
+RecentTrap = namedtuple(
+    'RecentTrap',
+    'sequence received host port version pdu_type trap_OID varbinds')
+RecentTrap.__doc__ = """
+A notification read back from a RecentTraps buffer.
+
+Attributes:
+    sequence (int): Position of the notification among every notification
+        added to the buffer, from 0.
+    received (float): Receive time, seconds since the epoch.
+    host (str): Address of the sender.
+    port (int): Port of the sender.
+    version (int): 1 for SNMPv2c, 3 for SNMPv3, 0 for SNMPv1.
+    pdu_type (str): 'trap' or 'inform'.
+    trap_OID (str): The snmpTrapOID.0 value, None if unknown.
+    varbinds (list(tuple(str, str))): (OID, value) pairs.
+"""
+
+
+def _under(oid: str, prefix: str) -> bool:
+    return oid == prefix or oid.startswith(prefix + '.')
+
+
+class _Interner:
+    # Bounded table of strings and their ids. Ids are never reused, a
+    # record may refer to any of them.
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.ids = {}
+        self.values = []
+
+    def pack(self, parts, value):
+        if value is None:
+            parts.append(_NONE_ID)
+            return NONE
+        value_id = self.ids.get(value)
+        if value_id is None:
+            if len(self.values) >= self.maxsize:
+                data = value.encode('utf-8')
+                parts.append(_INLINE_ID)
+                parts.append(_OID_LENGTH.pack(len(data)))
+                parts.append(data)
+                return INLINE
+            value_id = self.ids[value] = len(self.values)
+            self.values.append(value)
+        parts.append(_ID.pack(value_id))
+        return value_id
+
+    def unpack(self, data, offset: int):
+        value_id, = _ID.unpack_from(data, offset)
+        offset += 4
+        if value_id == NONE:
+            return None, offset
+        if value_id == INLINE:
+            length, = _OID_LENGTH.unpack_from(data, offset)
+            offset += 2
+            return bytes(data[offset:offset + length]).decode('utf-8'), \
+                offset + length
+        return self.values[value_id], offset
+
+    def matching(self, predicate):
+        return {value_id for value, value_id in self.ids.items()
+                if predicate(value)}
+
+
+class RecentTraps:
+    """
+    A ring buffer of the last notifications received, bounded both in
+    number and in bytes.
+
+    Notifications are added in arrival order and evicted oldest first,
+    when `capacity` is reached or their record needs the arena space of
+    the oldest ones. Every notification gets a sequence number; entries
+    with sequence numbers from `first` to `added - 1` are in the buffer.
+
+    Attributes:
+        capacity (int): Maximum number of notifications kept.
+        max_bytes (int): Size of the record arena in bytes.
+        added (int): Notifications added since the buffer was created.
+        evicted (int): Notifications evicted to make room.
+        oversized (int): Notifications not added because their record is
+            larger than the arena.
+    """
+    def __init__(self, capacity: int = 10000, max_bytes: int = 4 << 20,
+                 max_OIDs: int = 65536, max_hosts: int = 4096):
+        """
+        Args:
+            capacity (int, optional): Maximum number of notifications kept.
+            max_bytes (int, optional): Size of the record arena in bytes.
+            max_OIDs (int, optional): Maximum number of interned OIDs. OIDs
+                seen after the table is full are stored in the records.
+            max_hosts (int, optional): Maximum number of interned source
+                hosts.
+
+        Raises:
+            ValueError: If `capacity` or `max_bytes` is not positive.
+        """
+        if capacity <= 0:
+            raise ValueError('Argument "capacity" must be positive')
+
+        if max_bytes <= 0:
+            raise ValueError('Argument "max_bytes" must be positive')
+
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.added = 0
+        self.evicted = 0
+        self.oversized = 0
+        self._arena = bytearray(max_bytes)
+        self._received = array('d', bytes(8 * capacity))
+        self._offsets = array('Q', bytes(8 * capacity))
+        self._lengths = array('I', [0]) * capacity
+        self._hosts = array('I', [0]) * capacity
+        self._trap_OIDs = array('I', [0]) * capacity
+        self._count = 0
+        self._head = 0
+        self._OIDs = _Interner(max_OIDs)
+        self._host_names = _Interner(max_hosts)
+        self._waiters = []
+        self._closed = False
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def first(self):
+        """
+        Sequence number of the oldest notification in the buffer.
+        """
+        return self.added - self._count
+
+    def add(self, trap):
+        """
+        Adds a notification, evicting the oldest ones as needed.
+
+        Args:
+            trap (ReceivedTrap): The notification. Its var-binds are read
+                at once.
+
+        Returns:
+            int: The sequence number of the notification, None if it was
+                too large for the arena.
+        """
+        OIDs = self._OIDs
+        varbinds = trap.varbinds
+        parts = [_HEADER.pack(trap.version, trap.pdu_type == 'inform',
+                              trap.address[1], len(varbinds))]
+        host_id = self._host_names.pack(parts, trap.address[0])
+        trap_OID_id = OIDs.pack(parts, trap.trap_OID)
+        for oid, value in varbinds:
+            OIDs.pack(parts, oid)
+            data = value.encode('utf-8')
+            parts.append(_VALUE_LENGTH.pack(len(data)))
+            parts.append(data)
+        record = b''.join(parts)
+        size = len(record)
+        if size > self.max_bytes:
+            self.oversized += 1
+            return None
+
+        if self._count == self.capacity:
+            self._evict()
+        position = self._head
+        if position + size > self.max_bytes:
+            # Wrap around. The records between the head and the end of the
+            # arena are the oldest, they go first to keep the FIFO order.
+            while self._count and \
+                    self._offsets[self.first % self.capacity] >= position:
+                self._evict()
+            position = 0
+        while self._count:
+            slot = self.first % self.capacity
+            offset = self._offsets[slot]
+            if offset >= position + size or \
+                    offset + self._lengths[slot] <= position:
+                break
+            self._evict()
+
+        self._arena[position:position + size] = record
+        sequence = self.added
+        slot = sequence % self.capacity
+        self._received[slot] = trap.received
+        self._offsets[slot] = position
+        self._lengths[slot] = size
+        self._hosts[slot] = host_id
+        self._trap_OIDs[slot] = trap_OID_id
+        self._head = position + size
+        self._count += 1
+        self.added += 1
+
+        if self._waiters:
+            for waiter in self._waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+            self._waiters.clear()
+        return sequence
+
+    def _evict(self):
+        self._count -= 1
+        self.evicted += 1
+
+    def clear(self):
+        """
+        Removes every notification. Sequence numbers keep increasing.
+        """
+        self.evicted += self._count
+        self._count = 0
+        self._head = 0
+
+    def get(self, sequence: int):
+        """
+        Returns a notification by sequence number.
+
+        Args:
+            sequence (int): The sequence number.
+
+        Returns:
+            RecentTrap: The notification, None if it is not in the buffer.
+        """
+        if not self.first <= sequence < self.added:
+            return None
+        return self._decode(sequence)
+
+    def _decode(self, sequence: int):
+        slot = sequence % self.capacity
+        offset = self._offsets[slot]
+        data = memoryview(self._arena)[offset:offset + self._lengths[slot]]
+        version, inform, port, count = _HEADER.unpack_from(data, 0)
+        host, position = self._host_names.unpack(data, _HEADER.size)
+        trap_OID, position = self._OIDs.unpack(data, position)
+        varbinds = []
+        for _ in range(count):
+            oid, position = self._OIDs.unpack(data, position)
+            length, = _VALUE_LENGTH.unpack_from(data, position)
+            position += 4
+            varbinds.append(
+                (oid, bytes(data[position:position + length]).decode('utf-8')))
+            position += length
+        return RecentTrap(sequence, self._received[slot], host, port,
+                          version, PDU_TYPES[inform], trap_OID, varbinds)
+
+    def _varbind_OIDs(self, sequence: int):
+        # The var-bind names of a record, without decoding the values
+        slot = sequence % self.capacity
+        offset = self._offsets[slot]
+        data = memoryview(self._arena)[offset:offset + self._lengths[slot]]
+        count = _HEADER.unpack_from(data, 0)[3]
+        _, position = self._host_names.unpack(data, _HEADER.size)
+        _, position = self._OIDs.unpack(data, position)
+        for _ in range(count):
+            oid, position = self._OIDs.unpack(data, position)
+            yield oid
+            length, = _VALUE_LENGTH.unpack_from(data, position)
+            position += 4 + length
+
+    def query(self, host: str = None, trap_OID: str = None,
+              varbind_OID: str = None, since: float = None,
+              after: int = None, limit: int = None):
+        """
+        Returns the buffered notifications matching every given condition,
+        oldest first.
+
+        Args:
+            host (str, optional): Address of the sender.
+            trap_OID (str, optional): snmpTrapOID, or a prefix of it.
+            varbind_OID (str, optional): Name, or prefix of the name, of one
+                of the var-binds.
+            since (float, optional): Earliest receive time, inclusive.
+            after (int, optional): Only notifications with a greater
+                sequence number.
+            limit (int, optional): Return only the newest `limit` matches.
+
+        Returns:
+            list(RecentTrap): The notifications.
+        """
+        first = self.first
+        if after is not None:
+            first = max(first, after + 1)
+        # Conditions on interned values compare ids, inline values are
+        # compared as strings
+        host_id = None
+        if host is not None:
+            host_id = self._host_names.ids.get(host, INLINE)
+        trap_OID_ids = None
+        if trap_OID is not None:
+            trap_OID_ids = self._OIDs.matching(
+                lambda oid: _under(oid, trap_OID))
+
+        matches = []
+        for sequence in range(self.added - 1, first - 1, -1):
+            if limit is not None and len(matches) >= limit:
+                break
+            slot = sequence % self.capacity
+            if since is not None and self._received[slot] < since:
+                continue
+            if host_id is not None and self._hosts[slot] != host_id:
+                continue
+            if trap_OID_ids is not None and \
+                    self._trap_OIDs[slot] not in trap_OID_ids:
+                if self._trap_OIDs[slot] != INLINE:
+                    continue
+            if varbind_OID is not None and not any(
+                    _under(oid, varbind_OID)
+                    for oid in self._varbind_OIDs(sequence)):
+                continue
+            trap = self._decode(sequence)
+            # Inline values passed the id checks above
+            if (host is not None and trap.host != host) or \
+                    (trap_OID is not None and
+                     (trap.trap_OID is None or
+                      not _under(trap.trap_OID, trap_OID))):
+                continue
+            matches.append(trap)
+        matches.reverse()
+        return matches
+
+    async def follow(self, host: str = None, trap_OID: str = None,
+                     varbind_OID: str = None, after: int = None):
+        """
+        Yields the notifications added from now on that match the given
+        conditions, until `close()` is called. Notifications evicted before
+        the iterator gets to them are skipped.
+
+        Args:
+            host (str, optional): Address of the sender.
+            trap_OID (str, optional): snmpTrapOID, or a prefix of it.
+            varbind_OID (str, optional): Name, or prefix of the name, of one
+                of the var-binds.
+            after (int, optional): Start after this sequence number instead
+                of after the newest notification.
+
+        Yields:
+            RecentTrap: Each matching notification.
+        """
+        cursor = self.added - 1 if after is None else after
+        while not self._closed:
+            if self.added - 1 <= cursor:
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                await waiter
+                continue
+            newest = self.added - 1
+            for trap in self.query(host, trap_OID, varbind_OID,
+                                   after=cursor):
+                yield trap
+            cursor = newest
+
+    def close(self):
+        """
+        Ends every `follow()` iterator. The buffer can still be queried.
+        """
+        self._closed = True
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._waiters.clear()
@@ -0,0 +1,328 @@
+"""
+Relaying received datagrams to downstream collectors.
+
+With a `TrapRelay`, SNMPManager forwards every received datagram to each
+destination as the bytes it arrived as. Nothing is decoded or re-encoded,
+and every destination queues the same bytes object. A destination only looks
+into a datagram when it has a filter rule; the datagram is then decoded
+once, up to its snmpTrapOID (see `commands.trap.lazy`), for every filtering
+destination.
+
+Each destination has its own bounded queue and sender thread, a record-mode
+`BufferedOutput` over a connected UDP socket, so a destination that is slow
+or down holds back neither the others nor the receive path. A destination
+can also forward an evenly spaced fraction of the datagrams (`sample`).
+
+Collectors see the relay as the sender of what it forwards. SNMPv1 traps
+carry the agent address in their PDU, SNMPv2c ones do not.
+
+    relay = TrapRelay([RelayDestination('10.0.0.5', 162),
+                       RelayDestination('10.0.0.6', 162, sample=0.1,
+                                        trap_OIDs=['1.3.6.1.4.1.12345'])])
+    manager = SNMPManager(verbose=False, relay=relay)
+"""
+import socket
+from commands.trap.lazy import decode_header
+from commands.trap.routing import OIDTrie
+from commands.trap.sinks import BufferedOutput
+
+
+def parse_destination(text: str):
+    """
+    Parses a destination given as 'HOST[:PORT][@SAMPLE]', with IPv6 hosts in
+    brackets, e.g. '[::1]:1162@0.5'.
+
+    Args:
+        text (str): The destination.
+
+    Returns:
+        dict: 'host', 'port' (162 by default) and 'sample' (1.0 by
+            default), keyword arguments of RelayDestination.
+
+    Raises:
+        ValueError: If the port or sample is not a number.
+    """
+    address, _, sample = text.partition('@')
+    if address.startswith('['):
+        host, _, port = address[1:].partition(']')
+        port = port[1:]
+    else:
+        host, _, port = address.partition(':')
+    return {'host': host, 'port': int(port) if port else 162,
+            'sample': float(sample) if sample else 1.0}
+
+
+class DatagramSink:
+    """
+    A record sink sending each record, one datagram, over a connected UDP
+    socket.
+
+    Attributes:
+        address (tuple): Address the socket is connected to.
+        sent (int): Datagrams sent.
+        errors (int): Datagrams the socket refused, e.g. after the
+            destination reported its port unreachable.
+    """
+    def __init__(self, host: str, port: int):
+        """
+        Args:
+            host (str): Host name or address of the destination.
+            port (int): UDP port of the destination.
+        """
+        family, _, _, _, address = socket.getaddrinfo(
+            host, port, type=socket.SOCK_DGRAM)[0]
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        self.sock.connect(address)
+        self.address = address
+        self.sent = 0
+        self.errors = 0
+
+    def write(self, batch):
+        send = self.sock.send
+        for data in batch:
+            try:
+                send(data)
+            except OSError:
+                self.errors += 1
+            else:
+                self.sent += 1
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.sock.close()
+
+
+class RelayDestination:
+    """
+    One collector a TrapRelay forwards datagrams to.
+
+    Attributes:
+        name (str): 'host:port' of the destination.
+        sample (float): Fraction of the datagrams forwarded.
+        trap_filter (function): Predicate on the TrapHeader of each
+            datagram, None to forward without looking.
+        sink (DatagramSink): The socket sending to the destination.
+        output (BufferedOutput): Queue and sender thread of the destination.
+        sampled_out (int): Datagrams skipped by sampling.
+        filtered (int): Datagrams rejected by the filter rules, or that are
+            not notifications the header decoder understands.
+    """
+    def __init__(self, host: str, port: int = 162, sample: float = 1.0,
+                 trap_OIDs=None, trap_filter=None, maxsize: int = 10000,
+                 policy: str = 'drop_oldest', batch_size: int = 256):
+        """
+        Args:
+            host (str): Host name or address of the collector.
+            port (int): UDP port of the collector.
+            sample (float): Fraction of the datagrams to forward, above 0
+                and at most 1.
+            trap_OIDs (list(str), optional): Forward only notifications
+                whose snmpTrapOID starts with one of these prefixes.
+            trap_filter (function, optional): Forward only notifications
+                whose TrapHeader it returns True for.
+            maxsize (int): Datagrams queued for the destination.
+            policy (str): What to do when the queue is full, one of
+                `commands.trap.sinks.POLICIES`. Dropping the oldest by
+                default, 'block' would stall the receive path while the
+                destination is slow.
+            batch_size (int): Most datagrams taken from the queue at once.
+
+        Raises:
+            ValueError: If `sample` is out of range, or the queue options
+                are invalid.
+        """
+        if not 0 < sample <= 1:
+            raise ValueError('Argument "sample" must be above 0 and at '
+                             'most 1')
+
+        self.sink = DatagramSink(host, port)
+        try:
+            self.output = BufferedOutput(self.sink, format=None,
+                                         maxsize=maxsize, policy=policy,
+                                         batch_size=batch_size)
+        except ValueError:
+            self.sink.close()
+            raise
+        self.name = f'[{host}]:{port}' if ':' in host else f'{host}:{port}'
+        self.sample = sample
+        self.trap_filter = trap_filter
+        self._prefixes = None
+        if trap_OIDs:
+            self._prefixes = OIDTrie()
+            for prefix in trap_OIDs:
+                self._prefixes.insert(prefix, True)
+        self.sampled_out = 0
+        self.filtered = 0
+        self._credit = 0.0
+
+    @property
+    def decodes(self):
+        """
+        Whether the destination needs the header of each datagram.
+        """
+        return self._prefixes is not None or self.trap_filter is not None
+
+    def accepts(self, header) -> bool:
+        """
+        Applies the filter rules to a datagram's header.
+
+        Args:
+            header (TrapHeader): The header, None for a datagram the header
+                decoder does not understand.
+        """
+        if header is None:
+            return False
+        if self._prefixes is not None and (
+                header.trap_OID is None or
+                not self._prefixes.match(header.trap_OID)):
+            return False
+        return self.trap_filter is None or bool(self.trap_filter(header))
+
+    def put(self, data: bytes, header=None) -> bool:
+        """
+        Queues a datagram for the destination, unless its filter rules or
+        sampling skip it.
+
+        Args:
+            data (bytes): The datagram.
+            header (TrapHeader): Its header when the destination `decodes`.
+
+        Returns:
+            bool: Whether the datagram was queued.
+        """
+        if self.decodes and not self.accepts(header):
+            self.filtered += 1
+            return False
+        if self.sample < 1.0:
+            self._credit += self.sample
+            # With a margin for the rounding of fractions like 0.1
+            if self._credit < 1.0 - 1e-9:
+                self.sampled_out += 1
+                return False
+            self._credit -= 1.0
+        return self.output.put(data)
+
+    def stats(self):
+        """
+        Returns the counters of the destination.
+
+        Returns:
+            dict: Its 'destination' name, 'queued' datagrams, datagrams
+                'sent' and refused ('errors'), 'blocked', 'dropped_oldest'
+                and 'dropped_newest' by the queue, 'sampled_out' and
+                'filtered'.
+        """
+        output = self.output
+        return {
+            'destination': self.name,
+            'queued': len(output),
+            'sent': self.sink.sent,
+            'errors': self.sink.errors,
+            'blocked': output.blocked,
+            'dropped_oldest': output.dropped_oldest,
+            'dropped_newest': output.dropped_newest,
+            'sampled_out': self.sampled_out,
+            'filtered': self.filtered,
+        }
+
+    def flush(self, timeout: float = None) -> bool:
+        return self.output.flush(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """
+        Sends the queued datagrams and closes the socket.
+        """
+        self.output.close(timeout)
+
+
+class TrapRelay:
+    """
+    Forwards received datagrams to every destination.
+
+    Attributes:
+        destinations (list(RelayDestination)): Where datagrams go.
+        relayed (int): Datagrams handed to `forward()`.
+    """
+    def __init__(self, destinations):
+        """
+        Args:
+            destinations (list(RelayDestination)): Where datagrams go.
+
+        Raises:
+            ValueError: If there are no destinations.
+        """
+        self.destinations = list(destinations)
+        if not self.destinations:
+            raise ValueError('Argument "destinations" cannot be empty')
+        self.relayed = 0
+        self._decodes = any(destination.decodes
+                            for destination in self.destinations)
+
+    def forward(self, data: bytes):
+        """
+        Queues a datagram for every destination that takes it.
+
+        Args:
+            data (bytes): The datagram, as received.
+        """
+        self.relayed += 1
+        header = None
+        if self._decodes:
+            try:
+                header = decode_header(data)
+            except ValueError:
+                pass
+        for destination in self.destinations:
+            destination.put(data, header)
+
+    def stats(self):
+        """
+        Returns the counters of the relay.
+
+        Returns:
+            dict: Datagrams 'relayed', and the stats of each of the
+                'destinations'.
+        """
+        return {
+            'relayed': self.relayed,
+            'destinations': [destination.stats()
+                             for destination in self.destinations],
+        }
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Waits until every destination has sent what was queued so far.
+
+        Returns:
+            bool: False if the timeout expired first for a destination.
+        """
+        return all([destination.flush(timeout)
+                    for destination in self.destinations])
+
+    def close(self, timeout: float = 5.0):
+        """
+        Sends the queued datagrams and closes every destination.
+        """
+        for destination in self.destinations:
+            destination.close(timeout)
+
+
+def open_relay(destinations, maxsize: int = 10000,
+               policy: str = 'drop_oldest'):
+    """
+    Returns a TrapRelay to destinations given as text.
+
+    Args:
+        destinations (list(str)): 'HOST[:PORT][@SAMPLE]' of each destination,
+            see `parse_destination()`.
+        maxsize (int): Datagrams queued per destination.
+        policy (str): What to do when a destination's queue is full.
+
+    Returns:
+        TrapRelay: The relay.
+    """
+    return TrapRelay([RelayDestination(maxsize=maxsize, policy=policy,
+                                       **parse_destination(destination))
+                      for destination in destinations])
@@ -0,0 +1,275 @@
+"""
+Routing of received notifications to handlers by OID prefix.
+
+Handlers register on a prefix of the snmpTrapOID or of var-bind names.
+Prefixes are kept in a trie keyed on integer OID arcs, so finding every
+route matching an OID walks at most one node per arc of the OID, however
+many routes are registered. Prefixes match whole arcs only: '1.3.6.1.4.1.1'
+matches '1.3.6.1.4.1.1.5' but not '1.3.6.1.4.1.12345'.
+
+    router = TrapRouter()
+    router.add('1.3.6.1.4.1.12345.1', on_settlement)
+    router.add('1.3.6.1.2.1.2.2.1', on_interface, on='varbind')
+    manager = SNMPManager(router=router)
+"""
+from collections import namedtuple
+
+
+# Received OIDs repeat from one notification to the next, so parsed OIDs are
+# memoized. The cache is emptied when full.
+OID_CACHE_SIZE = 4096
+_arcs = {}
+
+# Key of the routes list in a trie node, next to the integer arcs
+_ROUTES = None
+
+Route = namedtuple('Route', 'prefix handler on')
+Route.__doc__ = """
+A registered route.
+
+Attributes:
+    prefix (tuple(int)): The OID prefix, as integer arcs.
+    handler (function): Called with each matching ReceivedTrap.
+    on (str): 'trap_OID' or 'varbind'.
+"""
+
+
+def parse_oid(oid):
+    """
+    Returns the arcs of an OID.
+
+    Args:
+        oid (str | tuple(int)): A dotted OID such as '1.3.6.1', optionally
+            with a leading dot, or its arcs. '' is the empty prefix.
+
+    Returns:
+        tuple(int): The arcs.
+
+    Raises:
+        ValueError: If an arc is not a non-negative integer.
+    """
+    if not isinstance(oid, str):
+        arcs = tuple(oid)
+        if not all(isinstance(arc, int) and arc >= 0 for arc in arcs):
+            raise ValueError(f'Invalid OID {oid!r}')
+        return arcs
+    arcs = _arcs.get(oid)
+    if arcs is not None:
+        return arcs
+    text = oid[1:] if oid.startswith('.') else oid
+    if not text:
+        return ()
+    parts = text.split('.')
+    if not all(part.isdigit() and part.isascii() for part in parts):
+        raise ValueError(f'Invalid OID "{oid}"')
+    arcs = tuple(map(int, parts))
+    if len(_arcs) >= OID_CACHE_SIZE:
+        _arcs.clear()
+    _arcs[oid] = arcs
+    return arcs
+
+
+class OIDTrie:
+    """
+    A map from OID prefixes to values, finding every prefix of an OID in
+    O(number of arcs).
+
+    Each node is a dict from the next arc to the child node; the values
+    registered on the node's prefix are kept under the key None.
+    """
+    def __init__(self):
+        self._root = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def insert(self, prefix, value):
+        """
+        Adds a value on a prefix. A prefix can hold several values.
+
+        Args:
+            prefix (str | tuple(int)): The OID prefix.
+            value: The value.
+        """
+        node = self._root
+        for arc in parse_oid(prefix):
+            child = node.get(arc)
+            if child is None:
+                child = node[arc] = {}
+            node = child
+        node.setdefault(_ROUTES, []).append(value)
+        self._size += 1
+
+    def remove(self, prefix, value) -> bool:
+        """
+        Removes a value from a prefix, and the nodes left empty.
+
+        Args:
+            prefix (str | tuple(int)): The OID prefix.
+            value: The value, compared by equality.
+
+        Returns:
+            bool: False if the value was not on the prefix.
+        """
+        path = [self._root]
+        arcs = parse_oid(prefix)
+        for arc in arcs:
+            node = path[-1].get(arc)
+            if node is None:
+                return False
+            path.append(node)
+        values = path[-1].get(_ROUTES)
+        if not values or value not in values:
+            return False
+        values.remove(value)
+        if not values:
+            del path[-1][_ROUTES]
+        # Prune the branch up to the first node still in use
+        for depth in range(len(arcs), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][arcs[depth - 1]]
+        self._size -= 1
+        return True
+
+    def match(self, oid):
+        """
+        Returns the values of every prefix of an OID, longest prefix first.
+
+        Args:
+            oid (str | tuple(int)): The OID.
+
+        Returns:
+            list: The values, in insertion order within a prefix.
+        """
+        node = self._root
+        found = node.get(_ROUTES)
+        matched = [found] if found else []
+        for arc in parse_oid(oid):
+            node = node.get(arc)
+            if node is None:
+                break
+            found = node.get(_ROUTES)
+            if found:
+                matched.append(found)
+        return [value for values in reversed(matched) for value in values]
+
+
+class TrapRouter:
+    """
+    Dispatches notifications to the handlers of the routes they match.
+
+    A notification matches the 'trap_OID' routes on prefixes of its
+    snmpTrapOID and the 'varbind' routes on prefixes of any of its var-bind
+    names. Every matching handler is called once per notification,
+    snmpTrapOID routes first, longer prefixes before shorter ones. Var-binds
+    are only read when 'varbind' routes exist, so in lazy mode routing on
+    the snmpTrapOID alone does not decode them.
+
+    A handler that raises is counted in `errors` and does not stop the
+    other handlers.
+
+    Attributes:
+        dispatched (int): Notifications that matched at least one route.
+        unmatched (int): Notifications that matched no route.
+        errors (int): Handler calls that raised.
+    """
+    ON = ('trap_OID', 'varbind')
+
+    def __init__(self):
+        self._tries = {on: OIDTrie() for on in self.ON}
+        self.dispatched = 0
+        self.unmatched = 0
+        self.errors = 0
+
+    def __len__(self):
+        return sum(len(trie) for trie in self._tries.values())
+
+    def add(self, prefix, handler, on: str = 'trap_OID') -> Route:
+        """
+        Registers a handler on an OID prefix.
+
+        Args:
+            prefix (str | tuple(int)): The OID prefix.
+            handler (function): Called with each matching ReceivedTrap.
+            on (str, optional): 'trap_OID' to match the snmpTrapOID
+                (default), 'varbind' to match var-bind names.
+
+        Returns:
+            Route: The route, for `remove()`.
+
+        Raises:
+            ValueError: If `on` is unknown or `prefix` is not a valid OID.
+        """
+        if on not in self._tries:
+            raise ValueError(f'Unknown route target "{on}"')
+
+        route = Route(parse_oid(prefix), handler, on)
+        self._tries[on].insert(route.prefix, route)
+        return route
+
+    def route(self, prefix, on: str = 'trap_OID'):
+        """
+        Decorator registering the decorated function on an OID prefix.
+        """
+        def register(handler):
+            self.add(prefix, handler, on)
+            return handler
+        return register
+
+    def remove(self, route: Route) -> bool:
+        """
+        Unregisters a route returned by `add()`.
+
+        Returns:
+            bool: False if the route was not registered.
+        """
+        return self._tries[route.on].remove(route.prefix, route)
+
+    def match(self, trap):
+        """
+        Returns the routes a notification matches, in dispatch order.
+
+        Args:
+            trap (ReceivedTrap): The notification.
+
+        Returns:
+            list(Route): The matching routes, each handler once.
+        """
+        routes = []
+        trap_OID = trap.trap_OID
+        if trap_OID is not None:
+            routes = self._tries['trap_OID'].match(trap_OID)
+        varbind_trie = self._tries['varbind']
+        if len(varbind_trie):
+            for oid, _ in trap.varbinds:
+                routes.extend(varbind_trie.match(oid))
+        if len(routes) > 1:
+            seen = set()
+            routes = [route for route in routes
+                      if route.handler not in seen and
+                      not seen.add(route.handler)]
+        return routes
+
+    def dispatch(self, trap) -> int:
+        """
+        Calls the handler of every route a notification matches.
+
+        Args:
+            trap (ReceivedTrap): The notification.
+
+        Returns:
+            int: The number of handlers called.
+        """
+        routes = self.match(trap)
+        if not routes:
+            self.unmatched += 1
+            return 0
+        self.dispatched += 1
+        for route in routes:
+            try:
+                route.handler(trap)
+            except Exception:
+                self.errors += 1
+        return len(routes)
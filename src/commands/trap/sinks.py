@@ -0,0 +1,496 @@
+"""
+Buffered output of received notifications.
+
+Writing every var-bind to stdout from the receive callback makes the
+terminal the throughput limit and blocks the event loop on each write.
+`BufferedOutput` instead takes notifications into a bounded queue, and a
+background thread formats them and writes them to a sink in batches,
+flushing the sink once enough bytes are pending or enough time has passed.
+
+Notifications are formatted as the manager has always printed them
+('text') or as one JSON object per line ('ndjson'), and written to a stream
+(`StreamSink`, stdout by default) or to a size-rotated file
+(`RotatingFileSink`).
+
+When the queue is full, `put()` follows the queue's policy:
+
+    block        wait for the writer to make room (nothing is lost, the
+                 receive path slows down to the speed of the sink)
+    drop_oldest  discard the oldest queued notification
+    drop_newest  discard the notification being put
+
+'drop_oldest' is the default: `put()` runs on the event loop, and blocking
+it would stall the receive path, and every timer, until the writer caught
+up.
+
+Each case is counted in `blocked`, `dropped_oldest` and `dropped_newest`.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+
+POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+
+def format_text(trap):
+    """
+    Formats a notification as the manager prints it.
+
+    Args:
+        trap (ReceivedTrap): The notification.
+
+    Returns:
+        str: The header line, for a TrapSummary a line with its count and
+            time span, 'Var-binds:' and one 'OID = value' line per var-bind.
+    """
+    lines = ["Notification message from {}:{}: ".format(
+        trap.domain, trap.address)]
+    count = getattr(trap, 'count', None)
+    if count is not None:
+        lines.append(f"Repeated {count} times from {trap.first_seen:.3f} "
+                     f"to {trap.last_seen:.3f}")
+    lines.append("Var-binds:")
+    lines.extend(f"{oid} = {val}" for oid, val in trap.varbinds)
+    lines.append("")
+    return "\n".join(lines)
+
+
+def format_ndjson(trap):
+    """
+    Formats a notification as one line of JSON.
+
+    Args:
+        trap (ReceivedTrap): The notification.
+
+    Returns:
+        str: An object with the 'received' time, sender 'host' and 'port',
+            'version', 'pdu_type' and the 'varbinds' as [OID, value] pairs,
+            followed by a newline. A TrapSummary also has its 'count',
+            'first_seen' and 'last_seen'.
+    """
+    record = {
+        "received": trap.received,
+        "host": trap.address[0],
+        "port": trap.address[1],
+        "version": trap.version,
+        "pdu_type": trap.pdu_type,
+        "varbinds": trap.varbinds,
+    }
+    count = getattr(trap, 'count', None)
+    if count is not None:
+        record["count"] = count
+        record["first_seen"] = trap.first_seen
+        record["last_seen"] = trap.last_seen
+    return json.dumps(record, separators=(',', ':')) + "\n"
+
+
+FORMATS = {'text': format_text, 'ndjson': format_ndjson}
+
+
+class StreamSink:
+    """
+    Writes to a text stream, stdout by default. The stream is flushed but
+    never closed.
+
+    Attributes:
+        stream (TextIO): The stream written to.
+    """
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdout
+
+    def write(self, text: str):
+        self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+
+
+class RotatingFileSink:
+    """
+    Appends to a file, rotating it once it would grow past `max_bytes`:
+    `path` is renamed to `path.1`, `path.1` to `path.2` and so on, and the
+    oldest beyond `backups` is deleted.
+
+    Attributes:
+        path (str): Path of the current file.
+        max_bytes (int): Size at which the file is rotated, None to never
+            rotate.
+        backups (int): Number of rotated files kept.
+        rotations (int): Number of rotations done by this sink.
+    """
+    def __init__(self, path: str, max_bytes: int = 64 << 20,
+                 backups: int = 5, buffer_size: int = 1 << 16):
+        """
+        Args:
+            path (str): Path of the file.
+            max_bytes (int, optional): Size at which the file is rotated,
+                None to never rotate.
+            backups (int, optional): Number of rotated files kept.
+            buffer_size (int, optional): Size of the write buffer in bytes.
+
+        Raises:
+            ValueError: If `max_bytes` is not positive or `backups` is
+                negative.
+        """
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError('Argument "max_bytes" must be positive')
+
+        if backups < 0:
+            raise ValueError('Argument "backups" must not be negative')
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.rotations = 0
+        self._buffer_size = buffer_size
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, 'ab', buffering=self._buffer_size)
+        self._size = self._file.tell()
+
+    def write(self, text: str):
+        data = text.encode('utf-8')
+        if self.max_bytes is not None and self._size and \
+                self._size + len(data) > self.max_bytes:
+            self.rotate()
+        self._file.write(data)
+        self._size += len(data)
+
+    def rotate(self):
+        """
+        Closes the current file, shifts the rotated files and reopens an
+        empty file at `path`.
+        """
+        self._file.close()
+        if self.backups:
+            for index in range(self.backups - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+        self._open()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class BufferedOutput:
+    """
+    A bounded queue of notifications drained by a background writer thread.
+
+    The writer takes up to `batch_size` notifications at a time, formats
+    them and hands them to the sink in a single write. The sink is flushed
+    when `flush_bytes` are pending, `flush_interval` seconds after the
+    first pending write, and on `flush()` and `close()`. The thread is
+    started by the first `put()`.
+
+    Formatting happens on the writer thread, so the var-binds of lazily
+    decoded notifications are decoded there too.
+
+    With `format` None the sink is a record sink, such as the writer of a
+    `commands.trap.store.TrapStore`: its write() gets the list of
+    notifications itself and may return how many of them it skipped, and
+    `flush_bytes` counts notifications.
+
+    Attributes:
+        sink (StreamSink | RotatingFileSink): Where notifications are
+            written.
+        formatter (function): Returns the text of one notification, None
+            for a record sink.
+        maxsize (int): Maximum number of queued notifications.
+        policy (str): What `put()` does when the queue is full, one of
+            POLICIES.
+        batch_size (int): Maximum number of notifications per write.
+        flush_bytes (int): Pending bytes that trigger a flush.
+        flush_interval (float): Maximum seconds a write stays unflushed.
+        written (int): Notifications written to the sink.
+        batches (int): Writes made to the sink.
+        flushes (int): Flushes of the sink.
+        blocked (int): `put()` calls that had to wait for room.
+        dropped_oldest (int): Queued notifications discarded for newer ones.
+        dropped_newest (int): Notifications discarded by `put()`.
+        errors (int): Notifications that could not be formatted or written.
+    """
+    def __init__(self, sink=None, format='text', maxsize: int = 10000,
+                 policy: str = 'drop_oldest', batch_size: int = 256,
+                 flush_bytes: int = 1 << 16, flush_interval: float = 0.2):
+        """
+        Args:
+            sink (StreamSink | RotatingFileSink, optional): Where
+                notifications are written, stdout by default.
+            format (str | function, optional): 'text', 'ndjson', a
+                function returning the text of a notification, or None to
+                write the notifications themselves to a record sink.
+            maxsize (int, optional): Maximum number of queued
+                notifications.
+            policy (str, optional): 'drop_oldest' (the default), 'block'
+                or 'drop_newest'.
+            batch_size (int, optional): Maximum notifications per write.
+            flush_bytes (int, optional): Pending bytes that trigger a flush.
+            flush_interval (float, optional): Maximum seconds a write stays
+                unflushed.
+
+        Raises:
+            ValueError: If `format` or `policy` is unknown, or `maxsize` or
+                `batch_size` is not positive.
+        """
+        if format is None or callable(format):
+            formatter = format
+        elif format in FORMATS:
+            formatter = FORMATS[format]
+        else:
+            raise ValueError(f'Unknown output format "{format}"')
+
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown queue policy "{policy}"')
+
+        if maxsize <= 0:
+            raise ValueError('Argument "maxsize" must be positive')
+
+        if batch_size <= 0:
+            raise ValueError('Argument "batch_size" must be positive')
+
+        self.sink = sink if sink is not None else StreamSink()
+        self.formatter = formatter
+        self.maxsize = maxsize
+        self.policy = policy
+        self.batch_size = batch_size
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.batches = 0
+        self.flushes = 0
+        self.blocked = 0
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+        self.errors = 0
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._flush_requested = False
+        # Sequence numbers of the last queued and the last flushed
+        # notification, for `flush()`
+        self._queued = 0
+        self._flushed = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    @property
+    def dropped(self):
+        return self.dropped_oldest + self.dropped_newest
+
+    def stats(self):
+        """
+        Returns the counters of the output.
+
+        Returns:
+            dict: 'queued' notifications not yet written, and the 'written',
+                'batches', 'flushes', 'blocked', 'dropped_oldest',
+                'dropped_newest' and 'errors' counters.
+        """
+        return {
+            'queued': len(self._queue),
+            'written': self.written,
+            'batches': self.batches,
+            'flushes': self.flushes,
+            'blocked': self.blocked,
+            'dropped_oldest': self.dropped_oldest,
+            'dropped_newest': self.dropped_newest,
+            'errors': self.errors,
+        }
+
+    def put(self, trap) -> bool:
+        """
+        Queues a notification for writing.
+
+        Args:
+            trap (ReceivedTrap): The notification.
+
+        Returns:
+            bool: False if the notification was discarded, because the
+                queue is full under the 'drop_newest' policy or the output
+                is closed.
+        """
+        with self._condition:
+            if self._closed:
+                self.dropped_newest += 1
+                return False
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='trap-output', daemon=True)
+                self._thread.start()
+            queue = self._queue
+            if len(queue) >= self.maxsize:
+                if self.policy == 'drop_newest':
+                    self.dropped_newest += 1
+                    return False
+                if self.policy == 'drop_oldest':
+                    queue.popleft()
+                    self.dropped_oldest += 1
+                else:
+                    self.blocked += 1
+                    while len(queue) >= self.maxsize and not self._closed:
+                        self._condition.wait()
+                    if self._closed:
+                        self.dropped_newest += 1
+                        return False
+            queue.append(trap)
+            self._queued += 1
+            self._condition.notify_all()
+            return True
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Waits until every notification queued so far is written and the
+        sink flushed.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait.
+
+        Returns:
+            bool: False if the timeout expired first.
+        """
+        with self._condition:
+            target = self._queued
+            self._flush_requested = True
+            self._condition.notify_all()
+            return self._condition.wait_for(
+                lambda: self._flushed >= target or self._thread is None,
+                timeout)
+
+    def close(self, timeout: float = 5.0):
+        """
+        Writes the queued notifications, flushes and closes the sink, and
+        stops the writer thread. Notifications put afterwards are
+        discarded.
+
+        Args:
+            timeout (float): Maximum seconds to wait for the writer.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        try:
+            self.sink.close()
+        except (OSError, ValueError):
+            self.errors += 1
+
+    def _run(self):
+        condition = self._condition
+        queue = self._queue
+        pending = 0
+        deadline = None
+        while True:
+            with condition:
+                while not queue and not self._closed and \
+                        not self._flush_requested:
+                    if deadline is None:
+                        condition.wait()
+                        continue
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    condition.wait(remaining)
+                batch = [queue.popleft()
+                         for _ in range(min(len(queue), self.batch_size))]
+                # Sequence number of the last notification taken
+                sequence = self._queued - len(queue)
+                requested = self._flush_requested and not queue
+                if requested:
+                    self._flush_requested = False
+                closing = self._closed and not queue
+                # Make room for producers blocked on a full queue
+                condition.notify_all()
+
+            if batch:
+                pending += self._write(batch)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if pending and (pending >= self.flush_bytes or closing or
+                            requested or time.monotonic() >= deadline):
+                try:
+                    self.sink.flush()
+                except (OSError, ValueError):
+                    self.errors += 1
+                self.flushes += 1
+                pending = 0
+                deadline = None
+            if not pending:
+                with condition:
+                    self._flushed = sequence
+                    condition.notify_all()
+            if closing:
+                return
+
+    def _write(self, batch):
+        if self.formatter is None:
+            try:
+                skipped = self.sink.write(batch) or 0
+            except Exception:
+                # Including a sink failing on a malformed notification: the
+                # writer thread must outlive it, or the queue never drains
+                self.errors += len(batch)
+                return 0
+            self.errors += skipped
+            self.written += len(batch) - skipped
+            self.batches += 1
+            return len(batch)
+
+        chunks = []
+        for trap in batch:
+            try:
+                chunks.append(self.formatter(trap))
+            except Exception:
+                # A lazily decoded notification whose var-binds turn out
+                # to be malformed
+                self.errors += 1
+        text = "".join(chunks)
+        try:
+            self.sink.write(text)
+        except (OSError, ValueError):
+            self.errors += len(chunks)
+            return 0
+        self.written += len(chunks)
+        self.batches += 1
+        return len(text)
+
+
+def open_output(format='text', path: str = None, max_bytes: int = 64 << 20,
+                backups: int = 5, **options):
+    """
+    Creates a BufferedOutput writing to stdout or to a rotating file.
+
+    Args:
+        format (str, optional): 'text' or 'ndjson'.
+        path (str, optional): Path of the output file, None for stdout.
+        max_bytes (int, optional): Size at which the file is rotated.
+        backups (int, optional): Number of rotated files kept.
+        **options: Other keyword arguments for BufferedOutput.
+
+    Returns:
+        BufferedOutput: The output.
+    """
+    sink = StreamSink() if path is None else \
+        RotatingFileSink(path, max_bytes, backups)
+    return BufferedOutput(sink, format, **options)
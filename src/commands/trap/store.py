@@ -0,0 +1,426 @@
+"""
+Persistent store of received notifications.
+
+Notifications are appended to time segments, one SQLite database in WAL
+mode per `segment_seconds` of receive time, named after the segment start:
+
+    traps/traps-1704067200.db
+    traps/traps-1704070800.db
+
+Writes go through a `BufferedOutput` in record mode, so the receive path
+only queues the notification; a background thread inserts the queued
+notifications a batch at a time and commits once per flush. Each segment
+indexes receive time, source host, snmpTrapOID and var-bind names, and
+`TrapStore.query()` only opens the segments overlapping the requested time
+range. Retention deletes whole segment files, never rows. A storm summary
+(see `commands.trap.aggregate`) is stored as one row with its count.
+
+    store = TrapStore('traps', retention=7 * 86400)
+    manager = SNMPManager(store=store)
+    ...
+    store.query(start=time.time() - 60, trap_OID='1.3.6.1.4.1.12345')
+"""
+import json
+import os
+import re
+import sqlite3
+import time
+from collections import namedtuple
+from urllib.parse import quote
+from agents.raw import SNMP_TRAP_OID
+from commands.trap.sinks import BufferedOutput
+
+
+SEGMENT_NAME = 'traps-{:010d}.db'
+SEGMENT_PATTERN = re.compile(r'traps-(\d{10})\.db$')
+# Var-binds of every notification that are not worth indexing
+UNINDEXED_OIDS = frozenset(('1.3.6.1.2.1.1.3.0', SNMP_TRAP_OID))
+
+_encode_varbinds = json.JSONEncoder(separators=(',', ':'),
+                                    check_circular=False).encode
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS traps (
+    id INTEGER PRIMARY KEY,
+    received REAL NOT NULL,
+    host TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    pdu_type TEXT NOT NULL,
+    trap_oid TEXT,
+    shape_id INTEGER NOT NULL,
+    varbinds TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS names (
+    id INTEGER PRIMARY KEY,
+    oid TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS shapes (
+    id INTEGER PRIMARY KEY,
+    names TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS shape_names (
+    name_id INTEGER NOT NULL,
+    shape_id INTEGER NOT NULL,
+    PRIMARY KEY (name_id, shape_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS traps_received ON traps (received);
+CREATE INDEX IF NOT EXISTS traps_host ON traps (host, received);
+CREATE INDEX IF NOT EXISTS traps_trap_oid ON traps (trap_oid, received);
+CREATE INDEX IF NOT EXISTS traps_shape ON traps (shape_id, received);
+"""
+
+StoredTrap = namedtuple(
+    'StoredTrap',
+    'received host port version pdu_type trap_OID varbinds count',
+    defaults=(1,))
+StoredTrap.__doc__ = """
+A notification read back from a TrapStore.
+
+Attributes:
+    received (float): Receive time, seconds since the epoch.
+    host (str): Address of the sender.
+    port (int): Port of the sender.
+    version (int): 1 for SNMPv2c, 3 for SNMPv3, 0 for SNMPv1.
+    pdu_type (str): 'trap' or 'inform'.
+    trap_OID (str): The snmpTrapOID.0 value, None if unknown.
+    varbinds (list(tuple(str, str))): (OID, value) pairs.
+    count (int): Notifications the row stands for, more than 1 for a storm
+        summary received at the time of the last of them.
+"""
+
+
+def _prefix_condition(column: str, prefix: str):
+    # An OID or its subtree, as a range the column index can serve: the
+    # OIDs under 'P' sort between 'P.' and 'P/'
+    return (f"({column} = ? OR ({column} > ? AND {column} < ?))",
+            [prefix, prefix + '.', prefix + '/'])
+
+
+class _SegmentWriter:
+    """
+    Record sink of a TrapStore, used by its writer thread only.
+
+    Notifications of one type carry the same var-bind names, so rather than
+    indexing every var-bind, each segment records every distinct list of
+    names (a shape) once, with its names in `shape_names`, and each
+    notification refers to its shape.
+    """
+    def __init__(self, store):
+        self.store = store
+        self._connections = {}
+        self._next_ids = {}
+        self._shapes = {}
+
+    def _connection(self, start: int):
+        connection = self._connections.get(start)
+        if connection is not None:
+            return connection
+        # Notifications arrive in time order, so only the newest segments
+        # need to stay open
+        while len(self._connections) >= 2:
+            oldest = min(self._connections)
+            del self._shapes[oldest]
+            connection = self._connections.pop(oldest)
+            connection.commit()
+            connection.close()
+        connection = sqlite3.connect(self.store.segment_path(start),
+                                     check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(SCHEMA)
+        self._next_ids[start] = connection.execute(
+            'SELECT COALESCE(MAX(id), 0) + 1 FROM traps').fetchone()[0]
+        self._load_shapes(start, connection)
+        self._connections[start] = connection
+        self.store.apply_retention(keep=self._connections)
+        return connection
+
+    def _load_shapes(self, start: int, connection):
+        self._shapes[start] = {
+            tuple(names.split('\n')): shape_id for names, shape_id
+            in connection.execute('SELECT names, id FROM shapes')}
+
+    def _add_shape(self, start: int, connection, shape):
+        shape_id = connection.execute(
+            'INSERT INTO shapes (names) VALUES (?)',
+            ('\n'.join(shape),)).lastrowid
+        for oid in set(shape) - UNINDEXED_OIDS:
+            connection.execute('INSERT OR IGNORE INTO names (oid) VALUES (?)',
+                               (oid,))
+            connection.execute(
+                'INSERT INTO shape_names SELECT id, ? FROM names '
+                'WHERE oid = ?', (shape_id, oid))
+        self._shapes[start][shape] = shape_id
+        return shape_id
+
+    def write(self, batch):
+        """
+        Inserts a batch of notifications.
+
+        Returns:
+            int: Notifications skipped because their var-binds could not be
+                decoded.
+        """
+        store = self.store
+        skipped = 0
+        segments = {}
+        for trap in batch:
+            segments.setdefault(store.segment_start(trap.received),
+                                []).append(trap)
+        for start, traps in segments.items():
+            connection = self._connection(start)
+            shapes = self._shapes[start]
+            trap_id = self._next_ids[start]
+            rows = []
+            try:
+                for trap in traps:
+                    try:
+                        varbinds = trap.varbinds
+                    except ValueError:
+                        # Lazily decoded, with malformed var-binds
+                        skipped += 1
+                        continue
+                    shape = tuple([oid for oid, _ in varbinds])
+                    shape_id = shapes.get(shape)
+                    if shape_id is None:
+                        shape_id = self._add_shape(start, connection, shape)
+                    rows.append((trap_id, trap.received, trap.address[0],
+                                 trap.address[1], trap.version,
+                                 trap.pdu_type, trap.trap_OID, shape_id,
+                                 _encode_varbinds(varbinds),
+                                 getattr(trap, 'count', 1)))
+                    trap_id += 1
+                connection.executemany(
+                    'INSERT INTO traps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    rows)
+            except sqlite3.Error as error:
+                connection.rollback()
+                # Shapes added since the last commit are rolled back too
+                self._load_shapes(start, connection)
+                raise OSError(f'Cannot write to trap store: {error}') \
+                    from error
+            self._next_ids[start] = trap_id
+        return skipped
+
+    def flush(self):
+        for connection in self._connections.values():
+            connection.commit()
+
+    def close(self):
+        for connection in self._connections.values():
+            connection.commit()
+            connection.close()
+        self._connections.clear()
+
+
+class TrapStore:
+    """
+    A directory of time-segmented SQLite databases of notifications.
+
+    Attributes:
+        directory (str): Directory holding the segments.
+        segment_seconds (int): Receive time covered by each segment.
+        retention (float): Seconds of notifications kept, None to keep
+            every segment.
+        output (BufferedOutput): Queue and writer thread of the store.
+        clock (function): Returns the current time, seconds since the
+            epoch.
+    """
+    def __init__(self, directory: str, segment_seconds: int = 3600,
+                 retention: float = None, maxsize: int = 100000,
+                 policy: str = 'block', batch_size: int = 2048,
+                 flush_interval: float = 0.5, clock=time.time):
+        """
+        Args:
+            directory (str): Directory holding the segments, created if
+                missing.
+            segment_seconds (int, optional): Receive time covered by each
+                segment.
+            retention (float, optional): Seconds of notifications kept.
+                Older segments are deleted as new ones are started and by
+                `apply_retention()`.
+            maxsize (int, optional): Maximum number of notifications waiting
+                to be written.
+            policy (str, optional): What `put()` does while the queue is
+                full: 'block', 'drop_oldest' or 'drop_newest'.
+            batch_size (int, optional): Maximum notifications inserted at a
+                time.
+            flush_interval (float, optional): Maximum seconds before written
+                notifications are committed.
+            clock (function, optional): Returns the current time in seconds
+                since the epoch.
+
+        Raises:
+            ValueError: If `segment_seconds` or `retention` is not positive.
+        """
+        if segment_seconds <= 0:
+            raise ValueError('Argument "segment_seconds" must be positive')
+
+        if retention is not None and retention <= 0:
+            raise ValueError('Argument "retention" must be positive')
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_seconds = int(segment_seconds)
+        self.retention = retention
+        self.clock = clock
+        self.output = BufferedOutput(
+            _SegmentWriter(self), None, maxsize, policy, batch_size,
+            flush_bytes=batch_size * 8, flush_interval=flush_interval)
+        self.apply_retention()
+
+    def segment_start(self, timestamp: float) -> int:
+        return int(timestamp) // self.segment_seconds * self.segment_seconds
+
+    def segment_path(self, start: int) -> str:
+        return os.path.join(self.directory, SEGMENT_NAME.format(start))
+
+    def segments(self):
+        """
+        Returns the segments in the directory, oldest first.
+
+        Returns:
+            list(int): The start time of each segment.
+        """
+        starts = []
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                starts.append(int(match.group(1)))
+        return sorted(starts)
+
+    def put(self, trap) -> bool:
+        """
+        Queues a notification for writing.
+
+        Args:
+            trap (ReceivedTrap): The notification.
+
+        Returns:
+            bool: False if it was discarded because the queue is full.
+        """
+        return self.output.put(trap)
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Waits until every notification queued so far is committed.
+
+        Returns:
+            bool: False if the timeout expired first.
+        """
+        return self.output.flush(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """
+        Commits the queued notifications and closes the segments.
+        """
+        self.output.close(timeout)
+
+    def apply_retention(self, keep=()):
+        """
+        Deletes the segments that end before the retention period.
+
+        Args:
+            keep (iterable(int), optional): Segments not to delete, e.g.
+                those open for writing.
+
+        Returns:
+            int: The number of segments deleted.
+        """
+        if self.retention is None:
+            return 0
+        oldest = self.clock() - self.retention
+        deleted = 0
+        for start in self.segments():
+            if start + self.segment_seconds > oldest or start in keep:
+                continue
+            path = self.segment_path(start)
+            for suffix in ('-wal', '-shm', ''):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+            deleted += 1
+        return deleted
+
+    def query(self, start: float = None, end: float = None,
+              host: str = None, trap_OID: str = None,
+              varbind_OID: str = None, limit: int = None):
+        """
+        Returns the stored notifications matching every given condition, in
+        receive order. Notifications not yet committed are not returned,
+        see `flush()`.
+
+        Args:
+            start (float, optional): Earliest receive time, inclusive.
+            end (float, optional): Latest receive time, exclusive.
+            host (str, optional): Address of the sender.
+            trap_OID (str, optional): snmpTrapOID, or a prefix of it.
+            varbind_OID (str, optional): Name, or prefix of the name, of one
+                of the var-binds.
+            limit (int, optional): Maximum number of notifications.
+
+        Returns:
+            list(StoredTrap): The notifications.
+        """
+        conditions = []
+        parameters = []
+        if start is not None:
+            conditions.append("received >= ?")
+            parameters.append(start)
+        if end is not None:
+            conditions.append("received < ?")
+            parameters.append(end)
+        if host is not None:
+            conditions.append("host = ?")
+            parameters.append(host)
+        if trap_OID is not None:
+            condition, values = _prefix_condition('trap_oid', trap_OID)
+            conditions.append(condition)
+            parameters.extend(values)
+        if varbind_OID is not None:
+            condition, values = _prefix_condition('oid', varbind_OID)
+            conditions.append(
+                "shape_id IN (SELECT shape_id FROM shape_names WHERE "
+                f"name_id IN (SELECT id FROM names WHERE {condition}))")
+            parameters.extend(values)
+        sql = ("SELECT received, host, port, version, pdu_type, trap_oid, "
+               "varbinds, count FROM traps")
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY received, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+
+        results = []
+        for segment in self.segments():
+            if (end is not None and segment >= end) or (
+                    start is not None and
+                    segment + self.segment_seconds <= start):
+                continue
+            remaining = []
+            if limit is not None:
+                remaining = [limit - len(results)]
+                if not remaining[0]:
+                    break
+            # Not opened read-only: the last connection to close removes
+            # the WAL files of a segment that is no longer written. Not
+            # created either, retention may have deleted the segment.
+            try:
+                connection = sqlite3.connect(
+                    f"file:{quote(self.segment_path(segment))}?mode=rw",
+                    uri=True)
+            except sqlite3.OperationalError:
+                continue
+            try:
+                connection.execute('PRAGMA query_only=ON')
+                rows = connection.execute(sql, parameters + remaining)
+                results.extend(
+                    StoredTrap(*row[:6], [tuple(varbind) for varbind
+                                          in json.loads(row[6])], row[7])
+                    for row in rows)
+            finally:
+                connection.close()
+        return results
@@ -0,0 +1,183 @@
+"""
+Native asyncio UDP transport for SNMPManager.
+
+Datagrams are handed to the manager from `DatagramProtocol.datagram_received`
+as soon as the event loop reads them, instead of waiting for the next turn
+of a polling loop. `ManagerDispatcher` exposes the small part of the pysnmp
+transport dispatcher API that the manager's callbacks and its SNMPv3 engine
+use (sending responses and reading the timer), on top of those transports.
+"""
+import asyncio
+import socket
+import time
+from pysnmp.carrier.asyncio.dgram import udp, udp6
+
+
+class ManagerProtocol(asyncio.DatagramProtocol):
+    """
+    Passes every datagram of one socket to a receive callback.
+
+    Attributes:
+        domain (tuple): pysnmp transport domain of the socket.
+        errors (int): Datagrams whose callback raised.
+    """
+    def __init__(self, dispatcher, domain: tuple, on_datagram):
+        self.dispatcher = dispatcher
+        self.domain = domain
+        self.on_datagram = on_datagram
+        self.transport = None
+        self.errors = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            self.on_datagram(self.dispatcher, self.domain, addr, data)
+        except Exception:
+            # A malformed datagram must not take the receiver down
+            self.errors += 1
+
+    def error_received(self, exc):
+        self.errors += 1
+
+
+class ManagerDispatcher:
+    """
+    Owns the manager's UDP transports and stands in for the pysnmp
+    transport dispatcher where one is expected.
+
+    Attributes:
+        transports (dict): Transport domain -> asyncio DatagramTransport.
+        protocols (dict): Transport domain -> ManagerProtocol.
+        timer_errors (int): Timer callbacks that raised.
+    """
+    TIMER_RESOLUTION = 0.5
+
+    def __init__(self):
+        self.transports = {}
+        self.protocols = {}
+        self._timer_callbacks = []
+        self._timer_handle = None
+        self.timer_errors = 0
+
+    async def open(self, domain: tuple, family: int, address: tuple,
+                   on_datagram, reuse_port: bool = False):
+        """
+        Binds a UDP socket and starts delivering its datagrams.
+
+        Args:
+            domain (tuple): pysnmp transport domain, e.g. `udp.DOMAIN_NAME`.
+            family (int): socket.AF_INET or socket.AF_INET6.
+            address (tuple): (host, port) to bind.
+            on_datagram (function): Called with (dispatcher, domain,
+                address, data) for every datagram.
+            reuse_port (bool): Set SO_REUSEPORT so several processes can
+                bind the same address.
+        """
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            if family == socket.AF_INET6:
+                # Keep the IPv6 socket from claiming the IPv4 port as well
+                sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+            if reuse_port:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(address)
+        except OSError:
+            sock.close()
+            raise
+
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.create_datagram_endpoint(
+            lambda: ManagerProtocol(self, domain, on_datagram), sock=sock)
+        self.transports[domain] = transport
+        self.protocols[domain] = protocol
+        if self._timer_callbacks and self._timer_handle is None:
+            self._schedule_timer()
+
+    @property
+    def errors(self):
+        return self.timer_errors + sum(protocol.errors
+                                       for protocol in self.protocols.values())
+
+    def send_message(self, outgoingMessage, transportDomain,
+                     transportAddress):
+        """
+        Sends a datagram from the socket of `transportDomain`.
+        """
+        transport = self.transports.get(tuple(transportDomain))
+        if transport is not None:
+            transport.sendto(outgoingMessage, transportAddress)
+
+    # Parts of the pysnmp dispatcher API used by SnmpEngine
+
+    def register_recv_callback(self, recvCb, recvId=None):
+        pass
+
+    def unregister_recv_callback(self, recvId=None):
+        pass
+
+    def register_timer_callback(self, timerCbFun, tickInterval=None):
+        self._timer_callbacks.append(timerCbFun)
+        if self.transports and self._timer_handle is None:
+            self._schedule_timer()
+
+    def unregister_timer_callback(self, timerCbFun=None):
+        """
+        Stops calling `timerCbFun` on every timer tick.
+
+        Args:
+            timerCbFun (function, optional): The callback to remove, every
+                callback when None.
+        """
+        if timerCbFun is None:
+            self._timer_callbacks.clear()
+        elif timerCbFun in self._timer_callbacks:
+            self._timer_callbacks.remove(timerCbFun)
+        if not self._timer_callbacks and self._timer_handle is not None:
+            self._timer_handle.cancel()
+            self._timer_handle = None
+
+    def get_timer_resolution(self):
+        return self.TIMER_RESOLUTION
+
+    def get_timer_ticks(self):
+        return int(time.monotonic() / self.TIMER_RESOLUTION)
+
+    def _schedule_timer(self):
+        loop = asyncio.get_running_loop()
+        self._timer_handle = loop.call_later(self.TIMER_RESOLUTION,
+                                             self._fire_timer)
+
+    def _fire_timer(self):
+        now = time.monotonic()
+        try:
+            for callback in list(self._timer_callbacks):
+                try:
+                    callback(now)
+                except Exception:
+                    # A failing callback must neither stop the timer nor
+                    # keep the callbacks after it from running
+                    self.timer_errors += 1
+        finally:
+            if self.transports and self._timer_callbacks:
+                self._schedule_timer()
+            else:
+                self._timer_handle = None
+
+    def close_dispatcher(self):
+        """
+        Closes every socket and stops the timer.
+        """
+        if self._timer_handle is not None:
+            self._timer_handle.cancel()
+            self._timer_handle = None
+        for transport in self.transports.values():
+            transport.close()
+        self.transports.clear()
+
+
+DOMAINS = {
+    socket.AF_INET: udp.DOMAIN_NAME,
+    socket.AF_INET6: udp6.DOMAIN_NAME,
+}
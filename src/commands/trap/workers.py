@@ -0,0 +1,395 @@
+"""
+Multi-process SNMP notification receiver.
+
+A single SNMPManager decodes every notification on one core. With
+`--workers N`, N manager processes bind the same IPv4 and IPv6 port with
+SO_REUSEPORT and the kernel spreads incoming datagrams across them, hashing
+each sender's address to one socket. Every worker reports its counters to
+the supervisor, which restarts workers that die and sums their counters.
+
+Run from the repository root:
+    PYTHONPATH=src:src/client python -m commands.trap.manager \\
+        --workers 4 --quiet
+"""
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import traceback
+from commands.trap.aggregate import TrapAggregator
+from commands.trap.correlate import TransactionCorrelator
+from commands.trap.ingest import DecodePool
+from commands.trap.manager import SNMPManager
+from commands.trap.relay import open_relay
+from commands.trap.sinks import open_output
+from commands.trap.store import TrapStore
+
+
+COUNTERS = ('received', 'bytes', 'notifications', 'filtered', 'duplicates',
+            'suppressed', 'unsupported', 'errors', 'dropped')
+
+
+def _worker_main(index: int, options: dict, report_interval: float,
+                 reports):
+    """
+    Entry point of a receiver worker process. Runs one SNMPManager on
+    SO_REUSEPORT sockets and sends ('ready' | 'stats' | 'error', index, pid,
+    payload) tuples to the supervisor through `reports`, the last 'stats'
+    after the manager stops.
+    """
+    pid = os.getpid()
+    parent = os.getppid()
+    output = options.get("output")
+    if output is not None:
+        output = dict(output)
+        if output.get("path") is not None:
+            # Rotation is not safe across processes, each worker writes
+            # its own file
+            output["path"] = f"{output['path']}.worker{index}"
+        options = dict(options, output=open_output(**output))
+    store = options.get("store")
+    if store is not None:
+        # SQLite segments have a single writer, each worker has its own
+        # store in a subdirectory
+        store = dict(store, directory=os.path.join(store["directory"],
+                                                   f"worker{index}"))
+        options = dict(options, store=TrapStore(**store))
+    decode = options.get("decode")
+    if decode is not None:
+        options = dict(options, decode=DecodePool(**decode))
+    relay = options.get("relay")
+    if relay is not None:
+        options = dict(options, relay=open_relay(**relay))
+    aggregate = options.get("aggregate")
+    if aggregate is not None:
+        options = dict(options, aggregate=TrapAggregator(**aggregate))
+    correlate = options.get("correlate")
+    if correlate is not None:
+        options = dict(options,
+                       correlate=TransactionCorrelator(**correlate))
+
+    async def run():
+        manager = SNMPManager(reuse_port=True, **options)
+        # Workers are stopped with SIGTERM by the supervisor, which handles
+        # Ctrl-C for the whole group
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        try:
+            await manager.start()
+            reports.put(("ready", index, pid, None))
+            while manager._running:
+                await asyncio.sleep(report_interval)
+                reports.put(("stats", index, pid, manager.stats()))
+                if os.getppid() != parent:
+                    # Orphaned by a supervisor that did not stop us
+                    break
+        finally:
+            manager.stop()
+            reports.put(("stats", index, pid, manager.stats()))
+
+    try:
+        asyncio.run(run())
+    except Exception:
+        reports.put(("error", index, pid, traceback.format_exc()))
+        raise SystemExit(1)
+
+
+class _Worker:
+    __slots__ = ('process', 'started', 'ready', 'stats', 'restart_at')
+
+    def __init__(self, process):
+        self.process = process
+        self.started = time.monotonic()
+        self.ready = False
+        self.stats = dict.fromkeys(COUNTERS, 0)
+        self.restart_at = None
+
+
+class ReceiverSupervisor:
+    """
+    Runs SNMPManager worker processes sharing one port and keeps them
+    running.
+
+    A worker that exits while the supervisor runs, whatever the cause, is
+    restarted, at most once per `restart_delay` seconds so a worker that
+    cannot bind does not spin. The counters a worker reported before dying
+    are kept in the totals; datagrams it received after its last report are
+    not.
+
+    Attributes:
+        workers (int): Number of worker processes.
+        options (dict): SNMPManager keyword arguments of every worker.
+        report_interval (float): Seconds between worker counter reports.
+        restart_delay (float): Minimum seconds between two starts of the
+            same worker.
+        restarts (int): Workers restarted after exiting.
+        last_error (str): Traceback of the last worker failure, None if no
+            worker failed.
+    """
+    def __init__(self, workers: int,
+                 ipv4_host=os.getenv('IPv4_HOST_IP'),
+                 ipv6_host=os.getenv('IPv6_HOST_IP'),
+                 port=os.getenv('PORT'),
+                 verbose: bool = False,
+                 usm_users=None,
+                 lazy: bool = False,
+                 dedup: float = None,
+                 output: dict = None,
+                 store: dict = None,
+                 decode: dict = None,
+                 relay: dict = None,
+                 aggregate: dict = None,
+                 correlate: dict = None,
+                 report_interval: float = 1.0,
+                 restart_delay: float = 1.0):
+        """
+        Args:
+            workers (int): Number of worker processes.
+            ipv4_host (str): The IPv4 address to bind to.
+            ipv6_host (str): The IPv6 address to bind to. Defaults to every
+                IPv6 address when IPv6 is available.
+            port (int): The port every worker binds.
+            verbose (bool, optional): Print every notification.
+            usm_users (list(USMUser), optional): SNMPv3 users accepted by the
+                workers.
+            lazy (bool, optional): Decode var-binds only when they are read.
+            dedup (float, optional): Duplicate window in seconds. A sender's
+                datagrams all reach the same worker, so each worker filters
+                its own.
+            output (dict, optional): Keyword arguments of `open_output()`
+                for the output of every worker. A `path` gets the suffix
+                '.worker<index>', each worker writing its own file.
+            store (dict, optional): Keyword arguments of TrapStore for the
+                store of every worker. Each worker stores its notifications
+                in the subdirectory 'worker<index>' of `directory`.
+            decode (dict, optional): Keyword arguments of DecodePool for the
+                decode pool of every worker, which must run in 'thread'
+                mode: worker processes cannot start processes of their own.
+            relay (dict, optional): Keyword arguments of `open_relay()`.
+                Every worker forwards the datagrams it receives.
+            aggregate (dict, optional): Keyword arguments of TrapAggregator.
+                A sender's datagrams all reach the same worker, so each
+                worker collapses the storms of its own senders.
+            correlate (dict, optional): Keyword arguments of
+                TransactionCorrelator. Each worker correlates the
+                transactions of its own senders, so the notifications about
+                one transaction must come from one host.
+            report_interval (float): Seconds between worker counter reports.
+            restart_delay (float): Minimum seconds between two starts of the
+                same worker.
+
+        Raises:
+            ValueError: If `workers` is less than 1, or `decode` asks for
+                decode processes.
+        """
+        if workers < 1:
+            raise ValueError('Argument "workers" must be at least 1')
+
+        if decode is not None and decode.get("mode") == "process":
+            raise ValueError(
+                'Receiver workers cannot decode in "process" mode')
+
+        self.workers = workers
+        self.options = {
+            "ipv4_host": ipv4_host,
+            "ipv6_host": ipv6_host,
+            "port": int(port),
+            "verbose": verbose,
+            "usm_users": usm_users,
+            "lazy": lazy,
+            "dedup": dedup,
+            "output": output,
+            "store": store,
+            "decode": decode,
+            "relay": relay,
+            "aggregate": aggregate,
+            "correlate": correlate,
+        }
+        self.report_interval = report_interval
+        self.restart_delay = restart_delay
+        self.restarts = 0
+        self.last_error = None
+        self._context = multiprocessing.get_context()
+        self._reports = self._context.Queue()
+        self._workers = [None] * workers
+        self._retired = dict.fromkeys(COUNTERS, 0)
+        self._running = False
+
+    @property
+    def ready(self):
+        """
+        Number of live workers that have bound their sockets.
+        """
+        return sum(1 for worker in self._workers
+                   if worker is not None and worker.ready and
+                   worker.process.is_alive())
+
+    def totals(self):
+        """
+        Returns the counters summed over every worker, including workers
+        that have since been restarted.
+
+        Returns:
+            dict: Counter name -> total, for each of COUNTERS.
+        """
+        totals = dict(self._retired)
+        for worker in self._workers:
+            if worker is not None:
+                for key in COUNTERS:
+                    totals[key] += worker.stats[key]
+        return totals
+
+    def worker_stats(self):
+        """
+        Returns the latest report of each worker.
+
+        Returns:
+            list(dict): Per worker, its 'pid', whether it is 'ready' and its
+                counters since it was last started.
+        """
+        return [dict(worker.stats, pid=worker.process.pid,
+                     ready=worker.ready)
+                for worker in self._workers if worker is not None]
+
+    def start(self):
+        """
+        Starts every worker process.
+        """
+        self._running = True
+        for index in range(self.workers):
+            self._spawn(index)
+
+    def _spawn(self, index: int):
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self.options, self.report_interval, self._reports),
+            daemon=True)
+        process.start()
+        self._workers[index] = _Worker(process)
+
+    def poll(self, timeout: float = 0.1):
+        """
+        Handles the worker reports arriving within `timeout` seconds, then
+        restarts workers that have exited.
+        """
+        self._drain(timeout)
+        if self._running:
+            self._check_workers()
+
+    def _drain(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                kind, index, pid, payload = self._reports.get(
+                    timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                return
+            worker = self._workers[index]
+            # Late reports of a worker that has been replaced
+            if worker is None or worker.process.pid != pid:
+                continue
+            if kind == "ready":
+                worker.ready = True
+            elif kind == "stats":
+                worker.stats = payload
+            else:
+                self.last_error = payload
+                print(f"Receiver worker {index} failed:\n{payload}")
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for index, worker in enumerate(self._workers):
+            if worker.process.is_alive():
+                continue
+            if worker.restart_at is None:
+                worker.process.join()
+                worker.restart_at = worker.started + self.restart_delay
+            if now >= worker.restart_at:
+                for key in COUNTERS:
+                    self._retired[key] += worker.stats[key]
+                self._spawn(index)
+                self.restarts += 1
+
+    def run(self, duration: float = None, stats_interval: float = None,
+            on_stats=None):
+        """
+        Starts the workers and supervises them until interrupted, SIGTERM,
+        or `duration` seconds have passed, then stops them.
+
+        Args:
+            duration (float, optional): Seconds to run, None for no limit.
+            stats_interval (float, optional): Seconds between `on_stats`
+                calls.
+            on_stats (function, optional): Called without arguments every
+                `stats_interval` seconds.
+
+        Returns:
+            dict: The final totals.
+        """
+        main_thread = threading.current_thread() is threading.main_thread()
+        if main_thread:
+            previous = signal.signal(signal.SIGTERM, self.signal_handler)
+        self.start()
+        started = last_stats = time.monotonic()
+        try:
+            while self._running:
+                now = time.monotonic()
+                if duration is not None and now - started >= duration:
+                    break
+                if on_stats is not None and stats_interval and \
+                        now - last_stats >= stats_interval:
+                    last_stats = now
+                    on_stats()
+                self.poll()
+        except KeyboardInterrupt:
+            print("Shutting down...")
+        finally:
+            self.stop()
+            if main_thread:
+                signal.signal(signal.SIGTERM, previous)
+        return self.totals()
+
+    def signal_handler(self, signum, frame):
+        """
+        Ends `run()` on a termination signal.
+        """
+        self._running = False
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Stops every worker with SIGTERM, killing those still running after
+        `timeout` seconds, and collects their final counters.
+        """
+        self._running = False
+        workers = [worker for worker in self._workers if worker is not None]
+        for worker in workers:
+            if worker.process.is_alive():
+                worker.process.terminate()
+        # Keep reading reports while waiting, a worker blocked on a full
+        # queue would never exit
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and \
+                any(worker.process.is_alive() for worker in workers):
+            self._drain(0.05)
+        for worker in workers:
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.process.join()
+        self._drain(0)
+
+
+def format_stats(supervisor: ReceiverSupervisor):
+    """
+    Returns a one-line summary of a supervisor's workers and totals.
+    """
+    totals = supervisor.totals()
+    return (f"workers {supervisor.ready}/{supervisor.workers} ready, "
+            f"received {totals['received']}, "
+            f"notifications {totals['notifications']}, "
+            f"filtered {totals['filtered']}, "
+            f"duplicates {totals['duplicates']}, "
+            f"suppressed {totals['suppressed']}, "
+            f"errors {totals['errors']}, dropped {totals['dropped']}, "
+            f"restarts {supervisor.restarts}")
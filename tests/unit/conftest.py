@@ -0,0 +1,48 @@
+import os
+import pytest
+from commands.trap.manager import ReceivedTrap
+from client.agents.raw import SNMP_TRAP_OID
+
+
+class Clock:
+    """
+    A clock the test sets, for components taking a `clock` function.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def notification_OID():
+    return os.getenv('OID_SETTLEMENT_STATUS')
+
+
+@pytest.fixture
+def amount_OID():
+    return os.getenv('OID_SETTLEMENT_AMOUNT')
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def make_trap(notification_OID, amount_OID):
+    """
+    Returns a factory of SNMPv2c ReceivedTraps. Their var-binds are
+    sysUpTime.0, snmpTrapOID.0 (`notification_OID` by default), then
+    `varbinds`, or one settlement amount of `amount` when not given.
+    """
+    def make_trap(received=0.0, host='10.0.0.1', trap_OID=None, amount='1',
+                  varbinds=None):
+        if varbinds is None:
+            varbinds = [(amount_OID, amount)]
+        return ReceivedTrap(received, None, (host, 162), 1, 'trap',
+                            [('1.3.6.1.2.1.1.3.0', '0'),
+                             (SNMP_TRAP_OID, trap_OID or notification_OID),
+                             *varbinds])
+    return make_trap
@@ -0,0 +1,123 @@
+import io
+import json
+import pytest
+from commands.trap.aggregate import TrapAggregator, TrapSummary
+from commands.trap.manager import SNMPManager
+from commands.trap.sinks import BufferedOutput, StreamSink, format_ndjson
+from client.agents.raw import RawTrapTemplate
+
+
+def test_storm_collapses_into_summary(make_trap, notification_OID, amount_OID):
+    aggregator = TrapAggregator(window=1.0)
+    first = make_trap(100.0)
+    assert aggregator.add(first) == [first]
+    for index in range(1, 100):
+        assert aggregator.add(make_trap(100.0 + index * 0.01,
+                                        amount=str(index))) == []
+    # Other hosts and notification types are other keys
+    other = make_trap(100.5, host='10.0.0.2')
+    assert aggregator.add(other) == [other]
+    assert len(aggregator) == 2
+
+    # The window slides with every notification counted
+    assert aggregator.expire(now=101.9) == []
+    summary, = aggregator.expire(now=102.0)
+    assert isinstance(summary, TrapSummary)
+    assert (summary.count, summary.first_seen, summary.last_seen) == \
+        (99, 100.01, 100.99)
+    assert summary.received == 100.99
+    assert summary.varbinds[-1] == (amount_OID, '99')
+    assert summary.trap_OID == notification_OID
+    assert len(aggregator) == 0
+
+    assert aggregator.stats() == {
+        'keys': 0, 'seen': 101, 'suppressed': 99, 'summaries': 1,
+        'evicted': 0, 'suppression_ratio': pytest.approx(99 / 101)}
+
+    record = json.loads(format_ndjson(summary))
+    assert (record['count'], record['first_seen']) == (99, 100.01)
+
+
+def test_key_varbinds_and_max_span(make_trap, amount_OID):
+    aggregator = TrapAggregator(window=1.0, key_OIDs=[amount_OID],
+                                max_span=2.0)
+    assert len(aggregator.add(make_trap(0.0, amount='1'))) == 1
+    assert len(aggregator.add(make_trap(0.0, amount='2'))) == 1
+
+    records = []
+    for index in range(1, 50):
+        records.extend(aggregator.add(make_trap(index * 0.1, amount='1')))
+    # A storm that never pauses is summarized every `max_span` seconds,
+    # and the closed window of the other key on the way
+    summaries = [record for record in records
+                 if record.varbinds[-1][1] == '1']
+    assert [summary.count for summary in summaries] == [20, 20]
+    records.extend(aggregator.flush())
+    assert sum(getattr(record, 'count', 1) for record in records) + 2 == 51
+
+
+def test_full_table_evicts_least_recently_seen(make_trap):
+    aggregator = TrapAggregator(window=60.0, maxsize=2)
+    aggregator.add(make_trap(0.0, host='10.0.0.1'))
+    aggregator.add(make_trap(0.1, host='10.0.0.1'))
+    aggregator.add(make_trap(0.2, host='10.0.0.2'))
+    aggregator.add(make_trap(0.3, host='10.0.0.1'))
+    third = make_trap(0.4, host='10.0.0.3')
+    # 10.0.0.2 is the least recently seen, with nothing counted
+    assert aggregator.add(third) == [third]
+    fourth = make_trap(0.5, host='10.0.0.4')
+    summary, trap = aggregator.add(fourth)
+    assert (summary.address[0], summary.count, trap) == \
+        ('10.0.0.1', 2, fourth)
+    assert aggregator.evicted == 2
+    assert len(aggregator) == 2
+
+
+def test_invalid_arguments():
+    for options in ({'window': 0}, {'maxsize': 0}, {'max_span': 0}):
+        with pytest.raises(ValueError):
+            TrapAggregator(**options)
+
+
+def test_manager_delivers_summaries(tmp_path, notification_OID, amount_OID):
+    manager = SNMPManager(verbose=False, recent=100, aggregate=5.0,
+                          store=str(tmp_path))
+    template = RawTrapTemplate(notification_OID, [amount_OID])
+    for index in range(200):
+        manager._callback(manager.transportDispatcher, None,
+                          ('127.0.0.1', 5000), template.encode(
+                              index, 0, [str(index)]))
+    assert len(manager.recent) == 1
+    stats = manager.stats()
+    assert stats['suppressed'] == 199
+    assert stats['aggregate']['suppression_ratio'] == pytest.approx(0.995)
+    manager.stop()
+
+    found = manager.store.query()
+    assert [trap.count for trap in found] == [1, 199]
+    assert found[-1].varbinds[-1] == (amount_OID, '199')
+    assert len(manager.recent) == 2
+
+
+def test_manager_stops_once(monkeypatch, notification_OID, amount_OID):
+    stream = io.StringIO()
+    output = BufferedOutput(StreamSink(stream), 'ndjson')
+    manager = SNMPManager(verbose=False, aggregate=5.0, output=output)
+    flushes = []
+    flush = manager.aggregate.flush
+    monkeypatch.setattr(manager.aggregate, 'flush',
+                        lambda: flushes.append(1) or flush())
+    template = RawTrapTemplate(notification_OID, [amount_OID])
+    for index in range(10):
+        manager._callback(manager.transportDispatcher, None,
+                          ('127.0.0.1', 5000), template.encode(
+                              index, 0, [str(index)]))
+    # signal_handler and run() both stop the manager
+    manager.stop()
+    manager.stop()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line.get('count', 1) for line in lines] == [1, 9]
+    assert flushes == [1]
+    assert output.errors == 0
+    assert output.dropped_newest == 0
@@ -0,0 +1,83 @@
+import os
+import asyncio
+import pytest
+from client.agents.generic import SNMPAgent, SNMPNotification
+from client.components.varbinds import Varbind
+
+
+notification_OID = os.getenv('OID_SETTLEMENT_STATUS')
+
+
+def make_notifications(count):
+    for i in range(count):
+        yield SNMPNotification(notification_OID, [
+            Varbind(os.getenv('OID_SETTLEMENT_AMOUNT'), str(i)),
+            Varbind(os.getenv('OID_SETTLEMENT_MID'), 'abc123')
+        ])
+
+
+@pytest.mark.asyncio
+async def test_send_traps():
+    agent = SNMPAgent(notification_OID=notification_OID)
+    result = await agent.send_traps(make_notifications(20), concurrency=4)
+
+    assert result.sent == 20
+    assert result.failed == 0
+    assert sorted(o.index for o in result.outcomes) == list(range(20))
+    assert result.elapsed > 0
+    assert result.rate > 0
+
+
+@pytest.mark.asyncio
+async def test_send_traps_async_iterable_with_callback():
+    agent = SNMPAgent(notification_OID=notification_OID)
+    seen = []
+
+    async def produce():
+        for notification in make_notifications(10):
+            yield notification
+
+    result = await agent.send_traps(produce(), concurrency=3,
+                                    on_result=seen.append)
+
+    assert result.sent == 10
+    assert len(seen) == 10
+    # Outcomes are not accumulated when a callback is given
+    assert result.outcomes == []
+
+
+@pytest.mark.asyncio
+async def test_send_traps_reports_failures():
+    agent = SNMPAgent(notification_OID=notification_OID)
+    bad = SNMPNotification(None, [])
+    result = await agent.send_traps([bad] + list(make_notifications(2)))
+
+    assert result.sent == 2
+    assert result.failed == 1
+    failed = [o for o in result.outcomes if not o.ok]
+    assert failed[0].index == 0
+    assert 'AttributeError' in failed[0].error
+
+
+@pytest.mark.asyncio
+async def test_failing_callback_does_not_hang_close():
+    agent = SNMPAgent(notification_OID=notification_OID)
+    seen = []
+
+    def on_result(outcome):
+        seen.append(outcome)
+        raise RuntimeError('callback failed')
+
+    # One worker and a two-slot queue: a dead worker would block put()
+    with pytest.raises(RuntimeError, match='callback failed'):
+        await asyncio.wait_for(
+            agent.send_traps(make_notifications(10), concurrency=1,
+                             on_result=on_result), 5)
+    assert len(seen) == 10
+
+
+@pytest.mark.asyncio
+async def test_trap_sender_bad_concurrency():
+    agent = SNMPAgent(notification_OID=notification_OID)
+    with pytest.raises(ValueError):
+        agent.trap_sender(concurrency=0)
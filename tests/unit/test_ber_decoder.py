@@ -0,0 +1,254 @@
+import os
+import random
+import asyncio
+import pytest
+from pyasn1.codec.ber import decoder, encoder
+from pyasn1.type import univ
+from pysnmp.proto import api, rfc1902
+from commands.trap.ber import decode_notification, decode_oid, \
+    TAG_V1_TRAP_PDU, TAG_TRAP_PDU, TAG_INFORM_PDU, SNMP_TRAP_OID, \
+    GENERIC_TRAPS
+from commands.trap.manager import SNMPManager
+from client.agents.raw import RawTrapTemplate, encode_oid
+
+
+notification_OID = os.getenv('OID_SETTLEMENT_STATUS')
+varbind_OIDs = [os.getenv('OID_SETTLEMENT_AMOUNT'),
+                os.getenv('OID_SETTLEMENT_MID')]
+
+v1 = api.PROTOCOL_MODULES[api.SNMP_VERSION_1]
+v2c = api.PROTOCOL_MODULES[api.SNMP_VERSION_2C]
+
+
+def reference(data):
+    """
+    Decodes a notification with pyasn1 into the fields of a Notification.
+    """
+    version = int(api.decodeMessageVersion(data))
+    pMod = api.PROTOCOL_MODULES[version]
+    message, rest = decoder.decode(data, asn1Spec=pMod.Message())
+    assert not rest
+    pdu = pMod.apiMessage.get_pdu(message)
+    if version == 0:
+        assert pdu.isSameTypeWith(pMod.TrapPDU())
+        pdu_tag, request_id = TAG_V1_TRAP_PDU, 0
+        varbinds = pMod.apiTrapPDU.get_varbinds(pdu)
+        generic = int(pMod.apiTrapPDU.get_generic_trap(pdu))
+        if generic == 6:
+            trap_OID = '{}.0.{}'.format(
+                pMod.apiTrapPDU.get_enterprise(pdu).prettyPrint(),
+                int(pMod.apiTrapPDU.get_specific_trap(pdu)))
+        else:
+            trap_OID = f'{GENERIC_TRAPS}.{generic + 1}'
+    else:
+        if pdu.isSameTypeWith(pMod.SNMPv2TrapPDU()):
+            pdu_tag = TAG_TRAP_PDU
+        else:
+            assert pdu.isSameTypeWith(pMod.InformRequestPDU())
+            pdu_tag = TAG_INFORM_PDU
+        request_id = int(pMod.apiPDU.get_request_id(pdu))
+        varbinds = pMod.apiPDU.get_varbinds(pdu)
+        trap_OID = None
+        if len(varbinds) > 1 and \
+                varbinds[1][0].prettyPrint() == SNMP_TRAP_OID and \
+                isinstance(varbinds[1][1], univ.ObjectIdentifier):
+            trap_OID = varbinds[1][1].prettyPrint()
+    return (version, bytes(message['community']), pdu_tag, request_id,
+            trap_OID, [(oid.prettyPrint(), val.prettyPrint())
+                       for oid, val in varbinds])
+
+
+def random_OID(rng):
+    first = rng.choice([0, 1, 2])
+    second = rng.randrange(40) if first < 2 else \
+        rng.choice([0, 39, 40, 1000, 2 ** 32])
+    return (first, second) + tuple(
+        rng.choice([0, 127, 128, 16384, 2 ** 31, 2 ** 64])
+        if rng.random() < 0.3 else rng.randrange(200)
+        for _ in range(rng.randrange(12)))
+
+
+def random_octets(rng):
+    length = rng.choice([0, 1, 3, 40, 127, 128, 300])
+    if rng.random() < 0.5:
+        return bytes(rng.randrange(32, 127) for _ in range(length))
+    return bytes(rng.randrange(256) for _ in range(length))
+
+
+def random_value(rng, pMod):
+    kind = rng.randrange(10 if pMod is v2c else 9)
+    if kind == 0:
+        if pMod is v2c:
+            return rfc1902.Integer32(rng.randrange(-2 ** 31, 2 ** 31))
+        return univ.Integer(rng.choice([-2 ** 40, -1, 0, 2 ** 40]))
+    if kind == 1:
+        return pMod.OctetString(random_octets(rng))
+    if kind == 2:
+        return pMod.ObjectIdentifier(random_OID(rng))
+    if kind == 3:
+        return pMod.IpAddress(bytes(rng.randrange(256) for _ in range(4)))
+    if kind == 4:
+        counter = rfc1902.Counter32 if pMod is v2c else pMod.Counter
+        return counter(rng.choice([0, 2 ** 32 - 1, rng.randrange(2 ** 32)]))
+    if kind == 5:
+        gauge = rfc1902.Gauge32 if pMod is v2c else pMod.Gauge
+        return gauge(rng.randrange(2 ** 32))
+    if kind == 6:
+        return pMod.TimeTicks(rng.randrange(2 ** 32))
+    if kind == 7:
+        opaque = rfc1902.Opaque if pMod is v2c else pMod.Opaque
+        return opaque(random_octets(rng))
+    if kind == 8:
+        return univ.Null('')
+    return rfc1902.Counter64(rng.choice([0, 2 ** 64 - 1,
+                                         rng.randrange(2 ** 64)]))
+
+
+def random_message(rng):
+    pMod = rng.choice([v1, v2c])
+    varbinds = [(random_OID(rng), random_value(rng, pMod))
+                for _ in range(rng.randrange(8))]
+    if pMod is v1:
+        pdu = pMod.TrapPDU()
+        pMod.apiTrapPDU.set_defaults(pdu)
+        pMod.apiTrapPDU.set_enterprise(pdu, random_OID(rng))
+        pMod.apiTrapPDU.set_agent_address(
+            pdu, '.'.join(str(rng.randrange(256)) for _ in range(4)))
+        pMod.apiTrapPDU.set_generic_trap(pdu, rng.randrange(7))
+        pMod.apiTrapPDU.set_specific_trap(pdu, rng.randrange(-5, 2 ** 31))
+        pMod.apiTrapPDU.set_timestamp(pdu, rng.randrange(2 ** 32))
+        pMod.apiTrapPDU.set_varbinds(pdu, varbinds)
+    else:
+        pdu = pMod.SNMPv2TrapPDU() if rng.random() < 0.8 \
+            else pMod.InformRequestPDU()
+        pMod.apiPDU.set_defaults(pdu)
+        pMod.apiPDU.set_request_id(pdu, rng.randrange(-2 ** 31, 2 ** 31))
+        if rng.random() < 0.8:
+            varbinds[:0] = [
+                ((1, 3, 6, 1, 2, 1, 1, 3, 0),
+                 pMod.TimeTicks(rng.randrange(2 ** 32))),
+                ((1, 3, 6, 1, 6, 3, 1, 1, 4, 1, 0),
+                 pMod.ObjectIdentifier(random_OID(rng)))]
+        pMod.apiPDU.set_varbinds(pdu, varbinds)
+    message = pMod.Message()
+    pMod.apiMessage.set_defaults(message)
+    pMod.apiMessage.set_community(message, random_octets(rng)[:20])
+    pMod.apiMessage.set_pdu(message, pdu)
+    return encoder.encode(message)
+
+
+def mutate(rng, data):
+    data = bytearray(data)
+    for _ in range(rng.randrange(1, 4)):
+        operation = rng.random()
+        if operation < 0.4 and data:
+            data[rng.randrange(len(data))] = rng.randrange(256)
+        elif operation < 0.55 and data:
+            data[rng.randrange(len(data))] ^= 1 << rng.randrange(8)
+        elif operation < 0.7:
+            del data[rng.randrange(len(data) + 1):]
+        elif operation < 0.85:
+            index = rng.randrange(len(data) + 1)
+            data[index:index] = bytes((rng.randrange(256),))
+        elif data:
+            del data[rng.randrange(len(data))]
+    return bytes(data)
+
+
+def test_matches_pyasn1_on_random_notifications():
+    rng = random.Random(1)
+    for _ in range(300):
+        data = random_message(rng)
+        assert tuple(decode_notification(data)) == reference(data), \
+            data.hex()
+        assert tuple(decode_notification(memoryview(data))) == \
+            reference(data)
+
+
+def test_fuzzed_notifications_decode_like_pyasn1_or_fall_back():
+    """
+    Whatever the native decoder accepts, pyasn1 must decode identically.
+    Rejected datagrams go to pyasn1 anyway.
+    """
+    rng = random.Random(2)
+    accepted = 0
+    for _ in range(400):
+        data = random_message(rng)
+        for _ in range(4):
+            fuzzed = mutate(rng, data)
+            try:
+                notification = decode_notification(fuzzed)
+            except ValueError:
+                continue
+            accepted += 1
+            assert tuple(notification) == reference(fuzzed), fuzzed.hex()
+    # Mutations in values keep many datagrams valid
+    assert accepted > 100
+
+
+def test_random_bytes_never_crash():
+    rng = random.Random(3)
+    for _ in range(2000):
+        data = bytes(rng.randrange(256) for _ in range(rng.randrange(64)))
+        try:
+            decode_notification(b'\x30' + data)
+        except ValueError:
+            pass
+
+
+def test_long_form_lengths():
+    data = RawTrapTemplate(notification_OID, varbind_OIDs).encode(
+        1, 2, ['x' * 300, 'MID'])
+    assert tuple(decode_notification(data)) == reference(data)
+
+
+def test_outside_subset_is_rejected():
+    data = RawTrapTemplate(notification_OID, varbind_OIDs).encode(
+        1, 2, ['1', 'MID'])
+    # Indefinite length message
+    indefinite = b'\x30\x80' + data[2:] + b'\x00\x00'
+    # Counter64 is not an SNMPv1 type
+    pdu = v1.TrapPDU()
+    v1.apiTrapPDU.set_defaults(pdu)
+    v1.apiTrapPDU.set_varbinds(pdu, [((1, 3, 6), v1.Counter(1))])
+    message = v1.Message()
+    v1.apiMessage.set_defaults(message)
+    v1.apiMessage.set_pdu(message, pdu)
+    counter64 = encoder.encode(message).replace(b'\x41\x01\x01',
+                                                b'\x46\x01\x01')
+    for invalid in [indefinite, data + data, data[:-1], counter64]:
+        with pytest.raises(ValueError):
+            decode_notification(invalid)
+
+
+def test_decode_oid_rejects_padding():
+    encoded = encode_oid('1.3.6.1.4.1.12345')
+    assert decode_oid(encoded, 2, len(encoded)) == '1.3.6.1.4.1.12345'
+    with pytest.raises(ValueError):
+        decode_oid(b'\x2b\x80\x01', 0, 3)
+
+
+@pytest.mark.asyncio
+async def test_manager_native_and_pyasn1_paths_agree():
+    data = RawTrapTemplate(notification_OID, varbind_OIDs).encode(
+        5, 100, ['12.50', b'\x00\xff'])
+    results = []
+    for native in (True, False):
+        manager = SNMPManager(verbose=False, native=native)
+        received = []
+
+        async def collect():
+            async for trap in manager.traps():
+                received.append(trap)
+                return
+
+        collector = asyncio.create_task(collect())
+        await asyncio.sleep(0)
+        manager._callback(manager.transportDispatcher, None,
+                          ('127.0.0.1', 0), data)
+        await asyncio.wait_for(collector, 5)
+        manager.stop()
+        results.append((received[0].pdu_type, received[0].version,
+                        received[0].varbinds))
+    assert results[0] == results[1]
+    assert results[0][2][-1] == (varbind_OIDs[-1], '0x00ff')
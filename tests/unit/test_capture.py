@@ -0,0 +1,92 @@
+import os
+import asyncio
+import pytest
+from commands.trap.capture import CaptureWriter, read_capture, replay
+from commands.trap.manager import SNMPManager
+from client.agents.generic import SNMPAgent
+
+
+class Collector(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.datagrams = []
+
+    def datagram_received(self, data, addr):
+        self.datagrams.append(data)
+
+
+def test_write_and_read(tmp_path):
+    path = str(tmp_path / 'traps.cap')
+    with CaptureWriter(path) as writer:
+        writer.write(b'first', ('127.0.0.1', 1000), timestamp=10.0)
+        writer.write(b'second', ('::1', 2000, 0, 0), timestamp=10.5)
+    # Reopening appends instead of rewriting the header
+    with CaptureWriter(path) as writer:
+        writer.write(b'third', ('10.0.0.1', 3000), timestamp=11.0)
+
+    records = list(read_capture(path))
+    assert [record.data for record in records] == \
+        [b'first', b'second', b'third']
+    assert records[1].address == ('::1', 2000)
+    assert records[2].timestamp == 11.0
+
+
+def test_invalid_capture(tmp_path):
+    path = tmp_path / 'not.cap'
+    path.write_bytes(b'garbage!')
+    with pytest.raises(ValueError):
+        list(read_capture(str(path)))
+    with pytest.raises(ValueError):
+        CaptureWriter(str(path))
+
+    path = str(tmp_path / 'truncated.cap')
+    with CaptureWriter(path) as writer:
+        writer.write(b'datagram', ('127.0.0.1', 1000))
+    with open(path, 'r+b') as file:
+        file.truncate(os.path.getsize(path) - 3)
+    with pytest.raises(ValueError):
+        list(read_capture(path))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("speed, minimum", [(2.0, 0.2), (0, 0.0)])
+async def test_replay_timing(tmp_path, speed, minimum):
+    path = str(tmp_path / 'traps.cap')
+    with CaptureWriter(path) as writer:
+        for index in range(5):
+            writer.write(b'trap-%d' % index, ('127.0.0.1', 1000),
+                         timestamp=100.0 + index * 0.1)
+
+    loop = asyncio.get_running_loop()
+    transport, collector = await loop.create_datagram_endpoint(
+        Collector, local_addr=('127.0.0.1', 0))
+    port = transport.get_extra_info('sockname')[1]
+    try:
+        result = await replay(path, '127.0.0.1', port, speed=speed)
+        await asyncio.sleep(0.1)
+    finally:
+        transport.close()
+
+    assert result.sent == 5
+    assert result.elapsed >= minimum
+    assert collector.datagrams == [b'trap-%d' % i for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_manager_records_capture(tmp_path):
+    path = str(tmp_path / 'manager.cap')
+    manager = SNMPManager(capture=path)
+    manager_task = asyncio.create_task(manager.run_async())
+    agent = SNMPAgent(notification_OID=os.getenv('OID_SETTLEMENT_STATUS'),
+                      varbinds={os.getenv('OID_SETTLEMENT_TYPE'): 'captured'})
+    try:
+        await asyncio.sleep(0.5)
+        await agent.send_trap()
+        await asyncio.sleep(0.5)
+    finally:
+        manager.stop()
+        await manager_task
+
+    records = list(read_capture(path))
+    assert len(records) == 1
+    assert b'captured' in records[0].data
+    assert records[0].address[0] == '127.0.0.1'
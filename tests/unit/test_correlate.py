@@ -0,0 +1,179 @@
+import pytest
+from commands.trap.correlate import TransactionCorrelator, parse_datetime
+from commands.trap.manager import ReceivedTrap, SNMPManager
+from commands.trap.metrics import MetricsRegistry, manager_metrics
+from client.agents.raw import RawTrapTemplate, SNMP_TRAP_OID
+from client.agents.transaction import settlement_OIDs
+
+
+FIELD_OIDS = settlement_OIDs()
+OPEN = '2024-01-01T00:00:00'
+CLOSE = '2024-01-01T01:00:00'
+SUBMISSION = '2024-01-01T01:10:00'
+DEPOSIT = '2024-01-02T01:10:00'
+
+
+def settlement(mid, received=0.0, status='settled', open='', close='',
+               submission='', deposit=''):
+    fields = {'type': 'sale', 'status': status, 'amount': '125.40',
+              'entity': 'VISA', 'mid': mid, 'deposit_datetime': deposit,
+              'open_datetime': open, 'close_datetime': close,
+              'submission_datetime': submission}
+    varbinds = [('1.3.6.1.2.1.1.3.0', '0'),
+                (SNMP_TRAP_OID, FIELD_OIDS['status'])]
+    varbinds.extend((FIELD_OIDS[field], value)
+                    for field, value in fields.items())
+    return ReceivedTrap(received, None, ('10.0.0.1', 162), 1, 'trap',
+                        varbinds)
+
+
+def test_parse_datetime():
+    assert parse_datetime('1970-01-01T01:00:00') == 3600.0
+    assert parse_datetime('1970-01-01T01:00:00+01:00') == 0.0
+    assert parse_datetime('') is None
+    assert parse_datetime('soon') is None
+
+
+def test_stages_join_across_notifications(clock):
+    correlator = TransactionCorrelator(clock=clock)
+    assert correlator.add(settlement('MID1', open=OPEN)) == 'open'
+    assert correlator.add(settlement('MID1', 5.0, open=OPEN,
+                                     close=CLOSE)) == 'open'
+    lifecycle = correlator.lookup('MID1')
+    assert lifecycle.close - lifecycle.open == 3600.0
+    assert (lifecycle.submission, lifecycle.last_seen) == (None, 5.0)
+
+    assert correlator.add(settlement('MID1', submission=SUBMISSION,
+                                     deposit=DEPOSIT)) == 'completed'
+    assert correlator.lookup('MID1') is None
+    durations = correlator.durations
+    assert durations[('open', 'close')].max == 3600.0
+    assert durations[('close', 'submission')].max == 600.0
+    assert durations[('open', 'deposit')].max == 90600.0
+
+    # Finished by their first notification, never stored
+    assert correlator.add(settlement('MID2', open=OPEN, close=CLOSE,
+                                     submission=SUBMISSION,
+                                     deposit=DEPOSIT)) == 'completed'
+    assert correlator.add(settlement('MID3', status='failed',
+                                     open=OPEN)) == 'failed'
+    assert correlator.add(ReceivedTrap(0.0, None, ('10.0.0.1', 162), 1,
+                                       'trap', [])) is None
+
+    stats = correlator.stats()
+    assert (stats['open'], stats['transactions'], stats['completed'],
+            stats['failed'], stats['ignored']) == (0, 3, 2, 1, 1)
+    assert stats['durations']['submission_deposit']['max'] == 86400.0
+
+
+def test_open_transactions_expire_after_ttl(clock):
+    correlator = TransactionCorrelator(ttl=100.0, clock=clock)
+    correlator.add(settlement('MID1', 0.0, open=OPEN))
+    correlator.add(settlement('MID2', 0.0, open=OPEN, close=CLOSE))
+    clock.now = 50.0
+    # Seen again, its TTL runs from now on
+    correlator.add(settlement('MID2', 50.0, open=OPEN, close=CLOSE))
+
+    assert correlator.expire(now=99.0) == 0
+    assert correlator.expire(now=101.0) == 1
+    assert correlator.lookup('MID1') is None
+    assert correlator.lookup('MID2') is not None
+    assert correlator.expire(now=151.0) == 1
+    assert len(correlator) == 0
+    assert len(correlator.wheel) == 0
+    assert correlator.incomplete == {'open': 0, 'close': 1,
+                                     'submission': 1, 'deposit': 0}
+    # What is known of incomplete transactions is still recorded
+    assert correlator.durations[('open', 'close')].count == 1
+
+
+def test_capacity_evicts_least_recently_seen_transaction(clock):
+    correlator = TransactionCorrelator(capacity=3, clock=clock)
+    correlator.add(settlement('LONG', 0.0, open=OPEN))
+    # Short transactions finishing free their slot for the next ones
+    for index in range(5):
+        mid = f'MID{index}'
+        correlator.add(settlement(mid, 1.0 + index, open=OPEN))
+        correlator.add(settlement(mid, 1.0 + index, close=CLOSE,
+                                  submission=SUBMISSION, deposit=DEPOSIT))
+    assert correlator.evicted == 0
+    assert correlator.lookup('LONG') is not None
+
+    correlator.add(settlement('MID5', 10.0, open=OPEN))
+    correlator.add(settlement('MID6', 11.0, open=OPEN))
+    correlator.add(settlement('LONG', 12.0, open=OPEN, close=CLOSE))
+    # Every slot is taken: MID5 is the least recently seen
+    correlator.add(settlement('MID7', 13.0, open=OPEN))
+    assert correlator.evicted == 1
+    assert correlator.lookup('MID5') is None
+    assert correlator.lookup('LONG').close is not None
+    assert len(correlator) == 3
+    assert correlator.incomplete['close'] == 1
+
+    # Timers of evicted and finished transactions serve their slot's next
+    assert correlator.expire(now=correlator.ttl + 14) == 3
+    assert correlator.expired == 3
+
+
+def test_timers_stay_bounded_by_capacity(clock):
+    correlator = TransactionCorrelator(ttl=3600.0, capacity=100,
+                                       clock=clock)
+    for index in range(20000):
+        clock.now = index * 0.01
+        mid = f'MID{index}'
+        correlator.add(settlement(mid, clock.now, open=OPEN))
+        correlator.add(settlement(mid, clock.now, close=CLOSE,
+                                  submission=SUBMISSION, deposit=DEPOSIT))
+    assert (len(correlator), correlator.completed) == (0, 20000)
+    assert len(correlator.wheel) <= correlator.capacity
+
+
+def test_reused_slot_expires_after_its_own_ttl(clock):
+    correlator = TransactionCorrelator(ttl=100.0, capacity=1, clock=clock)
+    correlator.add(settlement('MID1', 0.0, open=OPEN))
+    clock.now = 50.0
+    correlator.add(settlement('MID1', 50.0, close=CLOSE,
+                              submission=SUBMISSION, deposit=DEPOSIT))
+    # Takes over the slot, and the timer MID1 left on it
+    correlator.add(settlement('MID2', 50.0, open=OPEN))
+    assert len(correlator.wheel) == 1
+    assert correlator.expire(now=101.0) == 0
+    assert correlator.expire(now=151.0) == 1
+    assert len(correlator.wheel) == 0
+
+
+def test_composite_key_and_invalid_arguments(clock):
+    correlator = TransactionCorrelator(key_fields=('mid', 'open_datetime'),
+                                       clock=clock)
+    correlator.add(settlement('MID1', open=OPEN))
+    correlator.add(settlement('MID1', open=CLOSE))
+    assert len(correlator) == 2
+    assert correlator.lookup(('MID1', OPEN)).open == parse_datetime(OPEN)
+
+    for options in ({'ttl': 0}, {'capacity': 0}, {'key_fields': ('tid',)},
+                    {'field_OIDs': dict(FIELD_OIDS, mid='')}):
+        with pytest.raises(ValueError):
+            TransactionCorrelator(**options)
+
+
+def test_manager_correlates_transactions():
+    correlator = TransactionCorrelator()
+    manager = SNMPManager(verbose=False, correlate=correlator)
+    template = RawTrapTemplate(FIELD_OIDS['status'], FIELD_OIDS.values())
+    for index in range(10):
+        values = ['sale', 'settled', '1.00', 'VISA', f'MID{index}', '',
+                  OPEN, '', '']
+        if index % 2:
+            values[5:] = [DEPOSIT, OPEN, CLOSE, SUBMISSION]
+        manager._callback(manager.transportDispatcher, None,
+                          ('127.0.0.1', 5000),
+                          template.encode(index, 0, values))
+    manager.stop()
+
+    stats = manager.stats()['correlate']
+    assert (stats['open'], stats['completed']) == (5, 5)
+    text = MetricsRegistry([manager_metrics(manager)]).render()
+    assert 'snmp_manager_transactions_open 5' in text
+    bucket = 'snmp_manager_transaction_stage_seconds_bucket{from="open",'
+    assert bucket + 'to="close",le="1800"} 0' in text
+    assert bucket + 'to="close",le="7200"} 5' in text
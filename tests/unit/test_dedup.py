@@ -0,0 +1,80 @@
+import pytest
+from commands.trap.dedup import DuplicateFilter
+from commands.trap.manager import SNMPManager
+from client.agents.raw import RawTrapTemplate, TAG_INFORM_PDU
+
+
+def test_duplicates_within_window(clock):
+    dedup = DuplicateFilter(window=5.0, clock=clock)
+    source = ('10.0.0.1', 162)
+
+    assert not dedup.seen(b'trap', source)
+    clock.now = 4.9
+    assert dedup.seen(b'trap', source)
+    # Another port of the same host is the same source
+    assert dedup.seen(b'trap', ('10.0.0.1', 1162))
+    assert not dedup.seen(b'trap', ('10.0.0.2', 162))
+    assert not dedup.seen(b'other', source)
+
+    # The window runs from the first copy and expired keys are evicted
+    clock.now = 5.0
+    assert not dedup.seen(b'trap', source)
+    assert len(dedup) == 3
+    clock.now = 20.0
+    assert not dedup.seen(b'other', source)
+    assert len(dedup) == 1
+
+    assert (dedup.hits, dedup.misses) == (2, 5)
+    assert dedup.hit_rate == pytest.approx(2 / 7)
+
+
+def test_size_bound_evicts_oldest(clock):
+    dedup = DuplicateFilter(window=60.0, maxsize=3, clock=clock)
+    for index in range(4):
+        dedup.seen(bytes([index]), ('10.0.0.1', 162))
+    assert len(dedup) == 3
+    assert dedup.evictions == 1
+    assert not dedup.seen(bytes([0]), ('10.0.0.1', 162))
+    assert dedup.seen(bytes([3]), ('10.0.0.1', 162))
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        DuplicateFilter(window=0)
+    with pytest.raises(ValueError):
+        DuplicateFilter(maxsize=0)
+
+
+def test_manager_skips_duplicates_before_decoding(notification_OID,
+                                                  amount_OID):
+    manager = SNMPManager(verbose=False, dedup=5.0)
+    template = RawTrapTemplate(notification_OID, [amount_OID])
+    datagrams = [template.encode(index, 0, [str(index)])
+                 for index in range(10)]
+    for _ in range(3):
+        for data in datagrams:
+            manager._callback(manager.transportDispatcher, None,
+                              ('127.0.0.1', 5000), data)
+
+    stats = manager.stats()
+    assert stats['received'] == 30
+    assert stats['notifications'] == 10
+    assert stats['duplicates'] == 20
+    assert stats['duplicate_rate'] == pytest.approx(2 / 3)
+    manager.stop()
+
+
+def test_manager_answers_retransmitted_informs(notification_OID, amount_OID):
+    manager = SNMPManager(verbose=False, dedup=5.0)
+    sent = []
+    manager.transportDispatcher.send_message = \
+        lambda message, domain, address: sent.append(message)
+    data = RawTrapTemplate(notification_OID, [amount_OID],
+                           pdu_tag=TAG_INFORM_PDU).encode(7, 0, ['1'])
+    for _ in range(3):
+        manager._callback(manager.transportDispatcher, None,
+                          ('127.0.0.1', 5000), data)
+
+    assert len(sent) == 3
+    assert manager.duplicates == 0
+    manager.stop()
@@ -0,0 +1,81 @@
+import os
+import asyncio
+import tracemalloc
+import pytest
+from client.agents.fleet import Fleet
+
+
+notification_OID = os.getenv('OID_SETTLEMENT_STATUS')
+device_OID = os.getenv('OID_SETTLEMENT_ENTITY')
+mid_OID = os.getenv('OID_SETTLEMENT_MID')
+
+
+class Collector(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.datagrams = []
+
+    def datagram_received(self, data, addr):
+        self.datagrams.append(data)
+
+
+def test_add_and_view():
+    fleet = Fleet(notification_OID, device_OID, mid_OID)
+    index = fleet.add(device_id=42, mid='ABC123')
+
+    assert fleet[index].device_id == 42
+    assert fleet[index].mid == 'ABC123'
+    assert fleet[-1].index == index
+    with pytest.raises(IndexError):
+        fleet[1]
+
+
+def test_mid_too_long():
+    fleet = Fleet(notification_OID, device_OID, mid_OID, mid_length=4)
+    with pytest.raises(ValueError):
+        fleet.add(mid='ABCDEF')
+
+
+def test_empty_device_OID():
+    with pytest.raises(ValueError):
+        Fleet(notification_OID, None, mid_OID)
+
+
+def test_memory_per_device():
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    fleet = Fleet(notification_OID, device_OID, mid_OID)
+    fleet.populate(20000)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    assert len(fleet) == 20000
+    assert (after - before) / len(fleet) < 300
+    assert fleet.bytes_per_device() < 64
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("send_mode", ["hlapi", "raw"])
+async def test_send_round(send_mode):
+    loop = asyncio.get_running_loop()
+    transport, collector = await loop.create_datagram_endpoint(
+        Collector, local_addr=('127.0.0.1', 0))
+    port = transport.get_extra_info('sockname')[1]
+    fleet = Fleet(notification_OID, device_OID, mid_OID,
+                  varbinds={os.getenv('OID_SETTLEMENT_TYPE'): 'settlement'},
+                  port=port, send_mode=send_mode)
+    fleet.populate(50)
+
+    try:
+        result = await fleet.send_round(concurrency=8)
+        await fleet[3].send()
+        await asyncio.sleep(0.2)
+    finally:
+        fleet.close()
+        transport.close()
+
+    assert result.sent == 50
+    assert list(fleet.sent[:5]) == [1, 1, 1, 2, 1]
+    assert len(collector.datagrams) == 51
+    # Device identity travels in the varbinds
+    assert fleet[3].mid.encode() in collector.datagrams[-1]
+    assert b'settlement' in collector.datagrams[0]
@@ -0,0 +1,64 @@
+import random
+import pytest
+from commands.trap.histogram import LatencyHistogram
+
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(99) == 0.0
+    assert histogram.mean == 0.0
+
+
+def test_bucket_bounds_cover_values():
+    for micros in list(range(0, 200)) + [1000, 65535, 10 ** 6, 10 ** 9]:
+        low, high = LatencyHistogram.bucket_bounds(
+            LatencyHistogram.bucket_index(micros))
+        assert low <= micros <= high
+
+
+def test_percentile_precision():
+    rng = random.Random(7)
+    values = [rng.expovariate(1 / 0.005) for _ in range(20000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+
+    values.sort()
+    for percent in (50, 90, 99):
+        exact = values[int(len(values) * percent / 100) - 1]
+        assert histogram.percentile(percent) == pytest.approx(exact,
+                                                              rel=0.04)
+    assert histogram.max == values[-1]
+    assert histogram.count == 20000
+
+
+def test_merge():
+    first, second, combined = (LatencyHistogram(), LatencyHistogram(),
+                               LatencyHistogram())
+    for i in range(1000):
+        value = i / 1e4
+        (first if i % 2 else second).record(value)
+        combined.record(value)
+
+    first.merge(second)
+    assert first.counts == combined.counts
+    assert first.count == combined.count
+    assert first.max == combined.max
+    assert first.percentile(99) == combined.percentile(99)
+
+
+def test_record_ns_matches_record():
+    rng = random.Random(11)
+    by_seconds = LatencyHistogram()
+    by_nanos = LatencyHistogram()
+    for _ in range(5000):
+        nanos = int(rng.expovariate(1 / 2e6))
+        by_seconds.record(nanos / 1e9)
+        by_nanos.record_ns(nanos)
+    assert by_nanos.counts == by_seconds.counts
+    assert by_nanos.count == 5000
+    assert by_nanos.total == pytest.approx(by_seconds.total)
+    for micros in (0, 63, 64, 1000, 10 ** 6):
+        histogram = LatencyHistogram()
+        histogram.record_ns(micros * 1000)
+        assert histogram.counts[LatencyHistogram.bucket_index(micros)] == 1
@@ -0,0 +1,103 @@
+import os
+import asyncio
+import pytest
+from commands.trap.manager import SNMPManager
+from client.agents.generic import SNMPAgent
+from client.agents.raw import RawTrapTemplate, decode_request_id, \
+    TAG_INFORM_PDU, TAG_TRAP_PDU
+from client.agents.timers import TimerWheel
+
+
+notification_OID = os.getenv('OID_SETTLEMENT_STATUS')
+varbinds = {os.getenv('OID_SETTLEMENT_TYPE'): 'settlement',
+            os.getenv('OID_SETTLEMENT_MID'): 'abc123'}
+
+
+def test_timer_wheel_expiry(clock):
+    wheel = TimerWheel(tick=0.01, slots=8, clock=clock)
+    wheel.schedule('short', 0.02)
+    wheel.schedule('long', 0.25)    # wraps around the 8 slots
+    assert len(wheel) == 2
+
+    clock.now = 0.05
+    assert wheel.advance() == ['short']
+    clock.now = 0.2
+    assert wheel.advance() == []
+    clock.now = 0.3
+    assert wheel.advance() == ['long']
+    assert len(wheel) == 0
+
+
+def test_timer_wheel_schedule_after_idle_gap(clock):
+    wheel = TimerWheel(tick=0.01, slots=8, clock=clock)
+    # Nothing advanced the wheel for a second
+    clock.now = 1.0
+    assert wheel.schedule('key', 0.05) == 105
+    clock.now = 1.04
+    assert wheel.advance() == []
+    clock.now = 1.06
+    assert wheel.advance() == ['key']
+
+
+def test_decode_request_id():
+    template = RawTrapTemplate(notification_OID, list(varbinds))
+    assert decode_request_id(template.encode(1234, 0, ['a', 'b'])) == \
+        (TAG_TRAP_PDU, 1234)
+    with pytest.raises(ValueError):
+        decode_request_id(b'\x30\x05\x02')
+
+
+@pytest.mark.asyncio
+async def test_informs_acked_by_manager(capfd):
+    manager = SNMPManager()
+    manager_task = asyncio.create_task(manager.run_async())
+    agent = SNMPAgent(notification_OID=notification_OID, varbinds=varbinds)
+    results = []
+
+    try:
+        await asyncio.sleep(0.5)
+        report = await agent.send_informs(count=200, window=64,
+                                          timeout=0.5,
+                                          on_result=results.append)
+    finally:
+        manager.stop()
+        await manager_task
+
+    assert report.sent == 200
+    assert report.acked == 200
+    assert report.lost == 0
+    assert report.latency_max > 0
+    assert sorted(outcome.index for outcome in results) == list(range(200))
+    assert "settlement" in capfd.readouterr().out
+
+
+@pytest.mark.asyncio
+async def test_informs_lost_without_manager():
+    loop = asyncio.get_running_loop()
+    # A bound socket that never answers
+    transport, _ = await loop.create_datagram_endpoint(
+        asyncio.DatagramProtocol, local_addr=('127.0.0.1', 0))
+    port = transport.get_extra_info('sockname')[1]
+    agent = SNMPAgent(port=port, notification_OID=notification_OID,
+                      varbinds=varbinds)
+
+    try:
+        sender = await agent.inform_sender(window=4, timeout=0.02,
+                                           retries=2, backoff=1.5)
+        for _ in range(10):
+            await sender.send(['x', 'y'])
+            assert sender.in_flight <= 4
+        report = await asyncio.wait_for(sender.drain(), 5)
+        sender.close()
+    finally:
+        transport.close()
+
+    assert report.lost == 10
+    assert report.acked == 0
+    assert report.retransmits == 20
+    assert report.loss_rate == 1.0
+
+
+def test_inform_template_tag():
+    template = RawTrapTemplate(notification_OID, [], pdu_tag=TAG_INFORM_PDU)
+    assert decode_request_id(template.encode(7, 0, []))[0] == TAG_INFORM_PDU
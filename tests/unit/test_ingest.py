@@ -0,0 +1,169 @@
+import asyncio
+import os
+import threading
+import time
+import pytest
+from commands.trap.ingest import DecodePool, decode_batch
+from commands.trap.manager import SNMPManager
+from client.agents.generic import SNMPAgent
+from client.agents.raw import RawTrapTemplate
+
+
+notification_OID = os.getenv('OID_SETTLEMENT_STATUS')
+amount_OID = os.getenv('OID_SETTLEMENT_AMOUNT')
+template = RawTrapTemplate(notification_OID, [amount_OID])
+
+
+def datagram(index):
+    return template.encode(index, 0, [str(index)])
+
+
+def amounts(batches):
+    return [header.varbinds[-1][1] for batch in batches
+            for *_, header in batch]
+
+
+def test_decode_batch():
+    headers = decode_batch([datagram(1), b'\x30\x03garbage', datagram(2)])
+    assert headers[0].varbinds[-1] == (amount_OID, '1')
+    assert headers[1] is None
+    lazy = decode_batch([datagram(3)], lazy=True)[0]
+    assert lazy.trap_OID == notification_OID
+    assert lazy._varbinds is None
+
+
+def test_pool_decodes_in_batches():
+    batches = []
+    pool = DecodePool(workers=1, batch_size=8)
+    for index in range(20):
+        assert pool.submit(None, ('10.0.0.1', 162), datagram(index))
+    pool.submit(None, ('10.0.0.1', 162), b'\x30\x03garbage')
+    pool.start(batches.append)
+    assert pool.flush(5)
+    pool.close()
+
+    assert [len(batch) for batch in batches] == [8, 8, 5]
+    assert amounts(batches[:2]) + amounts([batches[2][:-1]]) == \
+        [str(index) for index in range(20)]
+    received, domain, address, data, header = batches[2][-1]
+    assert (address, data, header) == \
+        (('10.0.0.1', 162), b'\x30\x03garbage', None)
+    stats = pool.stats()
+    assert (stats['submitted'], stats['decoded'], stats['fallbacks'],
+            stats['batches'], stats['max_depth'], stats['depth']) == \
+        (21, 20, 1, 3, 21, 0)
+    assert pool.wait.count == 21
+    assert stats['wait']['max'] >= 0
+
+
+@pytest.mark.parametrize('policy, expected, counter', [
+    ('drop_newest', ['0', '1', '2'], 'dropped_newest'),
+    ('drop_oldest', ['2', '3', '4'], 'dropped_oldest'),
+])
+def test_drop_policies(policy, expected, counter):
+    batches = []
+    pool = DecodePool(workers=1, maxsize=3, policy=policy)
+    # Not started yet, so nothing leaves the queue
+    results = [pool.submit(None, None, datagram(index)) for index in range(5)]
+    assert results == ([True] * 3 + [False] * 2
+                       if policy == 'drop_newest' else [True] * 5)
+    assert getattr(pool, counter) == 2
+    assert pool.dropped == 2
+    pool.start(batches.append)
+    assert pool.flush(5)
+    pool.close()
+    assert amounts(batches) == expected
+    assert not pool.submit(None, None, datagram(5))
+    assert pool.dropped_newest == 3 - (policy == 'drop_oldest') * 2
+
+
+def test_block_policy_waits_for_room():
+    release = threading.Event()
+    batches = []
+
+    def deliver(batch):
+        release.wait(5)
+        batches.append(batch)
+
+    pool = DecodePool(workers=1, maxsize=1, batch_size=1, policy='block')
+    pool.start(deliver)
+    pool.submit(None, None, datagram(0))
+    # The worker holds datagram 0, datagram 1 fills the queue
+    deadline = time.monotonic() + 5
+    while len(pool) and time.monotonic() < deadline:
+        time.sleep(0.001)
+    pool.submit(None, None, datagram(1))
+    producer = threading.Thread(
+        target=pool.submit, args=(None, None, datagram(2)))
+    producer.start()
+    while not pool.blocked and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert pool.blocked == 1
+    release.set()
+    producer.join(5)
+    assert pool.flush(5)
+    pool.close()
+    assert amounts(batches) == ['0', '1', '2']
+    assert pool.blocked_seconds > 0
+    assert pool.dropped == 0
+
+
+def test_process_mode():
+    batches = []
+    pool = DecodePool(workers=2, mode='process', batch_size=16)
+    pool.start(batches.append)
+    for index in range(100):
+        pool.submit(None, None, datagram(index))
+    assert pool.flush(10)
+    pool.close()
+    assert sorted(amounts(batches), key=int) == \
+        [str(index) for index in range(100)]
+    assert pool.decoded == 100
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        DecodePool(mode='fiber')
+    with pytest.raises(ValueError):
+        DecodePool(policy='spill')
+    with pytest.raises(ValueError):
+        DecodePool(workers=0)
+    with pytest.raises(ValueError):
+        SNMPManager(verbose=False, decode=DecodePool(lazy=True))
+
+
+@pytest.mark.asyncio
+async def test_close_delivers_batches_waiting_for_loop():
+    batches = []
+    pool = DecodePool(workers=2, batch_size=4)
+    pool.start(batches.append, asyncio.get_running_loop())
+    for index in range(50):
+        pool.submit(None, None, datagram(index))
+    # No await: decoded batches cannot be delivered until close()
+    pool.close()
+    assert sorted(amounts(batches), key=int) == \
+        [str(index) for index in range(50)]
+
+
+@pytest.mark.asyncio
+async def test_manager_decodes_off_the_loop():
+    manager = SNMPManager(verbose=False, decode=2, recent=1000)
+    manager_task = asyncio.create_task(manager.run_async())
+    agent = SNMPAgent(notification_OID=notification_OID,
+                      varbinds={amount_OID: 'inform'})
+
+    try:
+        await asyncio.wait_for(manager.ready.wait(), 5)
+        report = await agent.send_informs(count=100, window=32, timeout=0.5)
+    finally:
+        manager.stop()
+        await manager_task
+
+    assert report.acked == 100
+    stats = manager.stats()
+    assert stats['notifications'] == 100
+    assert stats['decode']['submitted'] == stats['received']
+    assert stats['decode']['wait']['max'] > 0
+    traps = manager.recent.query()
+    assert len(traps) == 100
+    assert traps[0].pdu_type == 'inform'
@@ -0,0 +1,170 @@
+import os
+import asyncio
+import pytest
+from pyasn1.codec.ber import encoder
+from pysnmp.proto import api
+from commands.trap.lazy import decode_header, decode_message, decode_oid, \
+    TAG_V1_TRAP_PDU
+from commands.trap.manager import SNMPManager, LazyReceivedTrap
+from client.agents.raw import RawTrapTemplate, TAG_INFORM_PDU, \
+    TAG_RESPONSE_PDU, encode_oid, decode_request_id
+
+
+notification_OID = os.getenv('OID_SETTLEMENT_STATUS')
+other_OID = os.getenv('OID_SETTLEMENT_TYPE')
+varbind_OIDs = [os.getenv('OID_SETTLEMENT_AMOUNT'),
+                os.getenv('OID_SETTLEMENT_MID')]
+
+
+def full_varbinds(data):
+    pMod, message = decode_message(data)
+    return [(oid.prettyPrint(), val.prettyPrint())
+            for oid, val in pMod.apiPDU.get_varbinds(
+                pMod.apiMessage.get_pdu(message))]
+
+
+def v1_trap(generic, specific):
+    pMod = api.PROTOCOL_MODULES[api.SNMP_VERSION_1]
+    pdu = pMod.TrapPDU()
+    pMod.apiTrapPDU.set_defaults(pdu)
+    pMod.apiTrapPDU.set_enterprise(pdu, (1, 3, 6, 1, 4, 1, 12345))
+    pMod.apiTrapPDU.set_generic_trap(pdu, generic)
+    pMod.apiTrapPDU.set_specific_trap(pdu, specific)
+    pMod.apiTrapPDU.set_varbinds(
+        pdu, [((1, 3, 6, 1, 4, 1, 12345, 1), pMod.OctetString('x'))])
+    message = pMod.Message()
+    pMod.apiMessage.set_defaults(message)
+    pMod.apiMessage.set_community(message, 'public')
+    pMod.apiMessage.set_pdu(message, pdu)
+    return encoder.encode(message)
+
+
+def get_request():
+    pMod = api.PROTOCOL_MODULES[api.SNMP_VERSION_2C]
+    pdu = pMod.GetRequestPDU()
+    pMod.apiPDU.set_defaults(pdu)
+    pMod.apiPDU.set_varbinds(pdu, [((1, 3, 6, 1, 2, 1, 1, 1, 0),
+                                    pMod.Null(''))])
+    message = pMod.Message()
+    pMod.apiMessage.set_defaults(message)
+    pMod.apiMessage.set_community(message, 'public')
+    pMod.apiMessage.set_pdu(message, pdu)
+    return encoder.encode(message)
+
+
+def test_decode_oid():
+    for OID in ['1.3.6.1.2.1.1.3.0', '1.3.6.1.4.1.12345.4294967295',
+                '2.999.1', '0.39']:
+        encoded = encode_oid(OID)
+        assert decode_oid(encoded, 2, len(encoded)) == OID
+    with pytest.raises(ValueError):
+        decode_oid(b'\x2b\x86', 0, 2)
+
+
+def test_v2c_header_and_lazy_varbinds():
+    template = RawTrapTemplate(notification_OID, varbind_OIDs,
+                               community='private')
+    data = template.encode(1234, 500, ['12.50', 'MID00001'])
+    header = decode_header(data)
+
+    assert header.version == 1
+    assert header.community == b'private'
+    assert header.pdu_type == 'trap'
+    assert header.request_id == 1234
+    assert header.trap_OID == notification_OID
+    assert header._message is None
+
+    assert header.varbinds == full_varbinds(data)
+    assert header.varbinds[-1] == (varbind_OIDs[-1], 'MID00001')
+
+
+def test_inform_header():
+    template = RawTrapTemplate(notification_OID, varbind_OIDs,
+                               pdu_tag=TAG_INFORM_PDU)
+    header = decode_header(template.encode(7, 0, ['1', '2']))
+    assert header.pdu_type == 'inform'
+    assert header.request_id == 7
+
+
+def test_v1_trap_OID():
+    header = decode_header(v1_trap(6, 7))
+    assert header.version == 0
+    assert header.pdu_tag == TAG_V1_TRAP_PDU
+    assert header.trap_OID == '1.3.6.1.4.1.12345.0.7'
+    assert header.varbinds == [('1.3.6.1.4.1.12345.1', 'x')]
+    # linkDown is generic trap 2
+    assert decode_header(v1_trap(2, 0)).trap_OID == '1.3.6.1.6.3.1.1.5.3'
+
+
+def test_rejects_other_messages():
+    data = RawTrapTemplate(notification_OID, []).encode(1, 0, [])
+    for invalid in [get_request(), data + data, data[:-1], b'',
+                    b'\x30\x03\x02\x01\x03']:
+        with pytest.raises(ValueError):
+            decode_header(invalid)
+
+
+def test_malformed_varbinds_raise_value_error():
+    data = RawTrapTemplate(notification_OID, varbind_OIDs[:1]).encode(
+        1, 0, ['12'])
+    # The last value's tag starts a high tag number that never ends
+    header = decode_header(data[:-4] + b'\x1f' + data[-3:])
+    assert header.trap_OID == notification_OID
+    with pytest.raises(ValueError):
+        header.varbinds
+
+
+def test_filter_requires_lazy():
+    with pytest.raises(ValueError):
+        SNMPManager(verbose=False, trap_filter=lambda header: True)
+
+
+@pytest.mark.asyncio
+async def test_manager_filters_on_header():
+    manager = SNMPManager(verbose=False, lazy=True,
+                          trap_filter=lambda header:
+                          header.trap_OID == notification_OID)
+    accepted = RawTrapTemplate(notification_OID, varbind_OIDs)
+    rejected = RawTrapTemplate(other_OID, varbind_OIDs)
+    received = []
+
+    async def collect():
+        async for trap in manager.traps():
+            received.append(trap)
+            if len(received) == 5:
+                return
+
+    collector = asyncio.create_task(collect())
+    await asyncio.sleep(0)
+    for index in range(10):
+        template = accepted if index % 2 else rejected
+        manager._callback(manager.transportDispatcher, None,
+                          ('127.0.0.1', 0),
+                          template.encode(index, 0, [str(index), 'MID']))
+    await asyncio.wait_for(collector, 5)
+
+    assert manager.stats()['notifications'] == 5
+    assert manager.stats()['filtered'] == 5
+    assert all(isinstance(trap, LazyReceivedTrap) for trap in received)
+    assert all(trap.header._varbinds is None for trap in received)
+    assert [trap.varbinds[2][1] for trap in received] == \
+        ['1', '3', '5', '7', '9']
+    manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_lazy_manager_acknowledges_filtered_inform():
+    manager = SNMPManager(verbose=False, lazy=True,
+                          trap_filter=lambda header: False)
+    sent = []
+    manager.transportDispatcher.send_message = \
+        lambda message, domain, address: sent.append(message)
+    template = RawTrapTemplate(notification_OID, varbind_OIDs,
+                               pdu_tag=TAG_INFORM_PDU)
+    manager._callback(manager.transportDispatcher, None, ('127.0.0.1', 0),
+                      template.encode(99, 0, ['1', '2']))
+
+    assert manager.filtered == 1
+    assert len(sent) == 1
+    assert decode_request_id(sent[0]) == (TAG_RESPONSE_PDU, 99)
+    manager.stop()
@@ -0,0 +1,124 @@
+import os
+import json
+import socket
+import asyncio
+import pytest
+from commands.trap.histogram import LatencyHistogram
+from commands.trap.loadgen import load_profile, build_agent, LoadGenerator, \
+    run_workers
+
+
+class Collector(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.received = 0
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+
+
+@pytest.fixture
+def profile_path(tmp_path):
+    # Same layout SaveConfig writes
+    state = {
+        "ipv4_host": "127.0.0.1",
+        "port": "2162",
+        "notification_OID": os.getenv('OID_SETTLEMENT_STATUS'),
+        "varbinds": [
+            {os.getenv('OID_SETTLEMENT_TYPE'): "settlement"},
+            {os.getenv('OID_SETTLEMENT_MID'): "abc123"}
+        ]
+    }
+    file_path = tmp_path / "profile.json"
+    file_path.write_text(json.dumps(state, indent=4))
+    return str(file_path)
+
+
+def test_load_profile(profile_path):
+    profile = load_profile(profile_path)
+
+    assert profile["notification_OID"] == os.getenv('OID_SETTLEMENT_STATUS')
+    assert profile["varbinds"] == {
+        os.getenv('OID_SETTLEMENT_TYPE'): "settlement",
+        os.getenv('OID_SETTLEMENT_MID'): "abc123"
+    }
+
+
+def test_load_profile_without_notification(tmp_path):
+    file_path = tmp_path / "profile.json"
+    file_path.write_text(json.dumps({"varbinds": []}))
+    with pytest.raises(ValueError):
+        load_profile(str(file_path))
+
+
+def test_bad_rate(profile_path):
+    agent = build_agent(load_profile(profile_path))
+    with pytest.raises(ValueError):
+        LoadGenerator(agent, rate=0, duration=1)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("send_mode", ["hlapi", "raw"])
+async def test_open_loop_rate(profile_path, send_mode):
+    loop = asyncio.get_running_loop()
+    transport, collector = await loop.create_datagram_endpoint(
+        Collector, local_addr=('127.0.0.1', 0))
+    port = str(transport.get_extra_info('sockname')[1])
+    send_latency = LatencyHistogram()
+    agent = build_agent(load_profile(profile_path), port=port,
+                        send_mode=send_mode, send_latency=send_latency)
+    generator = LoadGenerator(agent, rate=200, duration=0.5, warmup=0.1,
+                              vary_mid_OID=os.getenv('OID_SETTLEMENT_MID'))
+
+    try:
+        report = await generator.run()
+        await asyncio.sleep(0.1)
+    finally:
+        agent.close()
+        transport.close()
+
+    # 0.5s at 200/s, warm-up traps are sent but not measured
+    assert report.scheduled == 100
+    assert report.sent + report.errors + report.skipped == 100
+    assert report.sent >= 95
+    assert collector.received >= 115
+    assert report.latency.count == report.sent
+    assert report.lag.count == 100
+    assert "achieved rate" in report.format()
+    # The agent's histogram also has the warm-up sends
+    assert send_latency.count >= report.sent
+
+
+@pytest.mark.parametrize("send_mode", ["hlapi", "raw"])
+def test_run_workers(profile_path, send_mode):
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('127.0.0.1', 0))
+    port = str(sink.getsockname()[1])
+    progress = []
+    send_latency = LatencyHistogram()
+
+    try:
+        report = run_workers(load_profile(profile_path), workers=2,
+                             rate=200, duration=0.5, warmup=0.1,
+                             mode=send_mode, port=port,
+                             on_progress=progress.append,
+                             progress_interval=0.1,
+                             send_latency=send_latency)
+    finally:
+        sink.close()
+
+    # Each worker offers 100/s for 0.5s; the parent merges both reports
+    assert report.rate == 200
+    assert report.scheduled == 100
+    assert report.sent + report.errors + report.skipped == 100
+    assert report.latency.count == report.sent
+    assert report.lag.count == 100
+    # The final progress snapshot of both workers sums to the report
+    assert progress[-1]["scheduled"] == 100
+    # Every send of both workers, warm-up included, reached the parent
+    assert send_latency.count >= report.sent + 10
+
+
+def test_run_workers_bad_count(profile_path):
+    with pytest.raises(ValueError):
+        run_workers(load_profile(profile_path), workers=0, rate=10,
+                    duration=1)
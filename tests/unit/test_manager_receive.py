@@ -0,0 +1,138 @@
+import os
+import asyncio
+import socket
+import time
+import pytest
+from commands.trap.histogram import LatencyHistogram
+from commands.trap.manager import SNMPManager
+from client.agents.generic import SNMPAgent
+from client.agents.raw import RawTrapTemplate
+
+
+notification_OID = os.getenv('OID_SETTLEMENT_STATUS')
+stamp_OID = os.getenv('OID_SETTLEMENT_AMOUNT')
+
+
+async def collect(manager, count, received):
+    async for trap in manager.traps():
+        received.append((time.perf_counter(), trap))
+        if len(received) == count:
+            return
+
+
+@pytest.mark.asyncio
+async def test_ready_and_iterator_end():
+    manager = SNMPManager(verbose=False)
+    manager_task = asyncio.create_task(manager.run_async())
+    await asyncio.wait_for(manager.ready.wait(), 5)
+    iterator_task = asyncio.create_task(collect(manager, 1, []))
+    await asyncio.sleep(0)
+
+    manager.stop()
+    await asyncio.wait_for(iterator_task, 5)
+    await manager_task
+    assert manager._running is False
+
+
+@pytest.mark.asyncio
+async def test_receive_latency_under_poll_interval():
+    manager = SNMPManager(verbose=False)
+    manager_task = asyncio.create_task(manager.run_async())
+    agent = SNMPAgent(notification_OID=notification_OID,
+                      varbinds={stamp_OID: ''}, send_mode='raw')
+    sent = []
+    received = []
+
+    try:
+        await asyncio.wait_for(manager.ready.wait(), 5)
+        collector = asyncio.create_task(collect(manager, 100, received))
+        await asyncio.sleep(0)
+        sender = await agent.get_raw_sender()
+        for index in range(100):
+            sent.append(time.perf_counter())
+            sender.send([str(index)])
+            await asyncio.sleep(0.002)
+        await asyncio.wait_for(collector, 5)
+    finally:
+        agent.close()
+        manager.stop()
+        await manager_task
+
+    histogram = LatencyHistogram()
+    for arrival, trap in received:
+        histogram.record(arrival - sent[int(trap.varbinds[-1][1])])
+    assert received[0][1].pdu_type == 'trap'
+    assert received[0][1].version == 1
+    # The old poll loop woke up every 100 ms
+    assert histogram.percentile(99) < 0.05
+
+
+@pytest.mark.asyncio
+async def test_malformed_datagram_is_counted(capfd):
+    manager = SNMPManager()
+    manager_task = asyncio.create_task(manager.run_async())
+    agent = SNMPAgent(notification_OID=notification_OID,
+                      varbinds={stamp_OID: 'after-garbage'})
+
+    try:
+        await asyncio.wait_for(manager.ready.wait(), 5)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b'\x30\x03garbage', ('127.0.0.1', manager.port))
+        await agent.send_trap()
+        await asyncio.sleep(0.2)
+    finally:
+        manager.stop()
+        await manager_task
+
+    assert manager.transportDispatcher.errors == 1
+    assert "after-garbage" in capfd.readouterr().out
+
+
+@pytest.mark.asyncio
+async def test_unregister_timer_callback_removes_only_it():
+    manager = SNMPManager(verbose=False, aggregate=1.0)
+    manager_task = asyncio.create_task(manager.run_async())
+    await asyncio.wait_for(manager.ready.wait(), 5)
+    dispatcher = manager.transportDispatcher
+    ticks = []
+    dispatcher.register_timer_callback(ticks.append)
+    dispatcher.unregister_timer_callback(ticks.append)
+    assert dispatcher._timer_callbacks == [manager._on_timer]
+    assert dispatcher._timer_handle is not None
+
+    dispatcher.unregister_timer_callback()
+    assert dispatcher._timer_callbacks == []
+    assert dispatcher._timer_handle is None
+    manager.stop()
+    await manager_task
+
+
+@pytest.mark.asyncio
+async def test_timer_survives_failing_callbacks():
+    manager = SNMPManager(verbose=False, lazy=True, recent=100,
+                          aggregate=0.1)
+    manager_task = asyncio.create_task(manager.run_async())
+    template = RawTrapTemplate(notification_OID, [stamp_OID])
+
+    def fail(now):
+        raise RuntimeError('timer callback failed')
+
+    try:
+        await asyncio.wait_for(manager.ready.wait(), 5)
+        dispatcher = manager.transportDispatcher
+        dispatcher.register_timer_callback(fail)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for index in range(3):
+                # Decodes up to its header, but not its var-binds
+                data = template.encode(index, 0, ['12'])
+                sock.sendto(data[:-4] + b'\x1f' + data[-3:],
+                            ('127.0.0.1', manager.port))
+        await asyncio.sleep(1.2)
+        # The first trap, then the summary of the other two, failed
+        assert manager.stats()['errors'] >= 4
+        assert manager.errors == 1
+        assert dispatcher.timer_errors >= 2
+        assert not dispatcher._timer_handle.cancelled()
+    finally:
+        manager.stop()
+        await manager_task
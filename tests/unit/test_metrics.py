@@ -0,0 +1,109 @@
+import asyncio
+import urllib.error
+import urllib.request
+import pytest
+from commands.trap.histogram import LatencyHistogram
+from commands.trap.manager import SNMPManager
+from commands.trap.metrics import CONTENT_TYPE, Exposition, MetricsRegistry, \
+    MetricsServer, histogram_buckets, histogram_metrics, manager_metrics
+from client.agents.generic import SNMPAgent
+from client.agents.raw import RawTrapTemplate
+
+
+def samples(text):
+    # Sample lines as {name with labels: value}
+    return dict(line.rsplit(' ', 1) for line in text.splitlines()
+                if not line.startswith('#'))
+
+
+def test_exposition_format():
+    histogram = LatencyHistogram()
+    for seconds in (0.00002, 0.0003, 0.0003, 0.02, 20.0):
+        histogram.record(seconds)
+    assert histogram_buckets(histogram, (0.0001, 0.001, 0.1)) == \
+        ([1, 3, 4], 5)
+
+    exposition = Exposition()
+    exposition.counter('x_total', 'Things.', 3)
+    exposition.gauge('depth', 'Depth.', [({'stage': 'a"b'}, 2)])
+    exposition.histogram('wait_seconds', 'Wait.', [({'stage': 'x'},
+                                                    histogram)])
+    text = exposition.text()
+    assert '# TYPE x_total counter\nx_total 3\n' in text
+    assert 'depth{stage="a\\"b"} 2\n' in text
+    found = samples(text)
+    assert found['wait_seconds_bucket{stage="x",le="0.0001"}'] == '1'
+    assert found['wait_seconds_bucket{stage="x",le="0.001"}'] == '3'
+    assert found['wait_seconds_bucket{stage="x",le="10"}'] == '4'
+    assert found['wait_seconds_bucket{stage="x",le="+Inf"}'] == '5'
+    assert found['wait_seconds_count{stage="x"}'] == '5'
+    assert float(found['wait_seconds_sum{stage="x"}']) == \
+        pytest.approx(20.02062)
+
+
+def test_manager_metrics(notification_OID, amount_OID):
+    manager = SNMPManager(verbose=False, latency=True, recent=10)
+    template = RawTrapTemplate(notification_OID, [amount_OID])
+    sizes = 0
+    for index in range(3):
+        data = template.encode(index, 0, [str(index)])
+        sizes += len(data)
+        manager._callback(manager.transportDispatcher, None,
+                          ('127.0.0.1', 5000), data)
+    # An SNMPv3 message without USM users configured
+    manager._callback(manager.transportDispatcher, None,
+                      ('127.0.0.1', 5000), b'\x30\x03\x02\x01\x03')
+    manager.stop()
+
+    found = samples(MetricsRegistry([manager_metrics(manager)]).render())
+    assert found['snmp_manager_datagrams_received_total'] == '4'
+    assert found['snmp_manager_bytes_received_total'] == str(sizes + 5)
+    assert found['snmp_manager_notifications_total'] == '3'
+    assert found['snmp_manager_unsupported_version_total'] == '1'
+    assert found['snmp_manager_dropped_total{stage="iterator",'
+                 'policy="drop_newest"}'] == '0'
+    assert found['snmp_manager_stage_latency_seconds_count'
+                 '{stage="decode"}'] == '3'
+    assert found['snmp_manager_stage_latency_seconds_count'
+                 '{stage="deliver"}'] == '3'
+    assert found['snmp_manager_recent_notifications'] == '3'
+
+
+def test_metrics_server():
+    histogram = LatencyHistogram()
+    histogram.record(0.001)
+    server = MetricsServer(MetricsRegistry([histogram_metrics(
+        'snmp_agent_send_latency_seconds', 'Send latency.', histogram)]),
+        port=0)
+    server.start()
+    try:
+        url = f'http://127.0.0.1:{server.port}'
+        with urllib.request.urlopen(f'{url}/metrics', timeout=5) as reply:
+            assert reply.headers['Content-Type'] == CONTENT_TYPE
+            text = reply.read().decode()
+        assert 'snmp_agent_send_latency_seconds_count 1\n' in text
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f'{url}/other', timeout=5)
+        assert error.value.code == 404
+    finally:
+        server.close()
+
+
+@pytest.mark.asyncio
+async def test_agent_send_latency(notification_OID, amount_OID):
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        asyncio.DatagramProtocol, local_addr=('127.0.0.1', 0))
+    port = transport.get_extra_info('sockname')[1]
+    histogram = LatencyHistogram()
+    agent = SNMPAgent('127.0.0.1', port, notification_OID,
+                      {amount_OID: '1.00'}, send_mode='raw',
+                      send_latency=histogram)
+    try:
+        for _ in range(5):
+            await agent.send_trap()
+    finally:
+        agent.close()
+        transport.close()
+    assert histogram.count == 5
+    assert histogram.max > 0
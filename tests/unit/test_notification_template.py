@@ -0,0 +1,89 @@
+import os
+import pytest
+from client.agents.generic import SNMPAgent, SNMPNotification, \
+    NotificationTemplate, SNMP_TRAP_OID
+from client.components.varbinds import Varbind
+from pysnmp.hlapi.asyncio import SnmpEngine
+from pysnmp.hlapi.varbinds import MibViewControllerManager
+
+
+sample_varbinds = [
+            Varbind(os.getenv('OID_SETTLEMENT_TYPE'), 'settlement'),
+            Varbind(os.getenv('OID_SETTLEMENT_STATUS'), 'submitted'),
+            Varbind(os.getenv('OID_SETTLEMENT_AMOUNT'), '1000'),
+            Varbind(os.getenv('OID_SETTLEMENT_MID'), 'abc123')
+]
+
+
+def flatten(varbinds, engine):
+    mib_view = MibViewControllerManager.get_mib_view_controller(engine.cache)
+    resolved = [varbind.resolve_with_mib(mib_view, ignoreErrors=False)
+                for varbind in varbinds]
+    return [(str(oid), str(val)) for oid, val in resolved]
+
+
+def test_template_matches_notification_type():
+    engine = SnmpEngine()
+    notification_OID = os.getenv('OID_SETTLEMENT_STATUS')
+    notification = SNMPNotification(notification_OID, sample_varbinds)
+    template = NotificationTemplate.from_notification(notification)
+
+    mib_view = MibViewControllerManager.get_mib_view_controller(engine.cache)
+    expected = notification.create().resolve_with_mib(
+        mib_view, ignoreErrors=False).to_varbinds()
+    created = template.create([v.message for v in sample_varbinds], engine)
+
+    assert flatten(created, engine) == flatten(expected, engine)
+    assert flatten(created, engine)[0][0] == SNMP_TRAP_OID
+
+
+def test_template_resolves_once_per_engine():
+    engine = SnmpEngine()
+    template = NotificationTemplate('1.2.3.4', ['1.2.3.4.1'])
+    resolved = template.resolve(engine)
+    first = template.create(('a',), engine)
+    second = template.create(('b',), engine)
+
+    # The snmpTrapOID varbind and identities are shared between creates
+    assert template.resolve(engine) is resolved
+    assert first[0] is second[0] is resolved[0]
+    assert flatten(second, engine)[1] == ('1.2.3.4.1', 'b')
+
+
+def test_template_value_count_mismatch():
+    template = NotificationTemplate('1.2.3.4', ['1.2.3.4.1', '1.2.3.4.2'])
+    with pytest.raises(ValueError):
+        template.create(('only one',), SnmpEngine())
+
+
+def test_template_empty_notification_OID():
+    with pytest.raises(AttributeError):
+        NotificationTemplate(None, ['1.2.3.4.1'])
+
+
+def test_template_bad_varbind_OID():
+    with pytest.raises(AttributeError):
+        NotificationTemplate('1.2.3.4', ['1.2.3.4.1', 5])
+
+
+@pytest.mark.asyncio
+async def test_agent_template_cache():
+    agent = SNMPAgent(notification_OID=os.getenv('OID_SETTLEMENT_STATUS'),
+                      varbinds=list(sample_varbinds))
+    template = agent.get_template()
+    assert agent.get_template() is template
+
+    # Changing only values keeps the template, changing OIDs rebuilds it
+    agent.varbinds[0] = Varbind(os.getenv('OID_SETTLEMENT_TYPE'), 'refund')
+    assert agent.get_template() is template
+    agent.varbinds.append(Varbind('1.2.3.4', 'extra'))
+    assert agent.get_template() is not template
+
+
+@pytest.mark.asyncio
+async def test_agent_dict_varbinds():
+    agent = SNMPAgent(notification_OID=os.getenv('OID_SETTLEMENT_STATUS'),
+                      varbinds={'1.2.3.4': 'test'})
+    notification = agent.create_notification()
+
+    assert flatten(notification, agent.snmp_engine)[1] == ('1.2.3.4', 'test')
@@ -0,0 +1,160 @@
+import os
+import random
+import string
+import asyncio
+import pytest
+from pyasn1.codec.ber import decoder
+from pysnmp.hlapi.asyncio import CommunityData
+from pysnmp.proto import api
+from commands.trap.manager import SNMPManager
+from client.agents.generic import SNMPAgent
+from client.agents.raw import RawTrapTemplate, encode_oid, encode_length
+from client.components.varbinds import Varbind
+
+
+settlement_OIDs = [os.getenv('OID_SETTLEMENT_TYPE'),
+                   os.getenv('OID_SETTLEMENT_STATUS'),
+                   os.getenv('OID_SETTLEMENT_AMOUNT'),
+                   os.getenv('OID_SETTLEMENT_ENTITY'),
+                   os.getenv('OID_SETTLEMENT_MID')]
+pMod = api.PROTOCOL_MODULES[api.SNMP_VERSION_2C]
+
+
+class Collector(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.datagrams = asyncio.Queue()
+
+    def datagram_received(self, data, addr):
+        self.datagrams.put_nowait(data)
+
+
+def random_value(rng):
+    # Mix short and long values so long-form lengths are exercised
+    length = rng.choice([0, 1, 5, 40, 130, 300])
+    alphabet = string.ascii_letters + string.digits + ' -:.é'
+    return ''.join(rng.choice(alphabet) for _ in range(length))
+
+
+def decode(data):
+    message, _ = decoder.decode(data, asn1Spec=pMod.Message())
+    pdu = pMod.apiMessage.get_pdu(message)
+    varbinds = pMod.apiPDU.get_varbinds(pdu)
+    return int(pMod.apiPDU.get_request_id(pdu)), varbinds
+
+
+def test_encode_oid():
+    assert encode_oid('1.3.6.1.2.1.1.3.0').hex() == '06082b06010201010300'
+    assert encode_oid('1.3.6.1.4.1.12345').hex() == '06072b06010401e039'
+    with pytest.raises(ValueError):
+        encode_oid('1')
+
+
+def test_encode_length():
+    assert encode_length(5) == b'\x05'
+    assert encode_length(200) == b'\x81\xc8'
+    assert encode_length(300) == b'\x82\x01\x2c'
+
+
+def test_value_count_mismatch():
+    template = RawTrapTemplate('1.2.3.4', ['1.2.3.4.1'])
+    with pytest.raises(ValueError):
+        template.encode(1, 0, [])
+
+
+@pytest.mark.asyncio
+async def test_raw_matches_hlapi():
+    loop = asyncio.get_running_loop()
+    transport, collector = await loop.create_datagram_endpoint(
+        Collector, local_addr=('127.0.0.1', 0))
+    port = transport.get_extra_info('sockname')[1]
+    notification_OID = os.getenv('OID_SETTLEMENT_STATUS')
+    template = RawTrapTemplate(notification_OID, settlement_OIDs)
+    rng = random.Random(1234)
+
+    try:
+        for _ in range(25):
+            values = [random_value(rng) for _ in settlement_OIDs]
+            agent = SNMPAgent(port=port, notification_OID=notification_OID,
+                              varbinds=[Varbind(OID, value) for OID, value
+                                        in zip(settlement_OIDs, values)])
+            await agent.send_trap()
+            expected = await asyncio.wait_for(collector.datagrams.get(), 5)
+
+            request_id, varbinds = decode(expected)
+            uptime = int(varbinds[0][1])
+
+            assert template.encode(request_id, uptime, values) == expected
+    finally:
+        transport.close()
+
+
+@pytest.mark.asyncio
+async def test_raw_send_mode(capfd):
+    loop = asyncio.get_running_loop()
+    transport, collector = await loop.create_datagram_endpoint(
+        Collector, local_addr=('127.0.0.1', 0))
+    port = transport.get_extra_info('sockname')[1]
+    agent = SNMPAgent(port=port,
+                      notification_OID=os.getenv('OID_SETTLEMENT_STATUS'),
+                      varbinds=[Varbind(settlement_OIDs[0], 'settlement'),
+                                Varbind(settlement_OIDs[1], 'submitted')],
+                      send_mode='raw')
+    manager = SNMPManager()
+
+    try:
+        await agent.send_trap()
+        data = await asyncio.wait_for(collector.datagrams.get(), 5)
+
+        # The existing manager callback decodes the raw datagram
+        manager._callback(manager.transportDispatcher, None,
+                          ('127.0.0.1', 0), data)
+        # Notifications are written by the output's writer thread
+        assert manager.output.flush(5)
+        print_output = capfd.readouterr().out
+        assert "settlement" in print_output
+        assert "submitted" in print_output
+    finally:
+        agent.close()
+        manager.stop()
+        transport.close()
+
+
+@pytest.mark.asyncio
+async def test_raw_sender_follows_target_and_community():
+    loop = asyncio.get_running_loop()
+    transports, collectors, ports = [], [], []
+    for _ in range(2):
+        transport, collector = await loop.create_datagram_endpoint(
+            Collector, local_addr=('127.0.0.1', 0))
+        transports.append(transport)
+        collectors.append(collector)
+        ports.append(transport.get_extra_info('sockname')[1])
+    agent = SNMPAgent(port=ports[0],
+                      notification_OID=os.getenv('OID_SETTLEMENT_STATUS'),
+                      varbinds=[Varbind(settlement_OIDs[0], 'settlement')],
+                      send_mode='raw')
+
+    try:
+        sender = await agent.get_raw_sender()
+        assert await agent.get_raw_sender() is sender
+
+        agent.target['port'] = ports[1]
+        await agent.send_trap()
+        data = await asyncio.wait_for(collectors[1].datagrams.get(), 5)
+        assert collectors[0].datagrams.empty()
+
+        agent.community = CommunityData('private', mpModel=1)
+        await agent.send_trap()
+        data = await asyncio.wait_for(collectors[1].datagrams.get(), 5)
+        message, _ = decoder.decode(data, asn1Spec=pMod.Message())
+        assert str(pMod.apiMessage.get_community(message)) == 'private'
+        assert sender.protocol is None
+    finally:
+        agent.close()
+        for transport in transports:
+            transport.close()
+
+
+def test_bad_send_mode():
+    with pytest.raises(ValueError):
+        SNMPAgent(notification_OID='1.2.3.4', send_mode='fast')
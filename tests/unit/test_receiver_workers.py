@@ -0,0 +1,98 @@
+import os
+import signal
+import socket
+import time
+import pytest
+from client.agents.raw import RawTrapTemplate
+from commands.trap.workers import ReceiverSupervisor, format_stats
+
+
+notification_OID = os.getenv('OID_SETTLEMENT_STATUS')
+amount_OID = os.getenv('OID_SETTLEMENT_AMOUNT')
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(supervisor, condition, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, format_stats(supervisor)
+        supervisor.poll(0.05)
+
+
+def send(port, count, sources=16):
+    """
+    Sends `count` traps from `sources` sockets, so SO_REUSEPORT hashes them
+    to different workers.
+    """
+    template = RawTrapTemplate(notification_OID, [amount_OID])
+    sockets = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+               for _ in range(sources)]
+    try:
+        for index in range(count):
+            sockets[index % sources].sendto(
+                template.encode(index, 0, [str(index)]), ('127.0.0.1', port))
+            # Stay well below the socket buffers, a lost datagram fails
+            # the exact counts below
+            if index % 25 == 24:
+                time.sleep(0.02)
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+@pytest.fixture
+def supervisor():
+    supervisor = ReceiverSupervisor(2, '127.0.0.1', '::1', free_port(),
+                                    report_interval=0.1, restart_delay=0.2)
+    yield supervisor
+    supervisor.stop()
+
+
+def test_rejects_no_workers():
+    with pytest.raises(ValueError):
+        ReceiverSupervisor(0, '127.0.0.1', None, 2162)
+
+
+def test_workers_share_port_and_aggregate(supervisor):
+    supervisor.start()
+    wait_for(supervisor, lambda: supervisor.ready == 2)
+
+    send(supervisor.options["port"], 200)
+    wait_for(supervisor,
+             lambda: supervisor.totals()["notifications"] == 200)
+
+    stats = supervisor.worker_stats()
+    assert len({worker["pid"] for worker in stats}) == 2
+    # 16 senders all hashed to one of two sockets is a 1 in 32768 chance
+    assert all(worker["notifications"] > 0 for worker in stats)
+    assert supervisor.totals()["received"] == 200
+    assert supervisor.totals()["errors"] == 0
+
+    supervisor.stop()
+    assert supervisor.ready == 0
+    assert supervisor.totals()["notifications"] == 200
+
+
+def test_restarts_crashed_worker(supervisor):
+    supervisor.start()
+    wait_for(supervisor, lambda: supervisor.ready == 2)
+    send(supervisor.options["port"], 100)
+    wait_for(supervisor,
+             lambda: supervisor.totals()["notifications"] == 100)
+
+    crashed = supervisor.worker_stats()[0]["pid"]
+    os.kill(crashed, signal.SIGKILL)
+    wait_for(supervisor,
+             lambda: supervisor.restarts == 1 and supervisor.ready == 2)
+    assert crashed not in {worker["pid"]
+                           for worker in supervisor.worker_stats()}
+
+    # Counters of the crashed worker are kept in the totals
+    send(supervisor.options["port"], 100)
+    wait_for(supervisor,
+             lambda: supervisor.totals()["notifications"] == 200)
@@ -0,0 +1,105 @@
+import asyncio
+import random
+from collections import deque
+import pytest
+from commands.trap.manager import SNMPManager
+from commands.trap.recent import RecentTraps
+from client.agents.raw import RawTrapTemplate
+
+
+@pytest.fixture
+def indexed_trap(make_trap, amount_OID):
+    # Notification `index`, its var-bind names cycling over four
+    def indexed_trap(index, host='10.0.0.1', trap_OID=None, value=None):
+        return make_trap(1000.0 + index, host, trap_OID,
+                         varbinds=[(f'{amount_OID}.{index % 4}',
+                                    value or str(index))])
+    return indexed_trap
+
+
+def test_capacity_and_sequence_numbers(indexed_trap, notification_OID):
+    recent = RecentTraps(capacity=3)
+    for index in range(5):
+        assert recent.add(indexed_trap(index)) == index
+    assert (len(recent), recent.first, recent.evicted) == (3, 2, 2)
+    assert recent.get(1) is None
+    trap = recent.get(4)
+    assert (trap.sequence, trap.received, trap.host, trap.port) == \
+        (4, 1004.0, '10.0.0.1', 162)
+    assert trap.trap_OID == notification_OID
+    assert trap.varbinds == indexed_trap(4).varbinds
+    assert trap.pdu_type == 'trap'
+
+
+def test_byte_bound_matches_reference(indexed_trap):
+    rng = random.Random(3)
+    recent = RecentTraps(capacity=50, max_bytes=2000, max_OIDs=6,
+                         max_hosts=2)
+    reference = deque()
+    for index in range(2000):
+        trap = indexed_trap(index, host=f'10.0.0.{rng.randrange(4)}',
+                            value='x' * rng.randrange(200))
+        recent.add(trap)
+        reference.append(trap)
+        while len(reference) > len(recent):
+            reference.popleft()
+        assert recent.first == index + 1 - len(recent)
+    assert len(recent) > 3
+    assert [(trap.host, trap.varbinds) for trap in recent.query()] == \
+        [(trap.address[0], trap.varbinds) for trap in reference]
+    assert recent.add(indexed_trap(0, value='x' * 2000)) is None
+    assert recent.oversized == 1
+
+
+def test_query_filters(indexed_trap, amount_OID):
+    # Few interned values, so the filters also see inline ones
+    recent = RecentTraps(max_OIDs=4, max_hosts=1)
+    for index in range(100):
+        recent.add(indexed_trap(index, host=f'10.0.0.{index % 2}',
+                                trap_OID=f'1.3.6.1.4.1.{1 + index % 3}.1'))
+
+    assert len(recent.query()) == 100
+    assert len(recent.query(host='10.0.0.1')) == 50
+    assert len(recent.query(host='10.0.0.9')) == 0
+    assert len(recent.query(trap_OID='1.3.6.1.4.1.2')) == 33
+    assert len(recent.query(trap_OID='1.3.6.1.4.1')) == 100
+    assert len(recent.query(varbind_OID=f'{amount_OID}.3')) == 25
+    assert len(recent.query(varbind_OID=amount_OID)) == 100
+    found = recent.query(host='10.0.0.0', trap_OID='1.3.6.1.4.1.3',
+                         since=1050.0, limit=3)
+    assert [trap.sequence for trap in found] == [86, 92, 98]
+    assert [trap.sequence for trap in recent.query(after=97)] == [98, 99]
+
+
+@pytest.mark.asyncio
+async def test_follow(indexed_trap):
+    recent = RecentTraps()
+    recent.add(indexed_trap(0))
+    received = []
+
+    async def follow():
+        async for trap in recent.follow(host='10.0.0.2'):
+            received.append(trap.sequence)
+
+    task = asyncio.create_task(follow())
+    await asyncio.sleep(0)
+    for index in range(1, 7):
+        recent.add(indexed_trap(index, host=f'10.0.0.{index % 3}'))
+        await asyncio.sleep(0)
+    recent.close()
+    await asyncio.wait_for(task, 1)
+    assert received == [2, 5]
+
+
+def test_manager_keeps_recent_notifications(notification_OID, amount_OID):
+    manager = SNMPManager(verbose=False, recent=5)
+    template = RawTrapTemplate(notification_OID, [amount_OID])
+    for index in range(8):
+        manager._callback(manager.transportDispatcher, None,
+                          ('127.0.0.1', 5000), template.encode(
+                              index, 0, [str(index)]))
+    manager.stop()
+
+    found = manager.recent.query(trap_OID=notification_OID)
+    assert [trap.varbinds[-1][1] for trap in found] == \
+        [str(index) for index in range(3, 8)]
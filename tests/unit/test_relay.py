@@ -0,0 +1,106 @@
+import socket
+import pytest
+from commands.trap.manager import SNMPManager
+from commands.trap.metrics import MetricsRegistry, manager_metrics
+from commands.trap.relay import RelayDestination, TrapRelay, \
+    parse_destination
+from commands.trap.transport import DOMAINS
+from client.agents.raw import RawTrapTemplate, TAG_INFORM_PDU
+
+
+@pytest.fixture
+def collectors():
+    sockets = []
+    for _ in range(2):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        sock.settimeout(5)
+        sockets.append(sock)
+    yield sockets
+    for sock in sockets:
+        sock.close()
+
+
+def received(sock, count):
+    return [sock.recv(65535) for _ in range(count)]
+
+
+def test_parse_destination():
+    assert parse_destination('10.0.0.5') == \
+        {'host': '10.0.0.5', 'port': 162, 'sample': 1.0}
+    assert parse_destination('collector:1162@0.25') == \
+        {'host': 'collector', 'port': 1162, 'sample': 0.25}
+    assert parse_destination('[::1]:1162') == \
+        {'host': '::1', 'port': 1162, 'sample': 1.0}
+    with pytest.raises(ValueError):
+        RelayDestination('127.0.0.1', 162, sample=0)
+
+
+def test_forwards_bytes_unchanged(collectors, notification_OID, amount_OID):
+    first, second = collectors
+    relay = TrapRelay([
+        RelayDestination('127.0.0.1', first.getsockname()[1]),
+        RelayDestination('127.0.0.1', second.getsockname()[1],
+                         sample=0.25)])
+    template = RawTrapTemplate(notification_OID, [amount_OID])
+    datagrams = [template.encode(index, 0, [str(index)])
+                 for index in range(20)]
+    datagrams.append(b'not SNMP at all')
+    for data in datagrams:
+        relay.forward(data)
+    assert relay.flush(5)
+
+    assert received(first, 21) == datagrams
+    assert received(second, 5) == datagrams[3::4]
+    stats = relay.stats()
+    assert stats['relayed'] == 21
+    assert [(stats['sent'], stats['sampled_out'])
+            for stats in stats['destinations']] == [(21, 0), (5, 16)]
+    relay.close()
+
+
+def test_filter_rules(collectors, notification_OID, amount_OID):
+    first, second = collectors
+    other_OID = '1.3.6.1.4.1.99999.1'
+    by_prefix = RelayDestination('127.0.0.1', first.getsockname()[1],
+                                 trap_OIDs=[notification_OID])
+    by_filter = RelayDestination(
+        '127.0.0.1', second.getsockname()[1],
+        trap_filter=lambda header: header.request_id % 2 == 0)
+    relay = TrapRelay([by_prefix, by_filter])
+    ours = RawTrapTemplate(notification_OID, [amount_OID])
+    theirs = RawTrapTemplate(other_OID, [amount_OID])
+    datagrams = [(ours if index % 3 else theirs).encode(index, 0, ['1'])
+                 for index in range(12)]
+    for data in datagrams + [b'garbage']:
+        relay.forward(data)
+    assert relay.flush(5)
+
+    assert received(first, 8) == [data for index, data in
+                                  enumerate(datagrams) if index % 3]
+    assert received(second, 6) == datagrams[::2]
+    assert (by_prefix.filtered, by_filter.filtered) == (5, 7)
+    relay.close()
+
+
+def test_manager_relays_without_decoding(collectors, notification_OID,
+                                         amount_OID):
+    first, _ = collectors
+    manager = SNMPManager(verbose=False, relay=[
+        RelayDestination('127.0.0.1', first.getsockname()[1])])
+    trap = RawTrapTemplate(notification_OID, [amount_OID])
+    inform = RawTrapTemplate(notification_OID, [amount_OID],
+                             pdu_tag=TAG_INFORM_PDU)
+    datagrams = [trap.encode(1, 0, ['1']), inform.encode(2, 0, ['2']),
+                 trap.encode(3, 0, ['3'])]
+    for data in datagrams:
+        manager._callback(manager.transportDispatcher,
+                          DOMAINS[socket.AF_INET], ('127.0.0.1', 5000), data)
+    manager.stop()
+
+    assert received(first, 3) == datagrams
+    # Only the inform was decoded, to acknowledge it
+    assert manager.notifications == 1
+    found = MetricsRegistry([manager_metrics(manager)]).render()
+    assert f'snmp_manager_relay_sent_total{{destination="127.0.0.1:' \
+        f'{first.getsockname()[1]}"}} 3\n' in found
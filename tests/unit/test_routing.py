@@ -0,0 +1,96 @@
+import pytest
+from commands.trap.manager import SNMPManager
+from commands.trap.routing import OIDTrie, TrapRouter, parse_oid
+from client.agents.raw import RawTrapTemplate
+
+
+def test_parse_oid():
+    assert parse_oid('1.3.6.1') == (1, 3, 6, 1)
+    assert parse_oid('.1.3.6.1') == (1, 3, 6, 1)
+    assert parse_oid('') == ()
+    assert parse_oid((1, 3)) == (1, 3)
+    for invalid in ('1..3', '1.3.x', '1.-3', (1, -3)):
+        with pytest.raises(ValueError):
+            parse_oid(invalid)
+
+
+def test_trie_matches_whole_arcs_longest_first():
+    trie = OIDTrie()
+    trie.insert('1.3.6.1.4.1', 'enterprises')
+    trie.insert('1.3.6.1.4.1.1', 'one')
+    trie.insert('1.3.6.1.4.1.12345', 'settlement')
+    trie.insert('1.3.6.1.4.1.12345.1', 'status')
+    trie.insert('', 'default')
+
+    assert trie.match('1.3.6.1.4.1.12345.1.1') == \
+        ['status', 'settlement', 'enterprises', 'default']
+    assert trie.match('1.3.6.1.4.1.1.5') == ['one', 'enterprises', 'default']
+    assert trie.match('1.3.6.1.2.1') == ['default']
+    assert len(trie) == 5
+
+    assert trie.remove('1.3.6.1.4.1.12345.1', 'status')
+    assert not trie.remove('1.3.6.1.4.1.12345.1', 'status')
+    assert not trie.remove('1.3.6.1.4.1.99', 'enterprises')
+    assert trie.match('1.3.6.1.4.1.12345.1.1') == \
+        ['settlement', 'enterprises', 'default']
+    assert len(trie) == 4
+
+
+def test_trie_remove_prunes_empty_branches():
+    trie = OIDTrie()
+    trie.insert('1.3.6.1.4.1.12345.1.1', 'a')
+    trie.insert('1.3.6.1.4.1.12345.2', 'b')
+    trie.remove('1.3.6.1.4.1.12345.1.1', 'a')
+    trie.remove('1.3.6.1.4.1.12345.2', 'b')
+    assert trie._root == {}
+
+
+def test_router_dispatch_order_and_counters(make_trap, notification_OID,
+                                            amount_OID):
+    router = TrapRouter()
+    calls = []
+    router.add('1.3.6.1.4.1.12345', lambda trap: calls.append('subtree'))
+    router.add(notification_OID, lambda trap: calls.append('status'))
+    router.add(amount_OID, lambda trap: calls.append('amount'), on='varbind')
+
+    @router.route('1.3.6.1.4.1.12345.1', on='varbind')
+    def settlement(trap):
+        calls.append('settlement')
+        raise RuntimeError('handler failure')
+
+    assert router.dispatch(make_trap()) == 4
+    assert calls == ['status', 'subtree', 'amount', 'settlement']
+    assert router.errors == 1
+
+    calls.clear()
+    # A handler matching several var-binds is called once
+    assert router.dispatch(make_trap(
+        trap_OID='1.3.6.1.6.3.1.1.5.1',
+        varbinds=[(amount_OID, '1'), (amount_OID, '2')])) == 2
+    assert calls == ['amount', 'settlement']
+
+    assert router.dispatch(make_trap(trap_OID='1.3.6.1.6.3.1.1.5.1',
+                                     varbinds=[])) == 0
+    assert (router.dispatched, router.unmatched) == (2, 1)
+    assert len(router) == 4
+
+    with pytest.raises(ValueError):
+        router.add('1.3', print, on='community')
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_manager_routes_notifications(lazy, notification_OID, amount_OID):
+    router = TrapRouter()
+    routed = []
+    router.add('1.3.6.1.4.1.12345.1', routed.append)
+    manager = SNMPManager(verbose=False, lazy=lazy, router=router)
+    template = RawTrapTemplate(notification_OID, [amount_OID])
+    other = RawTrapTemplate('1.3.6.1.6.3.1.1.5.3', [amount_OID])
+    for data in (template.encode(1, 0, ['1']), other.encode(2, 0, ['2'])):
+        manager._callback(manager.transportDispatcher, None,
+                          ('127.0.0.1', 5000), data)
+    manager.stop()
+
+    assert [trap.trap_OID for trap in routed] == [notification_OID]
+    assert routed[0].varbinds[-1] == (amount_OID, '1')
+    assert router.unmatched == 1
@@ -0,0 +1,152 @@
+import io
+import json
+import os
+import threading
+import pytest
+from commands.trap.manager import SNMPManager
+from commands.trap.sinks import (BufferedOutput, RotatingFileSink,
+                                 StreamSink, format_text)
+from client.agents.raw import RawTrapTemplate, SNMP_TRAP_OID
+
+
+class StalledSink(StreamSink):
+    """
+    A sink whose writes wait until `release` is set.
+    """
+    def __init__(self):
+        super().__init__(io.StringIO())
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, text):
+        self.entered.set()
+        assert self.release.wait(5)
+        super().write(text)
+
+
+def test_ndjson_batches(make_trap, amount_OID):
+    stream = io.StringIO()
+    output = BufferedOutput(StreamSink(stream), 'ndjson', batch_size=64)
+    for index in range(1000):
+        assert output.put(make_trap(index, amount=str(index)))
+    assert output.flush(5)
+
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [record['varbinds'][-1] for record in records] == \
+        [[amount_OID, str(index)] for index in range(1000)]
+    assert records[0]['host'] == '10.0.0.1'
+    assert records[0]['pdu_type'] == 'trap'
+    assert output.written == 1000
+    assert output.batches < 1000
+    output.close()
+    assert not output.put(make_trap())
+
+
+def test_text_format_matches_print(make_trap, notification_OID, amount_OID):
+    text = format_text(make_trap(7, amount='7'))
+    assert text == ("Notification message from None:('10.0.0.1', 162): \n"
+                    "Var-binds:\n"
+                    "1.3.6.1.2.1.1.3.0 = 0\n"
+                    f"{SNMP_TRAP_OID} = {notification_OID}\n"
+                    f"{amount_OID} = 7\n")
+
+
+@pytest.mark.parametrize("policy, written", [
+    ('drop_newest', ['0', '1', '2']),
+    ('drop_oldest', ['0', '3', '4']),
+])
+def test_drop_policies(policy, written, make_trap):
+    sink = StalledSink()
+    output = BufferedOutput(sink, 'ndjson', maxsize=2, policy=policy)
+    output.put(make_trap(0, amount='0'))
+    # The writer holds the first notification, two more fill the queue
+    assert sink.entered.wait(5)
+    for index in range(1, 5):
+        output.put(make_trap(index, amount=str(index)))
+    sink.release.set()
+    assert output.flush(5)
+
+    values = [json.loads(line)['varbinds'][-1][1]
+              for line in sink.stream.getvalue().splitlines()]
+    assert values == written
+    assert output.dropped == 2
+    assert output.stats()['blocked'] == 0
+    output.close()
+
+
+def test_block_policy_waits_for_room(make_trap):
+    sink = StalledSink()
+    output = BufferedOutput(sink, 'ndjson', maxsize=2, policy='block')
+    output.put(make_trap())
+    assert sink.entered.wait(5)
+    output.put(make_trap())
+    output.put(make_trap())
+
+    producer = threading.Thread(target=output.put, args=(make_trap(),))
+    producer.start()
+    producer.join(0.2)
+    assert producer.is_alive()
+    sink.release.set()
+    producer.join(5)
+    output.close()
+
+    assert output.blocked == 1
+    assert output.dropped == 0
+    assert output.written == 4
+
+
+def test_default_policy_does_not_block(make_trap):
+    sink = StalledSink()
+    output = BufferedOutput(sink, 'ndjson', maxsize=2)
+    output.put(make_trap())
+    assert sink.entered.wait(5)
+    for index in range(3):
+        output.put(make_trap())
+    sink.release.set()
+    output.close()
+
+    assert output.policy == 'drop_oldest'
+    assert output.blocked == 0
+    assert output.dropped_oldest == 1
+
+
+def test_rotating_file_sink(tmp_path, make_trap):
+    path = str(tmp_path / 'traps.ndjson')
+    sink = RotatingFileSink(path, max_bytes=1000, backups=2)
+    output = BufferedOutput(sink, 'ndjson', batch_size=1)
+    for index in range(100):
+        output.put(make_trap(index, amount=str(index)))
+    output.close()
+
+    assert sink.rotations > 2
+    assert sorted(os.listdir(tmp_path)) == \
+        ['traps.ndjson', 'traps.ndjson.1', 'traps.ndjson.2']
+    for name in os.listdir(tmp_path):
+        assert os.path.getsize(tmp_path / name) <= 1000
+    with open(path) as file:
+        assert json.loads(file.readlines()[-1])['varbinds'][-1][1] == '99'
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        BufferedOutput(format='xml')
+    with pytest.raises(ValueError):
+        BufferedOutput(policy='drop_all')
+    with pytest.raises(ValueError):
+        BufferedOutput(maxsize=0)
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_manager_writes_to_output(lazy, notification_OID, amount_OID):
+    stream = io.StringIO()
+    output = BufferedOutput(StreamSink(stream), 'ndjson')
+    manager = SNMPManager(verbose=False, lazy=lazy, output=output)
+    data = RawTrapTemplate(notification_OID, [amount_OID]).encode(
+        1, 0, ['125.40'])
+    manager._callback(manager.transportDispatcher, None,
+                      ('127.0.0.1', 5000), data)
+    manager.stop()
+
+    record = json.loads(stream.getvalue())
+    assert record['port'] == 5000
+    assert record['varbinds'][-1] == [amount_OID, '125.40']
@@ -0,0 +1,113 @@
+import os
+import re
+import asyncio
+import time
+import numpy as np
+import pytest
+from client.agents.synthetic import TransactionGenerator
+from client.agents.transaction import TransactionSNMPAgent
+
+
+class Collector(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.datagrams = []
+
+    def datagram_received(self, data, addr):
+        self.datagrams.append(data)
+
+
+def test_same_seed_same_batch():
+    first = TransactionGenerator(seed=7).generate(1000)
+    second = TransactionGenerator(seed=7).generate(1000)
+    other = TransactionGenerator(seed=8).generate(1000)
+
+    assert list(first.rows()) == list(second.rows())
+    assert list(first.rows()) != list(other.rows())
+
+
+def test_timestamps_monotonic_and_ordered():
+    generator = TransactionGenerator(seed=1, rate=50.0)
+    batch = generator.generate(5000)
+    following = generator.generate(10)
+    columns = batch.columns
+
+    assert (np.diff(columns['open_datetime']).astype(int) >= 0).all()
+    assert (columns['close_datetime'] >= columns['open_datetime']).all()
+    assert (columns['submission_datetime'] >=
+            columns['close_datetime']).all()
+    assert (columns['deposit_datetime'] >=
+            columns['submission_datetime']).all()
+    # Successive batches continue the timeline
+    assert following.columns['open_datetime'][0] >= \
+        columns['open_datetime'][-1]
+
+
+def test_fields_and_distributions():
+    generator = TransactionGenerator(seed=3, statuses=('ok', 'ko'),
+                                     status_weights=(1, 0),
+                                     amount_distribution='uniform',
+                                     amount_params=(10, 20))
+    batch = generator.generate(2000)
+    amounts = batch.column('amount')
+
+    assert set(batch.column('status')) == {'ok'}
+    assert ((amounts >= 10) & (amounts <= 20)).all()
+    assert all(re.fullmatch('[A-Z0-9]{8}', mid) for mid in batch.column('mid'))
+    assert np.allclose(amounts, np.round(amounts, 2))
+
+
+def test_merchant_pool():
+    batch = TransactionGenerator(seed=5, merchants=10).generate(1000)
+    assert len(set(batch.column('mid'))) <= 10
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        TransactionGenerator(type_weights=(1, 2))
+    with pytest.raises(ValueError):
+        TransactionGenerator(amount_distribution='normal')
+    with pytest.raises(ValueError):
+        TransactionGenerator(rate=0)
+
+
+def test_rows_order_and_chunks():
+    batch = TransactionGenerator(seed=2).generate(10)
+    rows = list(batch.rows(('mid', 'amount'), chunk_size=3))
+
+    assert len(rows) == 10
+    assert rows[4] == (batch.column('mid')[4],
+                       '%.2f' % batch.column('amount')[4])
+    assert len(next(batch.rows())) == 9
+
+
+def test_generate_million_under_a_second():
+    generator = TransactionGenerator(seed=0)
+    start = time.perf_counter()
+    batch = generator.generate(1_000_000)
+    assert len(batch) == 1_000_000
+    assert time.perf_counter() - start < 1.0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("send_mode", ["hlapi", "raw"])
+async def test_send_transactions(send_mode):
+    loop = asyncio.get_running_loop()
+    transport, collector = await loop.create_datagram_endpoint(
+        Collector, local_addr=('127.0.0.1', 0))
+    port = transport.get_extra_info('sockname')[1]
+    agent = TransactionSNMPAgent(
+        port=port, notification_OID=os.getenv('OID_SETTLEMENT_STATUS'),
+        varbinds={}, send_mode=send_mode)
+    batch = TransactionGenerator(seed=11).generate(40)
+
+    try:
+        result = await agent.send_transactions(batch, concurrency=8)
+        await asyncio.sleep(0.2)
+    finally:
+        agent.close()
+        transport.close()
+
+    assert result.sent == 40
+    assert len(collector.datagrams) == 40
+    mids = {mid.encode() for mid in batch.column('mid')}
+    assert any(mid in collector.datagrams[0] for mid in mids)
@@ -0,0 +1,87 @@
+import os
+import asyncio
+import pytest
+from client.agents.generic import SNMPAgent
+from client.agents.registry import TransportTargetCache
+from client.components.varbinds import Varbind
+
+
+sample_varbinds = [
+            Varbind(os.getenv('OID_SETTLEMENT_TYPE'), 'settlement'),
+            Varbind(os.getenv('OID_SETTLEMENT_STATUS'), 'submitted')
+]
+
+
+@pytest.mark.asyncio
+async def test_cache_hit():
+    cache = TransportTargetCache()
+    first = await cache.get('127.0.0.1', 2162)
+    second = await cache.get('127.0.0.1', '2162')
+
+    assert first is second
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_lru_eviction():
+    cache = TransportTargetCache(maxsize=2)
+    await cache.get('127.0.0.1', 2001)
+    await cache.get('127.0.0.1', 2002)
+    # Touch 2001 so 2002 becomes the least recently used entry
+    await cache.get('127.0.0.1', 2001)
+    await cache.get('127.0.0.1', 2003)
+
+    assert len(cache) == 2
+    assert ('127.0.0.1', 2001) in cache
+    assert ('127.0.0.1', 2002) not in cache
+
+
+@pytest.mark.asyncio
+async def test_cache_close():
+    cache = TransportTargetCache()
+    await cache.get('127.0.0.1', 2162)
+    cache.close()
+
+    assert len(cache) == 0
+    assert cache.hits == 0 and cache.misses == 0
+
+
+def test_cache_bad_maxsize():
+    with pytest.raises(ValueError):
+        TransportTargetCache(maxsize=0)
+
+
+@pytest.mark.asyncio
+async def test_agents_share_engine_and_target():
+    notification_OID = os.getenv('OID_SETTLEMENT_STATUS')
+    cache = TransportTargetCache()
+    agent = SNMPAgent(notification_OID=notification_OID,
+                      varbinds=sample_varbinds, target_cache=cache)
+    other = SNMPAgent(notification_OID=notification_OID,
+                      varbinds=sample_varbinds, target_cache=cache)
+
+    await agent.send_trap()
+    await other.send_trap()
+
+    assert agent.snmp_engine is other.snmp_engine
+    assert cache.misses == 1
+    assert cache.hits == 1
+
+
+def test_engine_needs_running_loop():
+    agent = SNMPAgent(notification_OID=os.getenv('OID_SETTLEMENT_STATUS'))
+    with pytest.raises(RuntimeError):
+        agent.snmp_engine
+
+    async def engine():
+        return agent.snmp_engine
+
+    # Each loop gets its own engine, the GUI reuses one loop for its sends
+    loop = asyncio.new_event_loop()
+    try:
+        first = loop.run_until_complete(engine())
+        assert loop.run_until_complete(engine()) is first
+    finally:
+        loop.close()
+    assert asyncio.run(engine()) is not first
@@ -0,0 +1,119 @@
+import os
+import pytest
+from commands.trap.aggregate import TrapSummary
+from commands.trap.lazy import decode_header
+from commands.trap.manager import LazyReceivedTrap, SNMPManager
+from commands.trap.store import TrapStore
+from client.agents.raw import RawTrapTemplate
+
+
+@pytest.fixture
+def store(tmp_path, make_trap):
+    store = TrapStore(str(tmp_path), segment_seconds=100)
+    for index in range(300):
+        received = 1000.0 + index
+        store.put(make_trap(received, f'10.0.0.{index % 3}',
+                            f'1.3.6.1.4.1.{1 + index % 2}.1',
+                            varbinds=[(f'1.3.6.1.2.1.2.2.1.{index % 5}',
+                                       str(received))]))
+    assert store.flush(5)
+    yield store
+    store.close()
+
+
+def test_segments_and_time_range(store):
+    assert store.segments() == [1000, 1100, 1200]
+    assert len(store.query()) == 300
+    found = store.query(start=1050, end=1150)
+    assert [trap.received for trap in found] == \
+        [float(received) for received in range(1050, 1150)]
+    assert store.query(start=1150, end=1160, limit=3)[-1].received == 1152
+    assert len(store.query(start=1090, limit=20)) == 20
+
+
+def test_host_and_OID_queries(store, make_trap):
+    assert len(store.query(host='10.0.0.1')) == 100
+    # Prefixes match whole arcs: '1.3.6.1.4.1.1' is not a prefix of
+    # '1.3.6.1.4.1.12345'
+    store.put(make_trap(1299.5, '10.0.0.9'))
+    assert store.flush(5)
+    assert len(store.query(trap_OID='1.3.6.1.4.1.1')) == 150
+    assert len(store.query(trap_OID='1.3.6.1.4.1.1.1')) == 150
+    assert len(store.query(trap_OID='1.3.6.1.4.1')) == 301
+    assert len(store.query(varbind_OID='1.3.6.1.2.1.2.2.1.3')) == 60
+    found = store.query(host='10.0.0.0', trap_OID='1.3.6.1.4.1.2',
+                        varbind_OID='1.3.6.1.2.1.2.2.1', start=1200)
+    assert [trap.received for trap in found] == \
+        [float(received) for received in range(1201, 1300, 6)]
+    assert found[0].varbinds[-1] == ('1.3.6.1.2.1.2.2.1.1', '1201.0')
+
+
+def test_retention_drops_whole_segments(tmp_path, make_trap, clock):
+    clock.now = 1250.0
+    store = TrapStore(str(tmp_path), segment_seconds=100, retention=150,
+                      clock=clock)
+    for received in (1000.0, 1150.0, 1240.0):
+        store.put(make_trap(received))
+    assert store.flush(5)
+    # The first segment was deleted when the last one was started
+    assert store.segments() == [1100, 1200]
+    clock.now = 1400.0
+    assert store.apply_retention() == 1
+    assert store.segments() == [1200]
+    store.close()
+    assert sorted(os.listdir(tmp_path)) == ['traps-0000001200.db']
+
+
+def test_reopened_store_appends(tmp_path, make_trap):
+    for received in (1000.0, 1001.0):
+        store = TrapStore(str(tmp_path))
+        store.put(make_trap(received))
+        store.close()
+    assert [trap.received for trap in TrapStore(str(tmp_path)).query()] == \
+        [1000.0, 1001.0]
+
+
+def test_manager_stores_notifications(tmp_path, notification_OID, amount_OID):
+    manager = SNMPManager(verbose=False, store=str(tmp_path))
+    template = RawTrapTemplate(notification_OID, [amount_OID])
+    for index in range(10):
+        manager._callback(manager.transportDispatcher, None,
+                          ('127.0.0.1', 5000), template.encode(
+                              index, 0, [str(index)]))
+    manager.stop()
+
+    found = TrapStore(str(tmp_path)).query(varbind_OID=amount_OID)
+    assert [trap.varbinds[-1][1] for trap in found] == \
+        [str(index) for index in range(10)]
+    assert found[0].trap_OID == notification_OID
+    assert found[0].host == '127.0.0.1'
+
+
+def test_malformed_lazy_notification_is_skipped(tmp_path, make_trap,
+                                                notification_OID, amount_OID):
+    store = TrapStore(str(tmp_path))
+    template = RawTrapTemplate(notification_OID, [amount_OID])
+    for index in range(3):
+        data = template.encode(index, 0, [str(index)])
+        if index == 1:
+            # Its header decodes, its var-binds do not
+            data = data[:-3] + b'\x1f' + data[-2:]
+        store.put(LazyReceivedTrap(1000.0 + index, None, ('10.0.0.1', 162),
+                                   decode_header(data)))
+    assert store.flush(timeout=2)
+    assert store.output.errors == 1
+    store.put(make_trap(1003.0))
+    store.close()
+    assert [trap.received for trap in store.query()] == \
+        [1000.0, 1002.0, 1003.0]
+
+
+def test_summaries_keep_their_count(tmp_path, make_trap):
+    store = TrapStore(str(tmp_path))
+    store.put(make_trap(1000.0))
+    store.put(TrapSummary(make_trap(1002.0),
+                          40, 1001.0, 1002.0))
+    store.close()
+    found = TrapStore(str(tmp_path)).query()
+    assert [(trap.received, trap.count) for trap in found] == \
+        [(1000.0, 1), (1002.0, 40)]
@@ -0,0 +1,95 @@
+import os
+import asyncio
+import pytest
+from commands.trap.manager import SNMPManager
+from client.agents.generic import SNMPAgent
+from client.agents.registry import get_snmp_engine
+from client.agents.usm import USMUser, LocalizedKeyCache
+
+
+notification_OID = os.getenv('OID_SETTLEMENT_STATUS')
+engine_id = '8000000001020304'
+
+
+def test_localized_key_vectors():
+    # RFC 3414, A.3.1 and A.3.2
+    engine = bytes.fromhex('000000000000000000000002')
+    md5 = USMUser('user', 'maplesyrup', auth_protocol='MD5',
+                  key_cache=LocalizedKeyCache())
+    sha = USMUser('user', 'maplesyrup', auth_protocol='SHA',
+                  key_cache=LocalizedKeyCache())
+
+    assert md5.localized_keys(engine)[0].hex() == \
+        '526f5eed9fcce26f8964c2930787d82b'
+    assert sha.localized_keys(engine)[0].hex() == \
+        '6695febc9288e36282235fc7151f128497b38f3f'
+
+
+def test_key_cache_hits():
+    cache = LocalizedKeyCache()
+    user = USMUser('user', 'authpass123', 'privpass123', key_cache=cache)
+    changed = USMUser('user', 'authpass123', 'otherpass123',
+                      key_cache=cache)
+
+    first = user.localized_keys(engine_id)
+    assert user.localized_keys(engine_id) == first
+    assert (cache.misses, cache.hits) == (1, 1)
+
+    user.localized_keys('8000000001020305')
+    assert changed.localized_keys(engine_id) != first
+    assert cache.misses == 3
+    assert len(cache) == 3
+
+
+def test_invalid_users():
+    with pytest.raises(ValueError):
+        USMUser('')
+    with pytest.raises(ValueError):
+        USMUser('user', 'short')
+    with pytest.raises(ValueError):
+        USMUser('user', priv_key='privpass123')
+    with pytest.raises(ValueError):
+        USMUser('user', 'authpass123', auth_protocol='CRC32')
+    with pytest.raises(ValueError):
+        USMUser('user').user_data()
+
+
+def test_raw_mode_rejects_v3():
+    with pytest.raises(ValueError):
+        SNMPAgent(notification_OID=notification_OID, send_mode='raw',
+                  usm_user=USMUser('user', 'authpass123'))
+
+
+@pytest.mark.asyncio
+async def test_engine_id_mismatch():
+    engine = get_snmp_engine('usm-test', bytes.fromhex(engine_id))
+    assert bytes(engine.snmpEngineID).hex() == engine_id
+    with pytest.raises(ValueError):
+        get_snmp_engine('usm-test', bytes.fromhex('8000000001020399'))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("manager_priv_key, received", [
+    ('privpass123', True),
+    ('wrongpass123', False),
+])
+async def test_v3_trap_end_to_end(capfd, manager_priv_key, received):
+    manager_user = USMUser('trapuser', 'authpass123', manager_priv_key,
+                           auth_protocol='SHA256', engine_id=engine_id)
+    manager = SNMPManager(usm_users=[manager_user])
+    manager_task = asyncio.create_task(manager.run_async())
+    agent = SNMPAgent(notification_OID=notification_OID,
+                      varbinds={os.getenv('OID_SETTLEMENT_TYPE'): 'v3secret'},
+                      engine_name='usm-agent', engine_id=engine_id,
+                      usm_user=USMUser('trapuser', 'authpass123',
+                                       'privpass123',
+                                       auth_protocol='SHA256'))
+    try:
+        await asyncio.sleep(0.5)
+        await agent.send_trap()
+        await asyncio.sleep(0.5)
+    finally:
+        manager.stop()
+        await manager_task
+
+    assert ("v3secret" in capfd.readouterr().out) is received